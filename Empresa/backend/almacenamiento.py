@@ -0,0 +1,205 @@
+"""
+Capa de almacenamiento de estaciones
+Los servicios no acceden a la colección de estaciones de Motor sino a un
+repositorio con operaciones de dominio (crear, paginar, actualizar precios,
+confirmar versiones, cambiar estados, importar y exportar...). El driver se
+elige con la variable de entorno ALMACENAMIENTO.
+
+La única excepción es la migración del historial embebido legado
+(historico_service.migrar_historico_embebido), que solo existe en MongoDB.
+El resto de las colecciones de la Empresa (buckets del histórico,
+contadores, outbox de entregas, programaciones, rollouts) siguen en MongoDB
+fuera de esta capa, por lo que el único driver es mongo. Los drivers en
+memoria y SQLite existen en la estación (Estacion/backend/almacenamiento.py).
+
+Los documentos se intercambian como diccionarios con las mismas claves que
+en MongoDB y "_id" siempre se entrega como string. La verificación de
+conformidad del driver está en conformidad_almacenamiento.py.
+
+Variables de entorno:
+    ALMACENAMIENTO: mongo. Default mongo
+"""
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+DRIVERS = ("mongo",)
+
+ALMACENAMIENTO = os.getenv("ALMACENAMIENTO", "mongo").lower()
+
+
+class RepositorioEstaciones(ABC):
+    """Estaciones de servicio, sus precios vigentes y la versión confirmada"""
+
+    @abstractmethod
+    async def inicializar(self):
+        """Alinea la secuencia de IDs con los datos existentes (los índices se declaran en indices.py)"""
+
+    @abstractmethod
+    async def reservar_ids(self, cantidad: int = 1) -> range:
+        """Reserva un bloque de IDs consecutivos (nunca repetidos)"""
+
+    @abstractmethod
+    async def insertar(self, estacion: Dict[str, Any]) -> str:
+        """
+        Inserta una estación (no modifica el diccionario recibido)
+
+        Returns:
+            _id asignado
+        """
+
+    @abstractmethod
+    async def insertar_varias(self, estaciones: List[Dict[str, Any]]) -> Dict[int, str]:
+        """
+        Inserta un lote de estaciones; un error en una no detiene las demás
+
+        Returns:
+            Posición en el lote -> mensaje de error de las que no se insertaron
+        """
+
+    @abstractmethod
+    async def listar(
+        self,
+        campos: Optional[Iterable[str]] = None,
+        despues_de: Optional[int] = None,
+        estado: Union[str, Iterable[str], None] = None,
+        limit: Optional[int] = None,
+        ids: Optional[Iterable[int]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Estaciones ordenadas por id_estacion
+
+        Args:
+            campos: Campos a incluir (None = todos excepto el historial legado)
+            despues_de: Solo estaciones con id_estacion mayor a este
+            estado: Filtrar por estado (o por cualquiera de una lista de estados)
+            limit: Cantidad máxima (None = todas)
+            ids: Solo estas estaciones (None = todas)
+        """
+
+    @abstractmethod
+    def iterar(
+        self,
+        campos: Optional[Iterable[str]] = None,
+        estado: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Recorre las estaciones ordenadas por id_estacion sin cargarlas todas
+        en memoria (mismos campos y filtro que listar)
+        """
+
+    @abstractmethod
+    async def obtener(self, id_estacion: int) -> Optional[Dict[str, Any]]:
+        """Estación por ID (sin historial legado) o None"""
+
+    @abstractmethod
+    async def actualizar(self, id_estacion: int, campos: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Reemplaza los campos indicados
+
+        Returns:
+            La estación como estaba ANTES del cambio, o None si no existe
+        """
+
+    @abstractmethod
+    async def actualizar_precios(self, id_estacion: int, precios: Dict[str, int],
+                                 fecha: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Reemplaza los precios vigentes y avanza version_precios en uno
+
+        Returns:
+            La estación actualizada o None si no existe
+        """
+
+    @abstractmethod
+    async def cambiar_estados(self, cambios: Iterable[Tuple[int, str, str]], fecha: datetime) -> int:
+        """
+        Cambia el estado de varias estaciones en una sola escritura; cada
+        cambio se aplica solo si la estación sigue en el estado anterior
+
+        Args:
+            cambios: (id_estacion, estado anterior, estado nuevo)
+            fecha: fecha_cambio_estado a registrar
+
+        Returns:
+            Cantidad de estaciones que cambiaron
+        """
+
+    @abstractmethod
+    async def contar_por_estado(self) -> Tuple[int, Dict[str, int]]:
+        """
+        Returns:
+            (total de estaciones, estado -> cantidad); las estaciones sin
+            estado cuentan en el total pero no en el desglose
+        """
+
+    @abstractmethod
+    async def eliminar(self, id_estacion: int) -> Optional[Dict[str, Any]]:
+        """
+        Elimina una estación
+
+        Returns:
+            estado, version_precios y version_confirmada (si existe) de la
+            estación eliminada, o None si no existía
+        """
+
+    @abstractmethod
+    async def confirmar_version(self, id_estacion: int, version: int,
+                                fecha: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Registra la versión confirmada y su fecha solo si 'version' es mayor
+        que la confirmada actual (nunca retrocede)
+
+        Returns:
+            version_precios y version_confirmada (si existe) ANTES del cambio,
+            o None si la versión no avanzó o la estación no existe
+        """
+
+    @abstractmethod
+    async def listar_desactualizadas(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Estaciones con version_confirmada < version_precios, ordenadas por ID
+
+        Returns:
+            Documentos con id_estacion, nombre, estado, version_precios,
+            version_confirmada (si existe) y fecha_confirmacion
+        """
+
+    @abstractmethod
+    async def contar_desactualizadas(self) -> int:
+        """Cantidad de estaciones con version_confirmada < version_precios"""
+
+    @abstractmethod
+    async def existe_ip(self, ip: str, excluir_id: Optional[int] = None) -> bool:
+        """Si otra estación (distinta de excluir_id) ya usa esa IP"""
+
+
+class Almacenamiento(ABC):
+    """Driver de almacenamiento (la conexión la abre database.py al importarse)"""
+
+    nombre = ""
+    estaciones: RepositorioEstaciones
+
+
+def crear_almacenamiento(driver: str = ALMACENAMIENTO) -> Almacenamiento:
+    """
+    Construye el driver de almacenamiento indicado
+
+    Args:
+        driver: "mongo"
+
+    Raises:
+        ValueError: Si el driver no existe en la Empresa
+    """
+    if driver == "mongo":
+        from almacenamiento_mongo import AlmacenamientoMongo
+        return AlmacenamientoMongo()
+    raise ValueError(
+        f"Driver de almacenamiento no disponible en la Empresa: {driver} "
+        f"(opciones: {', '.join(DRIVERS)})"
+    )
+
+
+# Instancia global usada por los servicios
+almacenamiento = crear_almacenamiento()
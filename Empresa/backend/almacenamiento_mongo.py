@@ -0,0 +1,244 @@
+"""
+Driver de almacenamiento de estaciones sobre MongoDB (Motor)
+Traduce las operaciones del repositorio a consultas sobre
+estaciones_collection; la secuencia de IDs vive en la colección de
+contadores (secuencias.py).
+"""
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from almacenamiento import Almacenamiento, RepositorioEstaciones
+from database import db, estaciones_collection
+from secuencias import reservar_ids, sincronizar_secuencia
+
+# Nombre de la secuencia de IDs de estaciones en la colección de contadores
+SECUENCIA_ESTACIONES = "estaciones"
+
+# Proyección por defecto: todo excepto el historial embebido (legado)
+PROYECCION_ESTACION = {"historico_precios": 0}
+
+# Documentos por lote de red al recorrer la colección con iterar()
+TAMANO_LOTE_CURSOR = 1000
+
+# Estaciones cuya última versión confirmada es anterior a la vigente
+FILTRO_DESACTUALIZADAS = {
+    "$expr": {
+        "$lt": [
+            {"$ifNull": ["$version_confirmada", 0]},
+            {"$ifNull": ["$version_precios", 0]}
+        ]
+    }
+}
+
+
+def _con_id_texto(documento: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if documento and "_id" in documento:
+        documento["_id"] = str(documento["_id"])
+    return documento
+
+
+def construir_proyeccion(campos: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Construye la proyección de MongoDB para un conjunto de campos
+
+    Args:
+        campos: Campos solicitados (None = proyección por defecto)
+
+    Returns:
+        Diccionario de proyección para find()
+    """
+    if not campos:
+        return dict(PROYECCION_ESTACION)
+
+    proyeccion = {campo: 1 for campo in campos}
+    # id_estacion siempre se incluye porque es la clave del cursor
+    proyeccion["id_estacion"] = 1
+    if "_id" not in proyeccion:
+        proyeccion["_id"] = 0
+
+    return proyeccion
+
+
+def _filtro(
+    despues_de: Optional[int] = None,
+    estado: Union[str, Iterable[str], None] = None,
+    ids: Optional[Iterable[int]] = None
+) -> Dict[str, Any]:
+    filtro: Dict[str, Any] = {}
+    if despues_de is not None:
+        filtro.setdefault("id_estacion", {})["$gt"] = despues_de
+    if ids is not None:
+        filtro.setdefault("id_estacion", {})["$in"] = list(ids)
+    if isinstance(estado, str):
+        filtro["estado"] = estado
+    elif estado is not None:
+        filtro["estado"] = {"$in": list(estado)}
+    return filtro
+
+
+class EstacionesMongo(RepositorioEstaciones):
+
+    async def inicializar(self):
+        await sincronizar_secuencia(db, SECUENCIA_ESTACIONES, "estaciones", "id_estacion")
+
+    async def reservar_ids(self, cantidad: int = 1) -> range:
+        return await reservar_ids(db, SECUENCIA_ESTACIONES, cantidad)
+
+    async def insertar(self, estacion: Dict[str, Any]) -> str:
+        resultado = await estaciones_collection.insert_one(dict(estacion))
+        return str(resultado.inserted_id)
+
+    async def insertar_varias(self, estaciones: List[Dict[str, Any]]) -> Dict[int, str]:
+        if not estaciones:
+            return {}
+        try:
+            await estaciones_collection.insert_many([dict(e) for e in estaciones], ordered=False)
+        except BulkWriteError as e:
+            return {
+                error["index"]: error.get("errmsg", "Error de escritura")
+                for error in e.details.get("writeErrors", [])
+            }
+        return {}
+
+    async def listar(
+        self,
+        campos: Optional[Iterable[str]] = None,
+        despues_de: Optional[int] = None,
+        estado: Union[str, Iterable[str], None] = None,
+        limit: Optional[int] = None,
+        ids: Optional[Iterable[int]] = None
+    ) -> List[Dict[str, Any]]:
+        filtro = _filtro(despues_de, estado, ids)
+        cursor = estaciones_collection.find(filtro, construir_proyeccion(campos)).sort("id_estacion", 1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return [_con_id_texto(estacion) async for estacion in cursor]
+
+    async def iterar(
+        self,
+        campos: Optional[Iterable[str]] = None,
+        estado: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        cursor = estaciones_collection.find(
+            _filtro(estado=estado),
+            construir_proyeccion(campos),
+            batch_size=TAMANO_LOTE_CURSOR
+        ).sort("id_estacion", 1)
+        async for estacion in cursor:
+            yield _con_id_texto(estacion)
+
+    async def obtener(self, id_estacion: int) -> Optional[Dict[str, Any]]:
+        return _con_id_texto(await estaciones_collection.find_one(
+            {"id_estacion": id_estacion},
+            PROYECCION_ESTACION
+        ))
+
+    async def actualizar(self, id_estacion: int, campos: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return _con_id_texto(await estaciones_collection.find_one_and_update(
+            {"id_estacion": id_estacion},
+            {"$set": campos},
+            projection=PROYECCION_ESTACION,
+            return_document=ReturnDocument.BEFORE
+        ))
+
+    async def actualizar_precios(self, id_estacion: int, precios: Dict[str, int],
+                                 fecha: datetime) -> Optional[Dict[str, Any]]:
+        # Precios, versión y lectura del resultado en un solo round-trip
+        return _con_id_texto(await estaciones_collection.find_one_and_update(
+            {"id_estacion": id_estacion},
+            {
+                "$set": {
+                    "precios_actuales": precios,
+                    "fecha_actualizacion": fecha
+                },
+                "$inc": {"version_precios": 1}
+            },
+            projection=PROYECCION_ESTACION,
+            return_document=ReturnDocument.AFTER
+        ))
+
+    async def cambiar_estados(self, cambios: Iterable[Tuple[int, str, str]], fecha: datetime) -> int:
+        operaciones = [
+            UpdateOne(
+                {"id_estacion": id_estacion, "estado": anterior},
+                {"$set": {"estado": nuevo, "fecha_cambio_estado": fecha}}
+            )
+            for id_estacion, anterior, nuevo in cambios
+        ]
+        if not operaciones:
+            return 0
+        resultado = await estaciones_collection.bulk_write(operaciones, ordered=False)
+        return resultado.modified_count
+
+    async def contar_por_estado(self) -> Tuple[int, Dict[str, int]]:
+        # Total y desglose en una única agregación
+        pipeline = [
+            {
+                "$facet": {
+                    "total": [{"$count": "n"}],
+                    "por_estado": [{"$group": {"_id": "$estado", "n": {"$sum": 1}}}]
+                }
+            }
+        ]
+        resultado = await estaciones_collection.aggregate(pipeline).to_list(1)
+        facetas = resultado[0] if resultado else {"total": [], "por_estado": []}
+        total = facetas["total"][0]["n"] if facetas["total"] else 0
+        por_estado = {
+            grupo["_id"]: grupo["n"]
+            for grupo in facetas["por_estado"]
+            if grupo["_id"] is not None
+        }
+        return total, por_estado
+
+    async def eliminar(self, id_estacion: int) -> Optional[Dict[str, Any]]:
+        return await estaciones_collection.find_one_and_delete(
+            {"id_estacion": id_estacion},
+            projection={"_id": 0, "estado": 1, "version_precios": 1, "version_confirmada": 1}
+        )
+
+    async def confirmar_version(self, id_estacion: int, version: int,
+                                fecha: datetime) -> Optional[Dict[str, Any]]:
+        # El filtro descarta los acuses atrasados; None cubre el campo ausente
+        return await estaciones_collection.find_one_and_update(
+            {
+                "id_estacion": id_estacion,
+                "$or": [{"version_confirmada": {"$lt": version}}, {"version_confirmada": None}]
+            },
+            {"$set": {"version_confirmada": version, "fecha_confirmacion": fecha}},
+            projection={"_id": 0, "version_precios": 1, "version_confirmada": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def listar_desactualizadas(self, limit: int = 100) -> List[Dict[str, Any]]:
+        cursor = estaciones_collection.find(
+            FILTRO_DESACTUALIZADAS,
+            {
+                "_id": 0,
+                "id_estacion": 1,
+                "nombre": 1,
+                "estado": 1,
+                "version_precios": 1,
+                "version_confirmada": 1,
+                "fecha_confirmacion": 1
+            }
+        ).sort("id_estacion", 1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def contar_desactualizadas(self) -> int:
+        return await estaciones_collection.count_documents(FILTRO_DESACTUALIZADAS)
+
+    async def existe_ip(self, ip: str, excluir_id: Optional[int] = None) -> bool:
+        query: Dict[str, Any] = {"ip": ip}
+        if excluir_id is not None:
+            query["id_estacion"] = {"$ne": excluir_id}
+        return await estaciones_collection.find_one(query, {"_id": 1}) is not None
+
+
+class AlmacenamientoMongo(Almacenamiento):
+    nombre = "mongo"
+
+    def __init__(self):
+        self.estaciones = EstacionesMongo()
@@ -0,0 +1,369 @@
+"""
+Analítica de precios vectorizada sobre el historial
+Carga los precios en arreglos NumPy (una columna por combustible) y calcula
+con operaciones vectorizadas las estadísticas de la red: mínimo, máximo,
+media y mediana de los precios vigentes, diferencial entre combustibles,
+desviación de cada estación respecto del promedio y volatilidad a partir
+de una matriz estaciones x días alineada en el tiempo.
+
+Los resultados se guardan en memoria hasta el siguiente cambio de precios
+(versión del historial), de modo que las consultas repetidas no vuelven a
+leer MongoDB ni a recalcular. Como la versión es por proceso, con varios
+workers HTTP los cambios hechos en otro proceso sin evento asociado (la
+retención del despachador, un historial importado en otro worker) se
+reflejan a más tardar tras ANALITICA_TTL segundos.
+
+Variables de entorno:
+    ANALITICA_DIAS: Ventana por defecto de la serie temporal. Default 365
+    ANALITICA_TTL: Segundos máximos que se reutiliza un resultado. Default 300
+"""
+import asyncio
+import os
+import time
+import warnings
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from almacenamiento import almacenamiento
+from database import historico_collection
+from historico_service import COMBUSTIBLES, version_historico
+
+# Ventana por defecto de la serie temporal (días)
+DIAS_POR_DEFECTO = int(os.getenv("ANALITICA_DIAS", "365"))
+
+# Pares de combustibles cuyo diferencial se informa (mayor - menor)
+PARES_DIFERENCIAL = [
+    ("precio_95", "precio_93"),
+    ("precio_97", "precio_95"),
+    ("precio_97", "precio_93"),
+    ("precio_93", "precio_diesel"),
+]
+
+TTL_CACHE = float(os.getenv("ANALITICA_TTL", "300"))
+
+# Resultados calculados para la versión vigente del historial
+_cache: Dict[str, Any] = {"version": None, "desde": 0.0, "resultados": {}}
+_lock = asyncio.Lock()
+
+
+def _numero(valor: Any) -> Optional[float]:
+    """Convierte un escalar de NumPy a float redondeado (NaN -> None)"""
+    valor = float(valor)
+    return None if np.isnan(valor) else round(valor, 2)
+
+
+def _resumen_columna(columna: np.ndarray) -> Dict[str, Optional[float]]:
+    """Estadísticos básicos de una columna ignorando NaN"""
+    if columna.size == 0 or np.all(np.isnan(columna)):
+        return {"min": None, "max": None, "media": None, "mediana": None, "desviacion": None}
+    return {
+        "min": _numero(np.nanmin(columna)),
+        "max": _numero(np.nanmax(columna)),
+        "media": _numero(np.nanmean(columna)),
+        "mediana": _numero(np.nanmedian(columna)),
+        "desviacion": _numero(np.nanstd(columna))
+    }
+
+
+# ============================================
+# CARGA DE DATOS
+# ============================================
+
+async def _cargar_precios_vigentes() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lee los precios actuales de todas las estaciones
+
+    Returns:
+        (ids, precios) con precios de forma (estaciones, combustibles)
+    """
+    estaciones = await almacenamiento.estaciones.listar(campos=("precios_actuales",))
+
+    ids = np.fromiter((e["id_estacion"] for e in estaciones), dtype=np.int64, count=len(estaciones))
+    precios = np.array(
+        [[(e.get("precios_actuales") or {}).get(c, np.nan) for c in COMBUSTIBLES] for e in estaciones],
+        dtype=np.float64
+    ).reshape(len(estaciones), len(COMBUSTIBLES))
+    return ids, precios
+
+
+async def _cargar_muestras(inicio_ventana: datetime) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Lee las muestras del historial dentro de la ventana más la última
+    muestra anterior de cada estación (el precio vigente al abrir la ventana)
+
+    Returns:
+        (ids, timestamps en datetime64[s], precios de forma (muestras, combustibles))
+    """
+    ids: List[int] = []
+    timestamps: List[datetime] = []
+    columnas: Dict[str, List[Any]] = {c: [] for c in COMBUSTIBLES}
+
+    # Precio vigente de cada estación al inicio de la ventana
+    semilla = [
+        {"$match": {"inicio": {"$lt": inicio_ventana}}},
+        {"$sort": {"id_estacion": 1, "inicio": 1, "desde": 1}},
+        {"$group": {
+            "_id": "$id_estacion",
+            "timestamp": {"$last": {"$arrayElemAt": ["$timestamps", -1]}},
+            **{c: {"$last": {"$arrayElemAt": [f"${c}", -1]}} for c in COMBUSTIBLES}
+        }}
+    ]
+    async for fila in historico_collection.aggregate(semilla):
+        ids.append(fila["_id"])
+        timestamps.append(fila["timestamp"])
+        for c in COMBUSTIBLES:
+            columnas[c].append(fila[c])
+
+    proyeccion = {"_id": 0, "id_estacion": 1, "timestamps": 1, **{c: 1 for c in COMBUSTIBLES}}
+    async for bucket in historico_collection.find({"inicio": {"$gte": inicio_ventana}}, proyeccion):
+        n = len(bucket["timestamps"])
+        ids.extend([bucket["id_estacion"]] * n)
+        timestamps.extend(bucket["timestamps"])
+        for c in COMBUSTIBLES:
+            columnas[c].extend(bucket[c])
+
+    return (
+        np.asarray(ids, dtype=np.int64),
+        np.asarray(timestamps, dtype="datetime64[s]"),
+        np.column_stack([np.asarray(columnas[c], dtype=np.float64) for c in COMBUSTIBLES])
+        if ids else np.empty((0, len(COMBUSTIBLES)))
+    )
+
+
+def _matriz_diaria(
+    ids: np.ndarray,
+    timestamps: np.ndarray,
+    precios: np.ndarray,
+    inicio_ventana: datetime,
+    dias: int
+) -> np.ndarray:
+    """
+    Construye la matriz (combustibles, estaciones, días) con el último
+    precio de cada día, arrastrando el anterior en los días sin cambios
+
+    Returns:
+        Matriz float64 con NaN donde la estación aún no tenía precio
+    """
+    estaciones, indice_estacion = np.unique(ids, return_inverse=True)
+    matriz = np.full((len(COMBUSTIBLES), len(estaciones), dias), np.nan)
+    if ids.size == 0:
+        return matriz
+
+    origen = np.datetime64(inicio_ventana, "s")
+    dia = ((timestamps - origen) // np.timedelta64(1, "D")).astype(np.int64)
+    # Las semillas (anteriores a la ventana) cuentan como precio del primer día
+    dia = np.clip(dia, 0, dias - 1)
+
+    # Quedarse con la última muestra de cada (estación, día)
+    clave = indice_estacion * dias + dia
+    orden = np.lexsort((timestamps, clave))
+    clave_ordenada = clave[orden]
+    ultima = np.append(clave_ordenada[1:] != clave_ordenada[:-1], True)
+    seleccion = orden[ultima]
+
+    matriz[:, indice_estacion[seleccion], dia[seleccion]] = precios[seleccion].T
+
+    # Arrastre hacia adelante (forward fill) a lo largo del eje de días
+    posiciones = np.where(~np.isnan(matriz), np.arange(dias), 0)
+    np.maximum.accumulate(posiciones, axis=2, out=posiciones)
+    return np.take_along_axis(matriz, posiciones, axis=2)
+
+
+# ============================================
+# CÁLCULOS
+# ============================================
+
+def _calcular_resumen(precios_vigentes: np.ndarray) -> Dict[str, Any]:
+    """Estadísticos de red y diferenciales entre combustibles sobre los precios vigentes"""
+    resumen = {
+        combustible: _resumen_columna(precios_vigentes[:, i])
+        for i, combustible in enumerate(COMBUSTIBLES)
+    }
+
+    diferenciales = {}
+    for mayor, menor in PARES_DIFERENCIAL:
+        diferencia = (
+            precios_vigentes[:, COMBUSTIBLES.index(mayor)]
+            - precios_vigentes[:, COMBUSTIBLES.index(menor)]
+        )
+        diferenciales[f"{mayor}-{menor}"] = _resumen_columna(diferencia)
+
+    return {
+        "total_estaciones": int(precios_vigentes.shape[0]),
+        "precios": resumen,
+        "diferenciales": diferenciales
+    }
+
+
+def _calcular_serie(matriz: np.ndarray, inicio_ventana: datetime) -> Dict[str, Any]:
+    """Serie diaria de la red (mínimo, media y máximo) y volatilidad"""
+    dias = matriz.shape[2]
+    fechas = [(inicio_ventana + timedelta(days=d)).date().isoformat() for d in range(dias)]
+
+    with warnings.catch_warnings():
+        # Días sin ninguna estación con precio producen NaN (se informan como None)
+        warnings.simplefilter("ignore", RuntimeWarning)
+        media = np.nanmean(matriz, axis=1)
+        minimo = np.nanmin(matriz, axis=1)
+        maximo = np.nanmax(matriz, axis=1)
+
+        # Volatilidad: desviación estándar de los retornos logarítmicos diarios.
+        # El retorno de la red es el promedio de los retornos de cada estación,
+        # así la aparición de estaciones nuevas no se confunde con un cambio de precio
+        retornos_estaciones = np.diff(np.log(matriz), axis=2)
+        retornos_red = np.nanmean(retornos_estaciones, axis=1)
+        volatilidad_red = np.nanstd(retornos_red, axis=1)
+        volatilidad_estaciones = np.nanstd(retornos_estaciones, axis=2)
+
+    serie = {}
+    volatilidad = {}
+    for i, combustible in enumerate(COMBUSTIBLES):
+        serie[combustible] = {
+            "media": [_numero(v) for v in media[i]],
+            "min": [_numero(v) for v in minimo[i]],
+            "max": [_numero(v) for v in maximo[i]]
+        }
+        diaria = _numero(volatilidad_red[i] * 100) if dias > 1 else None
+        volatilidad[combustible] = {
+            "diaria_pct": diaria,
+            "anualizada_pct": _numero(volatilidad_red[i] * np.sqrt(365) * 100) if dias > 1 else None,
+            "por_estacion_pct": _resumen_columna(volatilidad_estaciones[i] * 100)
+        }
+
+    return {"fechas": fechas, "serie": serie, "volatilidad": volatilidad}
+
+
+def _calcular_desviaciones(ids: np.ndarray, precios_vigentes: np.ndarray) -> Dict[str, Any]:
+    """Desviación de cada estación respecto del promedio de la red, por combustible"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        media = np.nanmean(precios_vigentes, axis=0)
+        desviacion_estandar = np.nanstd(precios_vigentes, axis=0)
+        diferencia = precios_vigentes - media
+        porcentaje = diferencia / media * 100
+        puntaje_z = np.where(desviacion_estandar > 0, diferencia / desviacion_estandar, 0.0)
+
+    return {
+        "ids": ids,
+        "media": media,
+        "diferencia": diferencia,
+        "porcentaje": porcentaje,
+        "puntaje_z": puntaje_z,
+        "precios": precios_vigentes
+    }
+
+
+# ============================================
+# API DEL SERVICIO
+# ============================================
+
+async def _obtener(clave: str, calcular) -> Any:
+    """
+    Retorna un resultado cacheado para la versión actual del historial (y
+    con menos de TTL_CACHE segundos) o lo calcula, una sola vez aunque
+    lleguen varias peticiones a la vez
+    """
+    async with _lock:
+        version = version_historico()
+        ahora = time.monotonic()
+        if _cache["version"] != version or ahora - _cache["desde"] > TTL_CACHE:
+            _cache["version"] = version
+            _cache["desde"] = ahora
+            _cache["resultados"] = {}
+
+        if clave not in _cache["resultados"]:
+            _cache["resultados"][clave] = await calcular()
+        return _cache["resultados"][clave]
+
+
+async def _datos_vigentes() -> Dict[str, Any]:
+    async def calcular():
+        ids, precios = await _cargar_precios_vigentes()
+        return {
+            "resumen": _calcular_resumen(precios),
+            "desviaciones": _calcular_desviaciones(ids, precios)
+        }
+    return await _obtener("vigentes", calcular)
+
+
+async def obtener_resumen_red() -> Dict[str, Any]:
+    """
+    Estadísticos de la red sobre los precios vigentes
+
+    Returns:
+        Mínimo, máximo, media, mediana y desviación por combustible, más
+        los diferenciales entre combustibles
+    """
+    return (await _datos_vigentes())["resumen"]
+
+
+async def obtener_desviaciones(
+    combustible: str = "precio_95",
+    limit: int = 50,
+    orden: str = "abs"
+) -> Dict[str, Any]:
+    """
+    Estaciones ordenadas por su desviación respecto del promedio de la red
+
+    Args:
+        combustible: Combustible a analizar
+        limit: Cantidad máxima de estaciones
+        orden: "abs" (mayor desviación absoluta), "caras" o "baratas"
+
+    Returns:
+        Promedio de la red y lista de estaciones con su desviación
+
+    Raises:
+        ValueError: Si el combustible no existe
+    """
+    if combustible not in COMBUSTIBLES:
+        raise ValueError(f"Combustible inválido: {combustible}")
+
+    datos = (await _datos_vigentes())["desviaciones"]
+    i = COMBUSTIBLES.index(combustible)
+    diferencia = np.nan_to_num(datos["diferencia"][:, i], nan=0.0)
+
+    if orden == "caras":
+        indices = np.argsort(-diferencia)
+    elif orden == "baratas":
+        indices = np.argsort(diferencia)
+    else:
+        indices = np.argsort(-np.abs(diferencia))
+    indices = indices[:limit]
+
+    return {
+        "combustible": combustible,
+        "media_red": _numero(datos["media"][i]),
+        "estaciones": [
+            {
+                "id_estacion": int(datos["ids"][j]),
+                "precio": _numero(datos["precios"][j, i]),
+                "diferencia": _numero(datos["diferencia"][j, i]),
+                "porcentaje": _numero(datos["porcentaje"][j, i]),
+                "puntaje_z": _numero(datos["puntaje_z"][j, i])
+            }
+            for j in indices
+        ]
+    }
+
+
+async def obtener_serie_red(dias: int = DIAS_POR_DEFECTO) -> Dict[str, Any]:
+    """
+    Serie diaria de precios de la red alineada en el tiempo y su volatilidad
+
+    Args:
+        dias: Días hacia atrás incluidos en la serie (incluye hoy)
+
+    Returns:
+        Fechas, mínimo/media/máximo diario por combustible y volatilidad
+    """
+    async def calcular():
+        hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        inicio_ventana = hoy - timedelta(days=dias - 1)
+        ids, timestamps, precios = await _cargar_muestras(inicio_ventana)
+        matriz = _matriz_diaria(ids, timestamps, precios, inicio_ventana, dias)
+        return _calcular_serie(matriz, inicio_ventana)
+
+    return await _obtener(f"serie:{dias}", calcular)
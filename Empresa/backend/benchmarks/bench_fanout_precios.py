@@ -0,0 +1,406 @@
+"""
+Benchmark de distribución de precios Empresa → Estaciones a escala de flota
+Levanta M estaciones falsas en puertos locales que hablan el protocolo de
+líneas de actualizacion_precios (aplican el mensaje y responden
+ack_precios) y les inyecta comportamientos:
+
+    - latencia:  demora antes de aplicar y confirmar (--latencia, --jitter)
+    - falla:     cada mensaje corta la conexión sin aplicarse con
+                 probabilidad --prob-falla
+    - caída:     una fracción de las estaciones no escucha (--caidas)
+    - agujero:   una fracción acepta y lee pero nunca aplica ni confirma
+                 (--agujeros); el envío TCP "tiene éxito" y solo la falta
+                 de acuse lo delata
+
+Modos:
+    directo: llama a enviar_precios_a_estacion() en este proceso con un
+             semáforo de --concurrencia (el mismo esquema del rollout).
+             No requiere MongoDB.
+    api:     registra las estaciones falsas en la Empresa (--api-url) y
+             lanza cada ronda con POST /api/rollouts, esperando a que el
+             despliegue termine. Las estaciones se eliminan al final.
+
+Por ronda mide el tiempo hasta que toda la flota sana aplicó los precios,
+la distribución de latencias de entrega por estación (desde el inicio de la
+ronda hasta que la estación aplica), lo que reporta el emisor (exitosos,
+fallidos, duración total incluyendo los timeouts de las estaciones caídas)
+y cuántas estaciones sanas quedaron sin recibir. La primera ronda incluye
+el establecimiento de conexiones del pool; las siguientes las reutilizan.
+
+Uso:
+    python benchmarks/bench_fanout_precios.py --estaciones 2000 --caidas 0.05 --agujeros 0.01
+    python benchmarks/bench_fanout_precios.py --modo api --api-url http://localhost:8000 --estaciones 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Los fallos inyectados generan un warning por estación: silenciarlos por defecto
+os.environ.setdefault("LOG_NIVEL", "ERROR")
+
+PRECIOS_BASE = {"precio_93": 1290, "precio_95": 1350, "precio_97": 1400, "precio_diesel": 1120}
+
+# Estados terminales de un despliegue en la API
+ESTADOS_FINALES = ("completado", "abortado", "fallido")
+
+
+def percentiles(valores: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p90/p99/máximo en milisegundos"""
+    if not valores:
+        return {"n": 0, "p50": None, "p90": None, "p99": None, "max": None}
+    ordenados = sorted(valores)
+
+    def p(q):
+        return round(ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))] * 1000, 1)
+
+    return {"n": len(ordenados), "p50": p(0.50), "p90": p(0.90), "p99": p(0.99),
+            "max": round(ordenados[-1] * 1000, 1)}
+
+
+# ============================================
+# ESTACIONES FALSAS
+# ============================================
+
+class EstacionFalsa:
+    """Listener TCP que simula una estación con un comportamiento inyectado"""
+
+    def __init__(self, indice: int, puerto: int, comportamiento: str, args):
+        self.indice = indice
+        self.puerto = puerto
+        self.comportamiento = comportamiento
+        self.args = args
+        self.id_estacion = indice
+        self.servidor: Optional[asyncio.AbstractServer] = None
+        # {version: instante en que se aplicó}
+        self.aplicadas: Dict[int, float] = {}
+        self.recibidos = 0
+        self.cortes = 0
+
+    @property
+    def sana(self) -> bool:
+        """Estación que debería terminar aplicando los precios"""
+        return self.comportamiento == "normal"
+
+    async def iniciar(self, host: str):
+        if self.comportamiento == "caida":
+            return
+        self.servidor = await asyncio.start_server(self._atender, host, self.puerto)
+
+    async def cerrar(self):
+        if self.servidor:
+            self.servidor.close()
+            await self.servidor.wait_closed()
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    return
+                if b"actualizacion_precios" not in linea:
+                    continue
+                self.recibidos += 1
+                if self.comportamiento == "agujero":
+                    continue
+                if random.random() < self.args.prob_falla:
+                    self.cortes += 1
+                    writer.transport.abort()
+                    return
+
+                mensaje = json.loads(linea)
+                demora = self.args.latencia + random.uniform(0, self.args.jitter)
+                if demora:
+                    await asyncio.sleep(demora / 1000)
+
+                version = mensaje.get("version", 0)
+                self.aplicadas.setdefault(version, time.perf_counter())
+                writer.write((json.dumps({
+                    "tipo": "ack_precios",
+                    "id_estacion": mensaje.get("id_estacion", self.id_estacion),
+                    "version": version,
+                    "aplicada": True
+                }) + "\n").encode())
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+
+def crear_flota(args) -> List[EstacionFalsa]:
+    """Asigna los comportamientos al azar (reproducible con --semilla)"""
+    indices = list(range(args.estaciones))
+    random.shuffle(indices)
+    n_caidas = int(args.estaciones * args.caidas)
+    n_agujeros = int(args.estaciones * args.agujeros)
+    comportamiento = {}
+    for posicion, indice in enumerate(indices):
+        if posicion < n_caidas:
+            comportamiento[indice] = "caida"
+        elif posicion < n_caidas + n_agujeros:
+            comportamiento[indice] = "agujero"
+        else:
+            comportamiento[indice] = "normal"
+    return [
+        EstacionFalsa(i, args.puerto_base + i, comportamiento[i], args)
+        for i in range(args.estaciones)
+    ]
+
+
+# ============================================
+# MODO DIRECTO (enviar_precios_a_estacion)
+# ============================================
+
+async def ronda_directa(flota: List[EstacionFalsa], version: int, precios: Dict[str, int], args) -> Dict[str, Any]:
+    from tcp_server import enviar_precios_a_estacion
+
+    semaforo = asyncio.Semaphore(args.concurrencia)
+
+    async def enviar(estacion: EstacionFalsa) -> bool:
+        async with semaforo:
+            return await enviar_precios_a_estacion(
+                args.host_estaciones,
+                estacion.puerto,
+                precios,
+                f"Bench {estacion.indice}",
+                timeout=args.timeout,
+                version=version,
+                id_estacion=estacion.id_estacion
+            )
+
+    resultados = await asyncio.gather(*[enviar(e) for e in flota])
+    return {"exitosos": sum(resultados), "fallidos": len(resultados) - sum(resultados)}
+
+
+# ============================================
+# MODO API (POST /api/rollouts)
+# ============================================
+
+def _http(metodo: str, url: str, cuerpo: Optional[Dict[str, Any]] = None) -> Any:
+    datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+    peticion = urllib.request.Request(url, data=datos, method=metodo,
+                                      headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+        contenido = respuesta.read()
+    return json.loads(contenido) if contenido else None
+
+
+async def registrar_en_api(flota: List[EstacionFalsa], args):
+    """Crea una estación en la Empresa por cada estación falsa"""
+    semaforo = asyncio.Semaphore(20)
+
+    async def crear(estacion: EstacionFalsa):
+        async with semaforo:
+            creada = await asyncio.to_thread(_http, "POST", f"{args.api_url}/api/estaciones", {
+                "nombre": f"Bench fan-out {estacion.indice}",
+                "ip": args.host_estaciones,
+                "puerto": estacion.puerto,
+                "precios_actuales": PRECIOS_BASE
+            })
+            estacion.id_estacion = creada["id_estacion"]
+
+    await asyncio.gather(*[crear(e) for e in flota])
+
+
+async def eliminar_de_api(flota: List[EstacionFalsa], args):
+    semaforo = asyncio.Semaphore(20)
+
+    async def eliminar(estacion: EstacionFalsa):
+        async with semaforo:
+            try:
+                await asyncio.to_thread(_http, "DELETE", f"{args.api_url}/api/estaciones/{estacion.id_estacion}")
+            except OSError:
+                pass
+
+    await asyncio.gather(*[eliminar(e) for e in flota])
+
+
+async def ronda_api(flota: List[EstacionFalsa], version: int, precios: Dict[str, int], args) -> Dict[str, Any]:
+    rollout = await asyncio.to_thread(_http, "POST", f"{args.api_url}/api/rollouts", {
+        "precios": precios,
+        "estaciones": [e.id_estacion for e in flota],
+        "concurrencia": args.concurrencia,
+        "timeout": args.timeout
+    })
+    while rollout["estado"] not in ESTADOS_FINALES:
+        await asyncio.sleep(0.2)
+        rollout = await asyncio.to_thread(_http, "GET", f"{args.api_url}/api/rollouts/{rollout['id_rollout']}")
+
+    conteo = rollout.get("conteo", {})
+    duraciones = [e["duracion_ms"] / 1000 for e in rollout.get("estaciones", []) if e.get("duracion_ms") is not None]
+    return {
+        "exitosos": conteo.get("exitoso", 0),
+        "fallidos": conteo.get("fallido", 0),
+        "id_rollout": rollout["id_rollout"],
+        "estado_rollout": rollout["estado"],
+        "envio_por_estacion_ms": percentiles(duraciones)
+    }
+
+
+# ============================================
+# EJECUCIÓN
+# ============================================
+
+def subir_limite_archivos(necesarios: int):
+    """Sube el límite de descriptores abiertos hasta el máximo permitido"""
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if blando < necesarios:
+        nuevo = duro if duro == resource.RLIM_INFINITY else min(duro, necesarios)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (nuevo, duro))
+        if nuevo < necesarios:
+            print(f"Aviso: límite de archivos abiertos {nuevo} < {necesarios} necesarios")
+
+
+async def ejecutar(args) -> Dict[str, Any]:
+    flota = crear_flota(args)
+    await asyncio.gather(*[e.iniciar(args.host_estaciones) for e in flota])
+    sanas = [e for e in flota if e.sana]
+
+    if args.modo == "api":
+        await registrar_en_api(flota, args)
+        ronda = ronda_api
+    else:
+        ronda = ronda_directa
+
+    rondas = []
+    try:
+        for numero in range(1, args.rondas + 1):
+            precios = {k: v + numero for k, v in PRECIOS_BASE.items()}
+            # En modo api la versión la asigna la Empresa: se detecta como
+            # cualquier versión aplicada que no estaba antes de la ronda
+            vistas = [set(e.aplicadas) for e in sanas]
+            version = numero
+
+            inicio = time.perf_counter()
+            emisor = await ronda(flota, version, precios, args)
+            fin_envio = time.perf_counter() - inicio
+
+            # Esperar a que las estaciones sanas terminen de aplicar
+            limite = time.perf_counter() + args.espera_final
+            while time.perf_counter() < limite:
+                pendientes = sum(1 for e, antes in zip(sanas, vistas) if not set(e.aplicadas) - antes)
+                if not pendientes:
+                    break
+                await asyncio.sleep(0.05)
+
+            latencias = []
+            for estacion, antes in zip(sanas, vistas):
+                nuevas = [estacion.aplicadas[v] for v in set(estacion.aplicadas) - antes]
+                if nuevas:
+                    latencias.append(min(nuevas) - inicio)
+
+            resultado = {
+                "ronda": numero,
+                "flota_completa_ms": round(max(latencias) * 1000, 1)
+                if latencias and len(latencias) == len(sanas) else None,
+                "fin_envio_ms": round(fin_envio * 1000, 1),
+                "sanas_aplicadas": len(latencias),
+                "sanas_sin_aplicar": len(sanas) - len(latencias),
+                "entrega_ms": percentiles(latencias),
+                "emisor": emisor
+            }
+            rondas.append(resultado)
+            imprimir_ronda(resultado, len(sanas))
+            await asyncio.sleep(args.pausa)
+    finally:
+        if args.modo == "api" and not args.conservar:
+            await eliminar_de_api(flota, args)
+        await asyncio.gather(*[e.cerrar() for e in flota])
+        if args.modo == "directo":
+            from pool_conexiones import pool_estaciones
+            await asyncio.gather(*[c.cerrar() for c in pool_estaciones.conexiones.values()])
+
+    return {
+        "fecha": datetime.now().isoformat(),
+        "configuracion": {
+            "modo": args.modo,
+            "estaciones": args.estaciones,
+            "sanas": len(sanas),
+            "caidas": sum(1 for e in flota if e.comportamiento == "caida"),
+            "agujeros": sum(1 for e in flota if e.comportamiento == "agujero"),
+            "prob_falla": args.prob_falla,
+            "latencia_ms": args.latencia,
+            "jitter_ms": args.jitter,
+            "concurrencia": args.concurrencia,
+            "timeout_s": args.timeout,
+            "semilla": args.semilla
+        },
+        "estaciones_falsas": {
+            "recibidos": sum(e.recibidos for e in flota),
+            "cortes_inyectados": sum(e.cortes for e in flota)
+        },
+        "rondas": rondas
+    }
+
+
+def imprimir_ronda(r: Dict[str, Any], total_sanas: int):
+    entrega, emisor = r["entrega_ms"], r["emisor"]
+    completa = f"{r['flota_completa_ms']:>9} ms" if r["flota_completa_ms"] is not None else "incompleta  "
+    print(f"Ronda {r['ronda']:>2} | flota {completa} | envío {r['fin_envio_ms']:>9} ms | "
+          f"aplicadas {r['sanas_aplicadas']}/{total_sanas} | "
+          f"p50 {entrega['p50']} p90 {entrega['p90']} p99 {entrega['p99']} ms | "
+          f"emisor ok {emisor['exitosos']} fallidos {emisor['fallidos']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modo", choices=("directo", "api"), default="directo")
+    parser.add_argument("--api-url", default="http://localhost:8000", help="URL de la API de Empresa (modo api)")
+    parser.add_argument("--estaciones", type=int, default=500, help="Cantidad de estaciones falsas")
+    parser.add_argument("--host-estaciones", default="127.0.0.1",
+                        help="IP donde escuchan las estaciones falsas (debe ser alcanzable por la Empresa)")
+    parser.add_argument("--puerto-base", type=int, default=20000, help="Puerto de la primera estación falsa")
+    parser.add_argument("--rondas", type=int, default=3, help="Actualizaciones de precios consecutivas")
+    parser.add_argument("--pausa", type=float, default=1.0, help="Segundos entre rondas")
+    parser.add_argument("--concurrencia", type=int, default=20, help="Envíos simultáneos (1 a 500)")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Timeout de conexión por estación (s)")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Demora de aplicación por mensaje (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Demora adicional aleatoria 0..jitter (ms)")
+    parser.add_argument("--prob-falla", type=float, default=0.0,
+                        help="Probabilidad de cortar la conexión al recibir un mensaje")
+    parser.add_argument("--caidas", type=float, default=0.0, help="Fracción de estaciones que no escuchan")
+    parser.add_argument("--agujeros", type=float, default=0.0,
+                        help="Fracción de estaciones que aceptan pero nunca aplican")
+    parser.add_argument("--espera-final", type=float, default=10.0,
+                        help="Segundos de espera tras el envío para que las estaciones apliquen")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--conservar", action="store_true", help="No eliminar las estaciones creadas (modo api)")
+    parser.add_argument("--salida", help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    if not 1 <= args.estaciones <= 20_000:
+        parser.error("--estaciones debe estar entre 1 y 20000")
+    if not 1 <= args.concurrencia <= 500:
+        parser.error("--concurrencia debe estar entre 1 y 500")
+    if args.puerto_base + args.estaciones > 65535:
+        parser.error("--puerto-base + --estaciones supera el puerto 65535")
+    if args.caidas + args.agujeros > 1:
+        parser.error("--caidas + --agujeros no puede superar 1")
+
+    random.seed(args.semilla)
+    # Listener + conexión aceptada + conexión del pool por estación
+    subir_limite_archivos(args.estaciones * 3 + 64)
+
+    print(f"Fan-out de precios ({args.modo}) a {args.estaciones} estaciones falsas, "
+          f"concurrencia {args.concurrencia}")
+    resultado = asyncio.run(ejecutar(args))
+
+    if args.salida:
+        if os.path.dirname(args.salida):
+            os.makedirs(os.path.dirname(args.salida), exist_ok=True)
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Micro-benchmark de round-trips a MongoDB por operación de escritura
+Cuenta los comandos que cada función del servicio envía al servidor
+(usando un CommandListener de pymongo) y mide su latencia media.
+
+Uso (requiere un MongoDB accesible en MONGODB_URL):
+    python benchmarks/bench_round_trips.py [--repeticiones 50]
+
+Trabaja sobre una base de datos temporal que se elimina al terminar.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_NAME"] = os.getenv("BENCH_DATABASE_NAME", "bench_round_trips")
+
+
+class ContadorComandos(monitoring.CommandListener):
+    """Cuenta los comandos enviados agrupados por colección"""
+
+    def __init__(self):
+        self.por_coleccion = Counter()
+
+    def started(self, event):
+        coleccion = event.command.get(event.command_name)
+        if isinstance(coleccion, str):
+            self.por_coleccion[coleccion] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reiniciar(self):
+        self.por_coleccion.clear()
+
+
+# Debe registrarse antes de crear el cliente (al importar database)
+contador = ContadorComandos()
+monitoring.register(contador)
+
+from database import client, db  # noqa: E402
+from estaciones_service import (  # noqa: E402
+    crear_estacion,
+    actualizar_estacion,
+    actualizar_precios,
+    inicializar_estaciones
+)
+from indices import aplicar_indices  # noqa: E402
+from models import EstacionCreate, EstacionUpdate, PreciosModel, PreciosUpdate  # noqa: E402
+
+PRECIOS = {"precio_93": 1290, "precio_95": 1350, "precio_97": 1400, "precio_diesel": 1120}
+
+
+async def medir(nombre, operacion, repeticiones):
+    """Ejecuta una operación N veces y retorna comandos por llamada y latencia"""
+    await operacion(0)  # calentamiento
+    contador.reiniciar()
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        await operacion(i + 1)
+    duracion = time.perf_counter() - inicio
+
+    por_llamada = {c: n / repeticiones for c, n in contador.por_coleccion.items()}
+    return {
+        "operacion": nombre,
+        "estaciones": por_llamada.get("estaciones", 0),
+        "total": sum(por_llamada.values()),
+        "ms": duracion / repeticiones * 1000
+    }
+
+
+async def main(repeticiones: int):
+    await aplicar_indices(db)
+    await inicializar_estaciones()
+    base = await crear_estacion(EstacionCreate(
+        nombre="Bench", ip="127.0.0.1", puerto=5000, precios_actuales=PreciosModel(**PRECIOS)
+    ))
+    id_base = base["id_estacion"]
+
+    async def op_crear(i):
+        await crear_estacion(EstacionCreate(
+            nombre=f"Bench {i}", ip="127.0.0.1", puerto=5000, precios_actuales=PreciosModel(**PRECIOS)
+        ))
+
+    async def op_actualizar(i):
+        await actualizar_estacion(id_base, EstacionUpdate(nombre=f"Bench {i}"))
+
+    async def op_precios(i):
+        precios = dict(PRECIOS, precio_93=PRECIOS["precio_93"] + i)
+        await actualizar_precios(id_base, PreciosUpdate(precios=PreciosModel(**precios)))
+
+    resultados = [
+        await medir("crear_estacion", op_crear, repeticiones),
+        await medir("actualizar_estacion", op_actualizar, repeticiones),
+        await medir("actualizar_precios", op_precios, repeticiones),
+    ]
+
+    print(f"{'operación':<24}{'rt estaciones':>15}{'rt total':>10}{'ms/op':>10}")
+    for r in resultados:
+        print(f"{r['operacion']:<24}{r['estaciones']:>15.1f}{r['total']:>10.1f}{r['ms']:>10.2f}")
+
+    await client.drop_database(db.name)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeticiones))
@@ -0,0 +1,125 @@
+"""
+Micro-benchmark de serialización de respuestas por endpoint
+Compara, sobre listas de 100, 1.000 y 10.000 elementos, el camino por
+defecto de FastAPI (validación contra response_model + JSONResponse) con
+RespuestaJSON (orjson, sin revalidar). No requiere MongoDB: los datos se
+generan en memoria con la misma forma que retornan los servicios.
+
+Uso:
+    python benchmarks/bench_serializacion.py [--repeticiones 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app  # noqa: E402
+from respuestas import RespuestaJSON  # noqa: E402
+
+TAMANOS = (100, 1_000, 10_000)
+PRECIOS = {"precio_93": 1290, "precio_95": 1350, "precio_97": 1400, "precio_diesel": 1120}
+AHORA = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def generar_estaciones(n):
+    return {
+        "estaciones": [
+            {
+                "_id": f"{i:024x}",
+                "id_estacion": i,
+                "nombre": f"Estación {i}",
+                "ip": "192.168.1.10",
+                "puerto": 5000,
+                "estado": "Activa",
+                "precios_actuales": PRECIOS,
+                "fecha_creacion": AHORA,
+                "fecha_actualizacion": AHORA
+            }
+            for i in range(1, n + 1)
+        ],
+        "next_cursor": n
+    }
+
+
+def generar_historico(n):
+    return [
+        dict(PRECIOS, fecha=AHORA - timedelta(minutes=i), precio_93=PRECIOS["precio_93"] + i % 50)
+        for i in range(n)
+    ]
+
+
+def generar_entregas(n):
+    return [
+        {
+            "id_estacion": i,
+            "ip": "192.168.1.10",
+            "puerto": 5000,
+            "nombre": f"Estación {i}",
+            "precios": PRECIOS,
+            "estado": "entregado",
+            "intentos": 1,
+            "secuencia": 3,
+            "proximo_intento": AHORA,
+            "fecha_encolado": AHORA,
+            "fecha_entrega": AHORA,
+            "ultimo_error": None
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+ENDPOINTS = [
+    ("/api/estaciones", generar_estaciones),
+    ("/api/estaciones/{id_estacion}/historico", generar_historico),
+    ("/api/entregas", generar_entregas),
+]
+
+
+def campo_respuesta(ruta):
+    for route in app.routes:
+        if getattr(route, "path", None) == ruta and "GET" in route.methods:
+            return route.response_field
+    raise LookupError(ruta)
+
+
+async def antes(campo, contenido):
+    """Camino por defecto: validar contra response_model y serializar con json"""
+    validado = await serialize_response(field=campo, response_content=contenido)
+    return JSONResponse(validado).body
+
+
+async def despues(campo, contenido):
+    return RespuestaJSON(contenido).body
+
+
+async def medir(funcion, campo, contenido, repeticiones):
+    await funcion(campo, contenido)  # calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        await funcion(campo, contenido)
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+async def main(repeticiones: int):
+    print(f"{'endpoint':<42}{'items':>8}{'antes ms':>11}{'después ms':>12}{'x':>7}")
+    for ruta, generar in ENDPOINTS:
+        campo = campo_respuesta(ruta)
+        for n in TAMANOS:
+            contenido = generar(n)
+            ms_antes = await medir(antes, campo, contenido, repeticiones)
+            ms_despues = await medir(despues, campo, contenido, repeticiones)
+            print(f"{ruta:<42}{n:>8}{ms_antes:>11.2f}{ms_despues:>12.2f}{ms_antes / ms_despues:>7.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeticiones))
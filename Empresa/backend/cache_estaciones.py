@@ -0,0 +1,117 @@
+"""
+Caché en memoria de estaciones (LRU con expiración por TTL)
+Las lecturas por ID pasan primero por este caché y solo consultan MongoDB
+ante un fallo; las rutas de creación, actualización, precios y eliminación
+lo refrescan o invalidan. El TTL acota cuánto puede quedar desactualizada
+una entrada si la estación se modifica fuera de este proceso.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Permite desactivar el caché (ESTACIONES_CACHE=0)
+CACHE_HABILITADO = os.getenv("ESTACIONES_CACHE", "1") not in ("0", "false", "no")
+# Cantidad máxima de estaciones en memoria
+CACHE_MAX_ENTRADAS = int(os.getenv("ESTACIONES_CACHE_MAX", "10000"))
+# Segundos que una entrada se considera vigente
+CACHE_TTL = float(os.getenv("ESTACIONES_CACHE_TTL", "60"))
+
+
+def _copiar(estacion: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia la estación (incluidos los diccionarios anidados, como los precios)"""
+    return {
+        clave: dict(valor) if isinstance(valor, dict) else valor
+        for clave, valor in estacion.items()
+    }
+
+
+class CacheEstaciones:
+    """Caché LRU acotado con TTL y contadores de aciertos/fallos"""
+
+    def __init__(
+        self,
+        max_entradas: int = CACHE_MAX_ENTRADAS,
+        ttl: float = CACHE_TTL,
+        habilitado: bool = CACHE_HABILITADO
+    ):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.habilitado = habilitado
+        # {id_estacion: (expira_en, estacion)}; el orden refleja el uso reciente
+        self._entradas: "OrderedDict[int, tuple]" = OrderedDict()
+
+        # Contadores
+        self.aciertos = 0
+        self.fallos = 0
+        self.expirados = 0
+        self.desalojados = 0
+        self.invalidaciones = 0
+
+    def obtener(self, id_estacion: int) -> Optional[Dict[str, Any]]:
+        """
+        Busca una estación en el caché
+
+        Returns:
+            Copia de la estación o None si no está o expiró
+        """
+        if not self.habilitado:
+            return None
+
+        entrada = self._entradas.get(id_estacion)
+        if entrada is None:
+            self.fallos += 1
+            return None
+
+        expira_en, estacion = entrada
+        if expira_en <= time.monotonic():
+            del self._entradas[id_estacion]
+            self.expirados += 1
+            self.fallos += 1
+            return None
+
+        self._entradas.move_to_end(id_estacion)
+        self.aciertos += 1
+        return _copiar(estacion)
+
+    def guardar(self, estacion: Dict[str, Any]):
+        """Guarda (o refresca) una estación desalojando la menos usada si hace falta"""
+        if not self.habilitado:
+            return
+
+        id_estacion = estacion["id_estacion"]
+        self._entradas[id_estacion] = (time.monotonic() + self.ttl, _copiar(estacion))
+        self._entradas.move_to_end(id_estacion)
+
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+            self.desalojados += 1
+
+    def invalidar(self, id_estacion: int):
+        """Descarta la entrada de una estación"""
+        if self._entradas.pop(id_estacion, None) is not None:
+            self.invalidaciones += 1
+
+    def limpiar(self):
+        """Descarta todas las entradas"""
+        self.invalidaciones += len(self._entradas)
+        self._entradas.clear()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        consultas = self.aciertos + self.fallos
+        return {
+            "habilitado": self.habilitado,
+            "entradas": len(self._entradas),
+            "max_entradas": self.max_entradas,
+            "ttl": self.ttl,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas * 100, 1) if consultas else 0.0,
+            "expirados": self.expirados,
+            "desalojados": self.desalojados,
+            "invalidaciones": self.invalidaciones
+        }
+
+
+# Caché global de estaciones
+cache_estaciones = CacheEstaciones()
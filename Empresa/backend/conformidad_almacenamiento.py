@@ -0,0 +1,188 @@
+"""
+Verificación de conformidad del driver de almacenamiento de estaciones
+Ejecuta sobre el repositorio de estaciones el escenario que esperan los
+servicios: secuencia de IDs, orden y paginación por id_estacion,
+proyección de campos, actualización con documento previo, avance de
+version_precios, confirmaciones que nunca retroceden, estaciones
+desactualizadas, inserción por lotes, cambios de estado condicionados y
+conteo por estado. Cualquier driver nuevo debe pasarlo.
+
+Uso (requiere un MongoDB accesible en MONGODB_URL):
+    python conformidad_almacenamiento.py [--drivers mongo]
+
+Trabaja sobre una base de datos temporal que se elimina al terminar.
+Retorna código de salida 1 si algún driver no cumple.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import List
+
+os.environ["DATABASE_NAME"] = os.getenv("CONFORMIDAD_DATABASE_NAME", "conformidad_almacenamiento")
+
+from almacenamiento import DRIVERS, Almacenamiento, crear_almacenamiento  # noqa: E402
+
+# Fechas sin microsegundos: MongoDB guarda milisegundos
+BASE = datetime(2024, 1, 15, 10, 30, 0)
+PRECIOS = {"precio_93": 1290, "precio_95": 1350, "precio_97": 1400, "precio_diesel": 1120}
+
+
+class Verificador:
+    """Acumula las comprobaciones de un driver"""
+
+    def __init__(self, driver: str):
+        self.driver = driver
+        self.total = 0
+        self.fallos: List[str] = []
+
+    def __call__(self, condicion: bool, descripcion: str):
+        self.total += 1
+        if not condicion:
+            self.fallos.append(descripcion)
+
+
+def estacion(id_estacion: int, nombre: str, ip: str, **campos):
+    documento = {
+        "id_estacion": id_estacion,
+        "nombre": nombre,
+        "ip": ip,
+        "puerto": 5000,
+        "estado": "Activa",
+        "precios_actuales": dict(PRECIOS),
+        "version_precios": 1,
+        "fecha_creacion": BASE,
+        "fecha_actualizacion": BASE
+    }
+    documento.update(campos)
+    return documento
+
+
+async def verificar_estaciones(db: Almacenamiento, ok: Verificador):
+    repo = db.estaciones
+    await repo.inicializar()
+
+    bloque = await repo.reservar_ids(3)
+    ok(len(bloque) == 3, "reservar_ids entrega la cantidad pedida")
+    siguiente = await repo.reservar_ids(1)
+    ok(siguiente[0] == bloque[-1] + 1, "reservar_ids no repite ni salta IDs")
+
+    original = estacion(1, "Norte", "10.0.0.1")
+    _id = await repo.insertar(original)
+    ok(isinstance(_id, str) and _id, "insertar retorna el _id como string")
+    ok("_id" not in original, "insertar no modifica el documento recibido")
+    await repo.insertar(estacion(3, "Sur", "10.0.0.3", estado="Inactiva"))
+    await repo.insertar(estacion(2, "Centro", "10.0.0.2", version_confirmada=1))
+
+    leida = await repo.obtener(1)
+    ok(leida is not None and leida["_id"] == _id, "obtener entrega el mismo _id que insertar")
+    ok(leida is not None and leida["precios_actuales"] == PRECIOS, "obtener conserva los documentos anidados")
+    ok(leida is not None and leida["fecha_creacion"] == BASE, "las fechas se recuperan como datetime")
+    ok(await repo.obtener(999) is None, "obtener un ID inexistente retorna None")
+
+    ok([e["id_estacion"] for e in await repo.listar()] == [1, 2, 3], "listar ordena por id_estacion")
+    ok([e["id_estacion"] for e in await repo.listar(despues_de=1, limit=1)] == [2],
+       "listar pagina con despues_de y limit")
+    ok([e["id_estacion"] for e in await repo.listar(estado="Inactiva")] == [3], "listar filtra por estado")
+    proyectadas = await repo.listar(campos=["nombre"])
+    ok(all(set(e) == {"id_estacion", "nombre"} for e in proyectadas),
+       "listar con campos incluye solo esos campos más id_estacion")
+    ok(all(isinstance(e["_id"], str) for e in await repo.listar(campos=["_id", "nombre"])),
+       "listar entrega _id como string cuando se pide")
+
+    anterior = await repo.actualizar(3, {"estado": "Activa", "nombre": "Sur 2"})
+    ok(anterior is not None and anterior["estado"] == "Inactiva", "actualizar retorna el documento previo")
+    ok((await repo.obtener(3))["nombre"] == "Sur 2", "actualizar persiste los campos")
+    ok(await repo.actualizar(999, {"nombre": "x"}) is None, "actualizar un ID inexistente retorna None")
+
+    nuevos = {**PRECIOS, "precio_95": 1400}
+    actualizada = await repo.actualizar_precios(2, nuevos, BASE + timedelta(minutes=1))
+    ok(actualizada is not None and actualizada["version_precios"] == 2, "actualizar_precios avanza la versión")
+    ok(actualizada is not None and actualizada["precios_actuales"] == nuevos,
+       "actualizar_precios retorna los precios nuevos")
+    ok(actualizada is not None and actualizada["fecha_actualizacion"] == BASE + timedelta(minutes=1),
+       "actualizar_precios registra la fecha")
+    ok(await repo.actualizar_precios(999, nuevos, BASE) is None,
+       "actualizar_precios a un ID inexistente retorna None")
+
+    # Estación 1: sin confirmar (v1), 2: confirmó v1 de v2, 3: sin confirmar (v1)
+    ok(await repo.contar_desactualizadas() == 3, "contar_desactualizadas trata la ausencia como versión 0")
+    previa = await repo.confirmar_version(1, 1, BASE)
+    ok(previa is not None and previa.get("version_confirmada", 0) == 0 and previa["version_precios"] == 1,
+       "confirmar_version retorna las versiones previas")
+    previa = await repo.confirmar_version(2, 2, BASE)
+    ok(previa is not None and previa["version_confirmada"] == 1, "confirmar_version avanza la versión confirmada")
+    ok(await repo.confirmar_version(2, 1, BASE) is None, "confirmar_version con una versión atrasada retorna None")
+    ok(await repo.confirmar_version(2, 2, BASE) is None, "confirmar_version con la misma versión retorna None")
+    ok((await repo.obtener(2))["version_confirmada"] == 2, "confirmar_version nunca retrocede")
+    desactualizadas = await repo.listar_desactualizadas()
+    ok([e["id_estacion"] for e in desactualizadas] == [3], "listar_desactualizadas compara con version_precios")
+    ok(await repo.contar_desactualizadas() == 1, "contar_desactualizadas coincide con el listado")
+    ok("_id" not in desactualizadas[0] and "precios_actuales" not in desactualizadas[0],
+       "listar_desactualizadas entrega solo los campos de versión")
+
+    fallidas = await repo.insertar_varias([estacion(10, "Este", "10.0.0.10"),
+                                           estacion(11, "Oeste", "10.0.0.11", estado="Inactiva")])
+    ok(fallidas == {}, "insertar_varias inserta el lote completo")
+    ok([e["id_estacion"] for e in await repo.listar(ids=[11, 1, 99])] == [1, 11],
+       "listar con ids filtra y ordena por id_estacion")
+    ok(await repo.listar(ids=[]) == [], "listar con ids vacío no retorna estaciones")
+    ok([e["id_estacion"] for e in await repo.listar(estado=["Inactiva"], despues_de=1)] == [11],
+       "listar acepta una lista de estados")
+    ok([e["id_estacion"] async for e in repo.iterar()] == [1, 2, 3, 10, 11], "iterar recorre en orden")
+    ok([e["id_estacion"] async for e in repo.iterar(estado="Inactiva")] == [11], "iterar filtra por estado")
+
+    cambiadas = await repo.cambiar_estados([(1, "Activa", "Desconectada"), (2, "Inactiva", "Activa")], BASE)
+    ok(cambiadas == 1, "cambiar_estados solo aplica si el estado anterior coincide")
+    ok((await repo.obtener(1))["estado"] == "Desconectada", "cambiar_estados persiste el estado nuevo")
+    ok(await repo.cambiar_estados([], BASE) == 0, "cambiar_estados sin cambios retorna 0")
+    total, por_estado = await repo.contar_por_estado()
+    ok(total == 5 and por_estado == {"Activa": 3, "Desconectada": 1, "Inactiva": 1},
+       "contar_por_estado entrega el total y el desglose")
+
+    ok(await repo.existe_ip("10.0.0.1"), "existe_ip encuentra IPs usadas")
+    ok(not await repo.existe_ip("10.0.0.1", excluir_id=1), "existe_ip respeta excluir_id")
+    ok(not await repo.existe_ip("10.0.0.9"), "existe_ip con IP libre es False")
+
+    eliminada = await repo.eliminar(3)
+    ok(eliminada is not None and eliminada.get("estado") == "Activa", "eliminar retorna el estado de la estación")
+    ok(eliminada is not None and eliminada.get("version_precios") == 1,
+       "eliminar retorna la versión de precios de la estación")
+    ok(await repo.eliminar(3) is None, "eliminar dos veces retorna None")
+
+
+async def verificar(driver: str) -> Verificador:
+    ok = Verificador(driver)
+    db = crear_almacenamiento(driver)
+    if driver == "mongo":
+        import database
+        await database.client.drop_database(os.environ["DATABASE_NAME"])
+    try:
+        await verificar_estaciones(db, ok)
+    finally:
+        if driver == "mongo":
+            import database
+            await database.client.drop_database(os.environ["DATABASE_NAME"])
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--drivers", nargs="+", choices=DRIVERS, default=list(DRIVERS))
+    args = parser.parse_args()
+
+    fallidos = 0
+    for driver in args.drivers:
+        ok = asyncio.run(verificar(driver))
+        estado = "OK" if not ok.fallos else "FALLA"
+        print(f"{driver:<8} {ok.total - len(ok.fallos)}/{ok.total} {estado}")
+        for fallo in ok.fallos:
+            print(f"    - {fallo}")
+        fallidos += bool(ok.fallos)
+
+    return 1 if fallidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,38 +2,71 @@
 Configuración de conexión a MongoDB usando Motor (async driver)
 """
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from dotenv import load_dotenv
 import os
+from bitacora import obtener_registrador
+from metricas import histograma
 
 # Cargar variables de entorno
 load_dotenv()
 
+log = obtener_registrador("database")
+
 # Configuración de MongoDB
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "bencineras_db")
 
+latencia_mongo = histograma(
+    "mongo_comando_segundos",
+    "Latencia de los comandos enviados a MongoDB",
+    ("comando", "resultado")
+)
+
+
+class ObservadorComandosMongo(monitoring.CommandListener):
+    """
+    Mide cada comando (find, insert, update, aggregate...) con la duración
+    que informa el driver. Motor ejecuta pymongo en su pool de hilos, por
+    eso la observación se encola con observar_desde_hilo.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        latencia_mongo.observar_desde_hilo(event.duration_micros / 1e6, event.command_name, "ok")
+
+    def failed(self, event):
+        latencia_mongo.observar_desde_hilo(event.duration_micros / 1e6, event.command_name, "error")
+
+
 # Cliente de MongoDB
-client = AsyncIOMotorClient(MONGODB_URL)
+client = AsyncIOMotorClient(MONGODB_URL, event_listeners=[ObservadorComandosMongo()])
 
 # Base de datos
 db = client[DATABASE_NAME]
 
 # Colecciones
 estaciones_collection = db["estaciones"]
+historico_collection = db["historico_precios"]
+estadisticas_collection = db["estadisticas"]
+entregas_collection = db["entregas_precios"]
+programaciones_collection = db["precios_programados"]
 
 # Función para verificar la conexión
 async def verificar_conexion():
     """Verifica que la conexión a MongoDB esté funcionando"""
     try:
         await client.admin.command('ping')
-        print("✅ Conexión exitosa a MongoDB")
+        log.info("Conexión exitosa a MongoDB", url=MONGODB_URL, base_datos=DATABASE_NAME)
         return True
     except Exception as e:
-        print(f"❌ Error conectando a MongoDB: {e}")
+        log.error("Error conectando a MongoDB", error=str(e))
         return False
 
 # Función para cerrar la conexión
 async def cerrar_conexion():
     """Cierra la conexión a MongoDB"""
     client.close()
-    print("🔒 Conexión a MongoDB cerrada")
+    log.info("Conexión a MongoDB cerrada")
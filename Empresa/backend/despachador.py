@@ -0,0 +1,340 @@
+"""
+Proceso despachador de la Empresa
+Reúne lo que debe existir una sola vez aunque la API HTTP corra con varios
+workers: el relay TCP del puerto 5000 y la pasarela socket.io, el pool de
+conexiones hacia las estaciones (y sus acuses de recibo), el outbox de
+entregas, los despliegues y cambios programados de precios, la
+verificación de liveness, las tareas periódicas de mantención y la
+numeración de los eventos del panel.
+
+Modos (MODO_DESPACHADOR):
+    integrado  Corre dentro del proceso de uvicorn, como un solo worker;
+               las operaciones se llaman directamente
+    externo    Corre como proceso propio y los workers HTTP le hablan por
+               el socket Unix de ipc.py; estaciones_activas, el estado de
+               las entregas y los rollouts son los mismos para todos ellos
+
+Los endpoints usan ejecutar(op, ...) y no saben en qué modo están. Los
+eventos que publica un worker se numeran en el despachador y vuelven a
+todos los workers, que además invalidan su caché de la estación afectada
+y, si el evento cambia el historial, los resultados de la analítica.
+
+Uso (modo externo, ver start.sh):
+    python despachador.py
+
+Variables de entorno:
+    MODO_DESPACHADOR: integrado o externo. Default integrado
+    DESPACHADOR_PUERTO_METRICAS: Puerto de /metrics del proceso despachador. Default 9101
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import signal
+from typing import Any, Dict, Optional
+
+from models import RolloutCreate, ProgramacionPreciosCreate
+from database import db, verificar_conexion, cerrar_conexion
+from indices import inicializar_indices
+from estaciones_service import (
+    inicializar_estaciones,
+    procesar_mensaje_estacion,
+    obtener_estadisticas_panel,
+    EVENTOS_ESTADISTICAS
+)
+from tcp_server import (
+    iniciar_tcp_servidor,
+    obtener_estaciones_activas,
+    obtener_estadisticas_pool,
+    obtener_estadisticas_relay
+)
+from pool_conexiones import pool_estaciones
+from historico_service import (
+    EVENTOS_HISTORICO,
+    migrar_historico_embebido,
+    tarea_retencion,
+    marcar_cambio_externo
+)
+from estadisticas_service import tarea_reconciliacion
+from entregas_service import despachador_entregas, despertar_entregas
+from liveness_service import LIVENESS_HABILITADO, tarea_liveness, estado_liveness
+from rollout_service import crear_rollout, obtener_rollout, listar_rollouts
+from programacion_service import (
+    inicializar_programaciones,
+    crear_programacion,
+    cancelar_programacion,
+    programador
+)
+from cache_estaciones import cache_estaciones
+from eventos import bus
+from ipc import ServidorIPC, ClienteIPC
+import pasarela_ws
+from bitacora import obtener_registrador
+from metricas import TIPO_CONTENIDO, exponer
+
+log = obtener_registrador("despachador")
+
+MODO_DESPACHADOR = os.getenv("MODO_DESPACHADOR", "integrado").lower()
+PUERTO_METRICAS = int(os.getenv("DESPACHADOR_PUERTO_METRICAS", "9101"))
+
+if MODO_DESPACHADOR not in ("integrado", "externo"):
+    raise ValueError(f"MODO_DESPACHADOR inválido: {MODO_DESPACHADOR} (opciones: integrado, externo)")
+
+_tareas = set()
+_cliente: Optional[ClienteIPC] = None
+
+
+# ============================================
+# OPERACIONES
+# ============================================
+# Argumentos por nombre y compatibles con JSON: en modo externo viajan por
+# el socket, así que los modelos se reciben como diccionarios
+
+def _crear_rollout(datos: Dict[str, Any]):
+    return crear_rollout(RolloutCreate(**datos))
+
+
+def _crear_programacion(datos: Dict[str, Any]):
+    return crear_programacion(ProgramacionPreciosCreate(**datos))
+
+
+def _publicar(tipo: str, datos: Any):
+    bus.publicar(tipo, datos)
+
+
+def _estaciones_activas() -> Dict[str, Any]:
+    activas = obtener_estaciones_activas()
+    return {
+        "total": len(activas),
+        "estaciones": activas,
+        "conexiones": obtener_estadisticas_pool()
+    }
+
+
+OPERACIONES = {
+    "publicar": _publicar,
+    "despertar_entregas": despertar_entregas,
+    "crear_rollout": _crear_rollout,
+    "obtener_rollout": obtener_rollout,
+    "listar_rollouts": listar_rollouts,
+    "crear_programacion": _crear_programacion,
+    "cancelar_programacion": cancelar_programacion,
+    "estaciones_activas": _estaciones_activas,
+    "estadisticas_relay": obtener_estadisticas_relay,
+    "estado_liveness": estado_liveness,
+    "estado_pasarela": pasarela_ws.estadisticas
+}
+
+
+async def ejecutar(op: str, **args) -> Any:
+    """
+    Ejecuta una operación del despachador donde sea que corra
+
+    Args:
+        op: Nombre en OPERACIONES
+        **args: Argumentos por nombre (compatibles con JSON)
+
+    Raises:
+        ValueError: Si la operación rechazó los datos
+        ipc.DespachadorNoDisponible: En modo externo, sin conexión con el despachador
+    """
+    if MODO_DESPACHADOR == "externo":
+        return await _cliente.llamar(op, **args)
+    resultado = OPERACIONES[op](**args)
+    if inspect.isawaitable(resultado):
+        resultado = await resultado
+    return resultado
+
+
+def avisar(op: str, **args):
+    """
+    Ejecuta una operación sin esperar su resultado (ej: despertar al
+    despachador de entregas tras escribir en el outbox). En modo externo, si
+    no hay conexión se descarta: el despachador revisa el outbox al iniciar
+    y periódicamente.
+    """
+    if MODO_DESPACHADOR == "externo":
+        _cliente.notificar(op, **args)
+        return
+    resultado = OPERACIONES[op](**args)
+    if inspect.isawaitable(resultado):
+        _en_segundo_plano(resultado)
+
+
+# ============================================
+# CICLO DE VIDA
+# ============================================
+
+def _en_segundo_plano(corrutina):
+    tarea = asyncio.create_task(corrutina)
+    _tareas.add(tarea)
+    tarea.add_done_callback(_tareas.discard)
+
+
+async def iniciar_despachador(conexion_ok: bool):
+    """
+    Arranca los componentes únicos (en el proceso de uvicorn en modo
+    integrado o en el proceso despachador en modo externo)
+
+    Args:
+        conexion_ok: Si MongoDB respondió; sin él solo se levantan el relay y el pool
+    """
+    if conexion_ok:
+        # 🔹 Índices declarados en indices.py (y auditoría opcional de consultas)
+        await inicializar_indices(db)
+
+        # 🔹 Secuencia de IDs de estaciones
+        await inicializar_estaciones()
+
+        # 🔹 Historial de precios por buckets (migración y retención)
+        await migrar_historico_embebido()
+        _en_segundo_plano(tarea_retencion())
+
+        # 🔹 Reconciliación periódica de los contadores de estadísticas
+        _en_segundo_plano(tarea_reconciliacion())
+
+        # 🔹 Outbox de entregas de precios (reanuda las pendientes tras reiniciar)
+        _en_segundo_plano(despachador_entregas())
+
+        # 🔹 Cambios de precios programados (heap en memoria)
+        await inicializar_programaciones()
+
+        # 🔹 Estadísticas del panel por SSE, recalculadas solo cuando algo cambia
+        _en_segundo_plano(bus.derivar("estadisticas", obtener_estadisticas_panel, EVENTOS_ESTADISTICAS))
+
+        # 🔹 Verificación periódica de conectividad de las estaciones
+        if LIVENESS_HABILITADO:
+            _en_segundo_plano(tarea_liveness())
+
+    # 🔹 Relay TCP de los surtidores
+    _en_segundo_plano(iniciar_tcp_servidor())
+    log.info("Servidor TCP iniciado", modo=MODO_DESPACHADOR)
+
+    # 🔹 Mantención del pool de conexiones hacia estaciones
+    pool_estaciones.al_recibir(procesar_mensaje_estacion)
+    pool_estaciones.iniciar()
+
+    # 🔹 socket.io hacia el frontend (puerto 4000), alimentado por el relay
+    await pasarela_ws.iniciar()
+
+
+async def detener_despachador():
+    """Detiene el programador, el pool y la pasarela socket.io"""
+    programador.detener()
+    await pool_estaciones.cerrar()
+    await pasarela_ws.detener()
+
+
+def _recibir_evento(evento: Dict[str, Any]):
+    """Evento difundido por el despachador hacia este worker"""
+    if "trama" not in evento:
+        # Saludo al conectar: numeración vigente del despachador; lo que
+        # cambió mientras no había conexión no llegó como evento
+        bus.sincronizar(evento["epoca"], evento["secuencia"])
+        marcar_cambio_externo()
+        return
+    if evento.get("id_estacion") is not None:
+        cache_estaciones.invalidar(evento["id_estacion"])
+    if evento.get("tipo") in EVENTOS_HISTORICO:
+        marcar_cambio_externo()
+    bus.recibir(evento["epoca"], evento["secuencia"], evento["trama"].encode())
+
+
+def conectar_despachador():
+    """
+    Conecta este worker HTTP al proceso despachador (modo externo)
+
+    Desde aquí lo que el worker publique en el bus se numera en el
+    despachador y vuelve por la difusión a todos los workers.
+    """
+    global _cliente
+    _cliente = ClienteIPC()
+    _cliente.al_recibir(_recibir_evento)
+    bus.redirigir(lambda tipo, datos: _cliente.notificar("publicar", tipo=tipo, datos=datos))
+    _cliente.iniciar()
+
+
+async def desconectar_despachador():
+    if _cliente is not None:
+        await _cliente.cerrar()
+
+
+def estado_despachador() -> Dict[str, Any]:
+    return {
+        "modo": MODO_DESPACHADOR,
+        "conectado": _cliente.conectado if _cliente is not None else None
+    }
+
+
+# ============================================
+# PROCESO DEDICADO
+# ============================================
+
+def _difundir_a(servidor: ServidorIPC):
+    def difundir(tipo: str, datos: Any, secuencia: int, trama: bytes):
+        servidor.difundir({"evento": {
+            "epoca": bus.epoca,
+            "secuencia": secuencia,
+            "trama": trama.decode(),
+            "tipo": tipo,
+            "id_estacion": datos.get("id_estacion") if isinstance(datos, dict) else None
+        }})
+    return difundir
+
+
+async def _servir_metricas(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Responde cualquier petición HTTP con las métricas de este proceso"""
+    try:
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        cuerpo = exponer()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: " + TIPO_CONTENIDO.encode() + b"\r\n"
+            b"Content-Length: " + str(len(cuerpo)).encode() + b"\r\n"
+            b"Connection: close\r\n\r\n" + cuerpo
+        )
+        await writer.drain()
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _ejecutar_proceso():
+    conexion_ok = await verificar_conexion()
+    if not conexion_ok:
+        log.warning("No se pudo conectar a MongoDB")
+    await iniciar_despachador(conexion_ok)
+
+    servidor = ServidorIPC(
+        OPERACIONES,
+        saludo=lambda: {"evento": {"epoca": bus.epoca, "secuencia": bus.secuencia}}
+    )
+    bus.al_publicar(_difundir_a(servidor))
+    await servidor.iniciar()
+
+    metricas = await asyncio.start_server(_servir_metricas, "0.0.0.0", PUERTO_METRICAS)
+    log.info("Métricas del despachador", puerto=PUERTO_METRICAS)
+
+    detener = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(senal, detener.set)
+    await detener.wait()
+
+    log.info("Deteniendo despachador")
+    metricas.close()
+    await servidor.cerrar()
+    await detener_despachador()
+    await cerrar_conexion()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.parse_args()
+    asyncio.run(_ejecutar_proceso())
+
+
+if __name__ == "__main__":
+    main()
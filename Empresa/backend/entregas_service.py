@@ -0,0 +1,320 @@
+"""
+Outbox persistente de entregas de precios hacia las estaciones
+Cada actualización de precios se registra en la colección entregas_precios
+(un documento por estación, de modo que una actualización nueva reemplaza
+a la anterior aún no entregada) y un despachador en segundo plano la
+entrega vía TCP, reintentando con backoff exponencial mientras la
+estación no responda. Así ninguna actualización se pierde y las
+estaciones que vuelven a estar en línea se ponen al día solas.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import entregas_collection
+from tcp_server import enviar_precios_a_estacion
+from eventos import bus
+from bitacora import obtener_registrador
+from metricas import histograma, medidor
+
+log = obtener_registrador("entregas")
+
+# Backoff entre reintentos (segundos)
+BACKOFF_INICIAL = float(os.getenv("ENTREGAS_BACKOFF_INICIAL", "2"))
+BACKOFF_MAXIMO = float(os.getenv("ENTREGAS_BACKOFF_MAXIMO", "300"))
+# Entregas simultáneas del despachador
+CONCURRENCIA = int(os.getenv("ENTREGAS_CONCURRENCIA", "50"))
+# Espera máxima del despachador entre revisiones de la colección
+INTERVALO_MAXIMO = float(os.getenv("ENTREGAS_INTERVALO_MAXIMO", "30"))
+
+# Despierta al despachador cuando se encola una entrega nueva
+_hay_trabajo = asyncio.Event()
+
+# Entregas en curso por id_estacion: una estación lenta no retrasa a las
+# demás y no se intenta dos veces a la vez
+_en_curso: Dict[int, asyncio.Task] = {}
+
+entregas_vencidas = medidor(
+    "empresa_entregas_vencidas",
+    "Entregas de precios vencidas en la última revisión del despachador"
+)
+medidor("empresa_entregas_en_curso", "Entregas de precios en curso en el despachador",
+        funcion=lambda: len(_en_curso))
+duracion_entrega = histograma(
+    "empresa_entregas_duracion_segundos",
+    "Duración de un intento de entrega de precios a una estación"
+)
+
+
+def publicar_estado_entrega(id_estacion: int, estado: str, version: Optional[int],
+                            intentos: int, error: Optional[str] = None):
+    """Informa al panel el estado de la entrega de precios a una estación"""
+    bus.publicar("entrega", {
+        "id_estacion": id_estacion,
+        "estado": estado,
+        "version": version,
+        "intentos": intentos,
+        "ultimo_error": error
+    })
+
+
+async def encolar_entrega(estacion: Dict[str, Any], precios: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Registra (o reemplaza) la entrega pendiente de precios a una estación
+
+    Args:
+        estacion: Documento de la estación (id_estacion, ip, puerto, nombre)
+        precios: Precios a entregar
+
+    Returns:
+        Estado de la entrega registrada
+    """
+    ahora = datetime.now()
+    entrega = await entregas_collection.find_one_and_update(
+        {"id_estacion": estacion["id_estacion"]},
+        {
+            "$set": {
+                "ip": estacion["ip"],
+                "puerto": estacion["puerto"],
+                "nombre": estacion.get("nombre"),
+                "precios": precios,
+                "version": estacion.get("version_precios"),
+                "estado": "pendiente",
+                "intentos": 0,
+                "proximo_intento": ahora,
+                "ultimo_error": None,
+                "fecha_encolado": ahora
+            },
+            # La secuencia distingue esta versión de una entrega en curso anterior
+            "$inc": {"secuencia": 1}
+        },
+        upsert=True,
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    despertar_entregas()
+    publicar_estado_entrega(entrega["id_estacion"], "pendiente", entrega.get("version"), 0)
+    return entrega
+
+
+async def registrar_entrega_directa(estacion: Dict[str, Any], precios: Dict[str, int]):
+    """
+    Registra en el outbox unos precios que ya se entregaron por otra vía
+    (envío directo de un rollout)
+
+    Reemplaza una entrega pendiente de una versión anterior, para que el
+    despachador no reenvíe precios viejos, y avanza la secuencia, para que
+    un intento en curso de esa versión no sobrescriba el resultado. Una
+    entrega pendiente de una versión más nueva se deja intacta.
+
+    Args:
+        estacion: Documento de la estación (id_estacion, ip, puerto, nombre, version_precios)
+        precios: Precios entregados
+    """
+    ahora = datetime.now()
+    version = estacion.get("version_precios")
+    try:
+        await entregas_collection.update_one(
+            {
+                "id_estacion": estacion["id_estacion"],
+                "$or": [{"version": {"$lte": version}}, {"version": None}]
+            },
+            {
+                "$set": {
+                    "ip": estacion["ip"],
+                    "puerto": estacion["puerto"],
+                    "nombre": estacion.get("nombre"),
+                    "precios": precios,
+                    "version": version,
+                    "estado": "entregado",
+                    "intentos": 1,
+                    "proximo_intento": ahora,
+                    "ultimo_error": None,
+                    "fecha_encolado": ahora,
+                    "fecha_entrega": ahora
+                },
+                "$inc": {"secuencia": 1}
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Ya hay una entrega de una versión más nueva: sigue su curso
+        return
+    publicar_estado_entrega(estacion["id_estacion"], "entregado", version, 1)
+
+
+def despertar_entregas():
+    """
+    Adelanta la próxima revisión del despachador de entregas
+
+    Con la API en varios workers, el worker que encola avisa por IPC al
+    proceso despachador (despachador.avisar)
+    """
+    _hay_trabajo.set()
+
+
+async def obtener_entrega(id_estacion: int) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene el estado de entrega de precios de una estación
+
+    Args:
+        id_estacion: ID de la estación
+
+    Returns:
+        Estado de la entrega o None si nunca se encoló una
+    """
+    return await entregas_collection.find_one({"id_estacion": id_estacion}, {"_id": 0})
+
+
+async def listar_entregas(estado: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Lista el estado de entrega de todas las estaciones
+
+    Args:
+        estado: Filtrar por estado (pendiente, reintentando, entregado)
+
+    Returns:
+        Lista de entregas ordenadas por id_estacion
+    """
+    filtro = {"estado": estado} if estado else {}
+    cursor = entregas_collection.find(filtro, {"_id": 0}).sort("id_estacion", 1)
+    return await cursor.to_list(length=None)
+
+
+async def eliminar_entrega(id_estacion: int):
+    """Descarta la entrega de una estación eliminada"""
+    await entregas_collection.delete_one({"id_estacion": id_estacion})
+
+
+async def _entregar(entrega: Dict[str, Any], semaforo: asyncio.Semaphore):
+    """Intenta una entrega y registra el resultado si sigue siendo la vigente"""
+    async with semaforo:
+        with duracion_entrega.medir():
+            exitoso = await enviar_precios_a_estacion(
+                entrega["ip"],
+                entrega["puerto"],
+                entrega["precios"],
+                entrega.get("nombre"),
+                version=entrega.get("version"),
+                id_estacion=entrega["id_estacion"]
+            )
+
+    # Solo se actualiza si no llegó una versión más nueva mientras tanto
+    filtro = {"id_estacion": entrega["id_estacion"], "secuencia": entrega["secuencia"]}
+    ahora = datetime.now()
+
+    intentos = entrega.get("intentos", 0) + 1
+
+    if exitoso:
+        resultado = await entregas_collection.update_one(filtro, {
+            "$set": {"estado": "entregado", "fecha_entrega": ahora, "ultimo_error": None},
+            "$inc": {"intentos": 1}
+        })
+        if resultado.matched_count:
+            publicar_estado_entrega(entrega["id_estacion"], "entregado", entrega.get("version"), intentos)
+        return
+
+    espera = min(BACKOFF_INICIAL * (2 ** (intentos - 1)), BACKOFF_MAXIMO)
+    error = f"Estación {entrega['ip']}:{entrega['puerto']} no disponible"
+    resultado = await entregas_collection.update_one(filtro, {
+        "$set": {
+            "estado": "reintentando",
+            "intentos": intentos,
+            "proximo_intento": ahora + timedelta(seconds=espera),
+            "ultimo_error": error,
+            "fecha_ultimo_intento": ahora
+        }
+    })
+    if resultado.matched_count:
+        publicar_estado_entrega(entrega["id_estacion"], "reintentando", entrega.get("version"), intentos, error)
+
+
+def _al_terminar(id_estacion: int):
+    def terminar(tarea: asyncio.Task):
+        _en_curso.pop(id_estacion, None)
+        if tarea.cancelled():
+            return
+        if tarea.exception() is not None:
+            # Queda vencida y se reintenta en la próxima revisión
+            log.error("Error en entrega de precios", id_estacion=id_estacion, error=str(tarea.exception()))
+            return
+        # Pudo llegar una versión más nueva mientras se entregaba esta
+        _hay_trabajo.set()
+    return terminar
+
+
+async def _segundos_hasta_proxima() -> float:
+    """Calcula cuánto esperar hasta la próxima entrega programada que no esté en curso"""
+    proxima = await entregas_collection.find_one(
+        {"estado": {"$in": ["pendiente", "reintentando"]}, "id_estacion": {"$nin": list(_en_curso)}},
+        {"proximo_intento": 1},
+        sort=[("proximo_intento", 1)]
+    )
+    if proxima is None:
+        return INTERVALO_MAXIMO
+    espera = (proxima["proximo_intento"] - datetime.now()).total_seconds()
+    return max(0.0, min(espera, INTERVALO_MAXIMO))
+
+
+async def despachador_entregas():
+    """
+    Lazo principal del despachador: lanza una tarea por cada entrega
+    vencida que no esté ya en curso y duerme hasta la próxima entrega
+    programada, hasta que llegue una nueva o hasta que termine una en curso
+    """
+    semaforo = asyncio.Semaphore(CONCURRENCIA)
+    log.info("Despachador de entregas de precios iniciado", concurrencia=CONCURRENCIA)
+
+    while True:
+        try:
+            _hay_trabajo.clear()
+            vencidas = await entregas_collection.find(
+                {
+                    "estado": {"$in": ["pendiente", "reintentando"]},
+                    "proximo_intento": {"$lte": datetime.now()},
+                    "id_estacion": {"$nin": list(_en_curso)}
+                },
+                {"_id": 0}
+            ).to_list(length=None)
+
+            entregas_vencidas.set(len(vencidas))
+            for entrega in vencidas:
+                tarea = asyncio.create_task(_entregar(entrega, semaforo))
+                _en_curso[entrega["id_estacion"]] = tarea
+                tarea.add_done_callback(_al_terminar(entrega["id_estacion"]))
+
+            espera = await _segundos_hasta_proxima()
+            try:
+                await asyncio.wait_for(_hay_trabajo.wait(), timeout=espera)
+            except asyncio.TimeoutError:
+                pass
+
+        except asyncio.CancelledError:
+            for tarea in list(_en_curso.values()):
+                tarea.cancel()
+            raise
+        except Exception:
+            log.exception("Error en despachador de entregas")
+            await asyncio.sleep(5)
+
+
+async def reintentar_ahora(id_estacion: int) -> bool:
+    """
+    Adelanta el próximo intento de una entrega pendiente (por ejemplo,
+    cuando se detecta que la estación volvió a estar en línea)
+
+    Args:
+        id_estacion: ID de la estación
+
+    Returns:
+        True si había una entrega pendiente
+    """
+    resultado = await entregas_collection.update_one(
+        {"id_estacion": id_estacion, "estado": "reintentando"},
+        {"$set": {"proximo_intento": datetime.now()}}
+    )
+    if resultado.modified_count:
+        _hay_trabajo.set()
+    return resultado.modified_count > 0
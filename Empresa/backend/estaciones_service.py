@@ -10,7 +10,53 @@ from models import (
     PreciosUpdate,
     HistoricoPreciosModel
 )
-from database import estaciones_collection
+from almacenamiento import almacenamiento
+from historico_service import registrar_precios, eliminar_historico, obtener_historico
+from estadisticas_service import registrar_cambio_estado, registrar_desactualizada, obtener_contadores
+from entregas_service import eliminar_entrega
+from cache_estaciones import cache_estaciones
+from eventos import bus
+
+# Campos de una estación que muestra el panel (foto inicial y eventos SSE)
+CAMPOS_PANEL = ["id_estacion", "nombre", "estado", "ip", "puerto", "precios_actuales", "version_precios"]
+
+
+# Eventos que cambian las estadísticas del panel
+EVENTOS_ESTADISTICAS = (
+    "estacion_creada",
+    "estacion_actualizada",
+    "estacion_eliminada",
+    "precios_actualizados",
+    "precios_confirmados",
+    "liveness",
+    "resincronizar"
+)
+
+
+def _publicar_estacion(tipo: str, estacion: Dict[str, Any]):
+    """Publica una estación en el bus del panel con solo los campos que este muestra"""
+    bus.publicar(tipo, {campo: estacion.get(campo) for campo in CAMPOS_PANEL})
+
+
+async def inicializar_estaciones():
+    """
+    Alinea la secuencia de IDs de estaciones con el máximo existente
+    """
+    await almacenamiento.estaciones.inicializar()
+
+
+async def reservar_ids_estaciones(cantidad: int) -> range:
+    """
+    Reserva un bloque de IDs de estación en un solo round-trip
+    (útil para importaciones masivas)
+    
+    Args:
+        cantidad: Cantidad de IDs a reservar
+        
+    Returns:
+        Rango con los IDs reservados
+    """
+    return await almacenamiento.estaciones.reservar_ids(cantidad)
 
 
 async def crear_estacion(estacion: EstacionCreate) -> Dict[str, Any]:
@@ -23,13 +69,10 @@ async def crear_estacion(estacion: EstacionCreate) -> Dict[str, Any]:
     Returns:
         Diccionario con los datos de la estación creada
     """
-    # Generar ID único (obtener el máximo ID actual + 1)
-    ultima_estacion = await estaciones_collection.find_one(
-        sort=[("id_estacion", -1)]
-    )
-    nuevo_id = 1 if ultima_estacion is None else ultima_estacion["id_estacion"] + 1
+    # Generar ID único de forma atómica desde la secuencia de estaciones
+    nuevo_id = (await almacenamiento.estaciones.reservar_ids(1))[0]
     
-    # Preparar documento para insertar
+    # Preparar documento para insertar (el historial vive en su propia colección)
     estacion_dict = {
         "id_estacion": nuevo_id,
         "nombre": estacion.nombre,
@@ -37,51 +80,112 @@ async def crear_estacion(estacion: EstacionCreate) -> Dict[str, Any]:
         "puerto": estacion.puerto,
         "estado": "Activa",
         "precios_actuales": estacion.precios_actuales.model_dump(),
-        "historico_precios": [
-            {
-                "timestamp": datetime.now(),
-                "precios": estacion.precios_actuales.model_dump()
-            }
-        ],
+        "version_precios": 1,
         "fecha_creacion": datetime.now(),
         "fecha_actualizacion": datetime.now()
     }
     
     # Insertar en la base de datos
-    resultado = await estaciones_collection.insert_one(estacion_dict)
+    estacion_dict["_id"] = await almacenamiento.estaciones.insertar(estacion_dict)
     
-    # Obtener el documento insertado
-    estacion_creada = await estaciones_collection.find_one(
-        {"_id": resultado.inserted_id}
-    )
+    # Registrar los precios iniciales en el historial y actualizar contadores
+    await registrar_precios(nuevo_id, estacion.precios_actuales.model_dump())
+    # Parte con version_precios 1 sin confirmar: cuenta como desactualizada
+    await registrar_cambio_estado(None, estacion_dict["estado"], desactualizadas=1)
+    
+    # El documento insertado ya está en memoria: no es necesario releerlo
+    cache_estaciones.guardar(estacion_dict)
+    _publicar_estacion("estacion_creada", estacion_dict)
     
-    # Convertir ObjectId a string para serialización JSON
-    if estacion_creada:
-        estacion_creada["_id"] = str(estacion_creada["_id"])
+    return estacion_dict
+
+
+# Campos que se pueden solicitar con ?fields= en el listado de estaciones
+CAMPOS_ESTACION = {
+    "_id",
+    "id_estacion",
+    "nombre",
+    "ip",
+    "puerto",
+    "estado",
+    "precios_actuales",
+    "version_precios",
+    "version_confirmada",
+    "fecha_creacion",
+    "fecha_actualizacion"
+}
+
+
+def validar_campos(campos: Optional[List[str]] = None):
+    """
+    Verifica que los campos solicitados con ?fields= existan
     
-    return estacion_creada
+    Args:
+        campos: Campos solicitados (None = proyección por defecto)
+        
+    Raises:
+        ValueError: Si se solicita un campo que no existe
+    """
+    invalidos = set(campos or ()) - CAMPOS_ESTACION
+    if invalidos:
+        raise ValueError(f"Campos no permitidos: {', '.join(sorted(invalidos))}")
 
 
 async def obtener_estaciones() -> List[Dict[str, Any]]:
     """
-    Obtiene todas las estaciones de la base de datos
+    Obtiene todas las estaciones de la base de datos (sin historial)
     
     Returns:
         Lista de diccionarios con los datos de todas las estaciones
     """
-    estaciones = []
-    cursor = estaciones_collection.find()
+    return await almacenamiento.estaciones.listar()
+
+
+async def obtener_estaciones_paginadas(
+    campos: Optional[List[str]] = None,
+    limit: int = 100,
+    despues_de: Optional[int] = None,
+    estado: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Obtiene una página de estaciones usando paginación por cursor (keyset)
+    sobre id_estacion, de modo que el costo depende del tamaño de página
+    y no del total de estaciones
+    
+    Args:
+        campos: Campos a incluir (None = todos excepto el historial)
+        limit: Cantidad máxima de estaciones por página
+        despues_de: Cursor; retorna estaciones con id_estacion mayor a este
+        estado: Filtrar por estado (opcional)
+        
+    Returns:
+        Diccionario con la lista de estaciones y el next_cursor (None si no hay más)
+    """
+    validar_campos(campos)
     
-    async for estacion in cursor:
-        estacion["_id"] = str(estacion["_id"])
-        estaciones.append(estacion)
+    # Se pide un elemento extra para saber si existe una página siguiente
+    estaciones = await almacenamiento.estaciones.listar(
+        campos=campos,
+        despues_de=despues_de,
+        estado=estado,
+        limit=limit + 1
+    )
     
-    return estaciones
+    next_cursor = None
+    if len(estaciones) > limit:
+        estaciones = estaciones[:limit]
+        next_cursor = estaciones[-1]["id_estacion"]
+    
+    return {
+        "estaciones": estaciones,
+        "next_cursor": next_cursor
+    }
 
 
 async def obtener_estacion_por_id(id_estacion: int) -> Optional[Dict[str, Any]]:
     """
     Obtiene una estación específica por su ID
+    Se sirve desde el caché en memoria y solo consulta la base ante un fallo
     
     Args:
         id_estacion: ID de la estación a buscar
@@ -89,10 +193,14 @@ async def obtener_estacion_por_id(id_estacion: int) -> Optional[Dict[str, Any]]:
     Returns:
         Diccionario con los datos de la estación o None si no existe
     """
-    estacion = await estaciones_collection.find_one({"id_estacion": id_estacion})
+    estacion = cache_estaciones.obtener(id_estacion)
+    if estacion is not None:
+        return estacion
+    
+    estacion = await almacenamiento.estaciones.obtener(id_estacion)
     
     if estacion:
-        estacion["_id"] = str(estacion["_id"])
+        cache_estaciones.guardar(estacion)
     
     return estacion
 
@@ -130,17 +238,22 @@ async def actualizar_estacion(
         # No hay nada que actualizar (solo fecha)
         return await obtener_estacion_por_id(id_estacion)
     
-    # Actualizar en la base de datos
-    resultado = await estaciones_collection.update_one(
-        {"id_estacion": id_estacion},
-        {"$set": datos_actualizacion}
-    )
+    # Actualizar en la base de datos obteniendo el documento previo,
+    # necesario para ajustar los contadores si cambia el estado
+    anterior = await almacenamiento.estaciones.actualizar(id_estacion, datos_actualizacion)
     
-    if resultado.matched_count == 0:
+    if anterior is None:
+        cache_estaciones.invalidar(id_estacion)
         return None
     
-    # Obtener y retornar la estación actualizada
-    return await obtener_estacion_por_id(id_estacion)
+    if datos.estado is not None:
+        await registrar_cambio_estado(anterior.get("estado"), datos.estado)
+    
+    # Construir la estación actualizada sin volver a leerla
+    anterior.update(datos_actualizacion)
+    cache_estaciones.guardar(anterior)
+    _publicar_estacion("estacion_actualizada", anterior)
+    return anterior
 
 
 async def actualizar_precios(
@@ -157,36 +270,30 @@ async def actualizar_precios(
     Returns:
         Diccionario con los datos actualizados o None si no existe la estación
     """
-    # Verificar que la estación existe
-    estacion = await obtener_estacion_por_id(id_estacion)
-    if not estacion:
-        return None
+    precios = precios_update.precios.model_dump()
     
-    # Preparar entrada para el historial
-    entrada_historial = {
-        "timestamp": datetime.now(),
-        "precios": precios_update.precios.model_dump()
-    }
-    
-    # Actualizar precios actuales y agregar al historial
-    resultado = await estaciones_collection.update_one(
-        {"id_estacion": id_estacion},
-        {
-            "$set": {
-                "precios_actuales": precios_update.precios.model_dump(),
-                "fecha_actualizacion": datetime.now()
-            },
-            "$push": {
-                "historico_precios": entrada_historial
-            }
-        }
-    )
+    # Actualizar precios actuales, avanzar la versión del conjunto de precios
+    # y obtener la estación actualizada en una sola operación
+    estacion = await almacenamiento.estaciones.actualizar_precios(id_estacion, precios, datetime.now())
     
-    if resultado.matched_count == 0:
+    if estacion is None:
+        cache_estaciones.invalidar(id_estacion)
         return None
     
-    # Obtener y retornar la estación actualizada
-    return await obtener_estacion_por_id(id_estacion)
+    # Agregar el cambio al historial (colección por buckets)
+    await registrar_precios(id_estacion, precios)
+    
+    # Si estaba al día (confirmada = versión anterior), ahora queda atrasada
+    if estacion.get("version_confirmada", 0) == estacion["version_precios"] - 1:
+        await registrar_desactualizada(1)
+    
+    cache_estaciones.guardar(estacion)
+    bus.publicar("precios_actualizados", {
+        "id_estacion": id_estacion,
+        "precios_actuales": estacion["precios_actuales"],
+        "version_precios": estacion.get("version_precios")
+    })
+    return estacion
 
 
 async def eliminar_estacion(id_estacion: int) -> bool:
@@ -199,29 +306,131 @@ async def eliminar_estacion(id_estacion: int) -> bool:
     Returns:
         True si se eliminó exitosamente, False si no existe
     """
-    resultado = await estaciones_collection.delete_one({"id_estacion": id_estacion})
-    return resultado.deleted_count > 0
+    eliminada = await almacenamiento.estaciones.eliminar(id_estacion)
+    cache_estaciones.invalidar(id_estacion)
+    
+    if eliminada is None:
+        return False
+    
+    await registrar_cambio_estado(
+        eliminada.get("estado"), None,
+        desactualizadas=-1 if _desactualizada(eliminada) else 0
+    )
+    await eliminar_historico(id_estacion)
+    await eliminar_entrega(id_estacion)
+    bus.publicar("estacion_eliminada", {"id_estacion": id_estacion})
+    return True
 
 
-async def obtener_historico_precios(id_estacion: int) -> Optional[List[Dict[str, Any]]]:
+async def obtener_historico_precios(
+    id_estacion: int,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    limit: int = 500,
+    skip: int = 0,
+    orden: str = "desc"
+) -> Optional[List[Dict[str, Any]]]:
     """
     Obtiene el historial de precios de una estación
     
     Args:
         id_estacion: ID de la estación
+        desde: Fecha mínima del rango (opcional)
+        hasta: Fecha máxima del rango (opcional)
+        limit: Cantidad máxima de entradas
+        skip: Entradas a saltar (paginación)
+        orden: "asc" o "desc" según fecha
         
     Returns:
         Lista con el historial de precios o None si la estación no existe
     """
-    estacion = await estaciones_collection.find_one(
-        {"id_estacion": id_estacion},
-        {"historico_precios": 1, "_id": 0}
-    )
+    existe = await obtener_estacion_por_id(id_estacion)
+    
+    if not existe:
+        return None
+    
+    return await obtener_historico(id_estacion, desde, hasta, limit, skip, orden)
+
+
+def _desactualizada(estacion: Dict[str, Any]) -> bool:
+    """Si la estación aún no confirma su version_precios vigente (ausente = 0)"""
+    return estacion.get("version_confirmada", 0) < estacion.get("version_precios", 0)
+
+
+async def registrar_confirmacion(id_estacion: int, version: int):
+    """
+    Registra la versión de precios que la estación confirmó haber aplicado
+    (nunca retrocede aunque los acuses lleguen desordenados)
+    
+    Args:
+        id_estacion: ID de la estación
+        version: Versión confirmada
+    """
+    anterior = await almacenamiento.estaciones.confirmar_version(id_estacion, version, datetime.now())
+    if anterior is None:
+        # Acuse repetido o atrasado: la versión no avanzó
+        return
+    
+    cache_estaciones.invalidar(id_estacion)
+    if _desactualizada(anterior) and version >= anterior.get("version_precios", 0):
+        await registrar_desactualizada(-1)
+    bus.publicar("precios_confirmados", {"id_estacion": id_estacion, "version_confirmada": version})
+
+
+async def procesar_mensaje_estacion(mensaje: Dict[str, Any]):
+    """
+    Procesa un mensaje recibido por la conexión persistente con una estación
+    
+    Args:
+        mensaje: Mensaje JSON decodificado (por ahora solo ack_precios)
+    """
+    if mensaje.get("tipo") != "ack_precios":
+        return
+    
+    id_estacion = mensaje.get("id_estacion")
+    version = mensaje.get("version")
+    if isinstance(id_estacion, int) and isinstance(version, int):
+        await registrar_confirmacion(id_estacion, version)
+
+
+async def obtener_estaciones_desactualizadas(limit: int = 100) -> List[Dict[str, Any]]:
+    """
+    Lista las estaciones que aún no confirman el último conjunto de precios
+    
+    Args:
+        limit: Cantidad máxima de estaciones
+        
+    Returns:
+        Lista con id, nombre, estado, versión vigente y versión confirmada
+    """
+    estaciones = await almacenamiento.estaciones.listar_desactualizadas(limit)
+    for estacion in estaciones:
+        estacion.setdefault("version_confirmada", 0)
+        estacion["versiones_atrasadas"] = estacion.get("version_precios", 0) - estacion["version_confirmada"]
+    return estaciones
+
+
+async def obtener_precios_vigentes(id_estacion: int) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene solo el último conjunto de precios de una estación y su versión
+    (lo que necesita una estación atrasada para ponerse al día)
     
+    Args:
+        id_estacion: ID de la estación
+        
+    Returns:
+        Diccionario con versión, precios y nombre, o None si no existe
+    """
+    estacion = await obtener_estacion_por_id(id_estacion)
     if not estacion:
         return None
     
-    return estacion.get("historico_precios", [])
+    return {
+        "id_estacion": id_estacion,
+        "version": estacion.get("version_precios", 0),
+        "precios": estacion.get("precios_actuales"),
+        "nombre_estacion": estacion.get("nombre")
+    }
 
 
 async def verificar_ip_existente(ip: str, excluir_id: Optional[int] = None) -> bool:
@@ -236,29 +445,41 @@ async def verificar_ip_existente(ip: str, excluir_id: Optional[int] = None) -> b
     Returns:
         True si la IP ya existe, False si está disponible
     """
-    query = {"ip": ip}
-    if excluir_id is not None:
-        query["id_estacion"] = {"$ne": excluir_id}
-    
-    estacion = await estaciones_collection.find_one(query)
-    return estacion is not None
+    return await almacenamiento.estaciones.existe_ip(ip, excluir_id)
 
 
 async def obtener_estadisticas() -> Dict[str, Any]:
     """
     Obtiene estadísticas generales del sistema
+    Lee los contadores mantenidos en cada escritura (una sola lectura)
     
     Returns:
         Diccionario con estadísticas: total estaciones, activas, inactivas, etc.
     """
-    total = await estaciones_collection.count_documents({})
-    activas = await estaciones_collection.count_documents({"estado": "Activa"})
-    inactivas = await estaciones_collection.count_documents({"estado": "Inactiva"})
-    desconectadas = await estaciones_collection.count_documents({"estado": "Desconectada"})
-    
+    estadisticas = await obtener_contadores()
+    estadisticas.pop("desactualizadas", None)
+    return estadisticas
+
+
+async def obtener_estadisticas_panel() -> Dict[str, Any]:
+    """
+    Estadísticas del panel principal: contadores por estado más la cantidad
+    de estaciones que aún no confirman sus últimos precios (todo desde el
+    documento de contadores, sin recorrer las estaciones)
+    """
+    return await obtener_contadores()
+
+
+async def obtener_panel(limit: int = 6) -> Dict[str, Any]:
+    """
+    Estado completo del panel principal: estadísticas y las primeras
+    estaciones con los campos que se muestran en las tarjetas
+
+    Args:
+        limit: Cantidad de estaciones a incluir (0 = ninguna)
+    """
+    pagina = await obtener_estaciones_paginadas(CAMPOS_PANEL, limit) if limit else {"estaciones": []}
     return {
-        "total_estaciones": total,
-        "activas": activas,
-        "inactivas": inactivas,
-        "desconectadas": desconectadas
+        "estadisticas": await obtener_estadisticas_panel(),
+        "estaciones": pagina["estaciones"]
     }
@@ -0,0 +1,183 @@
+"""
+Contadores de estadísticas mantenidos en cada escritura
+En lugar de contar las estaciones en cada consulta, las rutas de creación,
+actualización, confirmación de precios y eliminación ajustan un único
+documento de contadores con $inc: total, cantidad por estado y estaciones
+que aún no confirman sus precios vigentes (desactualizadas). La
+reconciliación periódica los recalcula a través del repositorio de
+estaciones (almacenamiento.py) para corregir cualquier desviación (por
+ejemplo, cambios hechos fuera de la API).
+"""
+import asyncio
+import os
+from typing import Any, Dict, Iterable, Optional, Tuple
+from almacenamiento import almacenamiento
+from database import estadisticas_collection
+from bitacora import obtener_registrador
+
+log = obtener_registrador("estadisticas")
+
+ID_CONTADORES = "estaciones"
+
+# Intervalo entre reconciliaciones completas (segundos)
+INTERVALO_RECONCILIACION = int(os.getenv("ESTADISTICAS_INTERVALO_RECONCILIACION", "300"))
+
+
+async def registrar_cambio_estado(
+    estado_anterior: Optional[str],
+    estado_nuevo: Optional[str],
+    desactualizadas: int = 0
+):
+    """
+    Ajusta los contadores tras crear, eliminar o cambiar de estado una estación
+
+    Args:
+        estado_anterior: Estado previo (None si la estación es nueva)
+        estado_nuevo: Estado resultante (None si la estación fue eliminada)
+        desactualizadas: Ajuste del contador de estaciones desactualizadas
+            (+1 al crear, -1 al eliminar una que no había confirmado)
+    """
+    if estado_anterior == estado_nuevo and not desactualizadas:
+        return
+
+    incrementos: Dict[str, int] = {}
+    if desactualizadas:
+        incrementos["desactualizadas"] = desactualizadas
+    if estado_anterior is None:
+        incrementos["total"] = 1
+    if estado_nuevo is None:
+        incrementos["total"] = -1
+    if estado_anterior != estado_nuevo:
+        if estado_anterior is not None:
+            incrementos[f"por_estado.{estado_anterior}"] = -1
+        if estado_nuevo is not None:
+            incrementos[f"por_estado.{estado_nuevo}"] = 1
+
+    await estadisticas_collection.update_one(
+        {"_id": ID_CONTADORES},
+        {"$inc": incrementos},
+        upsert=True
+    )
+
+
+async def registrar_altas(estados: Iterable[str]):
+    """
+    Ajusta los contadores tras crear un lote de estaciones con un solo $inc
+    (cada una parte con version_precios 1 sin confirmar: desactualizada)
+
+    Args:
+        estados: Estado inicial de cada estación creada
+    """
+    incrementos: Dict[str, int] = {}
+    for estado in estados:
+        incrementos["total"] = incrementos.get("total", 0) + 1
+        incrementos["desactualizadas"] = incrementos.get("desactualizadas", 0) + 1
+        clave = f"por_estado.{estado}"
+        incrementos[clave] = incrementos.get(clave, 0) + 1
+
+    if not incrementos:
+        return
+
+    await estadisticas_collection.update_one(
+        {"_id": ID_CONTADORES},
+        {"$inc": incrementos},
+        upsert=True
+    )
+
+
+async def registrar_cambios_estado(cambios: Iterable[Tuple[str, str]]):
+    """
+    Ajusta los contadores para un lote de cambios de estado con un solo $inc
+
+    Args:
+        cambios: Pares (estado_anterior, estado_nuevo) de estaciones existentes
+    """
+    incrementos: Dict[str, int] = {}
+    for estado_anterior, estado_nuevo in cambios:
+        if estado_anterior == estado_nuevo:
+            continue
+        clave_anterior = f"por_estado.{estado_anterior}"
+        clave_nueva = f"por_estado.{estado_nuevo}"
+        incrementos[clave_anterior] = incrementos.get(clave_anterior, 0) - 1
+        incrementos[clave_nueva] = incrementos.get(clave_nueva, 0) + 1
+
+    incrementos = {clave: n for clave, n in incrementos.items() if n}
+    if not incrementos:
+        return
+
+    await estadisticas_collection.update_one(
+        {"_id": ID_CONTADORES},
+        {"$inc": incrementos},
+        upsert=True
+    )
+
+
+async def registrar_desactualizada(delta: int):
+    """
+    Ajusta el contador de estaciones desactualizadas
+
+    Args:
+        delta: +1 si una estación al día recibió precios nuevos, -1 si una
+            atrasada confirmó sus precios vigentes
+    """
+    await estadisticas_collection.update_one(
+        {"_id": ID_CONTADORES},
+        {"$inc": {"desactualizadas": delta}},
+        upsert=True
+    )
+
+
+async def reconciliar_estadisticas() -> Dict[str, Any]:
+    """
+    Recalcula los contadores desde el repositorio de estaciones y los
+    reemplaza
+
+    Returns:
+        Documento de contadores recalculado
+    """
+    total, por_estado = await almacenamiento.estaciones.contar_por_estado()
+    contadores = {
+        "total": total,
+        "por_estado": por_estado,
+        "desactualizadas": await almacenamiento.estaciones.contar_desactualizadas()
+    }
+
+    await estadisticas_collection.replace_one(
+        {"_id": ID_CONTADORES},
+        contadores,
+        upsert=True
+    )
+    return contadores
+
+
+async def obtener_contadores() -> Dict[str, Any]:
+    """
+    Lee los contadores (una sola lectura por _id)
+
+    Returns:
+        Diccionario con total_estaciones, la cantidad por estado y las
+        estaciones desactualizadas
+    """
+    contadores = await estadisticas_collection.find_one({"_id": ID_CONTADORES})
+    if contadores is None or "desactualizadas" not in contadores:
+        # Primera lectura o documento anterior al contador de desactualizadas
+        contadores = await reconciliar_estadisticas()
+
+    por_estado = contadores.get("por_estado", {})
+    return {
+        "total_estaciones": contadores.get("total", 0),
+        "activas": por_estado.get("Activa", 0),
+        "inactivas": por_estado.get("Inactiva", 0),
+        "desconectadas": por_estado.get("Desconectada", 0),
+        "desactualizadas": contadores.get("desactualizadas", 0)
+    }
+
+
+async def tarea_reconciliacion():
+    """Reconcilia periódicamente los contadores con los datos reales"""
+    while True:
+        try:
+            await reconciliar_estadisticas()
+        except Exception as e:
+            log.warning("Error reconciliando estadísticas", error=str(e))
+        await asyncio.sleep(INTERVALO_RECONCILIACION)
@@ -0,0 +1,354 @@
+"""
+Bus de eventos en proceso y flujo Server-Sent Events para el panel
+Los servicios publican eventos de dominio (estación creada, precios
+actualizados, resultado de una entrega, cambio de liveness...) con
+bus.publicar(). Cada evento se serializa una sola vez como trama SSE y se
+deja en la cola acotada de cada suscriptor conectado a GET /api/eventos;
+sin eventos, un suscriptor solo recibe un comentario de keep-alive cada
+SSE_HEARTBEAT segundos y no genera consultas a la base de datos.
+
+Un historial circular con los últimos eventos permite retomar el flujo
+con Last-Event-ID: al reconectar se reenvían solo los eventos perdidos en
+lugar de una foto completa. Los IDs llevan como prefijo la época del
+proceso, de modo que un ID de antes de un reinicio fuerza una foto nueva.
+
+Con la API en varios workers (MODO_DESPACHADOR=externo, ver despachador.py)
+la numeración la lleva el bus del proceso despachador: los workers le
+redirigen lo que publican y reciben de vuelta cada trama ya numerada, así
+que un Last-Event-ID sirve en cualquier worker.
+
+Los eventos llevan el estado resultante y no diferencias: aplicar dos
+veces el mismo evento (por ejemplo, uno ya incluido en la foto inicial)
+es inocuo.
+
+Variables de entorno:
+    SSE_HEARTBEAT: Segundos sin eventos antes de enviar un keep-alive. Default 15
+    SSE_REINTENTO_MS: Espera sugerida al navegador antes de reconectar. Default 3000
+    SSE_TAMANO_COLA: Eventos en espera por suscriptor; si se llena se
+        descartan y el suscriptor recibe una foto nueva. Default 256
+    SSE_HISTORIAL: Eventos recientes conservados para Last-Event-ID. Default 1000
+    SSE_INTERVALO_DERIVADOS: Ventana (segundos) en que se agrupan los
+        recálculos de eventos derivados como las estadísticas. Default 1
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Iterable, List, Optional, Set, Tuple
+
+from respuestas import serializar
+from bitacora import obtener_registrador
+from metricas import contador, medidor
+
+log = obtener_registrador("eventos")
+
+HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+REINTENTO_MS = int(os.getenv("SSE_REINTENTO_MS", "3000"))
+TAMANO_COLA = int(os.getenv("SSE_TAMANO_COLA", "256"))
+TAMANO_HISTORIAL = int(os.getenv("SSE_HISTORIAL", "1000"))
+INTERVALO_DERIVADOS = float(os.getenv("SSE_INTERVALO_DERIVADOS", "1"))
+
+# Identifica al proceso que numera: los IDs de otra época no se pueden retomar
+EPOCA = format(int(time.time()), "x")
+
+# Marcadores que se encolan en lugar de una trama
+_RESINCRONIZAR = object()
+_CERRAR = object()
+
+eventos_publicados = contador(
+    "empresa_eventos_publicados_total",
+    "Eventos de dominio publicados en el bus del panel",
+    ("tipo",)
+)
+resincronizaciones_sse = contador(
+    "empresa_sse_resincronizaciones_total",
+    "Fotos completas enviadas a suscriptores SSE por desborde de su cola"
+)
+
+
+def trama_sse(tipo: str, datos: Any, id_evento: Optional[str] = None) -> bytes:
+    """
+    Construye una trama Server-Sent Events
+
+    Args:
+        tipo: Nombre del evento (campo event)
+        datos: Contenido serializable a JSON (una sola línea)
+        id_evento: ID para Last-Event-ID (opcional)
+    """
+    trama = b"event: " + tipo.encode() + b"\ndata: " + serializar(datos) + b"\n\n"
+    if id_evento is not None:
+        trama = b"id: " + id_evento.encode() + b"\n" + trama
+    return trama
+
+
+class SuscriptorEventos:
+    """Conexión SSE con su cola de tramas pendientes"""
+
+    def __init__(self):
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=TAMANO_COLA)
+        self.desbordado = False
+
+    def encolar(self, trama: bytes):
+        """
+        Encola sin bloquear; si la cola se llena el suscriptor ya perdió
+        eventos, así que se vacía y se le pide una foto nueva
+        """
+        if self.desbordado:
+            return
+        if self.cola.full():
+            self.resincronizar()
+            resincronizaciones_sse.inc()
+            return
+        self.cola.put_nowait(trama)
+
+    def resincronizar(self):
+        """Descarta lo pendiente y pide una foto nueva"""
+        if self.desbordado:
+            return
+        self.desbordado = True
+        while not self.cola.empty():
+            self.cola.get_nowait()
+        self.cola.put_nowait(_RESINCRONIZAR)
+
+
+class BusEventos:
+    """Distribución de eventos a los suscriptores SSE con historial para reanudar"""
+
+    def __init__(self, tamano_historial: int = TAMANO_HISTORIAL):
+        self.epoca = EPOCA
+        self.secuencia = 0
+        self.historial: Deque[Tuple[int, bytes]] = deque(maxlen=tamano_historial)
+        self.suscriptores: Set[SuscriptorEventos] = set()
+        # Eventos derivados: (tipos que los disparan, aviso a su tarea)
+        self._derivados: List[Tuple[Set[str], asyncio.Event]] = []
+        # Funciones llamadas con (tipo, datos, secuencia, trama) tras cada publicación
+        self._observadores: List[Callable[[str, Any, int, bytes], None]] = []
+        # Si está definida, publicar() entrega el evento a esta función en vez de numerarlo
+        self._destino: Optional[Callable[[str, Any], Any]] = None
+
+    @property
+    def ultimo_id(self) -> str:
+        return f"{self.epoca}-{self.secuencia}"
+
+    def al_publicar(self, funcion: Callable[[str, Any, int, bytes], None]):
+        """Registra una función que recibe cada evento publicado (ej: difundirlo a los workers)"""
+        self._observadores.append(funcion)
+
+    def redirigir(self, funcion: Optional[Callable[[str, Any], Any]]):
+        """
+        Envía las publicaciones a otro bus (el del despachador) en lugar de
+        numerarlas aquí; vuelven por recibir() con su ID definitivo
+
+        Args:
+            funcion: Recibe (tipo, datos); None vuelve a publicar localmente
+        """
+        self._destino = funcion
+
+    def publicar(self, tipo: str, datos: Any) -> Optional[str]:
+        """
+        Publica un evento a todos los suscriptores sin bloquear
+
+        Args:
+            tipo: Nombre del evento (ej: "estacion_actualizada")
+            datos: Estado resultante, serializable a JSON
+
+        Returns:
+            ID asignado al evento (None si se redirigió a otro proceso)
+        """
+        if self._destino is not None:
+            self._destino(tipo, datos)
+            return None
+
+        self.secuencia += 1
+        id_evento = self.ultimo_id
+        trama = trama_sse(tipo, datos, id_evento)
+        self._distribuir(self.secuencia, trama)
+
+        for disparadores, aviso in self._derivados:
+            if tipo in disparadores:
+                aviso.set()
+        for observador in self._observadores:
+            observador(tipo, datos, self.secuencia, trama)
+
+        eventos_publicados.inc(tipo)
+        return id_evento
+
+    def _distribuir(self, secuencia: int, trama: bytes):
+        self.historial.append((secuencia, trama))
+        for suscriptor in self.suscriptores:
+            suscriptor.encolar(trama)
+
+    def sincronizar(self, epoca: str, secuencia: int):
+        """
+        Adopta la numeración de otro bus (al conectarse al despachador)
+
+        Lo publicado antes pudo perderse y el historial ya no sirve para
+        reanudar, así que se vacía y cada suscriptor recibe una foto nueva.
+        """
+        self.epoca = epoca
+        self.secuencia = secuencia
+        self.historial.clear()
+        for suscriptor in self.suscriptores:
+            suscriptor.resincronizar()
+
+    def recibir(self, epoca: str, secuencia: int, trama: bytes):
+        """
+        Entrega a los suscriptores locales una trama numerada por otro bus
+
+        Args:
+            epoca: Época del bus que la numeró
+            secuencia: Número asignado
+            trama: Trama SSE completa (con su id)
+        """
+        if epoca != self.epoca or secuencia != self.secuencia + 1:
+            # Salto en la numeración: el despachador se reinició o faltan eventos
+            self.sincronizar(epoca, secuencia - 1)
+        self.secuencia = secuencia
+        self._distribuir(secuencia, trama)
+
+    def eventos_desde(self, ultimo_id: Optional[str]) -> Optional[List[bytes]]:
+        """
+        Tramas publicadas después de ultimo_id
+
+        Returns:
+            Lista (posiblemente vacía) o None si no se puede reanudar desde
+            ese ID (otra época, ID inválido o ya fuera del historial)
+        """
+        if not ultimo_id:
+            return None
+        epoca, _, numero = ultimo_id.partition("-")
+        if epoca != self.epoca or not numero.isdigit():
+            return None
+
+        numero = int(numero)
+        primero = self.historial[0][0] if self.historial else self.secuencia + 1
+        if numero > self.secuencia or numero < primero - 1:
+            return None
+        return [trama for secuencia, trama in self.historial if secuencia > numero]
+
+    def suscribir(self, ultimo_id: Optional[str] = None) -> Tuple[SuscriptorEventos, Optional[List[bytes]]]:
+        """
+        Registra un suscriptor
+
+        El registro y la lectura del historial ocurren sin ceder el control
+        al loop, así que ningún evento queda entre ambos.
+
+        Returns:
+            (suscriptor, tramas a reenviar o None si necesita una foto completa)
+        """
+        suscriptor = SuscriptorEventos()
+        self.suscriptores.add(suscriptor)
+        return suscriptor, self.eventos_desde(ultimo_id)
+
+    def cancelar(self, suscriptor: SuscriptorEventos):
+        self.suscriptores.discard(suscriptor)
+
+    def cerrar(self):
+        """Termina todos los flujos abiertos (al detener la aplicación)"""
+        for suscriptor in list(self.suscriptores):
+            suscriptor.desbordado = True
+            while not suscriptor.cola.empty():
+                suscriptor.cola.get_nowait()
+            suscriptor.cola.put_nowait(_CERRAR)
+
+    async def derivar(
+        self,
+        tipo: str,
+        calcular: Callable[[], Awaitable[Any]],
+        disparadores: Iterable[str],
+        intervalo: float = INTERVALO_DERIVADOS
+    ):
+        """
+        Tarea que publica 'tipo' con el resultado de calcular() cada vez
+        que se publica alguno de los disparadores. Las ráfagas se agrupan:
+        un despliegue a miles de estaciones produce un recálculo por
+        intervalo, no uno por evento ni uno por suscriptor.
+
+        Args:
+            tipo: Evento derivado a publicar (ej: "estadisticas")
+            calcular: Función async que retorna el contenido del evento
+            disparadores: Tipos de evento que invalidan el valor publicado
+            intervalo: Segundos que se espera para agrupar una ráfaga
+        """
+        aviso = asyncio.Event()
+        self._derivados.append((set(disparadores), aviso))
+        while True:
+            await aviso.wait()
+            await asyncio.sleep(intervalo)
+            aviso.clear()
+            try:
+                self.publicar(tipo, await calcular())
+            except Exception as e:
+                log.warning("Error calculando evento derivado", tipo=tipo, error=str(e))
+
+    def estadisticas(self) -> dict:
+        return {
+            "epoca": self.epoca,
+            "ultimo_id": self.ultimo_id,
+            "historial": len(self.historial),
+            "suscriptores": len(self.suscriptores),
+            "pendientes_max": max((s.cola.qsize() for s in self.suscriptores), default=0)
+        }
+
+
+# Bus global alimentado por los servicios
+bus = BusEventos()
+
+medidor(
+    "empresa_sse_suscriptores",
+    "Conexiones SSE abiertas hacia el panel",
+    funcion=lambda: len(bus.suscriptores)
+)
+
+
+async def flujo_sse(
+    foto: Callable[[], Awaitable[Any]],
+    ultimo_id: Optional[str] = None,
+    desconectado: Optional[Callable[[], Awaitable[bool]]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Genera el flujo SSE de un suscriptor
+
+    Envía la foto inicial (evento "foto") o, si ultimo_id se puede
+    reanudar, solo los eventos perdidos; luego los eventos a medida que se
+    publican y un comentario keep-alive tras HEARTBEAT segundos sin eventos.
+
+    Args:
+        foto: Función async que retorna el estado completo del panel
+        ultimo_id: Valor de Last-Event-ID enviado por el navegador
+        desconectado: Función async que indica si el cliente se fue
+    """
+    suscriptor, pendientes = bus.suscribir(ultimo_id)
+
+    async def trama_foto() -> bytes:
+        # El ID se toma antes de leer: lo publicado mientras tanto llega
+        # igual por la cola y reaplicarlo es inocuo
+        id_foto = bus.ultimo_id
+        return trama_sse("foto", await foto(), id_foto)
+
+    try:
+        yield f"retry: {REINTENTO_MS}\n\n".encode()
+        if pendientes is None:
+            yield await trama_foto()
+        else:
+            for trama in pendientes:
+                yield trama
+
+        while True:
+            try:
+                trama = await asyncio.wait_for(suscriptor.cola.get(), timeout=HEARTBEAT)
+            except asyncio.TimeoutError:
+                if desconectado is not None and await desconectado():
+                    break
+                yield b": keep-alive\n\n"
+                continue
+
+            if trama is _CERRAR:
+                break
+            if trama is _RESINCRONIZAR:
+                suscriptor.desbordado = False
+                yield await trama_foto()
+                continue
+            yield trama
+    finally:
+        bus.cancelar(suscriptor)
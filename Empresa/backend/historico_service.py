@@ -0,0 +1,303 @@
+"""
+Servicio de historial de precios con almacenamiento por buckets
+Cada documento de la colección historico_precios agrupa los cambios de
+precios de una estación dentro de un periodo (un día) en arreglos
+compactos, en lugar de crecer indefinidamente dentro del documento de la
+estación. Incluye consulta por rango de fechas y una política de
+retención que reduce los buckets antiguos a un punto por periodo.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from pymongo import ASCENDING, UpdateOne
+from database import estaciones_collection, historico_collection
+from models import hora_local
+from bitacora import obtener_registrador
+
+log = obtener_registrador("historico")
+
+COMBUSTIBLES = ("precio_93", "precio_95", "precio_97", "precio_diesel")
+
+# Cantidad máxima de muestras por bucket (si se llena se abre otro)
+MAX_MUESTRAS_BUCKET = int(os.getenv("HISTORICO_MAX_MUESTRAS_BUCKET", "200"))
+# Días que se conserva el detalle completo antes de reducir los buckets
+RETENCION_DIAS_DETALLE = int(os.getenv("HISTORICO_RETENCION_DIAS", "90"))
+# Intervalo entre ejecuciones de la política de retención (segundos)
+INTERVALO_RETENCION = int(os.getenv("HISTORICO_INTERVALO_RETENCION", "86400"))
+
+# Se incrementa con cada cambio del historial; permite a los cachés
+# derivados (analítica) saber si siguen vigentes
+_version = 0
+
+# Eventos del panel que implican un cambio del historial hecho en otro proceso
+EVENTOS_HISTORICO = ("estacion_creada", "precios_actualizados", "estacion_eliminada", "resincronizar")
+
+
+def version_historico() -> int:
+    """Retorna la versión actual del historial de precios"""
+    return _version
+
+
+def _nueva_version():
+    global _version
+    _version += 1
+
+
+def marcar_cambio_externo():
+    """
+    Registra un cambio del historial hecho por otro proceso (otro worker
+    HTTP o el despachador), de modo que los cachés locales se recalculen
+    """
+    _nueva_version()
+
+
+def _inicio_periodo(momento: datetime) -> datetime:
+    """Retorna el inicio del periodo (día) al que pertenece un instante"""
+    return momento.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _operacion_registro(id_estacion: int, precios: Dict[str, int], momento: datetime) -> tuple:
+    """
+    Construye el filtro y la actualización (upsert) que agregan una muestra
+    al bucket correspondiente. Si el bucket del periodo está lleno el
+    filtro no coincide y el upsert abre uno nuevo.
+    """
+    push = {"timestamps": momento}
+    for combustible in COMBUSTIBLES:
+        push[combustible] = precios.get(combustible)
+
+    filtro = {
+        "id_estacion": id_estacion,
+        "inicio": _inicio_periodo(momento),
+        "cantidad": {"$lt": MAX_MUESTRAS_BUCKET}
+    }
+    actualizacion = {
+        "$push": push,
+        "$inc": {"cantidad": 1},
+        "$min": {"desde": momento},
+        "$max": {"hasta": momento}
+    }
+    return filtro, actualizacion
+
+
+async def registrar_precios(
+    id_estacion: int,
+    precios: Dict[str, int],
+    momento: Optional[datetime] = None
+):
+    """
+    Registra un cambio de precios en el bucket del periodo actual
+
+    Args:
+        id_estacion: ID de la estación
+        precios: Precios aplicados
+        momento: Instante del cambio (por defecto ahora)
+    """
+    filtro, actualizacion = _operacion_registro(id_estacion, precios, momento or datetime.now())
+    await historico_collection.update_one(filtro, actualizacion, upsert=True)
+    _nueva_version()
+
+
+async def registrar_precios_lote(muestras: Iterable[Tuple[int, Dict[str, int], datetime]]):
+    """
+    Registra muchas muestras de precios en un solo bulk_write
+
+    Args:
+        muestras: Tuplas (id_estacion, precios, momento)
+    """
+    operaciones = [
+        UpdateOne(*_operacion_registro(id_estacion, precios, momento), upsert=True)
+        for id_estacion, precios, momento in sorted(muestras, key=lambda m: m[2])
+    ]
+    # Se aplican en orden: cada upsert depende del llenado del bucket anterior
+    if operaciones:
+        await historico_collection.bulk_write(operaciones, ordered=True)
+        _nueva_version()
+
+
+async def eliminar_historico(id_estacion: int):
+    """
+    Elimina todos los buckets de historial de una estación
+
+    Args:
+        id_estacion: ID de la estación
+    """
+    await historico_collection.delete_many({"id_estacion": id_estacion})
+    _nueva_version()
+
+
+async def obtener_historico(
+    id_estacion: int,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    limit: int = 500,
+    skip: int = 0,
+    orden: str = "desc"
+) -> List[Dict[str, Any]]:
+    """
+    Obtiene el historial de precios de una estación dentro de un rango
+
+    Args:
+        id_estacion: ID de la estación
+        desde: Fecha mínima (inclusive)
+        hasta: Fecha máxima (inclusive)
+        limit: Cantidad máxima de entradas a retornar
+        skip: Entradas a saltar (paginación)
+        orden: "asc" (más antiguas primero) o "desc" (más recientes primero)
+
+    Returns:
+        Lista de entradas {timestamp, precios}
+    """
+    # Los timestamps se guardan en hora local sin zona
+    desde = hora_local(desde)
+    hasta = hora_local(hasta)
+
+    filtro: Dict[str, Any] = {"id_estacion": id_estacion}
+    if desde is not None:
+        filtro.setdefault("inicio", {})["$gte"] = _inicio_periodo(desde)
+    if hasta is not None:
+        filtro.setdefault("inicio", {})["$lte"] = hasta
+
+    direccion = 1 if orden == "asc" else -1
+    cursor = historico_collection.find(filtro, {"_id": 0}).sort(
+        [("inicio", direccion), ("desde", direccion)]
+    )
+
+    entradas: List[Dict[str, Any]] = []
+    saltadas = 0
+
+    async for bucket in cursor:
+        muestras = range(bucket.get("cantidad", len(bucket["timestamps"])))
+        if direccion == -1:
+            muestras = reversed(muestras)
+
+        for i in muestras:
+            timestamp = bucket["timestamps"][i]
+            if (desde is not None and timestamp < desde) or (hasta is not None and timestamp > hasta):
+                continue
+            if saltadas < skip:
+                saltadas += 1
+                continue
+
+            entradas.append({
+                "timestamp": timestamp,
+                "precios": {c: bucket[c][i] for c in COMBUSTIBLES}
+            })
+            if len(entradas) >= limit:
+                return entradas
+
+    return entradas
+
+
+async def iterar_historico(id_estacion: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Recorre el historial en orden cronológico (por estación) sin cargarlo
+    completo en memoria
+
+    Args:
+        id_estacion: Limitar a una estación (None = todas)
+
+    Yields:
+        Entradas {id_estacion, timestamp, precio_93, ...}
+    """
+    filtro = {} if id_estacion is None else {"id_estacion": id_estacion}
+    cursor = historico_collection.find(filtro, {"_id": 0}).sort(
+        [("id_estacion", ASCENDING), ("inicio", ASCENDING), ("desde", ASCENDING)]
+    )
+
+    async for bucket in cursor:
+        for i in range(bucket.get("cantidad", len(bucket["timestamps"]))):
+            entrada = {"id_estacion": bucket["id_estacion"], "timestamp": bucket["timestamps"][i]}
+            for combustible in COMBUSTIBLES:
+                entrada[combustible] = bucket[combustible][i]
+            yield entrada
+
+
+async def aplicar_retencion(dias_detalle: int = RETENCION_DIAS_DETALLE) -> int:
+    """
+    Reduce los buckets más antiguos que el periodo de detalle a una sola
+    muestra (el último precio vigente de ese periodo)
+
+    Args:
+        dias_detalle: Días recientes que conservan todas sus muestras
+
+    Returns:
+        Cantidad de buckets reducidos
+    """
+    limite = _inicio_periodo(datetime.now() - timedelta(days=dias_detalle))
+    cursor = historico_collection.find(
+        {"inicio": {"$lt": limite}, "cantidad": {"$gt": 1}}
+    )
+
+    operaciones = []
+    reducidos = 0
+    async for bucket in cursor:
+        reducidos += 1
+        ultimo = bucket["cantidad"] - 1
+        reducido = {"timestamps": [bucket["timestamps"][ultimo]], "cantidad": 1, "reducido": True}
+        for combustible in COMBUSTIBLES:
+            reducido[combustible] = [bucket[combustible][ultimo]]
+        reducido["desde"] = bucket["timestamps"][ultimo]
+        operaciones.append(UpdateOne({"_id": bucket["_id"]}, {"$set": reducido}))
+
+        if len(operaciones) >= 500:
+            await historico_collection.bulk_write(operaciones, ordered=False)
+            operaciones = []
+
+    if operaciones:
+        await historico_collection.bulk_write(operaciones, ordered=False)
+
+    if reducidos:
+        _nueva_version()
+    return reducidos
+
+
+async def tarea_retencion():
+    """Ejecuta periódicamente la política de retención del historial"""
+    while True:
+        try:
+            reducidos = await aplicar_retencion()
+            log.info("Retención de historial aplicada", buckets_reducidos=reducidos)
+        except Exception as e:
+            log.warning("Error aplicando retención de historial", error=str(e))
+        await asyncio.sleep(INTERVALO_RETENCION)
+
+
+async def migrar_historico_embebido() -> int:
+    """
+    Migra el arreglo historico_precios embebido en las estaciones antiguas
+    a la colección de buckets y lo elimina del documento de la estación
+
+    Returns:
+        Cantidad de estaciones migradas
+    """
+    cursor = estaciones_collection.find(
+        {"historico_precios": {"$exists": True}},
+        {"id_estacion": 1, "historico_precios": 1}
+    )
+
+    migradas = 0
+    async for estacion in cursor:
+        operaciones = [
+            UpdateOne(
+                *_operacion_registro(estacion["id_estacion"], entrada["precios"], entrada["timestamp"]),
+                upsert=True
+            )
+            for entrada in sorted(estacion.get("historico_precios", []), key=lambda e: e["timestamp"])
+        ]
+        # Se aplican en orden: cada upsert depende del llenado del bucket anterior
+        if operaciones:
+            await historico_collection.bulk_write(operaciones, ordered=True)
+
+        await estaciones_collection.update_one(
+            {"_id": estacion["_id"]},
+            {"$unset": {"historico_precios": ""}}
+        )
+        migradas += 1
+
+    if migradas:
+        _nueva_version()
+        log.info("Historial embebido migrado a buckets", estaciones=migradas)
+
+    return migradas
@@ -0,0 +1,443 @@
+"""
+Importación y exportación masiva de estaciones y de su historial de precios
+La importación lee el cuerpo de la petición a medida que llega (NDJSON o
+CSV), valida cada fila y escribe por lotes: un bloque de IDs reservado en
+un solo round-trip, una inserción por lote en el repositorio de estaciones
+y un bulk_write para el historial. Los errores se informan por número de
+línea sin detener el resto de la carga. La exportación recorre las
+estaciones con un cursor y emite cada fila apenas se lee, sin construir la
+lista completa en memoria.
+"""
+import codecs
+import csv
+import io
+import os
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import orjson
+from pydantic import ValidationError
+
+from almacenamiento import almacenamiento
+from estaciones_service import reservar_ids_estaciones
+from estadisticas_service import registrar_altas
+from historico_service import COMBUSTIBLES, iterar_historico, registrar_precios_lote
+from models import EstacionImportacion, MuestraHistoricoImportacion
+from respuestas import serializar
+from eventos import bus
+from bitacora import obtener_registrador
+
+log = obtener_registrador("importacion")
+
+FORMATOS = ("ndjson", "csv")
+
+# Filas por lote de escritura
+TAMANO_LOTE = int(os.getenv("IMPORTACION_TAMANO_LOTE", "500"))
+# Errores detallados que se incluyen en el reporte (el total siempre se informa)
+MAX_ERRORES_REPORTADOS = int(os.getenv("IMPORTACION_MAX_ERRORES", "1000"))
+
+COLUMNAS_ESTACION = ["id_estacion", "nombre", "ip", "puerto", "estado", *COMBUSTIBLES,
+                     "fecha_creacion", "fecha_actualizacion"]
+COLUMNAS_HISTORICO = ["id_estacion", "timestamp", *COMBUSTIBLES]
+
+
+# ============================================
+# LECTURA INCREMENTAL
+# ============================================
+
+async def _lineas(contenido: AsyncIterator[bytes], omitir_vacias: bool = True) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Convierte los fragmentos del cuerpo en líneas de texto numeradas
+
+    Args:
+        contenido: Fragmentos del cuerpo de la petición
+        omitir_vacias: Saltar las líneas en blanco (en CSV pueden ser parte
+            de un campo entre comillas)
+
+    Yields:
+        Tuplas (número de línea, línea sin salto)
+    """
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+    pendiente = ""
+    numero = 0
+
+    async for fragmento in contenido:
+        pendiente += decodificador.decode(fragmento)
+        *completas, pendiente = pendiente.split("\n")
+        for linea in completas:
+            numero += 1
+            linea = linea.rstrip("\r")
+            if linea.strip() or not omitir_vacias:
+                yield numero, linea
+
+    pendiente += decodificador.decode(b"", final=True)
+    if pendiente.strip() or (pendiente and not omitir_vacias):
+        yield numero + 1, pendiente.rstrip("\r")
+
+
+class _LineasCSV:
+    """
+    Líneas pendientes de un único csv.reader para todo el cuerpo; _filas_csv
+    solo le pide un registro cuando ya tiene todas sus líneas, de modo que
+    nunca se queda sin entrada a mitad de un campo entre comillas
+    """
+
+    def __init__(self):
+        self.lineas = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lineas:
+            raise StopIteration
+        return self.lineas.popleft()
+
+
+def _sigue_entre_comillas(linea: str, entre_comillas: bool) -> bool:
+    """
+    Indica si al terminar la línea queda abierto un campo entre comillas
+    (reglas del dialecto excel: la comilla abre solo al inicio de un campo
+    y "" dentro de un campo entre comillas es una comilla literal)
+    """
+    inicio_campo = not entre_comillas
+    i = 0
+    while i < len(linea):
+        caracter = linea[i]
+        if entre_comillas:
+            if caracter == '"':
+                if linea[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    entre_comillas = False
+        elif caracter == '"' and inicio_campo:
+            entre_comillas = True
+        inicio_campo = not entre_comillas and caracter == ","
+        i += 1
+    return entre_comillas
+
+
+def _normalizar_precios(fila: Dict[str, Any]) -> Dict[str, Any]:
+    """Acepta los precios anidados en 'precios'/'precios_actuales' o como columnas planas"""
+    for clave in ("precios_actuales", "precios"):
+        if clave in fila:
+            return fila
+    fila = dict(fila)
+    fila["precios"] = {c: fila.pop(c) for c in COMBUSTIBLES if c in fila}
+    return fila
+
+
+async def _filas(contenido: AsyncIterator[bytes], formato: str) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Decodifica cada fila según el formato
+
+    Yields:
+        Tuplas (número de línea, diccionario) o (número de línea, ValueError)
+    """
+    if formato == "csv":
+        async for numero, fila in _filas_csv(contenido):
+            yield numero, fila
+        return
+
+    async for numero, linea in _lineas(contenido):
+        try:
+            fila = orjson.loads(linea)
+        except orjson.JSONDecodeError as e:
+            yield numero, ValueError(f"JSON inválido: {e}")
+            continue
+        if not isinstance(fila, dict):
+            yield numero, ValueError("Cada línea debe ser un objeto JSON")
+            continue
+        yield numero, fila
+
+
+async def _filas_csv(contenido: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Decodifica los registros CSV; un campo entre comillas puede ocupar
+    varias líneas y el registro se informa con el número de la primera
+
+    Yields:
+        Tuplas (número de línea, diccionario) o (número de línea, ValueError)
+    """
+    columnas: Optional[List[str]] = None
+    entrada = _LineasCSV()
+    lector = csv.reader(entrada)
+    inicio: Optional[int] = None
+    entre_comillas = False
+
+    async for numero, linea in _lineas(contenido, omitir_vacias=False):
+        if inicio is None:
+            if not linea.strip():
+                continue
+            inicio = numero
+        entrada.lineas.append(linea + "\n")
+        entre_comillas = _sigue_entre_comillas(linea, entre_comillas)
+        if entre_comillas:
+            continue
+
+        numero, inicio = inicio, None
+        try:
+            valores = next(lector)
+        except csv.Error as e:
+            entrada.lineas.clear()
+            yield numero, ValueError(f"CSV inválido: {e}")
+            continue
+
+        if columnas is None:
+            columnas = [c.strip() for c in valores]
+            continue
+        if len(valores) != len(columnas):
+            yield numero, ValueError(f"Se esperaban {len(columnas)} columnas y hay {len(valores)}")
+            continue
+        yield numero, {c: v for c, v in zip(columnas, valores) if v != ""}
+
+    if inicio is not None:
+        yield inicio, ValueError("Campo entre comillas sin cerrar al final del archivo")
+
+
+def _describir_error(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors()
+        )
+    return str(error)
+
+
+class _Reporte:
+    """Acumula el resultado de una importación"""
+
+    def __init__(self):
+        self.leidas = 0
+        self.importadas = 0
+        self.total_errores = 0
+        self.errores: List[Dict[str, Any]] = []
+
+    def error(self, linea: int, mensaje: str):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES_REPORTADOS:
+            self.errores.append({"linea": linea, "error": mensaje})
+
+    def resumen(self) -> Dict[str, Any]:
+        return {
+            "leidas": self.leidas,
+            "importadas": self.importadas,
+            "total_errores": self.total_errores,
+            "errores": self.errores
+        }
+
+
+# ============================================
+# IMPORTACIÓN
+# ============================================
+
+async def _escribir_lote_estaciones(lote: List[Tuple[int, EstacionImportacion]], reporte: _Reporte):
+    """Inserta un lote de estaciones válidas y registra sus precios iniciales"""
+    ids = await reservar_ids_estaciones(len(lote))
+    ahora = datetime.now()
+
+    documentos = [
+        {
+            "id_estacion": id_estacion,
+            "nombre": estacion.nombre,
+            "ip": estacion.ip,
+            "puerto": estacion.puerto,
+            "estado": estacion.estado,
+            "precios_actuales": estacion.precios_actuales.model_dump(),
+            "version_precios": 1,
+            "fecha_creacion": ahora,
+            "fecha_actualizacion": ahora
+        }
+        for id_estacion, (_, estacion) in zip(ids, lote)
+    ]
+
+    fallidas = await almacenamiento.estaciones.insertar_varias(documentos)
+    for indice, error in fallidas.items():
+        reporte.error(lote[indice][0], error)
+
+    insertadas = [doc for i, doc in enumerate(documentos) if i not in fallidas]
+    await registrar_precios_lote(
+        (doc["id_estacion"], doc["precios_actuales"], ahora) for doc in insertadas
+    )
+    await registrar_altas(doc["estado"] for doc in insertadas)
+    reporte.importadas += len(insertadas)
+
+
+async def importar_estaciones(contenido: AsyncIterator[bytes], formato: str) -> Dict[str, Any]:
+    """
+    Importa estaciones desde un flujo NDJSON o CSV
+
+    Cada fila tiene nombre, ip, puerto (opcional), estado (opcional) y los
+    precios, ya sea anidados en 'precios_actuales' o como columnas
+    precio_93, precio_95, precio_97 y precio_diesel. Los IDs se asignan
+    automáticamente.
+
+    Args:
+        contenido: Fragmentos del cuerpo de la petición
+        formato: "ndjson" o "csv"
+
+    Returns:
+        Reporte con filas leídas, importadas y errores por línea
+
+    Raises:
+        ValueError: Si el formato no es soportado
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    reporte = _Reporte()
+    lote: List[Tuple[int, EstacionImportacion]] = []
+
+    async for numero, fila in _filas(contenido, formato):
+        reporte.leidas += 1
+        if isinstance(fila, Exception):
+            reporte.error(numero, str(fila))
+            continue
+
+        fila = _normalizar_precios(fila)
+        fila.setdefault("precios_actuales", fila.pop("precios", None))
+        try:
+            lote.append((numero, EstacionImportacion(**fila)))
+        except ValidationError as e:
+            reporte.error(numero, _describir_error(e))
+            continue
+
+        if len(lote) >= TAMANO_LOTE:
+            await _escribir_lote_estaciones(lote, reporte)
+            lote = []
+
+    if lote:
+        await _escribir_lote_estaciones(lote, reporte)
+
+    log.info("Importación de estaciones", importadas=reporte.importadas, leidas=reporte.leidas,
+             errores=reporte.total_errores)
+    # Un evento por estación importada inundaría el panel: se le pide una foto nueva
+    if reporte.importadas:
+        bus.publicar("resincronizar", {"motivo": "importacion", "importadas": reporte.importadas})
+    return reporte.resumen()
+
+
+async def _escribir_lote_historico(lote: List[Tuple[int, MuestraHistoricoImportacion]], reporte: _Reporte):
+    """Registra un lote de muestras cuyas estaciones existen"""
+    ids = {muestra.id_estacion for _, muestra in lote}
+    existentes = {
+        e["id_estacion"]
+        for e in await almacenamiento.estaciones.listar(campos=("id_estacion",), ids=ids)
+    }
+
+    muestras = []
+    for numero, muestra in lote:
+        if muestra.id_estacion not in existentes:
+            reporte.error(numero, f"Estación con ID {muestra.id_estacion} no encontrada")
+            continue
+        muestras.append((muestra.id_estacion, muestra.precios.model_dump(), muestra.timestamp))
+
+    await registrar_precios_lote(muestras)
+    reporte.importadas += len(muestras)
+
+
+async def importar_historico(contenido: AsyncIterator[bytes], formato: str) -> Dict[str, Any]:
+    """
+    Importa muestras de historial de precios desde un flujo NDJSON o CSV
+
+    Cada fila tiene id_estacion, timestamp (ISO 8601) y los precios,
+    anidados en 'precios' o como columnas planas.
+
+    Args:
+        contenido: Fragmentos del cuerpo de la petición
+        formato: "ndjson" o "csv"
+
+    Returns:
+        Reporte con filas leídas, importadas y errores por línea
+
+    Raises:
+        ValueError: Si el formato no es soportado
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    reporte = _Reporte()
+    lote: List[Tuple[int, MuestraHistoricoImportacion]] = []
+
+    async for numero, fila in _filas(contenido, formato):
+        reporte.leidas += 1
+        if isinstance(fila, Exception):
+            reporte.error(numero, str(fila))
+            continue
+
+        fila = _normalizar_precios(fila)
+        fila.setdefault("precios", fila.pop("precios_actuales", None))
+        try:
+            lote.append((numero, MuestraHistoricoImportacion(**fila)))
+        except ValidationError as e:
+            reporte.error(numero, _describir_error(e))
+            continue
+
+        if len(lote) >= TAMANO_LOTE:
+            await _escribir_lote_historico(lote, reporte)
+            lote = []
+
+    if lote:
+        await _escribir_lote_historico(lote, reporte)
+
+    log.info("Importación de historial", importadas=reporte.importadas, leidas=reporte.leidas,
+             errores=reporte.total_errores)
+    return reporte.resumen()
+
+
+# ============================================
+# EXPORTACIÓN
+# ============================================
+
+def _fila_csv(valores: List[Any]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(
+        v.isoformat() if isinstance(v, datetime) else v for v in valores
+    )
+    return buffer.getvalue().encode()
+
+
+async def exportar_estaciones(formato: str, estado: Optional[str] = None) -> AsyncIterator[bytes]:
+    """
+    Emite todas las estaciones (sin historial) a medida que se leen del cursor
+
+    Args:
+        formato: "ndjson" o "csv"
+        estado: Filtrar por estado (opcional)
+
+    Yields:
+        Líneas codificadas en UTF-8
+    """
+    if formato == "csv":
+        yield _fila_csv(COLUMNAS_ESTACION)
+
+    async for estacion in almacenamiento.estaciones.iterar(estado=estado or None):
+        estacion.pop("_id", None)
+        if formato == "ndjson":
+            yield serializar(estacion) + b"\n"
+            continue
+
+        precios = estacion.get("precios_actuales") or {}
+        plana = dict(estacion, **precios)
+        yield _fila_csv([plana.get(c) for c in COLUMNAS_ESTACION])
+
+
+async def exportar_historico(formato: str, id_estacion: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Emite el historial de precios muestra por muestra
+
+    Args:
+        formato: "ndjson" o "csv"
+        id_estacion: Limitar a una estación (None = todas)
+
+    Yields:
+        Líneas codificadas en UTF-8
+    """
+    if formato == "csv":
+        yield _fila_csv(COLUMNAS_HISTORICO)
+
+    async for entrada in iterar_historico(id_estacion):
+        if formato == "ndjson":
+            yield serializar(entrada) + b"\n"
+        else:
+            yield _fila_csv([entrada.get(c) for c in COLUMNAS_HISTORICO])
@@ -0,0 +1,391 @@
+"""
+Registro declarativo de índices de MongoDB y auditoría de consultas
+INDICES declara, por colección, los índices que necesitan las consultas de
+los servicios; inicializar_indices() los crea al iniciar la aplicación y es
+idempotente (crear un índice que ya existe con la misma definición no hace
+nada). CONSULTAS enumera las formas de consulta que emiten los servicios y
+auditar_consultas() ejecuta explain() sobre cada una para detectar las que
+recorren la colección completa (COLLSCAN).
+
+Los índices no llevan nombre explícito: MongoDB los nombra a partir de sus
+campos (ej: "estado_1_id_estacion_1"), igual que los que creaban antes los
+servicios, de modo que las bases existentes los reconocen como el mismo índice.
+
+Uso:
+    python indices.py                       # crea los índices declarados
+    python indices.py --auditar             # además audita las consultas
+    python indices.py --eliminar-no-declarados
+
+Con --auditar retorna código de salida 1 si alguna consulta no permitida
+recorre la colección completa.
+
+Variables de entorno:
+    AUDITAR_CONSULTAS: Ejecutar la auditoría al iniciar la aplicación y
+        registrar las consultas sin índice (true/false). Default false
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from bitacora import obtener_registrador
+
+log = obtener_registrador("indices")
+
+AUDITAR_CONSULTAS = os.getenv("AUDITAR_CONSULTAS", "false").lower() == "true"
+
+# ============================================
+# ÍNDICES DECLARADOS
+# ============================================
+
+INDICES: Dict[str, List[IndexModel]] = {
+    "estaciones": [
+        IndexModel([("id_estacion", ASCENDING)], unique=True),
+        # Filtros por estado (listado, exportación, liveness, rollout) ordenados por ID
+        IndexModel([("estado", ASCENDING), ("id_estacion", ASCENDING)]),
+        # Validación de IP repetida al crear o actualizar
+        IndexModel([("ip", ASCENDING)]),
+    ],
+    "historico_precios": [
+        IndexModel([("id_estacion", ASCENDING), ("inicio", ASCENDING)]),
+        # Ventana de la analítica y retención de buckets antiguos
+        IndexModel([("inicio", ASCENDING)]),
+    ],
+    "entregas_precios": [
+        IndexModel([("id_estacion", ASCENDING)], unique=True),
+        IndexModel([("estado", ASCENDING), ("proximo_intento", ASCENDING)]),
+    ],
+    "precios_programados": [
+        IndexModel([("id_programacion", ASCENDING)], unique=True),
+        IndexModel([("estado", ASCENDING), ("fecha_aplicacion", ASCENDING)]),
+    ],
+}
+
+
+def _nombre_indice(modelo: IndexModel) -> str:
+    return modelo.document["name"]
+
+
+def _misma_definicion(modelo: IndexModel, existente: Dict[str, Any]) -> bool:
+    """Si un índice existente (index_information) coincide en claves y unicidad con el declarado"""
+    return (
+        list(existente["key"]) == list(modelo.document["key"].items())
+        and bool(existente.get("unique")) == bool(modelo.document.get("unique"))
+    )
+
+
+async def aplicar_indices(db, eliminar_no_declarados: bool = False) -> Dict[str, Any]:
+    """
+    Crea los índices declarados en INDICES
+
+    Cada índice se crea por separado para que un conflicto (misma clave con
+    otras opciones, o datos que violan un índice único) no impida crear los
+    demás; el conflicto se registra como error.
+
+    Args:
+        db: Base de datos Motor
+        eliminar_no_declarados: Eliminar los índices existentes que no estén
+            declarados (nunca el de _id)
+
+    Returns:
+        {"creados": [...], "conflictos": [...], "no_declarados": [...], "eliminados": [...]}
+        con nombres "coleccion.indice"
+    """
+    resultado: Dict[str, List[str]] = {"creados": [], "conflictos": [], "no_declarados": [], "eliminados": []}
+
+    for nombre_coleccion, modelos in INDICES.items():
+        coleccion = db[nombre_coleccion]
+        existentes = await coleccion.index_information()
+
+        for modelo in modelos:
+            nombre = _nombre_indice(modelo)
+            if nombre in existentes:
+                if not _misma_definicion(modelo, existentes[nombre]):
+                    resultado["conflictos"].append(f"{nombre_coleccion}.{nombre}")
+                    log.error(
+                        "El índice existe con otra definición",
+                        coleccion=nombre_coleccion,
+                        indice=nombre,
+                        existente=existentes[nombre]
+                    )
+                continue
+            try:
+                await coleccion.create_indexes([modelo])
+                resultado["creados"].append(f"{nombre_coleccion}.{nombre}")
+            except OperationFailure as e:
+                resultado["conflictos"].append(f"{nombre_coleccion}.{nombre}")
+                log.error(
+                    "No se pudo crear el índice",
+                    coleccion=nombre_coleccion,
+                    indice=nombre,
+                    codigo=e.code,
+                    error=str(e)
+                )
+
+        declarados = {_nombre_indice(modelo) for modelo in modelos}
+        for nombre in sorted(set(existentes) - declarados - {"_id_"}):
+            resultado["no_declarados"].append(f"{nombre_coleccion}.{nombre}")
+            if eliminar_no_declarados:
+                await coleccion.drop_index(nombre)
+                resultado["eliminados"].append(f"{nombre_coleccion}.{nombre}")
+
+    if resultado["creados"]:
+        log.info("Índices creados", indices=resultado["creados"])
+    if resultado["no_declarados"] and not eliminar_no_declarados:
+        log.warning("Índices existentes que no están declarados", indices=resultado["no_declarados"])
+    if resultado["eliminados"]:
+        log.info("Índices no declarados eliminados", indices=resultado["eliminados"])
+
+    return resultado
+
+
+# ============================================
+# FORMAS DE CONSULTA
+# ============================================
+
+def consulta(
+    coleccion: str,
+    descripcion: str,
+    filtro: Optional[Dict[str, Any]] = None,
+    orden: Optional[Dict[str, int]] = None,
+    limite: Optional[int] = None,
+    pipeline: Optional[List[Dict[str, Any]]] = None,
+    permitir_collscan: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Describe una forma de consulta a auditar
+
+    Las actualizaciones (update_one, find_one_and_update...) se declaran por
+    su filtro como un find: el planificador elige el índice igual en ambos casos.
+
+    Args:
+        coleccion: Colección consultada
+        descripcion: Dónde se emite la consulta
+        filtro: Filtro con valores de ejemplo (find)
+        orden: Ordenamiento (find)
+        limite: Límite (find)
+        pipeline: Pipeline de agregación (en lugar de filtro/orden)
+        permitir_collscan: Motivo por el que recorrer la colección es aceptable
+    """
+    return {
+        "coleccion": coleccion,
+        "descripcion": descripcion,
+        "filtro": filtro or {},
+        "orden": orden,
+        "limite": limite,
+        "pipeline": pipeline,
+        "permitir_collscan": permitir_collscan
+    }
+
+
+_AHORA = datetime(2024, 1, 1)
+_RECORRE_TODO = "recorre todas las estaciones por diseño"
+
+CONSULTAS: List[Dict[str, Any]] = [
+    # estaciones (repositorio de almacenamiento_mongo, usado por todos los servicios, y migración del historial)
+    consulta("estaciones", "obtener/actualizar/eliminar estación por ID", {"id_estacion": 1}),
+    consulta("estaciones", "listar estaciones paginadas", {"id_estacion": {"$gt": 100}},
+             orden={"id_estacion": 1}, limite=100),
+    consulta("estaciones", "listar estaciones por estado", {"id_estacion": {"$gt": 100}, "estado": "Activa"},
+             orden={"id_estacion": 1}, limite=100),
+    consulta("estaciones", "exportar estaciones", orden={"id_estacion": 1}),
+    consulta("estaciones", "exportar estaciones por estado", {"estado": "Activa"}, orden={"id_estacion": 1}),
+    consulta("estaciones", "estaciones desactualizadas",
+             {"$expr": {"$lt": [{"$ifNull": ["$version_confirmada", 0]}, {"$ifNull": ["$version_precios", 0]}]}},
+             orden={"id_estacion": 1}, limite=100),
+    consulta("estaciones", "validar IP repetida", {"ip": "10.0.0.1", "id_estacion": {"$ne": 1}}, limite=1),
+    consulta("estaciones", "liveness: estaciones verificadas", {"estado": {"$in": ["Activa", "Desconectada"]}}),
+    consulta("estaciones", "rollout: estaciones seleccionadas", {"id_estacion": {"$in": [1, 2, 3]}},
+             orden={"id_estacion": 1}),
+    consulta("estaciones", "rollout: estaciones por estado", {"estado": "Activa"}, orden={"id_estacion": 1}),
+    consulta("estaciones", "importación: estaciones existentes del lote", {"id_estacion": {"$in": [1, 2, 3]}}),
+    consulta("estaciones", "secuencias: máximo id_estacion", orden={"id_estacion": -1}, limite=1),
+    consulta("estaciones", "analítica: precios vigentes", permitir_collscan=_RECORRE_TODO),
+    consulta("estaciones", "estadísticas: reconciliación de desactualizadas",
+             {"$expr": {"$lt": [{"$ifNull": ["$version_confirmada", 0]}, {"$ifNull": ["$version_precios", 0]}]}},
+             permitir_collscan=_RECORRE_TODO),
+    consulta("estaciones", "estadísticas: reconciliación de contadores",
+             pipeline=[{"$facet": {
+                 "total": [{"$count": "n"}],
+                 "por_estado": [{"$group": {"_id": "$estado", "n": {"$sum": 1}}}]
+             }}],
+             permitir_collscan=_RECORRE_TODO),
+    consulta("estaciones", "migración del historial embebido", {"historico_precios": {"$exists": True}},
+             permitir_collscan="migración única al iniciar"),
+
+    # historico_precios
+    consulta("historico_precios", "registrar precios (bucket abierto)",
+             {"id_estacion": 1, "inicio": _AHORA, "cantidad": {"$lt": 200}}),
+    consulta("historico_precios", "historial de una estación por rango",
+             {"id_estacion": 1, "inicio": {"$gte": _AHORA, "$lte": _AHORA}},
+             orden={"inicio": -1, "desde": -1}),
+    consulta("historico_precios", "exportar historial de una estación", {"id_estacion": 1},
+             orden={"id_estacion": 1, "inicio": 1, "desde": 1}),
+    consulta("historico_precios", "exportar historial completo", orden={"id_estacion": 1, "inicio": 1, "desde": 1},
+             permitir_collscan="exportación completa del historial"),
+    consulta("historico_precios", "retención de buckets antiguos", {"inicio": {"$lt": _AHORA}, "cantidad": {"$gt": 1}}),
+    consulta("historico_precios", "analítica: buckets de la ventana", {"inicio": {"$gte": _AHORA}}),
+    consulta("historico_precios", "analítica: precio al abrir la ventana", pipeline=[
+        {"$match": {"inicio": {"$lt": _AHORA}}},
+        {"$sort": {"id_estacion": 1, "inicio": 1, "desde": 1}},
+        {"$group": {"_id": "$id_estacion", "timestamp": {"$last": "$desde"}}}
+    ]),
+
+    # entregas_precios
+    consulta("entregas_precios", "entrega de una estación", {"id_estacion": 1}),
+    consulta("entregas_precios", "reintentar entrega", {"id_estacion": 1, "estado": "reintentando"}),
+    consulta("entregas_precios", "listar entregas por estado", {"estado": "pendiente"}, orden={"id_estacion": 1}),
+    consulta("entregas_precios", "listar entregas", orden={"id_estacion": 1}),
+    consulta("entregas_precios", "despachador: entregas vencidas",
+             {"estado": {"$in": ["pendiente", "reintentando"]}, "proximo_intento": {"$lte": _AHORA}}),
+    consulta("entregas_precios", "despachador: próximo intento",
+             {"estado": {"$in": ["pendiente", "reintentando"]}}, orden={"proximo_intento": 1}, limite=1),
+
+    # precios_programados
+    consulta("precios_programados", "programación por ID", {"id_programacion": 1}),
+    consulta("precios_programados", "aplicar/cancelar programación pendiente",
+             {"id_programacion": 1, "estado": "pendiente"}),
+    consulta("precios_programados", "cargar pendientes / listar por estado", {"estado": "pendiente"},
+             orden={"fecha_aplicacion": 1}),
+    consulta("precios_programados", "listar programaciones", orden={"fecha_aplicacion": 1},
+             permitir_collscan="listado completo sin filtro"),
+]
+
+
+# ============================================
+# AUDITORÍA
+# ============================================
+
+def _etapas(plan: Any, encontradas: List[str], indices: List[str]):
+    """Recorre un plan de explain() acumulando etapas e índices usados (sin planes rechazados)"""
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            encontradas.append(plan["stage"])
+        if isinstance(plan.get("indexName"), str):
+            indices.append(plan["indexName"])
+        for clave, valor in plan.items():
+            if clave != "rejectedPlans":
+                _etapas(valor, encontradas, indices)
+    elif isinstance(plan, list):
+        for elemento in plan:
+            _etapas(elemento, encontradas, indices)
+
+
+async def explicar(db, forma: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ejecuta explain() (verbosidad queryPlanner, no ejecuta la consulta)
+
+    Returns:
+        {"etapas": [...], "indices": [...], "collscan": bool}
+    """
+    if forma["pipeline"] is not None:
+        comando: Dict[str, Any] = {"aggregate": forma["coleccion"], "pipeline": forma["pipeline"], "cursor": {}}
+    else:
+        comando = {"find": forma["coleccion"], "filter": forma["filtro"]}
+        if forma["orden"]:
+            comando["sort"] = forma["orden"]
+        if forma["limite"]:
+            comando["limit"] = forma["limite"]
+
+    plan = await db.command({"explain": comando, "verbosity": "queryPlanner"})
+    etapas: List[str] = []
+    indices: List[str] = []
+    _etapas(plan, etapas, indices)
+    return {"etapas": etapas, "indices": sorted(set(indices)), "collscan": "COLLSCAN" in etapas}
+
+
+async def auditar_consultas(db) -> List[Dict[str, Any]]:
+    """
+    Ejecuta explain() sobre todas las formas de CONSULTAS
+
+    Returns:
+        Una entrada por consulta con coleccion, descripcion, etapas, indices,
+        collscan, permitido (si el COLLSCAN está justificado) y error
+    """
+    resultados = []
+    for forma in CONSULTAS:
+        entrada = {"coleccion": forma["coleccion"], "descripcion": forma["descripcion"], "error": None}
+        try:
+            entrada.update(await explicar(db, forma))
+        except OperationFailure as e:
+            entrada.update({"etapas": [], "indices": [], "collscan": False, "error": str(e)})
+        entrada["permitido"] = bool(forma["permitir_collscan"])
+        resultados.append(entrada)
+    return resultados
+
+
+def consultas_sin_indice(resultados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Consultas auditadas que recorren la colección completa sin justificación"""
+    return [r for r in resultados if r["collscan"] and not r["permitido"]]
+
+
+async def inicializar_indices(db):
+    """
+    Crea los índices declarados al iniciar y, si AUDITAR_CONSULTAS está
+    activo, registra las consultas que no usan índice
+    """
+    await aplicar_indices(db)
+
+    if AUDITAR_CONSULTAS:
+        resultados = await auditar_consultas(db)
+        for r in consultas_sin_indice(resultados):
+            log.warning("Consulta sin índice (COLLSCAN)", coleccion=r["coleccion"], consulta=r["descripcion"],
+                        etapas=r["etapas"])
+        log.info("Auditoría de consultas completada", consultas=len(resultados),
+                 sin_indice=len(consultas_sin_indice(resultados)))
+
+
+# ============================================
+# LÍNEA DE COMANDOS
+# ============================================
+
+def _imprimir_auditoria(resultados: List[Dict[str, Any]]):
+    for r in resultados:
+        if r["error"]:
+            estado = "ERROR"
+        elif r["collscan"]:
+            estado = "COLLSCAN*" if r["permitido"] else "COLLSCAN"
+        else:
+            estado = "ok"
+        detalle = r["error"] or ", ".join(r["indices"]) or " > ".join(r["etapas"])
+        print(f"{estado:<10} {r['coleccion']:<20} {r['descripcion']:<48} {detalle}")
+    print("(* recorrido completo justificado en CONSULTAS)")
+
+
+async def _ejecutar(auditar: bool, eliminar_no_declarados: bool) -> int:
+    from database import db
+
+    resultado = await aplicar_indices(db, eliminar_no_declarados)
+    print(f"Índices creados: {len(resultado['creados'])}, conflictos: {len(resultado['conflictos'])}, "
+          f"no declarados: {len(resultado['no_declarados'])}, eliminados: {len(resultado['eliminados'])}")
+    for nombre in resultado["conflictos"]:
+        print(f"    conflicto: {nombre}")
+    for nombre in resultado["no_declarados"]:
+        print(f"    no declarado: {nombre}")
+
+    if not auditar:
+        return 1 if resultado["conflictos"] else 0
+
+    resultados = await auditar_consultas(db)
+    _imprimir_auditoria(resultados)
+    fallidas = consultas_sin_indice(resultados) + [r for r in resultados if r["error"]]
+    return 1 if fallidas or resultado["conflictos"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--auditar", action="store_true",
+                        help="Ejecutar explain() sobre cada forma de consulta y reportar los COLLSCAN")
+    parser.add_argument("--eliminar-no-declarados", action="store_true",
+                        help="Eliminar los índices que no están en INDICES")
+    args = parser.parse_args()
+    return asyncio.run(_ejecutar(args.auditar, args.eliminar_no_declarados))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
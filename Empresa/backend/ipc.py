@@ -0,0 +1,296 @@
+"""
+Canal IPC entre los workers HTTP y el proceso despachador
+Líneas JSON sobre un socket Unix local:
+
+    petición      {"id": 7, "op": "crear_rollout", "args": {...}}
+    respuesta     {"id": 7, "resultado": ...}
+                  {"id": 7, "error": "...", "tipo": "ValueError"}
+    notificación  {"op": "publicar", "args": {...}}  (sin id ni respuesta)
+    difusión      {"evento": {...}}  (del despachador a todos los workers)
+
+Cada worker mantiene una única conexión, multiplexada por id, que se
+restablece con backoff si el despachador se reinicia. Las peticiones hechas
+mientras no hay conexión esperan hasta IPC_TIMEOUT_CONEXION segundos.
+
+Variables de entorno:
+    DESPACHADOR_SOCKET: Ruta del socket Unix. Default /tmp/empresa_despachador.sock
+    IPC_TIMEOUT: Segundos máximos de espera de una respuesta. Default 30
+    IPC_TIMEOUT_CONEXION: Segundos de espera por la conexión antes de
+        fallar una petición. Default 5
+    IPC_LIMITE_BUFFER: Bytes pendientes de envío hacia un worker antes de
+        desconectarlo por consumo lento. Default 8388608
+"""
+import asyncio
+import inspect
+import itertools
+import os
+from typing import Any, Callable, Dict, Optional, Set
+
+import orjson
+
+from respuestas import serializar
+from bitacora import WARNING, obtener_registrador
+
+log = obtener_registrador("ipc")
+
+RUTA_SOCKET = os.getenv("DESPACHADOR_SOCKET", "/tmp/empresa_despachador.sock")
+TIMEOUT = float(os.getenv("IPC_TIMEOUT", "30"))
+TIMEOUT_CONEXION = float(os.getenv("IPC_TIMEOUT_CONEXION", "5"))
+LIMITE_BUFFER = int(os.getenv("IPC_LIMITE_BUFFER", str(8 * 1024 * 1024)))
+
+# Largo máximo de una línea (el detalle de un rollout grande cabe de sobra)
+LIMITE_LINEA = 16 * 1024 * 1024
+BACKOFF_INICIAL = 0.2
+BACKOFF_MAXIMO = 5.0
+
+
+class DespachadorNoDisponible(ConnectionError):
+    """No hay conexión con el proceso despachador"""
+
+
+class ErrorDespachador(RuntimeError):
+    """La operación falló dentro del proceso despachador"""
+
+
+def _linea(mensaje: Dict[str, Any]) -> bytes:
+    return serializar(mensaje) + b"\n"
+
+
+def _error_remoto(mensaje: Dict[str, Any]) -> Exception:
+    """Reconstruye la excepción de una respuesta; ValueError se conserva para responder 400"""
+    if mensaje.get("tipo") == "ValueError":
+        return ValueError(mensaje["error"])
+    return ErrorDespachador(f"{mensaje.get('tipo')}: {mensaje['error']}")
+
+
+# ============================================
+# LADO DEL DESPACHADOR
+# ============================================
+
+class ServidorIPC:
+    """Atiende a los workers HTTP y les difunde los eventos"""
+
+    def __init__(
+        self,
+        operaciones: Dict[str, Callable[..., Any]],
+        ruta: str = RUTA_SOCKET,
+        saludo: Optional[Callable[[], Dict[str, Any]]] = None
+    ):
+        """
+        Args:
+            operaciones: Nombre -> función (sync o async) con argumentos por nombre
+            ruta: Ruta del socket Unix
+            saludo: Mensaje que se envía a cada worker al conectarse
+        """
+        self.operaciones = operaciones
+        self.ruta = ruta
+        self.saludo = saludo
+        self.clientes: Set[asyncio.StreamWriter] = set()
+        self._servidor: Optional[asyncio.AbstractServer] = None
+        self._tareas: Set[asyncio.Task] = set()
+
+    async def iniciar(self):
+        # Un socket que quedó de una ejecución anterior impediría escuchar
+        if os.path.exists(self.ruta):
+            os.unlink(self.ruta)
+        self._servidor = await asyncio.start_unix_server(self._atender, path=self.ruta, limit=LIMITE_LINEA)
+        os.chmod(self.ruta, 0o660)
+        log.info("Despachador escuchando", socket=self.ruta)
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clientes.add(writer)
+        log.info("Worker conectado", workers=len(self.clientes))
+        if self.saludo is not None:
+            self._escribir(writer, _linea(self.saludo()))
+        try:
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                try:
+                    mensaje = orjson.loads(linea)
+                except orjson.JSONDecodeError:
+                    log.warning("Mensaje IPC inválido", largo=len(linea))
+                    continue
+                tarea = asyncio.create_task(self._ejecutar(mensaje, writer))
+                self._tareas.add(tarea)
+                tarea.add_done_callback(self._tareas.discard)
+        except (ConnectionError, ValueError):
+            # ValueError: línea sobre LIMITE_LINEA
+            pass
+        finally:
+            self.clientes.discard(writer)
+            writer.close()
+            log.info("Worker desconectado", workers=len(self.clientes))
+
+    async def _ejecutar(self, mensaje: Dict[str, Any], writer: asyncio.StreamWriter):
+        id_mensaje = mensaje.get("id")
+        op = mensaje.get("op")
+        try:
+            operacion = self.operaciones.get(op)
+            if operacion is None:
+                raise ValueError(f"Operación desconocida: {op}")
+            resultado = operacion(**mensaje.get("args", {}))
+            if inspect.isawaitable(resultado):
+                resultado = await resultado
+            if id_mensaje is None:
+                return
+            respuesta = _linea({"id": id_mensaje, "resultado": resultado})
+        except Exception as e:
+            if id_mensaje is None:
+                log.warning("Error en notificación IPC", op=op, error=str(e))
+                return
+            respuesta = _linea({"id": id_mensaje, "error": str(e), "tipo": type(e).__name__})
+        self._escribir(writer, respuesta)
+
+    def _escribir(self, writer: asyncio.StreamWriter, datos: bytes) -> bool:
+        if writer.is_closing():
+            return False
+        if writer.transport.get_write_buffer_size() > LIMITE_BUFFER:
+            # El worker se resincroniza al reconectar
+            log.warning("Worker desconectado por consumo lento", limite=LIMITE_BUFFER)
+            self.clientes.discard(writer)
+            writer.close()
+            return False
+        writer.write(datos)
+        return True
+
+    def difundir(self, mensaje: Dict[str, Any]):
+        """Envía un mensaje a todos los workers conectados sin bloquear"""
+        datos = _linea(mensaje)
+        for writer in list(self.clientes):
+            self._escribir(writer, datos)
+
+    async def cerrar(self):
+        if self._servidor is not None:
+            self._servidor.close()
+        for writer in list(self.clientes):
+            writer.close()
+        if os.path.exists(self.ruta):
+            os.unlink(self.ruta)
+
+
+# ============================================
+# LADO DE LOS WORKERS HTTP
+# ============================================
+
+class ClienteIPC:
+    """Conexión de un worker HTTP con el despachador"""
+
+    def __init__(self, ruta: str = RUTA_SOCKET):
+        self.ruta = ruta
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._conectado = asyncio.Event()
+        self._pendientes: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._al_recibir: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._tarea: Optional[asyncio.Task] = None
+
+    def al_recibir(self, funcion: Callable[[Dict[str, Any]], None]):
+        """Registra la función que procesa cada mensaje difundido por el despachador"""
+        self._al_recibir = funcion
+
+    def iniciar(self):
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._mantener())
+
+    @property
+    def conectado(self) -> bool:
+        return self._conectado.is_set()
+
+    async def _mantener(self):
+        backoff = BACKOFF_INICIAL
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.ruta, limit=LIMITE_LINEA)
+            except OSError as e:
+                log.muestreado("Despachador no disponible", clave="conectar", nivel=WARNING,
+                               socket=self.ruta, error=str(e))
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, BACKOFF_MAXIMO)
+                continue
+
+            backoff = BACKOFF_INICIAL
+            self._writer = writer
+            self._conectado.set()
+            log.info("Conectado al despachador", socket=self.ruta)
+            try:
+                await self._leer(reader)
+            except (ConnectionError, ValueError) as e:
+                log.warning("Error leyendo del despachador", error=str(e))
+            finally:
+                self._conectado.clear()
+                self._writer = None
+                writer.close()
+                for futuro in self._pendientes.values():
+                    if not futuro.done():
+                        futuro.set_exception(DespachadorNoDisponible("Conexión con el despachador perdida"))
+                self._pendientes.clear()
+            log.warning("Conexión con el despachador perdida", socket=self.ruta)
+
+    async def _leer(self, reader: asyncio.StreamReader):
+        while True:
+            linea = await reader.readline()
+            if not linea:
+                return
+            mensaje = orjson.loads(linea)
+
+            if "evento" in mensaje:
+                if self._al_recibir is not None:
+                    try:
+                        self._al_recibir(mensaje["evento"])
+                    except Exception as e:
+                        log.warning("Error procesando evento del despachador", error=str(e))
+                continue
+
+            futuro = self._pendientes.pop(mensaje.get("id"), None)
+            if futuro is None or futuro.done():
+                continue
+            if "error" in mensaje:
+                futuro.set_exception(_error_remoto(mensaje))
+            else:
+                futuro.set_result(mensaje.get("resultado"))
+
+    async def llamar(self, op: str, **args) -> Any:
+        """
+        Ejecuta una operación en el despachador y espera su resultado
+
+        Raises:
+            ValueError: Si la operación la rechazó por datos inválidos
+            DespachadorNoDisponible: Si no hay conexión o se perdió a la espera
+            ErrorDespachador: Si la operación falló por otro motivo
+        """
+        try:
+            await asyncio.wait_for(self._conectado.wait(), timeout=TIMEOUT_CONEXION)
+        except asyncio.TimeoutError:
+            raise DespachadorNoDisponible(f"Sin conexión con el despachador ({self.ruta})")
+
+        id_mensaje = next(self._ids)
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes[id_mensaje] = futuro
+        try:
+            self._writer.write(_linea({"id": id_mensaje, "op": op, "args": args}))
+            return await asyncio.wait_for(futuro, timeout=TIMEOUT)
+        except asyncio.TimeoutError:
+            raise DespachadorNoDisponible(f"El despachador no respondió '{op}' en {TIMEOUT}s")
+        finally:
+            self._pendientes.pop(id_mensaje, None)
+
+    def notificar(self, op: str, **args) -> bool:
+        """
+        Envía una operación sin esperar respuesta
+
+        Returns:
+            False si no hay conexión (la notificación se descarta)
+        """
+        if self._writer is None or self._writer.is_closing():
+            return False
+        self._writer.write(_linea({"op": op, "args": args}))
+        return True
+
+    async def cerrar(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+        if self._writer is not None:
+            self._writer.close()
@@ -0,0 +1,209 @@
+"""
+Verificación periódica de conectividad de las estaciones (liveness)
+Un barrido en segundo plano sondea en paralelo el ip:puerto de cada
+estación, con un semáforo que limita las conexiones simultáneas y un
+timeout corto por sondeo. El estado se decide con histéresis: una estación
+Activa pasa a Desconectada solo tras varios fallos seguidos y vuelve a
+Activa tras varios éxitos seguidos, de modo que un sondeo aislado no la
+hace oscilar. Los cambios de cada barrido se escriben en una única
+operación del repositorio de estaciones y se reflejan en los contadores de estadísticas.
+
+Las estaciones Inactiva se consideran deshabilitadas a mano y no se tocan.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+from almacenamiento import almacenamiento
+from cache_estaciones import cache_estaciones
+from entregas_service import reintentar_ahora
+from estadisticas_service import registrar_cambios_estado, reconciliar_estadisticas
+from pool_conexiones import pool_estaciones
+from tcp_server import registrar_verificacion
+from eventos import bus
+from bitacora import obtener_registrador
+
+log = obtener_registrador("liveness")
+
+LIVENESS_HABILITADO = os.getenv("LIVENESS_HABILITADO", "1") not in ("0", "false", "no")
+# Segundos entre barridos
+INTERVALO_BARRIDO = float(os.getenv("LIVENESS_INTERVALO", "30"))
+# Timeout de cada sondeo TCP (segundos)
+TIMEOUT_SONDEO = float(os.getenv("LIVENESS_TIMEOUT", "2"))
+# Sondeos simultáneos
+CONCURRENCIA = int(os.getenv("LIVENESS_CONCURRENCIA", "100"))
+# Fallos seguidos para marcar una estación Activa como Desconectada
+UMBRAL_FALLOS = int(os.getenv("LIVENESS_UMBRAL_FALLOS", "3"))
+# Éxitos seguidos para volver a marcar como Activa una estación Desconectada
+UMBRAL_EXITOS = int(os.getenv("LIVENESS_UMBRAL_EXITOS", "2"))
+
+ESTADOS_VERIFICADOS = ["Activa", "Desconectada"]
+
+# Racha de resultados por estación: {id_estacion: {"fallos": n, "exitos": n}}
+_rachas: Dict[int, Dict[str, int]] = {}
+
+# Resumen del último barrido
+ultimo_barrido: Dict[str, Any] = {}
+
+
+async def _sondear(ip: str, puerto: int, semaforo: asyncio.Semaphore) -> bool:
+    """
+    Verifica si la estación acepta conexiones TCP
+
+    Returns:
+        True si la estación respondió
+    """
+    # Una conexión persistente viva del pool ya demuestra que la estación responde
+    if pool_estaciones.conexion_abierta(ip, puerto):
+        return True
+
+    async with semaforo:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(ip, puerto),
+                timeout=TIMEOUT_SONDEO
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+        return True
+
+
+def _siguiente_estado(id_estacion: int, estado: str, viva: bool) -> str:
+    """
+    Aplica la máquina de estados con histéresis a un resultado de sondeo
+
+    Args:
+        id_estacion: ID de la estación
+        estado: Estado actual en la base de datos
+        viva: Resultado del sondeo
+
+    Returns:
+        Estado que corresponde tras este sondeo
+    """
+    racha = _rachas.setdefault(id_estacion, {"fallos": 0, "exitos": 0})
+    if viva:
+        racha["exitos"] += 1
+        racha["fallos"] = 0
+    else:
+        racha["fallos"] += 1
+        racha["exitos"] = 0
+
+    if estado == "Activa" and racha["fallos"] >= UMBRAL_FALLOS:
+        return "Desconectada"
+    if estado == "Desconectada" and racha["exitos"] >= UMBRAL_EXITOS:
+        return "Activa"
+    return estado
+
+
+async def verificar_estaciones() -> Dict[str, Any]:
+    """
+    Ejecuta un barrido completo: sondea todas las estaciones y persiste
+    los cambios de estado en una sola escritura
+
+    Returns:
+        Resumen del barrido
+    """
+    inicio = time.perf_counter()
+    estaciones = await almacenamiento.estaciones.listar(
+        campos=("ip", "puerto", "estado"),
+        estado=ESTADOS_VERIFICADOS
+    )
+
+    semaforo = asyncio.Semaphore(CONCURRENCIA)
+    resultados = await asyncio.gather(*[
+        _sondear(e["ip"], e["puerto"], semaforo) for e in estaciones
+    ])
+
+    # Olvidar las rachas de estaciones eliminadas o deshabilitadas
+    vigentes = {e["id_estacion"] for e in estaciones}
+    for id_estacion in list(_rachas):
+        if id_estacion not in vigentes:
+            del _rachas[id_estacion]
+
+    ahora = datetime.now()
+    cambios: List[Tuple[str, str]] = []
+    cambiadas: List[Tuple[int, str, str]] = []
+    recuperadas: List[int] = []
+
+    for estacion, viva in zip(estaciones, resultados):
+        registrar_verificacion(estacion["ip"], estacion["puerto"], viva)
+
+        anterior = estacion["estado"]
+        nuevo = _siguiente_estado(estacion["id_estacion"], anterior, viva)
+        if nuevo == anterior:
+            continue
+
+        cambios.append((anterior, nuevo))
+        cambiadas.append((estacion["id_estacion"], anterior, nuevo))
+        if nuevo == "Activa":
+            recuperadas.append(estacion["id_estacion"])
+
+    if cambiadas:
+        # Cada cambio exige el estado anterior: no pisa un cambio manual concurrente
+        modificadas = await almacenamiento.estaciones.cambiar_estados(cambiadas, ahora)
+
+        if modificadas == len(cambiadas):
+            await registrar_cambios_estado(cambios)
+            for id_estacion, anterior, nuevo in cambiadas:
+                bus.publicar("liveness", {"id_estacion": id_estacion, "anterior": anterior, "estado": nuevo})
+        else:
+            # Alguna estación cambió entre la lectura y la escritura: no se
+            # sabe cuáles, así que el panel vuelve a pedir su foto
+            await reconciliar_estadisticas()
+            bus.publicar("resincronizar", {"motivo": "liveness"})
+
+        for id_estacion, _, _ in cambiadas:
+            cache_estaciones.invalidar(id_estacion)
+
+        # Las estaciones que vuelven a responder reciben de inmediato sus precios pendientes
+        for id_estacion in recuperadas:
+            await reintentar_ahora(id_estacion)
+
+        log.info("Cambios de estado persistidos", cambios=len(cambiadas))
+
+    vivas = sum(1 for viva in resultados if viva)
+    ultimo_barrido.update({
+        "fecha": ahora,
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        "verificadas": len(estaciones),
+        "responden": vivas,
+        "no_responden": len(estaciones) - vivas,
+        "cambios": len(cambiadas)
+    })
+    return dict(ultimo_barrido)
+
+
+async def tarea_liveness():
+    """Ejecuta barridos periódicos sin bloquear las peticiones"""
+    log.info("Verificación de estaciones iniciada", intervalo=INTERVALO_BARRIDO)
+    while True:
+        try:
+            await verificar_estaciones()
+        except Exception:
+            log.exception("Error verificando estaciones")
+        await asyncio.sleep(INTERVALO_BARRIDO)
+
+
+def estado_liveness() -> Dict[str, Any]:
+    """
+    Configuración y resumen del último barrido
+
+    Returns:
+        Diccionario con parámetros y resultados
+    """
+    return {
+        "habilitado": LIVENESS_HABILITADO,
+        "intervalo": INTERVALO_BARRIDO,
+        "timeout": TIMEOUT_SONDEO,
+        "concurrencia": CONCURRENCIA,
+        "umbral_fallos": UMBRAL_FALLOS,
+        "umbral_exitos": UMBRAL_EXITOS,
+        "ultimo_barrido": ultimo_barrido or None
+    }
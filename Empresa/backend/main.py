@@ -1,34 +1,69 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio
-import subprocess
-from typing import List, Dict, Any
+from fastapi.responses import Response, StreamingResponse
+from datetime import datetime
+from typing import List, Dict, Any, Optional
 
 # Importar modelos y servicios
 from models import (
     EstacionCreate, 
     EstacionUpdate, 
     PreciosUpdate,
-    EstacionResponse
+    EstacionResponse,
+    RolloutCreate,
+    ProgramacionPreciosCreate
 )
 from estaciones_service import (
     crear_estacion,
-    obtener_estaciones,
+    obtener_estaciones_paginadas,
     obtener_estacion_por_id,
     actualizar_estacion,
     actualizar_precios,
     eliminar_estacion,
     obtener_historico_precios,
     verificar_ip_existente,
-    obtener_estadisticas
+    obtener_estadisticas,
+    obtener_estaciones_desactualizadas,
+    obtener_precios_vigentes,
+    obtener_panel
 )
 from database import verificar_conexion, cerrar_conexion
-from tcp_server import iniciar_tcp_servidor, enviar_precios_a_estacion, obtener_estaciones_activas
+from entregas_service import encolar_entrega, obtener_entrega, listar_entregas
+from cache_estaciones import cache_estaciones
+from despachador import (
+    MODO_DESPACHADOR,
+    ejecutar,
+    avisar,
+    iniciar_despachador,
+    detener_despachador,
+    conectar_despachador,
+    desconectar_despachador,
+    estado_despachador
+)
+from ipc import DespachadorNoDisponible
+from respuestas import RespuestaJSON
+from eventos import bus, flujo_sse
+from analitica_service import obtener_resumen_red, obtener_desviaciones, obtener_serie_red
+from importacion_service import (
+    importar_estaciones,
+    importar_historico,
+    exportar_estaciones,
+    exportar_historico
+)
+from programacion_service import (
+    obtener_programaciones,
+    obtener_programacion
+)
+from bitacora import obtener_registrador, configurar_niveles, estado_bitacora
+from metricas import MetricasHTTP, TIPO_CONTENIDO, exponer, medidor
+
+log = obtener_registrador("api")
 
 app = FastAPI(
     title="Backend Empresa Bencinera",
     version="1.0",
-    description="API REST para gestión de estaciones de servicio"
+    description="API REST para gestión de estaciones de servicio",
+    default_response_class=RespuestaJSON
 )
 
 # Configurar CORS
@@ -40,26 +75,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latencia HTTP por ruta (se agrega al final para medir también los demás middlewares)
+app.add_middleware(MetricasHTTP)
+
+medidor(
+    "bitacora_cola_pendientes",
+    "Registros de log en espera del hilo escritor",
+    funcion=lambda: estado_bitacora()["cola"]["pendientes"]
+)
+
+@app.exception_handler(DespachadorNoDisponible)
+async def despachador_no_disponible(request: Request, exc: DespachadorNoDisponible):
+    return RespuestaJSON({"detail": str(exc)}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
 @app.on_event("startup")
 async def iniciar_componentes():
     # 🔹 Verificar conexión a MongoDB
     conexion_ok = await verificar_conexion()
     if not conexion_ok:
-        print("⚠️ Advertencia: No se pudo conectar a MongoDB")
-    
-    # 🔹 Iniciar el servidor TCP en paralelo
-    asyncio.create_task(iniciar_tcp_servidor())
-    print("🚀 Servidor TCP iniciado junto con FastAPI")
+        log.warning("No se pudo conectar a MongoDB")
 
-    # 🔹 (Opcional) Iniciar el bridge Node.js automáticamente
-    try:
-        subprocess.Popen(["node", "tcp_bridge.js"], cwd=".", shell=True)
-        print("🌐 Bridge Node.js iniciado correctamente")
-    except Exception as e:
-        print("⚠️ No se pudo iniciar el bridge:", e)
+    if MODO_DESPACHADOR == "externo":
+        # 🔹 Relay TCP, pool, entregas y programador viven en despachador.py
+        conectar_despachador()
+        log.info("Worker HTTP en modo despachador externo")
+    else:
+        # 🔹 Un solo proceso: índices, tareas periódicas, relay TCP, pool y socket.io
+        await iniciar_despachador(conexion_ok)
 
 @app.on_event("shutdown")
 async def cerrar_componentes():
+    # 🔹 Terminar los flujos SSE abiertos
+    bus.cerrar()
+
+    # 🔹 Detener el programador, el pool hacia estaciones y socket.io (o soltar el socket)
+    if MODO_DESPACHADOR == "externo":
+        await desconectar_despachador()
+    else:
+        await detener_despachador()
+
     # 🔹 Cerrar conexión a MongoDB
     await cerrar_conexion()
 
@@ -76,14 +130,28 @@ def home():
 # ENDPOINTS CRUD DE ESTACIONES
 # ============================================
 
-@app.get("/api/estaciones", response_model=List[Dict[str, Any]])
-async def listar_estaciones():
+@app.get("/api/estaciones", response_model=Dict[str, Any])
+async def listar_estaciones(
+    fields: Optional[str] = Query(None, description="Campos separados por coma (ej: id_estacion,nombre,estado)"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = Query(None, description="next_cursor de la página anterior"),
+    estado: Optional[str] = None
+):
     """
-    Obtiene todas las estaciones registradas en el sistema
+    Obtiene las estaciones registradas en el sistema, paginadas por cursor
+    
+    - Por defecto no incluye el historial de precios
+    - ?fields= limita los campos retornados
+    - Para la página siguiente, enviar ?cursor=<next_cursor>
     """
     try:
-        estaciones = await obtener_estaciones()
-        return estaciones
+        campos = [c.strip() for c in fields.split(",") if c.strip()] if fields else None
+        return RespuestaJSON(await obtener_estaciones_paginadas(campos, limit, cursor, estado))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -91,6 +159,23 @@ async def listar_estaciones():
         )
 
 
+@app.get("/api/estaciones/desactualizadas", response_model=List[Dict[str, Any]])
+async def listar_estaciones_desactualizadas(limit: int = Query(100, ge=1, le=1000)):
+    """
+    Lista las estaciones que aún no confirman (ack) su último conjunto de precios
+    
+    Compara la versión vigente de precios con la última versión confirmada
+    por la estación
+    """
+    try:
+        return RespuestaJSON(await obtener_estaciones_desactualizadas(limit))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener estaciones desactualizadas: {str(e)}"
+        )
+
+
 @app.get("/api/estaciones/{id_estacion}", response_model=Dict[str, Any])
 async def obtener_estacion(id_estacion: int):
     """
@@ -104,7 +189,7 @@ async def obtener_estacion(id_estacion: int):
             detail=f"Estación con ID {id_estacion} no encontrada"
         )
     
-    return estacion
+    return RespuestaJSON(estacion)
 
 
 @app.post("/api/estaciones", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
@@ -119,7 +204,7 @@ async def crear_nueva_estacion(estacion: EstacionCreate):
     try:
         # Se permite que múltiples estaciones tengan la misma IP
         estacion_creada = await crear_estacion(estacion)
-        return estacion_creada
+        return RespuestaJSON(estacion_creada, status_code=status.HTTP_201_CREATED)
     
     except HTTPException:
         raise
@@ -147,7 +232,7 @@ async def actualizar_datos_estacion(id_estacion: int, datos: EstacionUpdate):
                 detail=f"Estación con ID {id_estacion} no encontrada"
             )
         
-        return estacion_actualizada
+        return RespuestaJSON(estacion_actualizada)
     
     except HTTPException:
         raise
@@ -183,14 +268,19 @@ async def eliminar_estacion_endpoint(id_estacion: int):
         )
 
 
-@app.put("/api/estaciones/{id_estacion}/precios", response_model=Dict[str, Any])
+@app.put(
+    "/api/estaciones/{id_estacion}/precios",
+    response_model=Dict[str, Any],
+    status_code=status.HTTP_202_ACCEPTED
+)
 async def actualizar_precios_estacion(id_estacion: int, precios: PreciosUpdate):
     """
     Actualiza los precios de una estación
     
     - Actualiza los precios actuales
     - Agrega una entrada al historial con timestamp
-    - Distribuye automáticamente los nuevos precios a la estación vía TCP
+    - Encola la entrega a la estación vía TCP y retorna de inmediato (202);
+      el despachador reintenta hasta que la estación la reciba
     """
     try:
         estacion_actualizada = await actualizar_precios(id_estacion, precios)
@@ -201,22 +291,18 @@ async def actualizar_precios_estacion(id_estacion: int, precios: PreciosUpdate):
                 detail=f"Estación con ID {id_estacion} no encontrada"
             )
         
-        # 🚀 Fase 5 - Enviar precios a la estación vía TCP
-        envio_exitoso = await enviar_precios_a_estacion(
-            estacion_actualizada["ip"],
-            estacion_actualizada["puerto"],
-            precios.precios.model_dump(),
-            estacion_actualizada.get("nombre")
-        )
+        # 📮 Registrar la entrega en el outbox (reemplaza cualquier versión anterior pendiente)
+        entrega = await encolar_entrega(estacion_actualizada, precios.precios.model_dump())
+        avisar("despertar_entregas")
         
-        # Agregar información sobre el envío a la respuesta
-        estacion_actualizada["_envio_tcp"] = {
-            "exitoso": envio_exitoso,
-            "ip": estacion_actualizada["ip"],
-            "puerto": estacion_actualizada["puerto"]
+        # Agregar información sobre la entrega a la respuesta
+        estacion_actualizada["_entrega"] = {
+            "estado": entrega["estado"],
+            "ip": entrega["ip"],
+            "puerto": entrega["puerto"]
         }
         
-        return estacion_actualizada
+        return RespuestaJSON(estacion_actualizada)
     
     except HTTPException:
         raise
@@ -227,15 +313,82 @@ async def actualizar_precios_estacion(id_estacion: int, precios: PreciosUpdate):
         )
 
 
+@app.get("/api/estaciones/{id_estacion}/precios-vigentes", response_model=Dict[str, Any])
+async def obtener_precios_vigentes_estacion(id_estacion: int, version_actual: int = 0):
+    """
+    Retorna solo el último conjunto de precios de una estación y su versión
+    
+    Pensado para que una estación atrasada (por ejemplo, tras reiniciarse) se
+    ponga al día: si version_actual ya es la vigente responde 204 sin cuerpo
+    """
+    vigentes = await obtener_precios_vigentes(id_estacion)
+    
+    if not vigentes:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Estación con ID {id_estacion} no encontrada"
+        )
+    
+    if vigentes["version"] <= version_actual:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    
+    return RespuestaJSON(vigentes)
+
+
+@app.get("/api/estaciones/{id_estacion}/entrega", response_model=Dict[str, Any])
+async def obtener_entrega_estacion(id_estacion: int):
+    """
+    Obtiene el estado de entrega de los últimos precios de una estación
+    
+    Estados: pendiente, reintentando, entregado
+    """
+    entrega = await obtener_entrega(id_estacion)
+    
+    if not entrega:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No hay entregas registradas para la estación {id_estacion}"
+        )
+    
+    return entrega
+
+
+@app.get("/api/entregas", response_model=List[Dict[str, Any]])
+async def listar_entregas_precios(estado: Optional[str] = None):
+    """
+    Lista el estado de entrega de precios de todas las estaciones
+    
+    Útil para ver qué estaciones aún no reciben la última actualización
+    """
+    try:
+        return RespuestaJSON(await listar_entregas(estado))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener entregas: {str(e)}"
+        )
+
+
 @app.get("/api/estaciones/{id_estacion}/historico", response_model=List[Dict[str, Any]])
-async def obtener_historico(id_estacion: int):
+async def obtener_historico(
+    id_estacion: int,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    skip: int = Query(0, ge=0),
+    orden: str = Query("desc", pattern="^(asc|desc)$")
+):
     """
     Obtiene el historial de precios de una estación
     
-    Retorna una lista ordenada cronológicamente con todos los cambios de precios
+    - Filtra opcionalmente por rango de fechas (desde / hasta)
+    - Pagina con limit / skip
+    - Ordena por fecha (por defecto los cambios más recientes primero)
     """
     try:
-        historico = await obtener_historico_precios(id_estacion)
+        historico = await obtener_historico_precios(
+            id_estacion, desde, hasta, limit, skip, orden
+        )
         
         if historico is None:
             raise HTTPException(
@@ -243,7 +396,7 @@ async def obtener_historico(id_estacion: int):
                 detail=f"Estación con ID {id_estacion} no encontrada"
             )
         
-        return historico
+        return RespuestaJSON(historico)
     
     except HTTPException:
         raise
@@ -271,21 +424,425 @@ async def obtener_estadisticas_sistema():
         )
 
 
+@app.get("/api/dashboard", response_model=Dict[str, Any])
+async def obtener_dashboard(limit: int = Query(6, ge=0, le=100)):
+    """
+    Obtiene en una sola petición las estadísticas y un resumen de estaciones
+    
+    Pensado para el panel principal: las estadísticas salen de los contadores
+    mantenidos en cada escritura y las estaciones solo traen los campos que
+    se muestran en las tarjetas
+    """
+    try:
+        return RespuestaJSON(await obtener_panel(limit))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener dashboard: {str(e)}"
+        )
+
+
+@app.get("/api/eventos")
+async def eventos_dashboard(
+    request: Request,
+    limit: int = Query(6, ge=0, le=100),
+    ultimo_id: Optional[str] = None
+):
+    """
+    Flujo Server-Sent Events del panel principal
+    
+    - Al conectar envía el evento "foto" (el mismo contenido que /api/dashboard)
+    - Luego envía eventos incrementales: estacion_creada, estacion_actualizada,
+      estacion_eliminada, precios_actualizados, precios_confirmados, entrega,
+      liveness, estadisticas y resincronizar (volver a pedir la foto)
+    - Al reconectar, el navegador envía Last-Event-ID y solo se reenvían
+      los eventos perdidos; ultimo_id permite lo mismo sin EventSource
+    - Sin cambios solo viaja un comentario keep-alive periódico
+    """
+    return StreamingResponse(
+        flujo_sse(
+            lambda: obtener_panel(limit),
+            request.headers.get("last-event-id") or ultimo_id,
+            request.is_disconnected
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/eventos/estado", response_model=Dict[str, Any])
+async def estado_eventos():
+    """
+    Estado del bus de eventos del panel: último ID, historial y suscriptores,
+    junto con el modo del despachador
+    """
+    return {**bus.estadisticas(), "despachador": estado_despachador()}
+
+
 @app.get("/api/estaciones-activas", response_model=Dict[str, Any])
 async def listar_estaciones_activas():
     """
     Obtiene el estado de conexión TCP de las estaciones
     
-    Muestra qué estaciones han sido contactadas recientemente y su estado
+    Muestra qué estaciones han sido contactadas recientemente y su estado,
+    junto con las estadísticas de cada conexión persistente del pool
     """
     try:
-        activas = obtener_estaciones_activas()
-        return {
-            "total": len(activas),
-            "estaciones": activas
-        }
+        return await ejecutar("estaciones_activas")
+    except DespachadorNoDisponible:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al obtener estaciones activas: {str(e)}"
         )
+
+
+@app.get("/api/relay", response_model=Dict[str, Any])
+async def estadisticas_relay():
+    """
+    Obtiene el estado del relay TCP (pub/sub)
+    
+    Muestra los clientes suscritos, sus tópicos, la profundidad de su cola
+    de salida y los mensajes descartados por consumo lento
+    """
+    return await ejecutar("estadisticas_relay")
+
+
+@app.get("/api/pasarela", response_model=Dict[str, Any])
+async def obtener_estado_pasarela():
+    """
+    Estado de la pasarela socket.io: frontends conectados y surtidores conocidos
+    """
+    return await ejecutar("estado_pasarela")
+
+
+@app.get("/api/liveness", response_model=Dict[str, Any])
+async def obtener_estado_liveness():
+    """
+    Estado de la verificación de conectividad de las estaciones
+    
+    Muestra la configuración (intervalo, timeout, umbrales de histéresis)
+    y el resumen del último barrido
+    """
+    return await ejecutar("estado_liveness")
+
+
+@app.get("/api/cache", response_model=Dict[str, Any])
+async def obtener_estado_cache():
+    """
+    Estado del caché de estaciones: entradas, aciertos, fallos y desalojos
+    """
+    return cache_estaciones.estadisticas()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def obtener_metricas():
+    """
+    Métricas en formato de texto de Prometheus: mensajes por tipo,
+    conexiones, colas de salida y latencias (HTTP por ruta, MongoDB por
+    comando, envíos de precios)
+    """
+    return Response(exponer(), media_type=TIPO_CONTENIDO)
+
+
+@app.get("/api/logs", response_model=Dict[str, Any])
+async def obtener_estado_logs():
+    """
+    Configuración del registro de eventos: niveles por subsistema, muestreo
+    y estado de la cola de escritura (incluye registros descartados)
+    """
+    return estado_bitacora()
+
+
+@app.put("/api/logs/niveles", response_model=Dict[str, str])
+async def cambiar_niveles_logs(niveles: Dict[str, str]):
+    """
+    Cambia en caliente el nivel de log de uno o más subsistemas
+
+    Ejemplo: {"tcp": "DEBUG", "pool": "WARNING"}; la clave "*" cambia el
+    nivel por defecto
+    """
+    try:
+        return configurar_niveles(niveles)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+# ============================================
+# ENDPOINTS DE DESPLIEGUE MASIVO DE PRECIOS
+# ============================================
+
+@app.post("/api/rollouts", response_model=Dict[str, Any], status_code=status.HTTP_202_ACCEPTED)
+async def crear_rollout_precios(datos: RolloutCreate):
+    """
+    Lanza un despliegue de precios a varias estaciones en paralelo
+    
+    - Selecciona estaciones por ID y/o estado (por defecto todas)
+    - Envía con un máximo de envíos TCP simultáneos (concurrencia)
+    - Opcionalmente prueba primero un canary y continúa por oleadas
+    - Retorna inmediatamente; el progreso se consulta en /api/rollouts/{id}
+    """
+    try:
+        return await ejecutar("crear_rollout", datos=datos.model_dump(mode="json"))
+    
+    except DespachadorNoDisponible:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al crear despliegue: {str(e)}"
+        )
+
+
+@app.get("/api/rollouts", response_model=List[Dict[str, Any]])
+async def listar_rollouts_precios():
+    """
+    Lista los despliegues de precios recientes con su progreso
+    """
+    return RespuestaJSON(await ejecutar("listar_rollouts"))
+
+
+@app.get("/api/rollouts/{id_rollout}", response_model=Dict[str, Any])
+async def obtener_rollout_precios(id_rollout: str):
+    """
+    Obtiene el progreso de un despliegue, con el detalle por estación
+    """
+    rollout = await ejecutar("obtener_rollout", id_rollout=id_rollout)
+    
+    if not rollout:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Despliegue {id_rollout} no encontrado"
+        )
+    
+    return RespuestaJSON(rollout)
+
+
+# ============================================
+# ENDPOINTS DE PRECIOS PROGRAMADOS
+# ============================================
+
+@app.post("/api/programaciones", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
+async def crear_programacion_precios(datos: ProgramacionPreciosCreate):
+    """
+    Programa un cambio de precios para una fecha futura
+    
+    - Al llegar la fecha se lanza un despliegue a las estaciones seleccionadas
+    - Con intervalo_dias se repite periódicamente (ej: 7 = cada semana)
+    """
+    try:
+        return await ejecutar("crear_programacion", datos=datos.model_dump(mode="json"))
+    
+    except DespachadorNoDisponible:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al programar precios: {str(e)}"
+        )
+
+
+@app.get("/api/programaciones", response_model=List[Dict[str, Any]])
+async def listar_programaciones(estado: Optional[str] = None):
+    """
+    Lista los cambios de precios programados (pendiente, aplicado, cancelado)
+    """
+    try:
+        return RespuestaJSON(await obtener_programaciones(estado))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener programaciones: {str(e)}"
+        )
+
+
+@app.get("/api/programaciones/{id_programacion}", response_model=Dict[str, Any])
+async def obtener_programacion_precios(id_programacion: int):
+    """
+    Obtiene una programación con el historial de sus ejecuciones
+    """
+    programacion = await obtener_programacion(id_programacion)
+    
+    if not programacion:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Programación {id_programacion} no encontrada"
+        )
+    
+    return programacion
+
+
+@app.delete("/api/programaciones/{id_programacion}", response_model=Dict[str, Any])
+async def cancelar_programacion_precios(id_programacion: int):
+    """
+    Cancela una programación pendiente
+    """
+    programacion = await ejecutar("cancelar_programacion", id_programacion=id_programacion)
+    
+    if not programacion:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Programación {id_programacion} no encontrada o no está pendiente"
+        )
+    
+    return programacion
+
+
+# ============================================
+# ENDPOINTS DE IMPORTACIÓN / EXPORTACIÓN MASIVA
+# ============================================
+
+TIPOS_CONTENIDO = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+@app.post("/api/importar/estaciones", response_model=Dict[str, Any])
+async def importar_estaciones_masivo(
+    request: Request,
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$")
+):
+    """
+    Importa estaciones desde el cuerpo de la petición (NDJSON o CSV)
+    
+    - El cuerpo se procesa a medida que llega y se escribe por lotes
+    - Columnas CSV: nombre, ip, puerto, estado, precio_93, precio_95, precio_97, precio_diesel
+    - Retorna las filas importadas y los errores por número de línea
+    """
+    try:
+        return await importar_estaciones(request.stream(), formato)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al importar estaciones: {str(e)}"
+        )
+
+
+@app.post("/api/importar/historico", response_model=Dict[str, Any])
+async def importar_historico_masivo(
+    request: Request,
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$")
+):
+    """
+    Importa muestras del historial de precios (NDJSON o CSV)
+    
+    - Columnas CSV: id_estacion, timestamp, precio_93, precio_95, precio_97, precio_diesel
+    - Las filas de estaciones inexistentes se informan como error
+    """
+    try:
+        return await importar_historico(request.stream(), formato)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al importar historial: {str(e)}"
+        )
+
+
+@app.get("/api/exportar/estaciones")
+async def exportar_estaciones_masivo(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    estado: Optional[str] = None
+):
+    """
+    Exporta todas las estaciones en streaming (NDJSON o CSV)
+    """
+    return StreamingResponse(
+        exportar_estaciones(formato, estado),
+        media_type=TIPOS_CONTENIDO[formato],
+        headers={"Content-Disposition": f'attachment; filename="estaciones.{formato}"'}
+    )
+
+
+@app.get("/api/exportar/historico")
+async def exportar_historico_masivo(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    id_estacion: Optional[int] = None
+):
+    """
+    Exporta el historial de precios en streaming, una muestra por línea
+    """
+    return StreamingResponse(
+        exportar_historico(formato, id_estacion),
+        media_type=TIPOS_CONTENIDO[formato],
+        headers={"Content-Disposition": f'attachment; filename="historico.{formato}"'}
+    )
+
+
+# ============================================
+# ENDPOINTS DE ANALÍTICA DE PRECIOS
+# ============================================
+
+@app.get("/api/analitica/resumen", response_model=Dict[str, Any])
+async def analitica_resumen():
+    """
+    Estadísticos de la red sobre los precios vigentes
+    
+    Mínimo, máximo, media, mediana y desviación por combustible, más el
+    diferencial entre combustibles (95-93, 97-95, 97-93, 93-diesel)
+    """
+    try:
+        return RespuestaJSON(await obtener_resumen_red())
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al calcular analítica: {str(e)}"
+        )
+
+
+@app.get("/api/analitica/desviaciones", response_model=Dict[str, Any])
+async def analitica_desviaciones(
+    combustible: str = "precio_95",
+    limit: int = Query(50, ge=1, le=10000),
+    orden: str = Query("abs", pattern="^(abs|caras|baratas)$")
+):
+    """
+    Estaciones ordenadas por su desviación respecto del promedio de la red
+    
+    Incluye la diferencia en pesos, en porcentaje y el puntaje z
+    """
+    try:
+        return RespuestaJSON(await obtener_desviaciones(combustible, limit, orden))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al calcular analítica: {str(e)}"
+        )
+
+
+@app.get("/api/analitica/serie", response_model=Dict[str, Any])
+async def analitica_serie(dias: int = Query(365, ge=2, le=3650)):
+    """
+    Serie diaria de precios de la red (mínimo, media y máximo por combustible)
+    y su volatilidad, con los precios de cada estación alineados por día
+    """
+    try:
+        return RespuestaJSON(await obtener_serie_red(dias))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al calcular analítica: {str(e)}"
+        )
@@ -1,11 +1,21 @@
 """
 Modelos Pydantic para el sistema de gestión de estaciones
 """
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 
 
+def hora_local(fecha: Optional[datetime]) -> Optional[datetime]:
+    """
+    Convierte una fecha con zona horaria (ej: "...Z" o "...-03:00") a la
+    hora local sin zona, que es como se guardan y comparan las fechas
+    """
+    if fecha is None or fecha.tzinfo is None:
+        return fecha
+    return fecha.astimezone().replace(tzinfo=None)
+
+
 class PreciosModel(BaseModel):
     """Modelo para los precios de combustibles"""
     precio_93: int = Field(..., ge=0, description="Precio de gasolina 93 octanos")
@@ -99,6 +109,18 @@ class EstacionCreate(BaseModel):
         }
 
 
+class EstacionImportacion(EstacionCreate):
+    """Fila de una importación masiva de estaciones"""
+    estado: Literal["Activa", "Inactiva", "Desconectada"] = Field(default="Activa", description="Estado inicial")
+
+
+class MuestraHistoricoImportacion(BaseModel):
+    """Fila de una importación masiva del historial de precios"""
+    id_estacion: int = Field(..., ge=1, description="ID de la estación")
+    timestamp: datetime = Field(..., description="Momento del cambio de precios")
+    precios: PreciosModel
+
+
 class EstacionUpdate(BaseModel):
     """Modelo para actualizar datos generales de una estación"""
     nombre: Optional[str] = Field(None, min_length=1, max_length=200, description="Nombre de la estación")
@@ -151,3 +173,65 @@ class EstacionResponse(BaseModel):
                 }
             }
         }
+
+
+class RolloutCreate(BaseModel):
+    """Modelo para lanzar un despliegue masivo de precios a varias estaciones"""
+    precios: Optional[PreciosModel] = Field(None, description="Precios comunes para todas las estaciones seleccionadas")
+    precios_por_estacion: Optional[Dict[int, PreciosModel]] = Field(
+        None,
+        description="Precios específicos por id_estacion (tienen prioridad sobre 'precios')"
+    )
+    estaciones: Optional[List[int]] = Field(None, description="IDs de estaciones a incluir (None = todas)")
+    estado: Optional[str] = Field(None, description="Filtrar estaciones por estado (Activa, Inactiva, Desconectada)")
+    concurrencia: int = Field(default=20, ge=1, le=500, description="Máximo de envíos TCP simultáneos")
+    canary: int = Field(default=0, ge=0, description="Cantidad de estaciones de prueba antes del resto")
+    tamano_oleada: Optional[int] = Field(None, ge=1, description="Tamaño de cada oleada (None = una sola oleada)")
+    max_fallos_canary: int = Field(default=0, ge=0, description="Fallos tolerados en el canary antes de abortar")
+    timeout: float = Field(default=5.0, gt=0, le=30, description="Timeout de conexión TCP por estación (segundos)")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "precios": {
+                    "precio_93": 1300,
+                    "precio_95": 1360,
+                    "precio_97": 1410,
+                    "precio_diesel": 1130
+                },
+                "estado": "Activa",
+                "concurrencia": 50,
+                "canary": 5,
+                "tamano_oleada": 100
+            }
+        }
+
+
+class ProgramacionPreciosCreate(BaseModel):
+    """Modelo para programar un cambio de precios en una fecha futura"""
+    fecha_aplicacion: datetime = Field(..., description="Fecha y hora en que se aplican los precios")
+    precios: PreciosModel
+    estaciones: Optional[List[int]] = Field(None, description="IDs de estaciones (None = todas)")
+    estado: Optional[str] = Field(None, description="Aplicar solo a estaciones con este estado")
+    intervalo_dias: Optional[int] = Field(None, ge=1, description="Repetir cada N días (ej: 7 = semanal)")
+    concurrencia: int = Field(default=20, ge=1, le=500, description="Máximo de envíos TCP simultáneos al aplicar")
+
+    @field_validator("fecha_aplicacion")
+    @classmethod
+    def _fecha_local(cls, fecha: datetime) -> datetime:
+        return hora_local(fecha)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "fecha_aplicacion": "2025-11-13T00:00:00",
+                "precios": {
+                    "precio_93": 1300,
+                    "precio_95": 1360,
+                    "precio_97": 1410,
+                    "precio_diesel": 1130
+                },
+                "estaciones": None,
+                "intervalo_dias": 7
+            }
+        }
@@ -0,0 +1,235 @@
+"""
+Pasarela socket.io hacia los frontends
+Reemplaza a tcp_bridge.js: corre en el mismo loop que la API y los
+servidores TCP y recibe los eventos directamente de quien los produce, en
+lugar de leerlos del puerto 5000 y volver a parsear cada línea en otro
+proceso. Conserva el puerto y los nombres de evento del bridge:
+
+    estadoSurtidores      Lista de surtidores (al conectar y en cada cambio)
+    actualizacionPrecios  Precios vigentes (al conectar, si hay una función
+                          registrada con al_conectar, y al cambiar)
+    actualizacionNombre   Nombre de la estación cuando la Empresa lo cambia
+    nuevaTransaccion      Transacción recién guardada
+
+Los productores no esperan a los frontends: cada emisión corre en su propia
+tarea y, sin frontends conectados, no se serializa nada. Las ráfagas de
+estados de surtidores se agrupan en una emisión por WS_INTERVALO_ESTADO.
+
+Variables de entorno:
+    WS_HABILITADO: Levantar la pasarela (true/false). Default true
+    WS_HOST: Interfaz en que escucha. Default 0.0.0.0
+    WS_PUERTO: Puerto socket.io. Default 4000
+    WS_ORIGENES: Orígenes CORS separados por coma.
+        Default http://localhost:3000,http://localhost:3001
+    WS_INTERVALO_ESTADO: Segundos en que se agrupan los cambios de estado
+        de surtidores. Default 0.1
+"""
+import asyncio
+import contextlib
+import os
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import socketio
+import uvicorn
+
+from bitacora import obtener_registrador
+from metricas import contador, medidor
+
+log = obtener_registrador("pasarela")
+
+HABILITADA = os.getenv("WS_HABILITADO", "true").lower() == "true"
+HOST = os.getenv("WS_HOST", "0.0.0.0")
+PUERTO = int(os.getenv("WS_PUERTO", "4000"))
+ORIGENES = [
+    origen.strip()
+    for origen in os.getenv("WS_ORIGENES", "http://localhost:3000,http://localhost:3001").split(",")
+    if origen.strip()
+]
+INTERVALO_ESTADO = float(os.getenv("WS_INTERVALO_ESTADO", "0.1"))
+
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins=ORIGENES)
+
+# Último estado de cada surtidor, en el formato que espera el frontend
+surtidores: Dict[Any, Dict[str, Any]] = {}
+
+_clientes: Set[str] = set()
+_al_conectar: List[Callable[[], Optional[Tuple[str, Any]]]] = []
+_tareas: Set[asyncio.Task] = set()
+_estado_pendiente = False
+_servidor: Optional[uvicorn.Server] = None
+
+eventos_emitidos = contador(
+    "pasarela_ws_eventos_total",
+    "Eventos emitidos a los frontends por la pasarela socket.io",
+    ("evento",)
+)
+medidor("pasarela_ws_clientes", "Frontends conectados a la pasarela socket.io",
+        funcion=lambda: len(_clientes))
+
+
+def _en_segundo_plano(corrutina):
+    tarea = asyncio.create_task(corrutina)
+    _tareas.add(tarea)
+    tarea.add_done_callback(_tareas.discard)
+
+
+@sio.event
+async def connect(sid, environ):
+    _clientes.add(sid)
+    log.debug("Frontend conectado", sid=sid, clientes=len(_clientes))
+
+    # Estado actual apenas se conecta
+    await sio.emit("estadoSurtidores", list(surtidores.values()), to=sid)
+    for funcion in _al_conectar:
+        evento = funcion()
+        if evento is not None:
+            await sio.emit(evento[0], evento[1], to=sid)
+
+
+@sio.event
+async def disconnect(sid, *args):
+    _clientes.discard(sid)
+    log.debug("Frontend desconectado", sid=sid, clientes=len(_clientes))
+
+
+def al_conectar(funcion: Callable[[], Optional[Tuple[str, Any]]]):
+    """
+    Registra una función que entrega un evento inicial a cada frontend nuevo
+
+    Args:
+        funcion: Retorna (evento, datos) o None para no enviar nada
+    """
+    _al_conectar.append(funcion)
+
+
+def _emitir(evento: str, datos: Any):
+    if not _clientes:
+        return
+    _en_segundo_plano(sio.emit(evento, datos))
+    eventos_emitidos.inc(evento)
+
+
+async def _emitir_estado():
+    global _estado_pendiente
+    await asyncio.sleep(INTERVALO_ESTADO)
+    _estado_pendiente = False
+    if _clientes:
+        await sio.emit("estadoSurtidores", list(surtidores.values()))
+        eventos_emitidos.inc("estadoSurtidores")
+
+
+# ============================================
+# PRODUCTORES
+# ============================================
+
+def actualizar_surtidor(mensaje: Dict[str, Any]):
+    """
+    Registra el estado de un surtidor y lo informa a los frontends
+
+    Args:
+        mensaje: Estado tal como llega al relay TCP (id, nombre, estado,
+            precio_93...); los mensajes con otro "tipo" se ignoran
+    """
+    global _estado_pendiente
+    if mensaje.get("tipo", "estado") != "estado" or "id" not in mensaje:
+        return
+
+    surtidores[mensaje["id"]] = {
+        "id": mensaje["id"],
+        "nombre": mensaje.get("nombre"),
+        "estado": mensaje.get("estado"),
+        "precios": {
+            "gasolina93": mensaje.get("precio_93"),
+            "gasolina95": mensaje.get("precio_95"),
+            "gasolina97": mensaje.get("precio_97"),
+            "diesel": mensaje.get("precio_diesel")
+        }
+    }
+
+    if _estado_pendiente or not _clientes:
+        return
+    _estado_pendiente = True
+    _en_segundo_plano(_emitir_estado())
+
+
+def publicar_precios(precios: Dict[str, int], nombre: Optional[str] = None):
+    """
+    Informa los precios vigentes y, si cambió, el nombre de la estación
+
+    Args:
+        precios: Precios completos (precio_93, precio_95, precio_97, precio_diesel)
+        nombre: Nombre nuevo de la estación (None = sin cambio)
+    """
+    _emitir("actualizacionPrecios", dict(precios))
+    if nombre:
+        _emitir("actualizacionNombre", nombre)
+
+
+def publicar_transaccion(transaccion: Dict[str, Any]):
+    """
+    Informa una transacción recién guardada
+
+    Args:
+        transaccion: Transacción serializable a JSON (fechas como texto ISO)
+    """
+    _emitir("nuevaTransaccion", transaccion)
+
+
+# ============================================
+# SERVIDOR
+# ============================================
+
+class _ServidorCompartido(uvicorn.Server):
+    """Servidor uvicorn dentro del loop de la aplicación: las señales las atiende el servidor principal"""
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+async def _servir(servidor: uvicorn.Server):
+    try:
+        await servidor.serve()
+    except SystemExit:
+        # uvicorn sale así si no puede abrir el puerto; la API sigue funcionando
+        log.error("No se pudo iniciar la pasarela socket.io", host=HOST, puerto=PUERTO)
+
+
+async def iniciar():
+    """Levanta la pasarela en el puerto WS_PUERTO, en el loop actual"""
+    global _servidor
+    if not HABILITADA:
+        log.info("Pasarela socket.io deshabilitada")
+        return
+    if _servidor is not None:
+        return
+
+    config = uvicorn.Config(
+        socketio.ASGIApp(sio),
+        host=HOST,
+        port=PUERTO,
+        lifespan="off",
+        access_log=False,
+        log_config=None
+    )
+    _servidor = _ServidorCompartido(config)
+    _en_segundo_plano(_servir(_servidor))
+    log.info("Pasarela socket.io iniciada", host=HOST, puerto=PUERTO)
+
+
+async def detener():
+    """Cierra la pasarela y las conexiones de los frontends"""
+    global _servidor
+    if _servidor is None:
+        return
+    _servidor.should_exit = True
+    _servidor = None
+
+
+def estadisticas() -> Dict[str, Any]:
+    return {
+        "habilitada": HABILITADA,
+        "puerto": PUERTO,
+        "clientes": len(_clientes),
+        "surtidores": len(surtidores)
+    }
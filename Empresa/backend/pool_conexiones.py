@@ -0,0 +1,288 @@
+"""
+Pool de conexiones TCP persistentes hacia las estaciones
+Mantiene una conexión de larga duración por cada ip:puerto que se reutiliza
+entre envíos de precios, con chequeo de salud, cierre por inactividad,
+reconexión con backoff exponencial y estadísticas por conexión.
+Los acuses de recibo de precios (ack_precios) que la estación responde por
+la misma conexión se entregan al manejador de mensajes del pool.
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from bitacora import obtener_registrador
+
+log = obtener_registrador("pool")
+
+# Segundos sin uso antes de cerrar una conexión
+IDLE_TIMEOUT = float(os.getenv("POOL_IDLE_TIMEOUT", "300"))
+# Intervalo del chequeo de salud / limpieza de conexiones inactivas
+INTERVALO_MANTENCION = float(os.getenv("POOL_INTERVALO_MANTENCION", "30"))
+# Backoff exponencial entre reintentos de conexión fallidos
+BACKOFF_INICIAL = float(os.getenv("POOL_BACKOFF_INICIAL", "0.5"))
+BACKOFF_MAXIMO = float(os.getenv("POOL_BACKOFF_MAXIMO", "30"))
+
+# Tipos de mensaje de la estación que se entregan al manejador (el resto se descarta)
+TIPOS_ENTRANTES = (b"ack_precios",)
+
+ManejadorMensajes = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class ConexionEnEspera(Exception):
+    """La estación falló recientemente y aún no corresponde reintentar"""
+
+
+class ConexionEstacion:
+    """Conexión persistente hacia una estación (ip:puerto)"""
+
+    def __init__(self, ip: str, puerto: int, manejador: Optional[ManejadorMensajes] = None):
+        self.ip = ip
+        self.puerto = puerto
+        self.manejador = manejador
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.lock = asyncio.Lock()
+        self._tarea_lectura: Optional[asyncio.Task] = None
+
+        # Estadísticas
+        self.fecha_creacion = datetime.now()
+        self.ultimo_uso = time.monotonic()
+        self.ultima_conexion: Optional[datetime] = None
+        self.mensajes_enviados = 0
+        self.mensajes_recibidos = 0
+        self.bytes_enviados = 0
+        self.conexiones_abiertas = 0
+        self.fallos_totales = 0
+        self.fallos_consecutivos = 0
+        self.proximo_intento = 0.0
+        self.ultimo_error: Optional[str] = None
+
+    @property
+    def clave(self) -> str:
+        return f"{self.ip}:{self.puerto}"
+
+    def esta_abierta(self) -> bool:
+        """Indica si la conexión está establecida y el socket sigue vivo"""
+        return (
+            self.writer is not None
+            and not self.writer.is_closing()
+            and self.reader is not None
+            and not self.reader.at_eof()
+        )
+
+    async def _conectar(self, timeout: float):
+        """Abre una nueva conexión respetando el backoff de fallos previos"""
+        ahora = time.monotonic()
+        if self.fallos_consecutivos and ahora < self.proximo_intento:
+            espera = round(self.proximo_intento - ahora, 1)
+            raise ConexionEnEspera(f"Reintento a {self.clave} en {espera}s")
+
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ip, self.puerto),
+                timeout=timeout
+            )
+        except Exception as e:
+            self._registrar_fallo(e)
+            raise
+
+        self.conexiones_abiertas += 1
+        self.ultima_conexion = datetime.now()
+        self._tarea_lectura = asyncio.create_task(self._consumir_entrada(self.reader))
+
+    async def _consumir_entrada(self, reader: asyncio.StreamReader):
+        """
+        Lee lo que envía la estación por esta conexión.
+        La estación reenvía sus eventos a todos sus clientes TCP; si no se
+        leen, su buffer se llena y se bloquea. Solo se decodifican las
+        líneas de los tipos en TIPOS_ENTRANTES (acuses de recibo); el resto
+        se descarta sin parsear. Al detectar EOF la conexión queda marcada
+        como cerrada para que el próximo envío reconecte.
+        """
+        try:
+            while True:
+                try:
+                    linea = await reader.readline()
+                except ValueError:
+                    # Línea más larga que el límite del buffer: se descarta
+                    continue
+                if not linea:
+                    break
+
+                if self.manejador is None or not any(t in linea for t in TIPOS_ENTRANTES):
+                    continue
+
+                try:
+                    mensaje = json.loads(linea)
+                except ValueError:
+                    continue
+
+                self.mensajes_recibidos += 1
+                try:
+                    await self.manejador(mensaje)
+                except Exception as e:
+                    log.warning("Error procesando mensaje de estación", estacion=self.clave, error=str(e))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+
+    def _registrar_fallo(self, error: Exception):
+        """Actualiza contadores y calcula el próximo reintento permitido"""
+        self.fallos_totales += 1
+        self.fallos_consecutivos += 1
+        self.ultimo_error = f"{type(error).__name__}: {error}"
+        backoff = min(BACKOFF_INICIAL * (2 ** (self.fallos_consecutivos - 1)), BACKOFF_MAXIMO)
+        self.proximo_intento = time.monotonic() + backoff
+
+    async def enviar(self, data: bytes, timeout: float):
+        """
+        Envía datos por la conexión, reconectando si es necesario.
+        Si la conexión reutilizada resulta estar rota se reintenta una
+        única vez con una conexión nueva.
+        """
+        async with self.lock:
+            self.ultimo_uso = time.monotonic()
+            reutilizada = self.esta_abierta()
+
+            for intento in range(2):
+                if not self.esta_abierta():
+                    await self.cerrar()
+                    await self._conectar(timeout)
+                    reutilizada = False
+
+                try:
+                    self.writer.write(data)
+                    await asyncio.wait_for(self.writer.drain(), timeout=timeout)
+                except Exception as e:
+                    await self.cerrar()
+                    if reutilizada and intento == 0:
+                        continue
+                    self._registrar_fallo(e)
+                    raise
+
+                self.mensajes_enviados += 1
+                self.bytes_enviados += len(data)
+                self.fallos_consecutivos = 0
+                self.ultimo_error = None
+                return
+
+    async def cerrar(self):
+        """Cierra la conexión actual (si existe)"""
+        if self._tarea_lectura:
+            self._tarea_lectura.cancel()
+            self._tarea_lectura = None
+
+        writer, self.writer, self.reader = self.writer, None, None
+        if writer:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Retorna las estadísticas de la conexión"""
+        ahora = time.monotonic()
+        return {
+            "ip": self.ip,
+            "puerto": self.puerto,
+            "abierta": self.esta_abierta(),
+            "fecha_creacion": self.fecha_creacion.isoformat(),
+            "ultima_conexion": self.ultima_conexion.isoformat() if self.ultima_conexion else None,
+            "segundos_inactiva": round(ahora - self.ultimo_uso, 1),
+            "mensajes_enviados": self.mensajes_enviados,
+            "mensajes_recibidos": self.mensajes_recibidos,
+            "bytes_enviados": self.bytes_enviados,
+            "conexiones_abiertas": self.conexiones_abiertas,
+            "fallos_totales": self.fallos_totales,
+            "fallos_consecutivos": self.fallos_consecutivos,
+            "reintento_en": round(max(self.proximo_intento - ahora, 0), 1) if self.fallos_consecutivos else 0,
+            "ultimo_error": self.ultimo_error
+        }
+
+
+class PoolConexiones:
+    """Pool de conexiones persistentes indexado por ip:puerto"""
+
+    def __init__(self):
+        self.conexiones: Dict[str, ConexionEstacion] = {}
+        self._tarea_mantencion: Optional[asyncio.Task] = None
+        self.manejador_mensajes: Optional[ManejadorMensajes] = None
+
+    def al_recibir(self, manejador: ManejadorMensajes):
+        """Registra la corrutina que procesa los mensajes recibidos de las estaciones"""
+        self.manejador_mensajes = manejador
+        for conexion in self.conexiones.values():
+            conexion.manejador = manejador
+
+    def _obtener(self, ip: str, puerto: int) -> ConexionEstacion:
+        clave = f"{ip}:{puerto}"
+        conexion = self.conexiones.get(clave)
+        if conexion is None:
+            conexion = ConexionEstacion(ip, puerto, self.manejador_mensajes)
+            self.conexiones[clave] = conexion
+        return conexion
+
+    async def enviar(self, ip: str, puerto: int, data: bytes, timeout: float = 5.0):
+        """
+        Envía datos a una estación reutilizando su conexión persistente
+
+        Args:
+            ip: Dirección IP de la estación
+            puerto: Puerto TCP de la estación
+            data: Bytes a enviar (mensaje JSON terminado en \\n)
+            timeout: Segundos máximos para conectar y para vaciar el buffer
+
+        Raises:
+            ConexionEnEspera: Si la estación está en periodo de backoff
+            asyncio.TimeoutError, OSError: Si falla la conexión o el envío
+        """
+        await self._obtener(ip, puerto).enviar(data, timeout)
+
+    def conexion_abierta(self, ip: str, puerto: int) -> bool:
+        """Indica si hay una conexión persistente viva hacia la estación"""
+        conexion = self.conexiones.get(f"{ip}:{puerto}")
+        return conexion is not None and conexion.esta_abierta()
+
+    async def _mantencion(self):
+        """Cierra conexiones inactivas o rotas y descarta entradas sin uso"""
+        while True:
+            await asyncio.sleep(INTERVALO_MANTENCION)
+            ahora = time.monotonic()
+
+            for clave, conexion in list(self.conexiones.items()):
+                if conexion.lock.locked():
+                    continue
+
+                inactiva = ahora - conexion.ultimo_uso > IDLE_TIMEOUT
+                if inactiva or (conexion.writer is not None and not conexion.esta_abierta()):
+                    await conexion.cerrar()
+
+                # Olvidar por completo las estaciones que no se usan hace mucho
+                if inactiva and ahora - conexion.ultimo_uso > IDLE_TIMEOUT * 4:
+                    self.conexiones.pop(clave, None)
+
+    def iniciar(self):
+        """Inicia la tarea periódica de mantención del pool"""
+        if self._tarea_mantencion is None:
+            self._tarea_mantencion = asyncio.create_task(self._mantencion())
+
+    async def cerrar(self):
+        """Detiene la mantención y cierra todas las conexiones"""
+        if self._tarea_mantencion:
+            self._tarea_mantencion.cancel()
+            self._tarea_mantencion = None
+
+        for conexion in list(self.conexiones.values()):
+            await conexion.cerrar()
+
+    def estadisticas(self) -> Dict[str, Dict[str, Any]]:
+        """Retorna las estadísticas de todas las conexiones del pool"""
+        return {clave: c.estadisticas() for clave, c in self.conexiones.items()}
+
+
+# Pool global usado por el servidor TCP
+pool_estaciones = PoolConexiones()
@@ -0,0 +1,241 @@
+"""
+Cambios de precios programados
+Las programaciones se guardan en la colección precios_programados y, al
+iniciar, se cargan en un heap ordenado por fecha de aplicación. Una única
+tarea duerme hasta la programación más próxima (o hasta que se agregue o
+cancele una), de modo que miles de programaciones pendientes no requieren
+consultar la base de datos cada segundo. Al vencer, los precios se aplican
+como un despliegue masivo (rollout_service), que persiste los precios y
+los envía a las estaciones por la ruta TCP habitual.
+"""
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ReturnDocument
+from database import db, programaciones_collection
+from models import ProgramacionPreciosCreate, RolloutCreate
+from rollout_service import crear_rollout
+from secuencias import siguiente_id
+from bitacora import obtener_registrador
+from metricas import medidor
+
+log = obtener_registrador("programacion")
+
+SECUENCIA_PROGRAMACIONES = "programaciones"
+
+
+class ProgramadorPrecios:
+    """Planificador en memoria basado en un heap de (fecha, id)"""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        # Fecha vigente de cada programación pendiente; las entradas del heap
+        # que no coinciden (canceladas o reprogramadas) se descartan al salir
+        self._vigentes: Dict[int, datetime] = {}
+        self._cambio = asyncio.Event()
+        self._tarea: Optional[asyncio.Task] = None
+
+    def agregar(self, id_programacion: int, fecha: datetime):
+        self._vigentes[id_programacion] = fecha
+        heapq.heappush(self._heap, (fecha, id_programacion))
+        self._cambio.set()
+
+    def quitar(self, id_programacion: int):
+        if self._vigentes.pop(id_programacion, None) is not None:
+            self._cambio.set()
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._vigentes)
+
+    def _descartar_obsoletas(self):
+        while self._heap and self._vigentes.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    async def _ejecutar(self):
+        while True:
+            self._cambio.clear()
+            self._descartar_obsoletas()
+
+            if not self._heap:
+                await self._cambio.wait()
+                continue
+
+            fecha, id_programacion = self._heap[0]
+            espera = (fecha - datetime.now()).total_seconds()
+            if espera > 0:
+                try:
+                    await asyncio.wait_for(self._cambio.wait(), timeout=espera)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            self._vigentes.pop(id_programacion, None)
+            try:
+                await _aplicar_programacion(id_programacion)
+            except Exception:
+                log.exception("Error aplicando programación", id_programacion=id_programacion)
+
+    def iniciar(self):
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._ejecutar())
+
+    def detener(self):
+        if self._tarea:
+            self._tarea.cancel()
+            self._tarea = None
+
+
+# Planificador global
+programador = ProgramadorPrecios()
+
+medidor(
+    "empresa_programaciones_pendientes",
+    "Cambios de precios programados a la espera de su fecha",
+    funcion=lambda: programador.pendientes
+)
+
+
+async def inicializar_programaciones():
+    """Carga en el heap las programaciones pendientes"""
+    cursor = programaciones_collection.find(
+        {"estado": "pendiente"},
+        {"_id": 0, "id_programacion": 1, "fecha_aplicacion": 1}
+    )
+    cargadas = 0
+    async for programacion in cursor:
+        programador.agregar(programacion["id_programacion"], programacion["fecha_aplicacion"])
+        cargadas += 1
+
+    programador.iniciar()
+    log.info("Programador de precios iniciado", pendientes=cargadas)
+
+
+async def crear_programacion(datos: ProgramacionPreciosCreate) -> Dict[str, Any]:
+    """
+    Registra un cambio de precios programado
+
+    Args:
+        datos: Fecha, precios, selector de estaciones y recurrencia
+
+    Returns:
+        Diccionario con la programación creada
+
+    Raises:
+        ValueError: Si la fecha ya pasó
+    """
+    if datos.fecha_aplicacion <= datetime.now():
+        raise ValueError("La fecha de aplicación debe ser futura")
+
+    programacion = {
+        "id_programacion": await siguiente_id(db, SECUENCIA_PROGRAMACIONES),
+        "fecha_aplicacion": datos.fecha_aplicacion,
+        "precios": datos.precios.model_dump(),
+        "estaciones": datos.estaciones,
+        "estado_estaciones": datos.estado,
+        "intervalo_dias": datos.intervalo_dias,
+        "concurrencia": datos.concurrencia,
+        "estado": "pendiente",
+        "ejecuciones": [],
+        "fecha_creacion": datetime.now()
+    }
+    await programaciones_collection.insert_one(programacion)
+    programacion.pop("_id", None)
+
+    programador.agregar(programacion["id_programacion"], programacion["fecha_aplicacion"])
+    return programacion
+
+
+async def _aplicar_programacion(id_programacion: int):
+    """Aplica una programación vencida lanzando un despliegue de precios"""
+    programacion = await programaciones_collection.find_one(
+        {"id_programacion": id_programacion, "estado": "pendiente"},
+        {"_id": 0}
+    )
+    if programacion is None:
+        return
+
+    ejecucion: Dict[str, Any] = {"fecha": datetime.now()}
+    try:
+        rollout = await crear_rollout(RolloutCreate(
+            precios=programacion["precios"],
+            estaciones=programacion.get("estaciones"),
+            estado=programacion.get("estado_estaciones"),
+            concurrencia=programacion.get("concurrencia", 20)
+        ))
+        ejecucion["id_rollout"] = rollout["id_rollout"]
+        ejecucion["total_estaciones"] = rollout["total_estaciones"]
+        log.info("Programación aplicada", id_programacion=id_programacion, id_rollout=rollout["id_rollout"])
+    except ValueError as e:
+        ejecucion["error"] = str(e)
+        log.warning("Programación sin efecto", id_programacion=id_programacion, error=str(e))
+
+    actualizacion: Dict[str, Any] = {"estado": "aplicado"}
+
+    # Programaciones recurrentes: calcular la próxima fecha futura
+    if programacion.get("intervalo_dias"):
+        intervalo = timedelta(days=programacion["intervalo_dias"])
+        proxima = programacion["fecha_aplicacion"] + intervalo
+        while proxima <= datetime.now():
+            proxima += intervalo
+        actualizacion = {"estado": "pendiente", "fecha_aplicacion": proxima}
+
+    await programaciones_collection.update_one(
+        {"id_programacion": id_programacion},
+        {"$set": actualizacion, "$push": {"ejecuciones": {"$each": [ejecucion], "$slice": -20}}}
+    )
+
+    if actualizacion["estado"] == "pendiente":
+        programador.agregar(id_programacion, actualizacion["fecha_aplicacion"])
+
+
+async def obtener_programaciones(estado: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Lista las programaciones ordenadas por fecha de aplicación
+
+    Args:
+        estado: Filtrar por estado (pendiente, aplicado, cancelado)
+
+    Returns:
+        Lista de programaciones
+    """
+    filtro = {"estado": estado} if estado else {}
+    cursor = programaciones_collection.find(filtro, {"_id": 0}).sort("fecha_aplicacion", 1)
+    return await cursor.to_list(length=None)
+
+
+async def obtener_programacion(id_programacion: int) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene una programación por su ID
+
+    Args:
+        id_programacion: ID de la programación
+
+    Returns:
+        Diccionario con la programación o None si no existe
+    """
+    return await programaciones_collection.find_one({"id_programacion": id_programacion}, {"_id": 0})
+
+
+async def cancelar_programacion(id_programacion: int) -> Optional[Dict[str, Any]]:
+    """
+    Cancela una programación pendiente
+
+    Args:
+        id_programacion: ID de la programación
+
+    Returns:
+        La programación cancelada o None si no existe o ya no está pendiente
+    """
+    programacion = await programaciones_collection.find_one_and_update(
+        {"id_programacion": id_programacion, "estado": "pendiente"},
+        {"$set": {"estado": "cancelado", "fecha_cancelacion": datetime.now()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if programacion:
+        programador.quitar(id_programacion)
+    return programacion
+
@@ -0,0 +1,171 @@
+"""
+Hub de publicación/suscripción para el relay TCP de la Empresa
+Cada cliente conectado es un suscriptor con su propia cola de salida
+acotada y una tarea escritora dedicada, de modo que un consumidor lento
+no bloquea al resto ni al lazo de lectura de quien publica.
+
+Tópicos:
+    "*"               todos los mensajes (suscripción por defecto)
+    "tipo:<tipo>"     mensajes con ese campo "tipo" (sin tipo = "estado")
+    "estacion:<id>"   mensajes de una estación (id_estacion o id)
+"""
+import asyncio
+import os
+from typing import Any, Dict, Iterable, Optional, Set
+from bitacora import obtener_registrador
+
+log = obtener_registrador("pubsub")
+
+# Tamaño máximo de la cola de salida de cada suscriptor
+TAMANO_COLA = int(os.getenv("RELAY_TAMANO_COLA", "1000"))
+# Qué hacer cuando la cola de un suscriptor se llena:
+#   "descartar"   descarta el mensaje más antiguo de la cola
+#   "desconectar" cierra la conexión del consumidor lento
+POLITICA_COLA_LLENA = os.getenv("RELAY_POLITICA", "descartar")
+
+
+def topicos_de_mensaje(mensaje: Dict[str, Any]) -> Set[str]:
+    """
+    Calcula los tópicos a los que pertenece un mensaje
+
+    Args:
+        mensaje: Mensaje JSON decodificado
+
+    Returns:
+        Conjunto de tópicos del mensaje
+    """
+    topicos = {f"tipo:{mensaje.get('tipo', 'estado')}"}
+    id_estacion = mensaje.get("id_estacion", mensaje.get("id"))
+    if id_estacion is not None:
+        topicos.add(f"estacion:{id_estacion}")
+    return topicos
+
+
+class Suscriptor:
+    """Cliente suscrito con cola de salida propia"""
+
+    def __init__(self, nombre: str, writer: asyncio.StreamWriter, politica: str):
+        self.nombre = nombre
+        self.writer = writer
+        self.politica = politica
+        self.topicos: Set[str] = {"*"}
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=TAMANO_COLA)
+        self.tarea: Optional[asyncio.Task] = None
+        self.activo = True
+
+        # Contadores
+        self.encolados = 0
+        self.enviados = 0
+        self.descartados = 0
+        self.profundidad_maxima = 0
+
+    def interesado_en(self, topicos: Set[str]) -> bool:
+        return "*" in self.topicos or not self.topicos.isdisjoint(topicos)
+
+    def encolar(self, data: bytes) -> bool:
+        """
+        Encola un mensaje sin bloquear aplicando la política de cola llena
+
+        Returns:
+            False si el suscriptor debe ser desconectado
+        """
+        if self.cola.full():
+            if self.politica == "desconectar":
+                return False
+            self.cola.get_nowait()
+            self.descartados += 1
+
+        self.cola.put_nowait(data)
+        self.encolados += 1
+        self.profundidad_maxima = max(self.profundidad_maxima, self.cola.qsize())
+        return True
+
+    async def escribir(self):
+        """Tarea escritora: vacía la cola hacia el socket del cliente"""
+        try:
+            while True:
+                data = await self.cola.get()
+                self.writer.write(data)
+                await self.writer.drain()
+                self.enviados += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log.warning("Error enviando a cliente", cliente=self.nombre, error=str(e))
+        finally:
+            self.activo = False
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "topicos": sorted(self.topicos),
+            "profundidad_cola": self.cola.qsize(),
+            "profundidad_maxima": self.profundidad_maxima,
+            "encolados": self.encolados,
+            "enviados": self.enviados,
+            "descartados": self.descartados
+        }
+
+
+class HubPubSub:
+    """Registro de suscriptores y distribución de mensajes por tópico"""
+
+    def __init__(self, politica: str = POLITICA_COLA_LLENA):
+        self.politica = politica
+        self.suscriptores: Dict[str, Suscriptor] = {}
+        self.publicados = 0
+        self.desconectados_por_lentitud = 0
+
+    def registrar(self, nombre: str, writer: asyncio.StreamWriter) -> Suscriptor:
+        """Registra un cliente y arranca su tarea escritora"""
+        suscriptor = Suscriptor(nombre, writer, self.politica)
+        suscriptor.tarea = asyncio.create_task(suscriptor.escribir())
+        self.suscriptores[nombre] = suscriptor
+        return suscriptor
+
+    def suscribir(self, nombre: str, topicos: Iterable[str]):
+        """Reemplaza los tópicos de un suscriptor"""
+        suscriptor = self.suscriptores.get(nombre)
+        if suscriptor:
+            suscriptor.topicos = set(topicos) or {"*"}
+
+    def eliminar(self, nombre: str):
+        """Quita un suscriptor y detiene su tarea escritora"""
+        suscriptor = self.suscriptores.pop(nombre, None)
+        if suscriptor and suscriptor.tarea:
+            suscriptor.tarea.cancel()
+
+    def publicar(self, data: bytes, topicos: Set[str], origen: Optional[str] = None):
+        """
+        Distribuye un mensaje a los suscriptores interesados sin bloquear
+
+        Args:
+            data: Mensaje serializado (terminado en \\n)
+            topicos: Tópicos del mensaje
+            origen: Nombre del suscriptor que lo envió (no se le reenvía)
+        """
+        self.publicados += 1
+
+        for nombre, suscriptor in list(self.suscriptores.items()):
+            if nombre == origen or not suscriptor.interesado_en(topicos):
+                continue
+
+            if not suscriptor.activo:
+                self.eliminar(nombre)
+            elif not suscriptor.encolar(data):
+                log.warning("Cliente desconectado por consumo lento", cliente=nombre)
+                self.desconectados_por_lentitud += 1
+                self.eliminar(nombre)
+                suscriptor.writer.close()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "politica": self.politica,
+            "tamano_cola": TAMANO_COLA,
+            "publicados": self.publicados,
+            "desconectados_por_lentitud": self.desconectados_por_lentitud,
+            "suscriptores": {n: s.estadisticas() for n, s in self.suscriptores.items()}
+        }
+
+
+# Hub global usado por el servidor TCP
+hub = HubPubSub()
@@ -0,0 +1,347 @@
+"""
+Despliegue masivo de precios (rollout) hacia las estaciones
+Envía los precios en paralelo con un límite de concurrencia, por oleadas
+y con un canary opcional. Cada despliegue queda registrado como un "job"
+en memoria que puede consultarse para ver el progreso por estación.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from almacenamiento import almacenamiento
+from entregas_service import encolar_entrega, registrar_entrega_directa
+from estaciones_service import actualizar_precios
+from models import PreciosModel, PreciosUpdate, RolloutCreate
+from tcp_server import enviar_precios_a_estacion
+from bitacora import obtener_registrador
+from metricas import histograma, medidor
+
+log = obtener_registrador("rollout")
+
+duracion_rollouts = histograma(
+    "empresa_rollout_segundos",
+    "Duración total de un despliegue de precios (todas las oleadas)",
+    ("estado",),
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+medidor(
+    "empresa_rollouts_en_curso",
+    "Despliegues de precios en ejecución",
+    funcion=lambda: sum(1 for job in rollouts.values() if job["estado"] == "en_curso")
+)
+
+# Cantidad máxima de despliegues que se mantienen en memoria
+MAX_ROLLOUTS_EN_MEMORIA = 50
+
+# Registro de despliegues: {id_rollout: job}
+rollouts: Dict[str, Dict[str, Any]] = {}
+
+# Referencias a las tareas en ejecución (evita que el GC las elimine)
+_tareas_activas = set()
+
+
+async def _seleccionar_estaciones(datos: RolloutCreate) -> List[Dict[str, Any]]:
+    """
+    Obtiene las estaciones que participan en el despliegue según el selector
+
+    Args:
+        datos: Parámetros del despliegue
+
+    Returns:
+        Lista de estaciones (solo los campos necesarios para el envío)
+    """
+    ids: Optional[List[int]] = None
+    if datos.estaciones is not None:
+        ids = datos.estaciones
+    elif datos.precios_por_estacion and datos.precios is None:
+        ids = list(datos.precios_por_estacion.keys())
+
+    return await almacenamiento.estaciones.listar(
+        campos=("nombre", "ip", "puerto"),
+        estado=datos.estado,
+        ids=ids
+    )
+
+
+def _dividir_en_oleadas(ids: List[int], canary: int, tamano_oleada: Optional[int]) -> List[List[int]]:
+    """
+    Divide la lista de estaciones en oleadas (la primera es el canary, si existe)
+
+    Args:
+        ids: IDs de estaciones en orden de envío
+        canary: Cantidad de estaciones de la oleada de prueba
+        tamano_oleada: Tamaño de las oleadas siguientes (None = todas juntas)
+
+    Returns:
+        Lista de oleadas, cada una con sus IDs de estación
+    """
+    oleadas = []
+    if canary > 0:
+        oleadas.append(ids[:canary])
+        ids = ids[canary:]
+
+    if not ids:
+        return oleadas
+
+    tamano = tamano_oleada or len(ids)
+    for i in range(0, len(ids), tamano):
+        oleadas.append(ids[i:i + tamano])
+
+    return oleadas
+
+
+def _podar_rollouts():
+    """Elimina los despliegues terminados más antiguos si se supera el máximo"""
+    if len(rollouts) <= MAX_ROLLOUTS_EN_MEMORIA:
+        return
+
+    terminados = [
+        job for job in rollouts.values()
+        if job["estado"] in ("completado", "abortado", "fallido")
+    ]
+    terminados.sort(key=lambda job: job["fecha_creacion"])
+
+    for job in terminados[:len(rollouts) - MAX_ROLLOUTS_EN_MEMORIA]:
+        rollouts.pop(job["id_rollout"], None)
+
+
+async def crear_rollout(datos: RolloutCreate) -> Dict[str, Any]:
+    """
+    Registra un nuevo despliegue de precios y lo lanza en segundo plano
+
+    Args:
+        datos: Precios, selector de estaciones y parámetros de concurrencia
+
+    Returns:
+        Resumen del despliegue recién creado
+
+    Raises:
+        ValueError: Si no hay precios definidos o ninguna estación coincide
+    """
+    if datos.precios is None and not datos.precios_por_estacion:
+        raise ValueError("Debe indicar 'precios' o 'precios_por_estacion'")
+
+    estaciones = await _seleccionar_estaciones(datos)
+    if not estaciones:
+        raise ValueError("Ninguna estación coincide con el selector indicado")
+
+    precios_por_estacion = datos.precios_por_estacion or {}
+    sin_precios = [
+        e["id_estacion"] for e in estaciones
+        if e["id_estacion"] not in precios_por_estacion and datos.precios is None
+    ]
+    if sin_precios:
+        raise ValueError(f"Estaciones sin precios definidos: {sin_precios}")
+
+    ids = [e["id_estacion"] for e in estaciones]
+    oleadas = _dividir_en_oleadas(ids, datos.canary, datos.tamano_oleada)
+
+    detalle: Dict[int, Dict[str, Any]] = {}
+    for numero, oleada in enumerate(oleadas, start=1):
+        for id_estacion in oleada:
+            detalle[id_estacion] = {"oleada": numero}
+
+    for estacion in estaciones:
+        id_estacion = estacion["id_estacion"]
+        precios = precios_por_estacion.get(id_estacion, datos.precios)
+        detalle[id_estacion].update({
+            "id_estacion": id_estacion,
+            "nombre": estacion.get("nombre"),
+            "ip": estacion["ip"],
+            "puerto": estacion["puerto"],
+            "precios": precios.model_dump(),
+            "estado": "pendiente",
+            "inicio": None,
+            "fin": None,
+            "duracion_ms": None,
+            "error": None
+        })
+
+    id_rollout = uuid.uuid4().hex[:12]
+    job = {
+        "id_rollout": id_rollout,
+        "estado": "pendiente",
+        "fecha_creacion": datetime.now(),
+        "fecha_inicio": None,
+        "fecha_fin": None,
+        "concurrencia": datos.concurrencia,
+        "timeout": datos.timeout,
+        "canary": min(datos.canary, len(ids)),
+        "max_fallos_canary": datos.max_fallos_canary,
+        "oleadas": oleadas,
+        "oleada_actual": 0,
+        "estaciones": detalle
+    }
+    rollouts[id_rollout] = job
+    _podar_rollouts()
+
+    tarea = asyncio.create_task(_ejecutar_rollout(job))
+    _tareas_activas.add(tarea)
+    tarea.add_done_callback(_tareas_activas.discard)
+
+    log.info("Rollout creado", id_rollout=id_rollout, estaciones=len(ids), oleadas=len(oleadas))
+    return resumen_rollout(job)
+
+
+async def _enviar_a_estacion(job: Dict[str, Any], id_estacion: int, semaforo: asyncio.Semaphore):
+    """
+    Persiste y envía los precios a una estación respetando el semáforo
+
+    Args:
+        job: Despliegue en curso
+        id_estacion: Estación a procesar
+        semaforo: Semáforo que limita los envíos simultáneos
+    """
+    entrada = job["estaciones"][id_estacion]
+
+    async with semaforo:
+        entrada["estado"] = "enviando"
+        entrada["inicio"] = datetime.now()
+        inicio = time.perf_counter()
+
+        try:
+            precios = PreciosModel(**entrada["precios"])
+            estacion = await actualizar_precios(id_estacion, PreciosUpdate(precios=precios))
+
+            if not estacion:
+                entrada["estado"] = "omitido"
+                entrada["error"] = "Estación eliminada durante el despliegue"
+            else:
+                exitoso = await enviar_precios_a_estacion(
+                    estacion["ip"],
+                    estacion["puerto"],
+                    entrada["precios"],
+                    estacion.get("nombre"),
+                    timeout=job["timeout"],
+                    version=estacion.get("version_precios"),
+                    id_estacion=id_estacion
+                )
+                entrada["estado"] = "exitoso" if exitoso else "fallido"
+                if exitoso:
+                    # Reemplaza en el outbox cualquier entrega pendiente de precios anteriores
+                    await registrar_entrega_directa(estacion, entrada["precios"])
+                else:
+                    entrada["error"] = "No se pudo entregar vía TCP"
+                    # Los precios ya quedaron guardados: el outbox seguirá
+                    # reintentando hasta que la estación vuelva a responder
+                    await encolar_entrega(estacion, entrada["precios"])
+
+        except Exception as e:
+            entrada["estado"] = "fallido"
+            entrada["error"] = f"{type(e).__name__}: {e}"
+
+        finally:
+            entrada["fin"] = datetime.now()
+            entrada["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+
+
+async def _ejecutar_rollout(job: Dict[str, Any]):
+    """
+    Ejecuta las oleadas de un despliegue una tras otra
+
+    Args:
+        job: Despliegue a ejecutar
+    """
+    job["estado"] = "en_curso"
+    job["fecha_inicio"] = datetime.now()
+    semaforo = asyncio.Semaphore(job["concurrencia"])
+
+    try:
+        for numero, oleada in enumerate(job["oleadas"], start=1):
+            job["oleada_actual"] = numero
+            await asyncio.gather(*[
+                _enviar_a_estacion(job, id_estacion, semaforo)
+                for id_estacion in oleada
+            ])
+
+            # Validar el canary antes de continuar con el resto de la red
+            if numero == 1 and job["canary"] > 0:
+                fallos = sum(
+                    1 for id_estacion in oleada
+                    if job["estaciones"][id_estacion]["estado"] == "fallido"
+                )
+                if fallos > job["max_fallos_canary"]:
+                    log.warning("Rollout abortado por fallos en el canary", id_rollout=job["id_rollout"], fallos=fallos)
+                    for entrada in job["estaciones"].values():
+                        if entrada["estado"] == "pendiente":
+                            entrada["estado"] = "cancelado"
+                    job["estado"] = "abortado"
+                    return
+
+        job["estado"] = "completado"
+        log.info("Rollout completado", id_rollout=job["id_rollout"])
+
+    except Exception:
+        log.exception("Error ejecutando rollout", id_rollout=job["id_rollout"])
+        job["estado"] = "fallido"
+
+    finally:
+        job["fecha_fin"] = datetime.now()
+        duracion_rollouts.observar((job["fecha_fin"] - job["fecha_inicio"]).total_seconds(), job["estado"])
+
+
+def resumen_rollout(job: Dict[str, Any], incluir_estaciones: bool = False) -> Dict[str, Any]:
+    """
+    Construye la representación pública de un despliegue
+
+    Args:
+        job: Despliegue registrado
+        incluir_estaciones: Si se incluye el detalle por estación
+
+    Returns:
+        Diccionario con el progreso del despliegue
+    """
+    conteo: Dict[str, int] = {}
+    for entrada in job["estaciones"].values():
+        conteo[entrada["estado"]] = conteo.get(entrada["estado"], 0) + 1
+
+    total = len(job["estaciones"])
+    terminadas = total - conteo.get("pendiente", 0) - conteo.get("enviando", 0)
+
+    resumen = {
+        "id_rollout": job["id_rollout"],
+        "estado": job["estado"],
+        "fecha_creacion": job["fecha_creacion"],
+        "fecha_inicio": job["fecha_inicio"],
+        "fecha_fin": job["fecha_fin"],
+        "concurrencia": job["concurrencia"],
+        "total_oleadas": len(job["oleadas"]),
+        "oleada_actual": job["oleada_actual"],
+        "total_estaciones": total,
+        "progreso": round(terminadas / total * 100, 1) if total else 100.0,
+        "conteo": conteo
+    }
+
+    if incluir_estaciones:
+        resumen["estaciones"] = list(job["estaciones"].values())
+
+    return resumen
+
+
+def obtener_rollout(id_rollout: str) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene el progreso detallado de un despliegue
+
+    Args:
+        id_rollout: ID del despliegue
+
+    Returns:
+        Diccionario con el progreso por estación o None si no existe
+    """
+    job = rollouts.get(id_rollout)
+    if not job:
+        return None
+    return resumen_rollout(job, incluir_estaciones=True)
+
+
+def listar_rollouts() -> List[Dict[str, Any]]:
+    """
+    Lista los despliegues registrados (más recientes primero)
+
+    Returns:
+        Lista de resúmenes de despliegue
+    """
+    jobs = sorted(rollouts.values(), key=lambda job: job["fecha_creacion"], reverse=True)
+    return [resumen_rollout(job) for job in jobs]
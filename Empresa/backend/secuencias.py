@@ -0,0 +1,94 @@
+"""
+Asignación atómica de IDs numéricos mediante una colección de contadores
+Cada secuencia es un documento {_id: nombre, valor: último ID entregado}
+que se incrementa con find_one_and_update + $inc, de modo que obtener un
+ID nuevo cuesta un solo round-trip y dos creaciones concurrentes nunca
+reciben el mismo valor. Permite reservar bloques de N IDs de una vez.
+"""
+from typing import Optional
+from pymongo import ReturnDocument
+
+COLECCION_CONTADORES = "contadores"
+
+
+async def reservar_ids(db, secuencia: str, cantidad: int = 1) -> range:
+    """
+    Reserva un bloque de IDs consecutivos de una secuencia
+
+    Args:
+        db: Base de datos Motor donde vive la colección de contadores
+        secuencia: Nombre de la secuencia (ej: "estaciones")
+        cantidad: Cantidad de IDs a reservar
+
+    Returns:
+        Rango con los IDs reservados
+    """
+    if cantidad < 1:
+        raise ValueError("La cantidad de IDs a reservar debe ser mayor a 0")
+
+    contador = await db[COLECCION_CONTADORES].find_one_and_update(
+        {"_id": secuencia},
+        {"$inc": {"valor": cantidad}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    ultimo = contador["valor"]
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+async def siguiente_id(db, secuencia: str) -> int:
+    """
+    Obtiene el siguiente ID de una secuencia
+
+    Args:
+        db: Base de datos Motor donde vive la colección de contadores
+        secuencia: Nombre de la secuencia
+
+    Returns:
+        Nuevo ID único
+    """
+    return (await reservar_ids(db, secuencia, 1))[0]
+
+
+async def asegurar_minimo(db, secuencia: str, valor: int):
+    """
+    Garantiza que la secuencia no entregue IDs menores o iguales a 'valor'
+    (usado cuando un documento se crea con un ID asignado manualmente)
+
+    Args:
+        db: Base de datos Motor donde vive la colección de contadores
+        secuencia: Nombre de la secuencia
+        valor: ID ya utilizado
+    """
+    await db[COLECCION_CONTADORES].update_one(
+        {"_id": secuencia},
+        {"$max": {"valor": valor}},
+        upsert=True
+    )
+
+
+async def sincronizar_secuencia(db, secuencia: str, coleccion: str, campo: str) -> Optional[int]:
+    """
+    Alinea la secuencia con el ID máximo existente en una colección.
+    Se ejecuta al iniciar para que bases de datos previas al uso de
+    contadores sigan generando IDs sin colisiones.
+
+    Args:
+        db: Base de datos Motor
+        secuencia: Nombre de la secuencia
+        coleccion: Colección que contiene los IDs
+        campo: Campo numérico del ID
+
+    Returns:
+        ID máximo encontrado o None si la colección está vacía
+    """
+    ultimo = await db[coleccion].find_one(
+        {campo: {"$exists": True}},
+        {campo: 1},
+        sort=[(campo, -1)]
+    )
+    if ultimo is None:
+        return None
+
+    await asegurar_minimo(db, secuencia, ultimo[campo])
+    return ultimo[campo]
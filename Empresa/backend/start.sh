@@ -0,0 +1,18 @@
+#!/bin/bash
+# API con varios workers HTTP y un proceso despachador único (ver despachador.py)
+
+export MODO_DESPACHADOR=externo
+
+echo " Iniciando despachador (relay TCP, pool de estaciones, entregas, socket.io)..."
+python3 despachador.py &
+DESPACHADOR_PID=$!
+echo " Despachador iniciado con PID: $DESPACHADOR_PID"
+
+# Si el despachador termina, el contenedor se reinicia completo
+trap 'kill $DESPACHADOR_PID 2>/dev/null' EXIT
+
+echo " Iniciando FastAPI con ${HTTP_WORKERS:-2} workers..."
+uvicorn main:app --host 0.0.0.0 --port 8000 --workers "${HTTP_WORKERS:-2}" &
+UVICORN_PID=$!
+
+wait -n $DESPACHADOR_PID $UVICORN_PID
@@ -1,22 +1,48 @@
 import asyncio
 import json
 import socket
+import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from pool_conexiones import pool_estaciones, ConexionEnEspera
+from pubsub import hub, topicos_de_mensaje
+from bitacora import WARNING, obtener_registrador
+from metricas import contador, histograma, medidor
+import pasarela_ws
+
+log = obtener_registrador("tcp")
 
 # Mantendrá el estado actual de los surtidores conectados
 surtidores = {}
-# Lista global de clientes conectados (writers)
-clientes_conectados = set()
 # Registro de estaciones conectadas con su información
 estaciones_activas: Dict[str, Dict[str, Any]] = {}
 
+mensajes_relay = contador("empresa_relay_mensajes_total", "Mensajes recibidos por el relay TCP", ("tipo",))
+envios_precios = histograma(
+    "empresa_envio_precios_segundos",
+    "Duración del envío de un conjunto de precios a una estación",
+    ("resultado",)
+)
+medidor("empresa_relay_conexiones", "Clientes conectados al relay TCP", funcion=lambda: len(surtidores))
+medidor(
+    "empresa_relay_cola_salida",
+    "Mensajes en la cola de salida de cada suscriptor del relay",
+    ("cliente",),
+    funcion=lambda: {(nombre,): s.cola.qsize() for nombre, s in hub.suscriptores.items()}
+)
+medidor(
+    "empresa_pool_conexiones_abiertas",
+    "Conexiones persistentes abiertas hacia estaciones",
+    funcion=lambda: sum(1 for c in pool_estaciones.conexiones.values() if c.esta_abierta())
+)
+
 async def manejar_surtidor(reader, writer):
     addr = writer.get_extra_info('peername')
     surtidor_id = f"{addr[0]}:{addr[1]}"
-    print(f"🔌 Nueva conexión de surtidor {surtidor_id}")
+    log.info("Nueva conexión de cliente", cliente=surtidor_id)
     surtidores[surtidor_id] = {"estado": "Conectado"}
-    clientes_conectados.add(writer)
+    # Cada cliente recibe por su propia cola (por defecto suscrito a todo)
+    hub.registrar(surtidor_id, writer)
 
     try:
         while True:
@@ -26,41 +52,56 @@ async def manejar_surtidor(reader, writer):
 
             try:
                 mensaje = json.loads(data.decode())
+                mensajes_relay.inc(str(mensaje.get("tipo", "sin_tipo")))
+
+                # 📬 Mensaje de control: el cliente elige sus tópicos
+                if mensaje.get("tipo") == "suscripcion":
+                    hub.suscribir(surtidor_id, mensaje.get("topicos", []))
+                    log.info("Cliente suscrito", cliente=surtidor_id, topicos=mensaje.get("topicos"))
+                    continue
+
                 surtidores[surtidor_id] = mensaje
-                print(f"📡 Estado recibido de {surtidor_id}: {mensaje}")
-
-                # 🔄 Reenviar a todos los clientes conectados (excepto al que lo envió)
-                for cliente in list(clientes_conectados):
-                    if cliente != writer:
-                        try:
-                            cliente.write(data)
-                            await cliente.drain()
-                        except Exception as e:
-                            print(f"⚠️ Error enviando a cliente: {e}")
-                            clientes_conectados.discard(cliente)
+                log.muestreado("Estado recibido", clave=surtidor_id, cliente=surtidor_id, tipo=mensaje.get("tipo"))
+
+                # 🔄 Publicar a los suscriptores interesados (sin esperar a ninguno)
+                hub.publicar(data, topicos_de_mensaje(mensaje), origen=surtidor_id)
+                pasarela_ws.actualizar_surtidor(mensaje)
 
             except json.JSONDecodeError:
-                print(f"⚠️ Mensaje inválido desde {surtidor_id}: {data.decode()}")
+                mensajes_relay.inc("invalido")
+                log.muestreado("Mensaje inválido", clave=surtidor_id, nivel=WARNING, cliente=surtidor_id,
+                               bytes=len(data))
 
     except Exception as e:
-        print(f"⚠️ Error en surtidor {surtidor_id}: {e}")
+        log.warning("Error en conexión de cliente", cliente=surtidor_id, error=str(e))
 
     finally:
-        print(f"❌ Surtidor desconectado {surtidor_id}")
+        log.info("Cliente desconectado", cliente=surtidor_id)
         surtidores.pop(surtidor_id, None)
-        clientes_conectados.discard(writer)
+        hub.eliminar(surtidor_id)
         writer.close()
-        await writer.wait_closed()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
 
 async def iniciar_tcp_servidor():
     """Inicia el servidor TCP que recibe los estados de los surtidores."""
     server = await asyncio.start_server(manejar_surtidor, "127.0.0.1", 5000)
-    print("🟢 Servidor TCP escuchando en 127.0.0.1:5000")
+    log.info("Servidor TCP escuchando", host="127.0.0.1", puerto=5000)
     async with server:
         await server.serve_forever()
 
 
-async def enviar_precios_a_estacion(ip: str, puerto: int, precios: Dict[str, int], nombre_estacion: str = None) -> bool:
+async def enviar_precios_a_estacion(
+    ip: str,
+    puerto: int,
+    precios: Dict[str, int],
+    nombre_estacion: str = None,
+    timeout: float = 5.0,
+    version: Optional[int] = None,
+    id_estacion: Optional[int] = None
+) -> bool:
     """
     Envía los precios actualizados a una estación específica vía TCP
     
@@ -69,10 +110,14 @@ async def enviar_precios_a_estacion(ip: str, puerto: int, precios: Dict[str, int
         puerto: Puerto TCP de la estación
         precios: Diccionario con los precios actualizados
         nombre_estacion: Nombre de la estación (opcional)
+        timeout: Segundos máximos para establecer la conexión
+        version: Versión del conjunto de precios (la estación descarta versiones viejas)
+        id_estacion: ID de la estación (lo incluye en su acuse de recibo)
         
     Returns:
         True si se envió exitosamente, False en caso de error
     """
+    inicio = time.perf_counter()
     try:
         # Crear mensaje con el formato esperado
         mensaje = {
@@ -85,24 +130,19 @@ async def enviar_precios_a_estacion(ip: str, puerto: int, precios: Dict[str, int
         if nombre_estacion:
             mensaje["nombre_estacion"] = nombre_estacion
         
-        print(f"📤 Enviando mensaje TCP: {mensaje}")
+        # Versión monótona por estación: permite descartar envíos atrasados
+        # o reordenados y confirmar qué precios aplicó la estación
+        if version is not None:
+            mensaje["version"] = version
+        if id_estacion is not None:
+            mensaje["id_estacion"] = id_estacion
         
-        # Conectar a la estación
-        reader, writer = await asyncio.wait_for(
-            asyncio.open_connection(ip, puerto),
-            timeout=5.0
-        )
-        
-        # Enviar mensaje JSON
+        # Enviar mensaje JSON reutilizando la conexión persistente del pool
         mensaje_json = json.dumps(mensaje) + "\n"
-        writer.write(mensaje_json.encode())
-        await writer.drain()
-        
-        # Cerrar conexión
-        writer.close()
-        await writer.wait_closed()
+        await pool_estaciones.enviar(ip, puerto, mensaje_json.encode(), timeout=timeout)
+        envios_precios.observar(time.perf_counter() - inicio, "ok")
         
-        print(f"✅ Precios enviados exitosamente a {ip}:{puerto}")
+        log.debug("Precios enviados", ip=ip, puerto=puerto, version=version)
         
         # Registrar la estación como activa
         estaciones_activas[f"{ip}:{puerto}"] = {
@@ -115,7 +155,8 @@ async def enviar_precios_a_estacion(ip: str, puerto: int, precios: Dict[str, int
         return True
         
     except asyncio.TimeoutError:
-        print(f"⏱️ Timeout al conectar con {ip}:{puerto}")
+        envios_precios.observar(time.perf_counter() - inicio, "timeout")
+        log.warning("Timeout al conectar con estación", ip=ip, puerto=puerto)
         estaciones_activas[f"{ip}:{puerto}"] = {
             "ip": ip,
             "puerto": puerto,
@@ -124,8 +165,20 @@ async def enviar_precios_a_estacion(ip: str, puerto: int, precios: Dict[str, int
         }
         return False
         
+    except ConexionEnEspera as e:
+        envios_precios.observar(time.perf_counter() - inicio, "en_espera")
+        log.debug("Estación en espera de reintento", ip=ip, puerto=puerto, detalle=str(e))
+        estaciones_activas[f"{ip}:{puerto}"] = {
+            "ip": ip,
+            "puerto": puerto,
+            "ultimo_envio": None,
+            "estado": "desconectada"
+        }
+        return False
+        
     except ConnectionRefusedError:
-        print(f"❌ Conexión rechazada por {ip}:{puerto} - Estación no disponible")
+        envios_precios.observar(time.perf_counter() - inicio, "rechazada")
+        log.warning("Conexión rechazada por estación", ip=ip, puerto=puerto)
         estaciones_activas[f"{ip}:{puerto}"] = {
             "ip": ip,
             "puerto": puerto,
@@ -135,7 +188,9 @@ async def enviar_precios_a_estacion(ip: str, puerto: int, precios: Dict[str, int
         return False
         
     except Exception as e:
-        print(f"❌ Error enviando precios a {ip}:{puerto}: {type(e).__name__} - {e}")
+        envios_precios.observar(time.perf_counter() - inicio, "error")
+        log.warning("Error enviando precios", ip=ip, puerto=puerto, tipo_error=type(e).__name__,
+                    error=str(e))
         estaciones_activas[f"{ip}:{puerto}"] = {
             "ip": ip,
             "puerto": puerto,
@@ -145,6 +200,24 @@ async def enviar_precios_a_estacion(ip: str, puerto: int, precios: Dict[str, int
         return False
 
 
+def registrar_verificacion(ip: str, puerto: int, conectada: bool):
+    """
+    Registra el resultado de un sondeo de conectividad de una estación
+    
+    Args:
+        ip: Dirección IP de la estación
+        puerto: Puerto TCP de la estación
+        conectada: Si la estación aceptó la conexión
+    """
+    entrada = estaciones_activas.setdefault(f"{ip}:{puerto}", {
+        "ip": ip,
+        "puerto": puerto,
+        "ultimo_envio": None
+    })
+    entrada["estado"] = "conectada" if conectada else "desconectada"
+    entrada["ultima_verificacion"] = datetime.now().isoformat()
+
+
 def obtener_estaciones_activas() -> Dict[str, Dict[str, Any]]:
     """
     Retorna el registro de estaciones activas y su estado de conexión
@@ -153,3 +226,24 @@ def obtener_estaciones_activas() -> Dict[str, Dict[str, Any]]:
         Diccionario con información de las estaciones
     """
     return estaciones_activas.copy()
+
+
+def obtener_estadisticas_relay() -> Dict[str, Any]:
+    """
+    Retorna las estadísticas del hub pub/sub del relay TCP
+    
+    Returns:
+        Diccionario con contadores globales y por suscriptor
+        (profundidad de cola, enviados, descartados)
+    """
+    return hub.estadisticas()
+
+
+def obtener_estadisticas_pool() -> Dict[str, Dict[str, Any]]:
+    """
+    Retorna las estadísticas de las conexiones persistentes hacia estaciones
+    
+    Returns:
+        Diccionario {ip:puerto: estadísticas de la conexión}
+    """
+    return pool_estaciones.estadisticas()
@@ -52,9 +52,17 @@ export default function EstacionesPage() {
   const cargarEstaciones = async () => {
     try {
       setLoading(true);
-      const response = await fetch(`${API_URL}/api/estaciones`);
-      const data = await response.json();
-      setEstaciones(data);
+      // Recorrer todas las páginas usando el cursor del backend
+      const todas = [];
+      let cursor = null;
+      do {
+        const query = cursor !== null ? `?limit=500&cursor=${cursor}` : "?limit=500";
+        const response = await fetch(`${API_URL}/api/estaciones${query}`);
+        const data = await response.json();
+        todas.push(...data.estaciones);
+        cursor = data.next_cursor;
+      } while (cursor !== null);
+      setEstaciones(todas);
     } catch (error) {
       console.error("Error cargando estaciones:", error);
       alert("Error al cargar estaciones");
@@ -160,13 +168,9 @@ export default function EstacionesPage() {
 
       const resultado = await response.json();
       
-      // Mostrar si el envío TCP fue exitoso
-      if (resultado._envio_tcp) {
-        if (resultado._envio_tcp.exitoso) {
-          alert(`✅ Precios actualizados y enviados a ${resultado._envio_tcp.ip}:${resultado._envio_tcp.puerto}`);
-        } else {
-          alert(`⚠️ Precios actualizados en BD pero no se pudo conectar con la estación`);
-        }
+      // La entrega a la estación queda en cola y se reintenta en segundo plano
+      if (resultado._entrega) {
+        alert(`✅ Precios actualizados. Entrega a ${resultado._entrega.ip}:${resultado._entrega.puerto} en curso`);
       }
 
       setOpenPrecios(false);
@@ -1,6 +1,6 @@
 ﻿"use client"
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { Button } from "../components/ui/button";
 import Link from "next/link";
 import { 
@@ -11,30 +11,88 @@ import {
 } from "@radix-ui/react-icons";
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+// Estaciones que se muestran en el panel
+const LIMITE_ESTACIONES = 6;
+
+const ETIQUETAS_ENTREGA = {
+  pendiente: "Entrega de precios pendiente",
+  reintentando: "Reintentando entrega de precios",
+  entregado: "Precios entregados",
+};
 
 export default function HomePage() {
   const [estadisticas, setEstadisticas] = useState(null);
   const [estaciones, setEstaciones] = useState([]);
+  const [entregas, setEntregas] = useState({});
   const [loading, setLoading] = useState(true);
+  // Copia de las estaciones visibles para decidir fuera de los setState
+  const estacionesRef = useRef([]);
+
+  useEffect(() => {
+    estacionesRef.current = estaciones;
+  }, [estaciones]);
 
   useEffect(() => {
-    cargarDatos();
-    const interval = setInterval(cargarDatos, 30000);
-    return () => clearInterval(interval);
+    // El servidor envía una foto inicial y luego solo los cambios; al
+    // reconectar, EventSource manda Last-Event-ID y recibe lo que se perdió
+    const fuente = new EventSource(`${API_URL}/api/eventos?limit=${LIMITE_ESTACIONES}`);
+    const escuchar = (tipo, manejador) =>
+      fuente.addEventListener(tipo, (evento) => manejador(JSON.parse(evento.data)));
+
+    escuchar("foto", aplicarFoto);
+    escuchar("estadisticas", setEstadisticas);
+    escuchar("resincronizar", cargarDatos);
+    escuchar("estacion_creada", (estacion) =>
+      setEstaciones((actuales) =>
+        // El panel muestra las primeras estaciones por ID: una nueva solo entra si hay espacio
+        actuales.length < LIMITE_ESTACIONES && !actuales.some((e) => e.id_estacion === estacion.id_estacion)
+          ? [...actuales, estacion]
+          : actuales
+      )
+    );
+    escuchar("estacion_actualizada", (estacion) => actualizarEstacion(estacion.id_estacion, estacion));
+    escuchar("precios_actualizados", ({ id_estacion, ...cambios }) => actualizarEstacion(id_estacion, cambios));
+    escuchar("liveness", ({ id_estacion, estado }) => actualizarEstacion(id_estacion, { estado }));
+    escuchar("entrega", (entrega) =>
+      setEntregas((actuales) => ({ ...actuales, [entrega.id_estacion]: entrega }))
+    );
+    escuchar("estacion_eliminada", ({ id_estacion }) => {
+      const visibles = estacionesRef.current;
+      if (!visibles.some((e) => e.id_estacion === id_estacion)) return;
+      // Si la lista estaba completa, otra estación ocupa el lugar libre
+      if (visibles.length === LIMITE_ESTACIONES) {
+        cargarDatos();
+      } else {
+        setEstaciones((actuales) => actuales.filter((e) => e.id_estacion !== id_estacion));
+      }
+    });
+
+    fuente.onerror = () => {
+      // EventSource reintenta solo; si el servidor no soporta el flujo se cae a una lectura puntual
+      if (fuente.readyState === EventSource.CLOSED) cargarDatos();
+    };
+
+    return () => fuente.close();
   }, []);
 
+  const aplicarFoto = (data) => {
+    setEstadisticas(data.estadisticas);
+    setEstaciones(data.estaciones);
+    setLoading(false);
+  };
+
+  const actualizarEstacion = (id_estacion, cambios) => {
+    setEstaciones((actuales) =>
+      actuales.map((e) => (e.id_estacion === id_estacion ? { ...e, ...cambios } : e))
+    );
+  };
+
   const cargarDatos = async () => {
     try {
-      const responseStats = await fetch(`${API_URL}/api/estadisticas`);
-      if (responseStats.ok) {
-        const dataStats = await responseStats.json();
-        setEstadisticas(dataStats);
-      }
-
-      const responseEstaciones = await fetch(`${API_URL}/api/estaciones`);
-      if (responseEstaciones.ok) {
-        const dataEstaciones = await responseEstaciones.json();
-        setEstaciones(dataEstaciones.slice(0, 6));
+      // Estadísticas y resumen de estaciones en una sola petición
+      const response = await fetch(`${API_URL}/api/dashboard?limit=${LIMITE_ESTACIONES}`);
+      if (response.ok) {
+        aplicarFoto(await response.json());
       }
     } catch (error) {
       console.error("Error cargando datos:", error);
@@ -121,6 +179,16 @@ export default function HomePage() {
             </div>
           </div>
         ) : null}
+
+        {estadisticas?.desactualizadas > 0 && (
+          <div className="bg-orange-50 border-l-4 border-orange-500 rounded-lg p-4 mb-8">
+            <p className="text-sm text-orange-800">
+              <span className="font-bold">{estadisticas.desactualizadas}</span>{' '}
+              {estadisticas.desactualizadas === 1 ? 'estación aún no confirma' : 'estaciones aún no confirman'} sus
+              últimos precios
+            </p>
+          </div>
+        )}
       </section>
 
       <section className="max-w-7xl mx-auto px-6 mb-12">
@@ -222,6 +290,16 @@ export default function HomePage() {
                   <div>Precio Diesel: ${estacion.precios_actuales.precio_diesel}</div>
                 </div>
 
+                {entregas[estacion.id_estacion] && (
+                  <p
+                    className={`mt-3 text-xs ${
+                      entregas[estacion.id_estacion].estado === "entregado" ? "text-green-700" : "text-orange-700"
+                    }`}
+                  >
+                    {ETIQUETAS_ENTREGA[entregas[estacion.id_estacion].estado] ?? entregas[estacion.id_estacion].estado}
+                  </p>
+                )}
+
                 <Link href={`/estaciones`}>
                   <Button
                     className="w-full mt-4 bg-[#F26E22] hover:bg-[#d65e1d] text-white"
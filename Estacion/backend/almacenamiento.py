@@ -0,0 +1,194 @@
+"""
+Capa de almacenamiento intercambiable de la estación
+Los servicios (surtidores_service, el guardado de transacciones de
+tcp_server_surtidores y los endpoints de transacciones) no acceden a
+colecciones de Motor sino a dos repositorios con operaciones de dominio.
+El driver se elige con la variable de entorno ALMACENAMIENTO:
+
+    mongo    MongoDB vía Motor (default, almacenamiento_mongo.py)
+    memoria  Diccionarios en el proceso, sin persistencia (pruebas y benchmarks)
+    sqlite   Archivo SQLite embebido operado en un hilo dedicado
+             (estaciones pequeñas que no pueden correr un mongod)
+
+Los documentos se intercambian como diccionarios con las mismas claves que
+en MongoDB y "_id" siempre se entrega como string. Todos los drivers deben
+pasar la misma verificación: python conformidad_almacenamiento.py
+
+Variables de entorno:
+    ALMACENAMIENTO: mongo | memoria | sqlite. Default mongo
+    SQLITE_RUTA: Archivo de la base SQLite. Default estacion.db
+"""
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+DRIVERS = ("mongo", "memoria", "sqlite")
+
+ALMACENAMIENTO = os.getenv("ALMACENAMIENTO", "mongo").lower()
+SQLITE_RUTA = os.getenv("SQLITE_RUTA", "estacion.db")
+
+
+class ClaveDuplicada(ValueError):
+    """Ya existe un documento con la misma clave única"""
+
+
+class RepositorioSurtidores(ABC):
+    """Surtidores registrados, su estado de conexión y sus totales acumulados"""
+
+    @abstractmethod
+    async def siguiente_id(self) -> int:
+        """Entrega un ID nuevo (nunca repetido) de la secuencia de surtidores"""
+
+    @abstractmethod
+    async def asegurar_id_minimo(self, valor: int):
+        """Evita que la secuencia entregue IDs menores o iguales a 'valor'"""
+
+    @abstractmethod
+    async def insertar(self, surtidor: Dict[str, Any]) -> str:
+        """
+        Inserta un surtidor
+
+        Returns:
+            _id asignado
+
+        Raises:
+            ClaveDuplicada: Si ya existe un surtidor con ese id_surtidor
+        """
+
+    @abstractmethod
+    async def listar(self, estado_conexion: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Surtidores ordenados por id_surtidor, opcionalmente por estado de conexión"""
+
+    @abstractmethod
+    async def obtener(self, id_surtidor: int) -> Optional[Dict[str, Any]]:
+        """Surtidor por ID o None"""
+
+    @abstractmethod
+    async def actualizar(self, id_surtidor: int, campos: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Reemplaza los campos indicados
+
+        Returns:
+            Surtidor actualizado o None si no existe
+        """
+
+    @abstractmethod
+    async def sumar_transaccion(self, id_surtidor: int, litros: float, monto: int,
+                                fecha: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Suma una transacción a los totales del surtidor en una sola operación
+
+        Returns:
+            {"nombre": ...} del surtidor o None si no existe
+        """
+
+    @abstractmethod
+    async def eliminar(self, id_surtidor: int) -> bool:
+        """True si existía y se eliminó"""
+
+    @abstractmethod
+    async def existe_nombre(self, nombre: str, excluir_id: Optional[int] = None) -> bool:
+        """Si otro surtidor (distinto de excluir_id) ya usa ese nombre"""
+
+    @abstractmethod
+    async def estadisticas(self) -> Dict[str, Any]:
+        """
+        Totales de la flota
+
+        Returns:
+            total_surtidores, conectados, disponibles, total_transacciones,
+            total_litros y total_ingresos
+        """
+
+
+class RepositorioTransacciones(ABC):
+    """Transacciones completadas (solo se insertan y se consultan)"""
+
+    @abstractmethod
+    async def insertar(self, transaccion: Dict[str, Any]) -> str:
+        """
+        Inserta una transacción (no modifica el diccionario recibido)
+
+        Returns:
+            _id asignado
+        """
+
+    @abstractmethod
+    async def listar(
+        self,
+        surtidor_id: Optional[str] = None,
+        tipo_combustible: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+        campos: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Transacciones más recientes primero (por fecha)
+
+        Args:
+            surtidor_id: Filtrar por surtidor (opcional)
+            tipo_combustible: Filtrar por combustible (opcional)
+            skip: Transacciones a saltar
+            limit: Cantidad máxima
+            campos: Campos a incluir (None = todos)
+        """
+
+    @abstractmethod
+    async def obtener(self, id_transaccion: str,
+                      campos: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """Transacción por _id o None (también si el _id no es válido)"""
+
+    @abstractmethod
+    async def resumen(self) -> Dict[str, Any]:
+        """{"total_transacciones": int, "ingresos_totales": suma de monto_total}"""
+
+
+class Almacenamiento(ABC):
+    """Driver de almacenamiento: conexión y repositorios"""
+
+    nombre = ""
+    surtidores: RepositorioSurtidores
+    transacciones: RepositorioTransacciones
+
+    @abstractmethod
+    async def conectar(self):
+        """Abre la conexión y prepara índices/tablas (idempotente)"""
+
+    @abstractmethod
+    async def desconectar(self):
+        """Libera la conexión"""
+
+
+def proyectar(documento: Dict[str, Any], campos: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Aplica una lista de campos a un documento (para los drivers sin proyección nativa)"""
+    if campos is None:
+        return documento
+    return {campo: documento[campo] for campo in campos if campo in documento}
+
+
+def crear_almacenamiento(driver: str = ALMACENAMIENTO, **opciones) -> Almacenamiento:
+    """
+    Construye el driver de almacenamiento indicado
+
+    Args:
+        driver: "mongo", "memoria" o "sqlite"
+        **opciones: Opciones del driver (ruta para sqlite)
+
+    Raises:
+        ValueError: Si el driver no existe
+    """
+    if driver == "mongo":
+        from almacenamiento_mongo import AlmacenamientoMongo
+        return AlmacenamientoMongo()
+    if driver == "memoria":
+        from almacenamiento_memoria import AlmacenamientoMemoria
+        return AlmacenamientoMemoria()
+    if driver == "sqlite":
+        from almacenamiento_sqlite import AlmacenamientoSQLite
+        return AlmacenamientoSQLite(opciones.get("ruta", SQLITE_RUTA))
+    raise ValueError(f"Driver de almacenamiento desconocido: {driver} (opciones: {', '.join(DRIVERS)})")
+
+
+# Instancia global usada por los servicios
+almacenamiento = crear_almacenamiento()
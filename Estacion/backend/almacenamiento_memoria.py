@@ -0,0 +1,149 @@
+"""
+Driver de almacenamiento en memoria
+Guarda los documentos en diccionarios del proceso: no persiste nada y no
+necesita servicios externos, lo que lo hace útil para pruebas y benchmarks.
+Cada operación corre completa dentro del event loop (sin awaits
+intermedios), por lo que es atómica frente a otras corrutinas. Los
+documentos se copian al entrar y al salir para que nadie modifique el
+estado guardado por referencia.
+"""
+import copy
+import itertools
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from almacenamiento import (
+    Almacenamiento,
+    ClaveDuplicada,
+    RepositorioSurtidores,
+    RepositorioTransacciones,
+    proyectar
+)
+
+
+class SurtidoresMemoria(RepositorioSurtidores):
+
+    def __init__(self):
+        self._surtidores: Dict[int, Dict[str, Any]] = {}
+        self._secuencia = 0
+        self._ids = itertools.count(1)
+
+    async def siguiente_id(self) -> int:
+        self._secuencia += 1
+        return self._secuencia
+
+    async def asegurar_id_minimo(self, valor: int):
+        self._secuencia = max(self._secuencia, valor)
+
+    async def insertar(self, surtidor: Dict[str, Any]) -> str:
+        id_surtidor = surtidor["id_surtidor"]
+        if id_surtidor in self._surtidores:
+            raise ClaveDuplicada(f"Ya existe un surtidor con ID {id_surtidor}")
+        documento = copy.deepcopy(surtidor)
+        documento["_id"] = str(next(self._ids))
+        self._surtidores[id_surtidor] = documento
+        return documento["_id"]
+
+    async def listar(self, estado_conexion: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [
+            copy.deepcopy(surtidor)
+            for _, surtidor in sorted(self._surtidores.items())
+            if estado_conexion is None or surtidor.get("estado_conexion") == estado_conexion
+        ]
+
+    async def obtener(self, id_surtidor: int) -> Optional[Dict[str, Any]]:
+        surtidor = self._surtidores.get(id_surtidor)
+        return copy.deepcopy(surtidor) if surtidor is not None else None
+
+    async def actualizar(self, id_surtidor: int, campos: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        surtidor = self._surtidores.get(id_surtidor)
+        if surtidor is None:
+            return None
+        surtidor.update(copy.deepcopy(campos))
+        return copy.deepcopy(surtidor)
+
+    async def sumar_transaccion(self, id_surtidor: int, litros: float, monto: int,
+                                fecha: datetime) -> Optional[Dict[str, Any]]:
+        surtidor = self._surtidores.get(id_surtidor)
+        if surtidor is None:
+            return None
+        surtidor["total_transacciones"] = surtidor.get("total_transacciones", 0) + 1
+        surtidor["litros_totales"] = surtidor.get("litros_totales", 0.0) + litros
+        surtidor["ingresos_totales"] = surtidor.get("ingresos_totales", 0) + monto
+        surtidor["fecha_actualizacion"] = fecha
+        return {"nombre": surtidor.get("nombre")}
+
+    async def eliminar(self, id_surtidor: int) -> bool:
+        return self._surtidores.pop(id_surtidor, None) is not None
+
+    async def existe_nombre(self, nombre: str, excluir_id: Optional[int] = None) -> bool:
+        return any(
+            surtidor.get("nombre") == nombre
+            for id_surtidor, surtidor in self._surtidores.items()
+            if id_surtidor != excluir_id
+        )
+
+    async def estadisticas(self) -> Dict[str, Any]:
+        surtidores = list(self._surtidores.values())
+        return {
+            "total_surtidores": len(surtidores),
+            "conectados": sum(1 for s in surtidores if s.get("estado_conexion") == "conectado"),
+            "disponibles": sum(1 for s in surtidores if s.get("estado") == "disponible"),
+            "total_transacciones": sum(s.get("total_transacciones", 0) for s in surtidores),
+            "total_litros": sum(s.get("litros_totales", 0.0) for s in surtidores),
+            "total_ingresos": sum(s.get("ingresos_totales", 0) for s in surtidores)
+        }
+
+
+class TransaccionesMemoria(RepositorioTransacciones):
+
+    def __init__(self):
+        self._transacciones: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+
+    async def insertar(self, transaccion: Dict[str, Any]) -> str:
+        documento = copy.deepcopy(transaccion)
+        documento["_id"] = str(next(self._ids))
+        self._transacciones[documento["_id"]] = documento
+        return documento["_id"]
+
+    async def listar(
+        self,
+        surtidor_id: Optional[str] = None,
+        tipo_combustible: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+        campos: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        seleccion = [
+            t for t in self._transacciones.values()
+            if (not surtidor_id or t.get("surtidor_id") == surtidor_id)
+            and (not tipo_combustible or t.get("tipo_combustible") == tipo_combustible)
+        ]
+        seleccion.sort(key=lambda t: t.get("fecha") or datetime.min, reverse=True)
+        return [proyectar(copy.deepcopy(t), campos) for t in seleccion[skip:skip + limit]]
+
+    async def obtener(self, id_transaccion: str,
+                      campos: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        transaccion = self._transacciones.get(id_transaccion)
+        return proyectar(copy.deepcopy(transaccion), campos) if transaccion is not None else None
+
+    async def resumen(self) -> Dict[str, Any]:
+        return {
+            "total_transacciones": len(self._transacciones),
+            "ingresos_totales": sum(t.get("monto_total") or 0 for t in self._transacciones.values())
+        }
+
+
+class AlmacenamientoMemoria(Almacenamiento):
+    nombre = "memoria"
+
+    def __init__(self):
+        self.surtidores = SurtidoresMemoria()
+        self.transacciones = TransaccionesMemoria()
+
+    async def conectar(self):
+        pass
+
+    async def desconectar(self):
+        pass
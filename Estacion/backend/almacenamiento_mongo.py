@@ -0,0 +1,184 @@
+"""
+Driver de almacenamiento sobre MongoDB (Motor)
+La conexión, los índices y la secuencia de IDs se preparan en database.py;
+aquí solo se traducen las operaciones de los repositorios a consultas.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from almacenamiento import (
+    Almacenamiento,
+    ClaveDuplicada,
+    RepositorioSurtidores,
+    RepositorioTransacciones
+)
+from database import conectar_db, desconectar_db, obtener_database
+from secuencias import asegurar_minimo, siguiente_id
+
+# Nombre de la secuencia de IDs de surtidores en la colección de contadores
+SECUENCIA_SURTIDORES = "surtidores"
+
+
+def _con_id_texto(documento: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if documento and "_id" in documento:
+        documento["_id"] = str(documento["_id"])
+    return documento
+
+
+def _proyeccion(campos: Optional[Iterable[str]]) -> Optional[Dict[str, int]]:
+    return {campo: 1 for campo in campos} if campos is not None else None
+
+
+class SurtidoresMongo(RepositorioSurtidores):
+
+    async def siguiente_id(self) -> int:
+        return await siguiente_id(obtener_database(), SECUENCIA_SURTIDORES)
+
+    async def asegurar_id_minimo(self, valor: int):
+        await asegurar_minimo(obtener_database(), SECUENCIA_SURTIDORES, valor)
+
+    async def insertar(self, surtidor: Dict[str, Any]) -> str:
+        documento = dict(surtidor)
+        try:
+            resultado = await obtener_database().surtidores.insert_one(documento)
+        except DuplicateKeyError:
+            raise ClaveDuplicada(f"Ya existe un surtidor con ID {surtidor['id_surtidor']}")
+        return str(resultado.inserted_id)
+
+    async def listar(self, estado_conexion: Optional[str] = None) -> List[Dict[str, Any]]:
+        filtro = {"estado_conexion": estado_conexion} if estado_conexion is not None else {}
+        cursor = obtener_database().surtidores.find(filtro).sort("id_surtidor", 1)
+        return [_con_id_texto(surtidor) async for surtidor in cursor]
+
+    async def obtener(self, id_surtidor: int) -> Optional[Dict[str, Any]]:
+        return _con_id_texto(await obtener_database().surtidores.find_one({"id_surtidor": id_surtidor}))
+
+    async def actualizar(self, id_surtidor: int, campos: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Actualizar y obtener el surtidor actualizado en un solo round-trip
+        surtidor = await obtener_database().surtidores.find_one_and_update(
+            {"id_surtidor": id_surtidor},
+            {"$set": campos},
+            return_document=ReturnDocument.AFTER
+        )
+        return _con_id_texto(surtidor)
+
+    async def sumar_transaccion(self, id_surtidor: int, litros: float, monto: int,
+                                fecha: datetime) -> Optional[Dict[str, Any]]:
+        return await obtener_database().surtidores.find_one_and_update(
+            {"id_surtidor": id_surtidor},
+            {
+                "$inc": {
+                    "total_transacciones": 1,
+                    "litros_totales": litros,
+                    "ingresos_totales": monto
+                },
+                "$set": {
+                    "fecha_actualizacion": fecha
+                }
+            },
+            projection={"_id": 0, "nombre": 1}
+        )
+
+    async def eliminar(self, id_surtidor: int) -> bool:
+        resultado = await obtener_database().surtidores.delete_one({"id_surtidor": id_surtidor})
+        return resultado.deleted_count > 0
+
+    async def existe_nombre(self, nombre: str, excluir_id: Optional[int] = None) -> bool:
+        query: Dict[str, Any] = {"nombre": nombre}
+        if excluir_id is not None:
+            query["id_surtidor"] = {"$ne": excluir_id}
+        return await obtener_database().surtidores.find_one(query, {"_id": 1}) is not None
+
+    async def estadisticas(self) -> Dict[str, Any]:
+        coleccion = obtener_database().surtidores
+
+        total = await coleccion.count_documents({})
+        conectados = await coleccion.count_documents({"estado_conexion": "conectado"})
+        disponibles = await coleccion.count_documents({"estado": "disponible"})
+
+        pipeline = [
+            {
+                "$group": {
+                    "_id": None,
+                    "total_transacciones": {"$sum": "$total_transacciones"},
+                    "total_litros": {"$sum": "$litros_totales"},
+                    "total_ingresos": {"$sum": "$ingresos_totales"}
+                }
+            }
+        ]
+        resultado = await coleccion.aggregate(pipeline).to_list(1)
+        stats = resultado[0] if resultado else {}
+
+        return {
+            "total_surtidores": total,
+            "conectados": conectados,
+            "disponibles": disponibles,
+            "total_transacciones": stats.get("total_transacciones", 0),
+            "total_litros": stats.get("total_litros", 0.0),
+            "total_ingresos": stats.get("total_ingresos", 0)
+        }
+
+
+class TransaccionesMongo(RepositorioTransacciones):
+
+    async def insertar(self, transaccion: Dict[str, Any]) -> str:
+        resultado = await obtener_database().transacciones.insert_one(dict(transaccion))
+        return str(resultado.inserted_id)
+
+    async def listar(
+        self,
+        surtidor_id: Optional[str] = None,
+        tipo_combustible: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+        campos: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        filtro = {}
+        if surtidor_id:
+            filtro["surtidor_id"] = surtidor_id
+        if tipo_combustible:
+            filtro["tipo_combustible"] = tipo_combustible
+
+        cursor = obtener_database().transacciones.find(
+            filtro,
+            _proyeccion(campos)
+        ).sort("fecha", -1).skip(skip).limit(limit)
+        return [_con_id_texto(transaccion) for transaccion in await cursor.to_list(length=limit)]
+
+    async def obtener(self, id_transaccion: str,
+                      campos: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        try:
+            filtro = {"_id": ObjectId(id_transaccion)}
+        except InvalidId:
+            return None
+        return _con_id_texto(await obtener_database().transacciones.find_one(filtro, _proyeccion(campos)))
+
+    async def resumen(self) -> Dict[str, Any]:
+        coleccion = obtener_database().transacciones
+        total = await coleccion.count_documents({})
+        resultado = await coleccion.aggregate([
+            {"$group": {"_id": None, "total": {"$sum": "$monto_total"}}}
+        ]).to_list(1)
+        return {
+            "total_transacciones": total,
+            "ingresos_totales": resultado[0]["total"] if resultado else 0
+        }
+
+
+class AlmacenamientoMongo(Almacenamiento):
+    nombre = "mongo"
+
+    def __init__(self):
+        self.surtidores = SurtidoresMongo()
+        self.transacciones = TransaccionesMongo()
+
+    async def conectar(self):
+        await conectar_db()
+
+    async def desconectar(self):
+        await desconectar_db()
@@ -0,0 +1,362 @@
+"""
+Driver de almacenamiento sobre SQLite embebido
+Pensado para estaciones pequeñas que no pueden correr un contenedor de
+mongod: la base es un único archivo (SQLITE_RUTA) y no requiere
+dependencias fuera de la biblioteca estándar.
+
+sqlite3 es bloqueante, así que todas las operaciones se ejecutan en un
+único hilo dedicado (ThreadPoolExecutor de un worker) y el event loop solo
+espera el resultado. Al haber un solo hilo escritor, cada operación de
+lectura-modificación-escritura es atómica sin locks adicionales.
+
+Cada fila guarda el documento completo como JSON (las fechas se etiquetan
+para recuperarlas como datetime) y copia en columnas propias los campos
+por los que se filtra u ordena, que son los que llevan índice.
+"""
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from almacenamiento import (
+    Almacenamiento,
+    ClaveDuplicada,
+    RepositorioSurtidores,
+    RepositorioTransacciones,
+    proyectar
+)
+from bitacora import obtener_registrador
+
+log = obtener_registrador("database")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS contadores (
+    nombre TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS surtidores (
+    id_surtidor INTEGER PRIMARY KEY,
+    nombre TEXT,
+    estado TEXT,
+    estado_conexion TEXT,
+    documento TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_surtidores_estado_conexion ON surtidores (estado_conexion);
+CREATE TABLE IF NOT EXISTS transacciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    surtidor_id TEXT,
+    tipo_combustible TEXT,
+    fecha TEXT,
+    monto_total REAL,
+    documento TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transacciones_fecha ON transacciones (fecha);
+CREATE INDEX IF NOT EXISTS idx_transacciones_surtidor ON transacciones (surtidor_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_transacciones_combustible ON transacciones (tipo_combustible, fecha);
+"""
+
+SECUENCIA_SURTIDORES = "surtidores"
+
+
+# ============================================
+# CODIFICACIÓN DE DOCUMENTOS
+# ============================================
+
+def _a_json(valor: Any) -> Any:
+    if isinstance(valor, datetime):
+        return {"$fecha": valor.isoformat()}
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def _desde_json(objeto: Dict[str, Any]) -> Any:
+    if len(objeto) == 1 and "$fecha" in objeto:
+        return datetime.fromisoformat(objeto["$fecha"])
+    return objeto
+
+
+def _codificar(documento: Dict[str, Any]) -> str:
+    return json.dumps({k: v for k, v in documento.items() if k != "_id"}, default=_a_json)
+
+
+def _decodificar(texto: str, _id: Any) -> Dict[str, Any]:
+    documento = json.loads(texto, object_hook=_desde_json)
+    documento["_id"] = str(_id)
+    return documento
+
+
+def _fecha_ordenable(fecha: Any) -> Optional[str]:
+    """Texto ISO con microsegundos: ordena igual que el datetime"""
+    if isinstance(fecha, datetime):
+        return fecha.isoformat(timespec="microseconds")
+    return str(fecha) if fecha is not None else None
+
+
+class _ConexionSQLite:
+    """Conexión SQLite confinada a un hilo dedicado"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._ejecutor: Optional[ThreadPoolExecutor] = None
+        self._conexion: Optional[sqlite3.Connection] = None
+
+    def _abrir(self):
+        conexion = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        conexion.executescript(ESQUEMA)
+        self._conexion = conexion
+
+    async def abrir(self):
+        if self._ejecutor is None:
+            self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+            await self.ejecutar(lambda conexion: None, abrir=True)
+
+    async def ejecutar(self, operacion: Callable[[sqlite3.Connection], Any], abrir: bool = False) -> Any:
+        """
+        Ejecuta operacion(conexion) en el hilo de SQLite dentro de una transacción
+
+        Args:
+            operacion: Función síncrona que recibe la conexión
+        """
+        def en_hilo():
+            if abrir:
+                self._abrir()
+            conexion = self._conexion
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                resultado = operacion(conexion)
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+            conexion.execute("COMMIT")
+            return resultado
+
+        if self._ejecutor is None:
+            raise RuntimeError("El almacenamiento SQLite no está conectado")
+        return await asyncio.get_running_loop().run_in_executor(self._ejecutor, en_hilo)
+
+    async def cerrar(self):
+        if self._ejecutor is None:
+            return
+        ejecutor, self._ejecutor = self._ejecutor, None
+        if self._conexion is not None:
+            await asyncio.get_running_loop().run_in_executor(ejecutor, self._conexion.close)
+            self._conexion = None
+        ejecutor.shutdown(wait=True)
+
+
+# ============================================
+# REPOSITORIOS
+# ============================================
+
+class SurtidoresSQLite(RepositorioSurtidores):
+
+    def __init__(self, conexion: _ConexionSQLite):
+        self._db = conexion
+
+    @staticmethod
+    def _leer(conexion: sqlite3.Connection, id_surtidor: int) -> Optional[Dict[str, Any]]:
+        fila = conexion.execute(
+            "SELECT documento, id_surtidor FROM surtidores WHERE id_surtidor = ?", (id_surtidor,)
+        ).fetchone()
+        return _decodificar(*fila) if fila else None
+
+    @staticmethod
+    def _escribir(conexion: sqlite3.Connection, surtidor: Dict[str, Any]):
+        conexion.execute(
+            "UPDATE surtidores SET nombre = ?, estado = ?, estado_conexion = ?, documento = ? "
+            "WHERE id_surtidor = ?",
+            (surtidor.get("nombre"), surtidor.get("estado"), surtidor.get("estado_conexion"),
+             _codificar(surtidor), surtidor["id_surtidor"])
+        )
+
+    async def siguiente_id(self) -> int:
+        def operacion(conexion):
+            conexion.execute(
+                "INSERT INTO contadores (nombre, valor) VALUES (?, 1) "
+                "ON CONFLICT(nombre) DO UPDATE SET valor = valor + 1",
+                (SECUENCIA_SURTIDORES,)
+            )
+            return conexion.execute(
+                "SELECT valor FROM contadores WHERE nombre = ?", (SECUENCIA_SURTIDORES,)
+            ).fetchone()[0]
+        return await self._db.ejecutar(operacion)
+
+    async def asegurar_id_minimo(self, valor: int):
+        await self._db.ejecutar(lambda conexion: conexion.execute(
+            "INSERT INTO contadores (nombre, valor) VALUES (?, ?) "
+            "ON CONFLICT(nombre) DO UPDATE SET valor = MAX(valor, excluded.valor)",
+            (SECUENCIA_SURTIDORES, valor)
+        ))
+
+    async def insertar(self, surtidor: Dict[str, Any]) -> str:
+        def operacion(conexion):
+            conexion.execute(
+                "INSERT INTO surtidores (id_surtidor, nombre, estado, estado_conexion, documento) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (surtidor["id_surtidor"], surtidor.get("nombre"), surtidor.get("estado"),
+                 surtidor.get("estado_conexion"), _codificar(surtidor))
+            )
+        try:
+            await self._db.ejecutar(operacion)
+        except sqlite3.IntegrityError:
+            raise ClaveDuplicada(f"Ya existe un surtidor con ID {surtidor['id_surtidor']}")
+        return str(surtidor["id_surtidor"])
+
+    async def listar(self, estado_conexion: Optional[str] = None) -> List[Dict[str, Any]]:
+        def operacion(conexion):
+            if estado_conexion is None:
+                filas = conexion.execute(
+                    "SELECT documento, id_surtidor FROM surtidores ORDER BY id_surtidor"
+                )
+            else:
+                filas = conexion.execute(
+                    "SELECT documento, id_surtidor FROM surtidores WHERE estado_conexion = ? "
+                    "ORDER BY id_surtidor",
+                    (estado_conexion,)
+                )
+            return [_decodificar(*fila) for fila in filas]
+        return await self._db.ejecutar(operacion)
+
+    async def obtener(self, id_surtidor: int) -> Optional[Dict[str, Any]]:
+        return await self._db.ejecutar(lambda conexion: self._leer(conexion, id_surtidor))
+
+    async def actualizar(self, id_surtidor: int, campos: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        def operacion(conexion):
+            surtidor = self._leer(conexion, id_surtidor)
+            if surtidor is None:
+                return None
+            surtidor.update(campos)
+            self._escribir(conexion, surtidor)
+            return surtidor
+        return await self._db.ejecutar(operacion)
+
+    async def sumar_transaccion(self, id_surtidor: int, litros: float, monto: int,
+                                fecha: datetime) -> Optional[Dict[str, Any]]:
+        def operacion(conexion):
+            surtidor = self._leer(conexion, id_surtidor)
+            if surtidor is None:
+                return None
+            surtidor["total_transacciones"] = surtidor.get("total_transacciones", 0) + 1
+            surtidor["litros_totales"] = surtidor.get("litros_totales", 0.0) + litros
+            surtidor["ingresos_totales"] = surtidor.get("ingresos_totales", 0) + monto
+            surtidor["fecha_actualizacion"] = fecha
+            self._escribir(conexion, surtidor)
+            return {"nombre": surtidor.get("nombre")}
+        return await self._db.ejecutar(operacion)
+
+    async def eliminar(self, id_surtidor: int) -> bool:
+        return await self._db.ejecutar(lambda conexion: conexion.execute(
+            "DELETE FROM surtidores WHERE id_surtidor = ?", (id_surtidor,)
+        ).rowcount > 0)
+
+    async def existe_nombre(self, nombre: str, excluir_id: Optional[int] = None) -> bool:
+        return await self._db.ejecutar(lambda conexion: conexion.execute(
+            "SELECT 1 FROM surtidores WHERE nombre = ? AND id_surtidor IS NOT ? LIMIT 1",
+            (nombre, excluir_id)
+        ).fetchone() is not None)
+
+    async def estadisticas(self) -> Dict[str, Any]:
+        def operacion(conexion):
+            fila = conexion.execute(
+                """
+                SELECT COUNT(*),
+                       COALESCE(SUM(estado_conexion = 'conectado'), 0),
+                       COALESCE(SUM(estado = 'disponible'), 0),
+                       COALESCE(SUM(json_extract(documento, '$.total_transacciones')), 0),
+                       COALESCE(SUM(json_extract(documento, '$.litros_totales')), 0.0),
+                       COALESCE(SUM(json_extract(documento, '$.ingresos_totales')), 0)
+                FROM surtidores
+                """
+            ).fetchone()
+            return {
+                "total_surtidores": fila[0],
+                "conectados": fila[1],
+                "disponibles": fila[2],
+                "total_transacciones": fila[3],
+                "total_litros": fila[4],
+                "total_ingresos": fila[5]
+            }
+        return await self._db.ejecutar(operacion)
+
+
+class TransaccionesSQLite(RepositorioTransacciones):
+
+    def __init__(self, conexion: _ConexionSQLite):
+        self._db = conexion
+
+    async def insertar(self, transaccion: Dict[str, Any]) -> str:
+        def operacion(conexion):
+            cursor = conexion.execute(
+                "INSERT INTO transacciones (surtidor_id, tipo_combustible, fecha, monto_total, documento) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (transaccion.get("surtidor_id"), transaccion.get("tipo_combustible"),
+                 _fecha_ordenable(transaccion.get("fecha")), transaccion.get("monto_total"),
+                 _codificar(transaccion))
+            )
+            return str(cursor.lastrowid)
+        return await self._db.ejecutar(operacion)
+
+    async def listar(
+        self,
+        surtidor_id: Optional[str] = None,
+        tipo_combustible: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+        campos: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        condiciones, parametros = [], []
+        if surtidor_id:
+            condiciones.append("surtidor_id = ?")
+            parametros.append(surtidor_id)
+        if tipo_combustible:
+            condiciones.append("tipo_combustible = ?")
+            parametros.append(tipo_combustible)
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        consulta = (f"SELECT documento, id FROM transacciones {donde} "
+                    f"ORDER BY fecha DESC LIMIT ? OFFSET ?")
+        campos = list(campos) if campos is not None else None
+
+        def operacion(conexion):
+            filas = conexion.execute(consulta, (*parametros, limit, skip))
+            return [proyectar(_decodificar(*fila), campos) for fila in filas]
+        return await self._db.ejecutar(operacion)
+
+    async def obtener(self, id_transaccion: str,
+                      campos: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        if not str(id_transaccion).isdigit():
+            return None
+
+        def operacion(conexion):
+            fila = conexion.execute(
+                "SELECT documento, id FROM transacciones WHERE id = ?", (int(id_transaccion),)
+            ).fetchone()
+            return proyectar(_decodificar(*fila), campos) if fila else None
+        return await self._db.ejecutar(operacion)
+
+    async def resumen(self) -> Dict[str, Any]:
+        def operacion(conexion):
+            total, ingresos = conexion.execute(
+                "SELECT COUNT(*), COALESCE(SUM(monto_total), 0) FROM transacciones"
+            ).fetchone()
+            return {"total_transacciones": total, "ingresos_totales": int(ingresos)}
+        return await self._db.ejecutar(operacion)
+
+
+class AlmacenamientoSQLite(Almacenamiento):
+    nombre = "sqlite"
+
+    def __init__(self, ruta: str):
+        self._conexion = _ConexionSQLite(ruta)
+        self.surtidores = SurtidoresSQLite(self._conexion)
+        self.transacciones = TransaccionesSQLite(self._conexion)
+
+    async def conectar(self):
+        await self._conexion.abrir()
+        log.info("Almacenamiento SQLite listo", ruta=self._conexion.ruta)
+
+    async def desconectar(self):
+        await self._conexion.cerrar()
+        log.info("Almacenamiento SQLite cerrado", ruta=self._conexion.ruta)
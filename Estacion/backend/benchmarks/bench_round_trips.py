@@ -0,0 +1,118 @@
+"""
+Micro-benchmark de round-trips a MongoDB por operación de escritura
+Cuenta los comandos que cada ruta de escritura envía al servidor
+(usando un CommandListener de pymongo) y mide su latencia media.
+
+Uso (requiere un MongoDB accesible en MONGODB_URL):
+    python benchmarks/bench_round_trips.py [--repeticiones 50]
+
+Trabaja sobre una base de datos temporal que se elimina al terminar.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_NAME"] = os.getenv("BENCH_DATABASE_NAME", "bench_round_trips")
+# Los round-trips solo tienen sentido sobre el driver de MongoDB
+os.environ["ALMACENAMIENTO"] = "mongo"
+
+
+class ContadorComandos(monitoring.CommandListener):
+    """Cuenta los comandos enviados agrupados por colección"""
+
+    def __init__(self):
+        self.por_coleccion = Counter()
+
+    def started(self, event):
+        coleccion = event.command.get(event.command_name)
+        if isinstance(coleccion, str):
+            self.por_coleccion[coleccion] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reiniciar(self):
+        self.por_coleccion.clear()
+
+
+# Debe registrarse antes de que database.py cree el cliente
+contador = ContadorComandos()
+monitoring.register(contador)
+
+import database  # noqa: E402
+from main import crear_transaccion  # noqa: E402
+from models import SurtidorCreate, SurtidorUpdate, TransaccionCreate  # noqa: E402
+from surtidores_service import actualizar_surtidor, crear_surtidor  # noqa: E402
+from tcp_server_surtidores import guardar_transaccion  # noqa: E402
+
+
+async def medir(nombre, coleccion, operacion, repeticiones):
+    """Ejecuta una operación N veces y retorna comandos por llamada y latencia"""
+    await operacion(0)  # calentamiento
+    contador.reiniciar()
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        await operacion(i + 1)
+    duracion = time.perf_counter() - inicio
+
+    por_llamada = {c: n / repeticiones for c, n in contador.por_coleccion.items()}
+    return {
+        "operacion": nombre,
+        "coleccion": por_llamada.get(coleccion, 0),
+        "total": sum(por_llamada.values()),
+        "ms": duracion / repeticiones * 1000
+    }
+
+
+async def main(repeticiones: int):
+    await database.conectar_db()
+    db = database.obtener_database()
+    base = await crear_surtidor(SurtidorCreate(nombre="Bench base"))
+    id_base = base["id_surtidor"]
+
+    async def op_crear_surtidor(i):
+        await crear_surtidor(SurtidorCreate(nombre=f"Bench {i}"))
+
+    async def op_actualizar_surtidor(i):
+        await actualizar_surtidor(id_base, SurtidorUpdate(capacidad_maxima=100.0 + i))
+
+    async def op_crear_transaccion(i):
+        await crear_transaccion(TransaccionCreate(
+            surtidor_id=str(id_base), tipo_combustible="95", litros=10.0,
+            precio_por_litro=1350, monto_total=13500
+        ))
+
+    async def op_guardar_transaccion(i):
+        await guardar_transaccion(id_base, {
+            "tipo_combustible": "95", "litros": 10.0, "precio_por_litro": 1350, "monto_total": 13500
+        })
+
+    resultados = [
+        await medir("crear_surtidor", "surtidores", op_crear_surtidor, repeticiones),
+        await medir("actualizar_surtidor", "surtidores", op_actualizar_surtidor, repeticiones),
+        await medir("POST /transacciones", "transacciones", op_crear_transaccion, repeticiones),
+        await medir("guardar_transaccion", "transacciones", op_guardar_transaccion, repeticiones),
+    ]
+
+    print(f"{'operación':<24}{'rt colección':>14}{'rt total':>10}{'ms/op':>10}")
+    for r in resultados:
+        print(f"{r['operacion']:<24}{r['coleccion']:>14.1f}{r['total']:>10.1f}{r['ms']:>10.2f}")
+
+    await database.mongodb_client.drop_database(db.name)
+    await database.desconectar_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeticiones))
@@ -0,0 +1,127 @@
+"""
+Micro-benchmark de serialización de respuestas por endpoint
+Compara, sobre listas de 100, 1.000 y 10.000 elementos, el camino anterior
+(TransaccionResponse por fila + validación contra response_model +
+JSONResponse) con RespuestaJSON (documentos tal cual, orjson). No requiere
+MongoDB: los datos se generan en memoria con la forma de la colección.
+
+Uso:
+    python benchmarks/bench_serializacion.py [--repeticiones 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app  # noqa: E402
+from models import TransaccionResponse  # noqa: E402
+from respuestas import RespuestaJSON  # noqa: E402
+
+TAMANOS = (100, 1_000, 10_000)
+AHORA = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def generar_transacciones(n):
+    return [
+        {
+            "_id": ObjectId(),
+            "surtidor_id": str(i % 8 + 1),
+            "tipo_combustible": "95",
+            "litros": 30.5,
+            "precio_por_litro": 1350,
+            "monto_total": 41175,
+            "metodo_pago": "tarjeta",
+            "fecha": AHORA,
+            "estado": "completada"
+        }
+        for i in range(n)
+    ]
+
+
+def generar_surtidores(n):
+    return [
+        {
+            "_id": str(ObjectId()),
+            "id_surtidor": i,
+            "nombre": f"Surtidor {i}",
+            "estado": "disponible",
+            "estado_conexion": "conectado",
+            "combustibles_soportados": ["93", "95", "97", "diesel"],
+            "combustible_actual": "95",
+            "capacidad_maxima": 100.0,
+            "fecha_creacion": AHORA,
+            "fecha_actualizacion": AHORA,
+            "ultima_conexion": AHORA,
+            "total_transacciones": 120,
+            "litros_totales": 3600.5,
+            "ingresos_totales": 4860675
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def construir_transacciones(docs):
+    """Lo que hacía antes listar_transacciones: str(_id) y un modelo por fila"""
+    modelos = []
+    for t in docs:
+        t = dict(t, _id=str(t["_id"]))
+        modelos.append(TransaccionResponse(**t))
+    return modelos
+
+
+ENDPOINTS = [
+    ("/transacciones", generar_transacciones, construir_transacciones),
+    ("/api/surtidores", generar_surtidores, None),
+]
+
+
+def campo_respuesta(ruta):
+    for route in app.routes:
+        if getattr(route, "path", None) == ruta and "GET" in route.methods:
+            return route.response_field
+    raise LookupError(ruta)
+
+
+async def antes(campo, contenido, construir):
+    if construir:
+        contenido = construir(contenido)
+    validado = await serialize_response(field=campo, response_content=contenido)
+    return JSONResponse(validado).body
+
+
+async def despues(campo, contenido, construir):
+    return RespuestaJSON(contenido).body
+
+
+async def medir(funcion, campo, contenido, construir, repeticiones):
+    await funcion(campo, contenido, construir)  # calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        await funcion(campo, contenido, construir)
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+async def main(repeticiones: int):
+    print(f"{'endpoint':<20}{'items':>8}{'antes ms':>11}{'después ms':>12}{'x':>7}")
+    for ruta, generar, construir in ENDPOINTS:
+        campo = campo_respuesta(ruta)
+        for n in TAMANOS:
+            contenido = generar(n)
+            ms_antes = await medir(antes, campo, contenido, construir, repeticiones)
+            ms_despues = await medir(despues, campo, contenido, construir, repeticiones)
+            print(f"{ruta:<20}{n:>8}{ms_antes:>11.2f}{ms_despues:>12.2f}{ms_antes / ms_despues:>7.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeticiones))
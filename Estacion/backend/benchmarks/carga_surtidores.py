@@ -0,0 +1,450 @@
+"""
+Generador de carga: flota de surtidores simulados contra el servidor de surtidores
+Simula N surtidores (1 a 10.000) en un solo proceso asyncio. Cada uno
+habla el protocolo real de tcp_server_surtidores.py: registro por TCP y
+espera de registro_confirmado, registro_udp, heartbeat periódico, estado
+por TCP al iniciar y terminar cada carga (y cada 5 ticks como respaldo),
+estado_rapido por UDP en cada tick de despacho y transaccion_completada
+al final de la carga.
+
+Mide:
+    - Mensajes/s sostenidos (enviados por TCP y UDP, recibidos por TCP)
+      en la ventana posterior a la rampa de conexión
+    - Tiempo de establecimiento de conexión (connect + registro confirmado)
+    - Latencia de commit de transacciones: desde que se envía
+      transaccion_completada hasta que la estación la guarda y la publica
+      como nueva_transaccion en su puerto de clientes (5000), donde este
+      script se conecta como observador
+    - CPU y RSS del proceso servidor (--pid, leyendo /proc; solo Linux)
+
+Los resultados se escriben en un archivo JSON para comparar corridas.
+Los surtidores se auto-registran en la base de la estación con IDs desde
+--id-inicial, por lo que conviene usar una base de pruebas.
+
+Uso:
+    python benchmarks/carga_surtidores.py --surtidores 1000 --duracion 60 \\
+        --pid $(pgrep -f "uvicorn main:app") --salida resultados/1000.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Tiempo máximo para conectar y recibir registro_confirmado
+TIMEOUT_REGISTRO = 30.0
+
+
+# ============================================
+# ESTADÍSTICAS
+# ============================================
+
+def percentiles(valores: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p90/p99/máximo en milisegundos"""
+    if not valores:
+        return {"n": 0, "p50": None, "p90": None, "p99": None, "max": None}
+    ordenados = sorted(valores)
+
+    def p(q):
+        return round(ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))] * 1000, 2)
+
+    return {"n": len(ordenados), "p50": p(0.50), "p90": p(0.90), "p99": p(0.99),
+            "max": round(ordenados[-1] * 1000, 2)}
+
+
+class Resultados:
+    """Contadores compartidos por todos los surtidores simulados"""
+
+    def __init__(self):
+        self.enviados_tcp = 0
+        self.enviados_udp = 0
+        self.recibidos_tcp = 0
+        self.por_tipo: Dict[str, int] = {}
+        self.conexion: List[float] = []
+        self.fallos_conexion = 0
+        self.desconexiones = 0
+        self.commit: List[float] = []
+        # Transacciones enviadas a la espera de ser observadas: {(id, fecha): instante}
+        self.pendientes: Dict[tuple, float] = {}
+        self.transacciones_enviadas = 0
+
+    def enviado(self, protocolo: str, tipo: str):
+        if protocolo == "tcp":
+            self.enviados_tcp += 1
+        else:
+            self.enviados_udp += 1
+        self.por_tipo[tipo] = self.por_tipo.get(tipo, 0) + 1
+
+    def total_mensajes(self) -> int:
+        return self.enviados_tcp + self.enviados_udp + self.recibidos_tcp
+
+
+class MonitorProceso:
+    """Muestrea CPU y RSS de un proceso leyendo /proc/<pid>"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.rss_max_mb = 0.0
+        self.muestras_cpu: List[float] = []
+
+    def _cpu_segundos(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            campos = f.read().rsplit(")", 1)[1].split()
+        # utime y stime son los campos 14 y 15 (índices 11 y 12 tras el nombre)
+        return (int(campos[11]) + int(campos[12])) / self.ticks
+
+    def _rss_mb(self) -> float:
+        with open(f"/proc/{self.pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+        return 0.0
+
+    async def ejecutar(self, detener: asyncio.Event):
+        anterior_cpu, anterior_t = self._cpu_segundos(), time.monotonic()
+        while not detener.is_set():
+            try:
+                await asyncio.wait_for(detener.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            cpu, t = self._cpu_segundos(), time.monotonic()
+            self.muestras_cpu.append((cpu - anterior_cpu) / (t - anterior_t) * 100)
+            anterior_cpu, anterior_t = cpu, t
+            self.rss_max_mb = max(self.rss_max_mb, self._rss_mb())
+
+    def resumen(self) -> Dict[str, Any]:
+        muestras = self.muestras_cpu or [0.0]
+        return {
+            "pid": self.pid,
+            "cpu_promedio_pct": round(sum(muestras) / len(muestras), 1),
+            "cpu_max_pct": round(max(muestras), 1),
+            "rss_final_mb": round(self._rss_mb(), 1),
+            "rss_max_mb": round(self.rss_max_mb, 1)
+        }
+
+
+# ============================================
+# SURTIDOR SIMULADO
+# ============================================
+
+class ProtocoloUDP(asyncio.DatagramProtocol):
+    pass
+
+
+async def surtidor(id_surtidor: int, args, udp: asyncio.DatagramTransport,
+                   resultados: Resultados, detener: asyncio.Event):
+    """Ciclo de vida completo de un surtidor: registro, cargas y heartbeats"""
+    inicio = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(args.host, args.puerto_tcp), timeout=TIMEOUT_REGISTRO
+        )
+    except (OSError, asyncio.TimeoutError):
+        resultados.fallos_conexion += 1
+        return
+
+    def enviar_tcp(mensaje: Dict[str, Any]):
+        writer.write((json.dumps(mensaje) + "\n").encode())
+        resultados.enviado("tcp", mensaje["tipo"])
+
+    def enviar_udp(mensaje: Dict[str, Any]):
+        udp.sendto(json.dumps(mensaje).encode())
+        resultados.enviado("udp", mensaje["tipo"])
+
+    async def leer():
+        """Consume lo que envía la estación (confirmación, precios, comandos)"""
+        while True:
+            linea = await reader.readline()
+            if not linea:
+                return
+            resultados.recibidos_tcp += 1
+
+    try:
+        enviar_tcp({
+            "tipo": "registro",
+            "id_surtidor": id_surtidor,
+            "nombre": f"Carga {id_surtidor}",
+            "combustibles_soportados": ["93", "95", "97", "diesel"],
+            "version": "2.0"
+        })
+        await writer.drain()
+        confirmacion = await asyncio.wait_for(reader.readline(), timeout=TIMEOUT_REGISTRO)
+        if b"registro_confirmado" not in confirmacion:
+            resultados.fallos_conexion += 1
+            return
+        resultados.recibidos_tcp += 1
+        resultados.conexion.append(time.perf_counter() - inicio)
+        precio = json.loads(confirmacion).get("precios", {}).get("precio_95", 1350)
+    except (OSError, asyncio.TimeoutError, ValueError):
+        resultados.fallos_conexion += 1
+        writer.close()
+        return
+
+    lector = asyncio.create_task(leer())
+    enviar_tcp({"tipo": "registro_udp", "ip": "127.0.0.1", "puerto": 0})
+    enviar_udp({"tipo": "registro_udp", "id_surtidor": id_surtidor})
+
+    intervalo_tick = 1.0 / args.tasa_despacho
+    proximo_heartbeat = time.monotonic() + args.heartbeat
+
+    def estado(estado_operacion: str, litros: float, monto: int, tipo: str = "estado"):
+        return {
+            "tipo": tipo,
+            "id_surtidor": id_surtidor,
+            "estado_operacion": estado_operacion,
+            "litros_actuales": litros,
+            "monto_actual": monto,
+            "tipo_combustible": "95",
+            "timestamp": datetime.now().isoformat()
+        }
+
+    try:
+        while not detener.is_set():
+            # Pausa entre cargas (aleatoria para no sincronizar la flota)
+            await asyncio.sleep(random.uniform(0, 2 * args.pausa))
+            if detener.is_set():
+                break
+
+            fecha_inicio = datetime.now().isoformat()
+            enviar_tcp(estado("despachando", 0.0, 0))
+            litros = 0.0
+            for tick in range(1, args.ticks_por_carga + 1):
+                await asyncio.sleep(intervalo_tick)
+                litros += 1.0
+                monto = int(litros * precio)
+                enviar_udp(estado("despachando", litros, monto, tipo="estado_rapido"))
+                if tick % 5 == 0:
+                    enviar_tcp(estado("despachando", litros, monto))
+                if time.monotonic() >= proximo_heartbeat:
+                    enviar_tcp({"tipo": "heartbeat", "id_surtidor": id_surtidor,
+                                "timestamp": datetime.now().isoformat()})
+                    proximo_heartbeat += args.heartbeat
+
+            fecha_fin = datetime.now().isoformat()
+            resultados.pendientes[(str(id_surtidor), fecha_fin)] = time.perf_counter()
+            resultados.transacciones_enviadas += 1
+            enviar_tcp({
+                "tipo": "transaccion_completada",
+                "id_surtidor": id_surtidor,
+                "tipo_combustible": "95",
+                "litros": litros,
+                "precio_por_litro": precio,
+                "monto_total": int(litros * precio),
+                "metodo_pago": random.choice(["efectivo", "tarjeta"]),
+                "fecha_inicio": fecha_inicio,
+                "fecha_fin": fecha_fin
+            })
+            enviar_tcp(estado("disponible", 0.0, 0))
+            await writer.drain()
+    except (OSError, ConnectionError):
+        resultados.desconexiones += 1
+    finally:
+        lector.cancel()
+        writer.close()
+
+
+async def observador(args, resultados: Resultados, listo: asyncio.Event):
+    """
+    Se conecta al puerto de clientes de la estación y empareja cada
+    nueva_transaccion publicada con la transacción enviada
+    """
+    try:
+        reader, writer = await asyncio.open_connection(args.host, args.puerto_observador)
+    except OSError as e:
+        print(f"Sin observador en {args.host}:{args.puerto_observador} ({e}): "
+              f"no se medirá la latencia de commit")
+        listo.set()
+        return
+
+    listo.set()
+    try:
+        while True:
+            linea = await reader.readline()
+            if not linea:
+                return
+            if b"nueva_transaccion" not in linea:
+                continue
+            ahora = time.perf_counter()
+            transaccion = json.loads(linea).get("transaccion", {})
+            enviado = resultados.pendientes.pop(
+                (str(transaccion.get("surtidor_id")), transaccion.get("fecha")), None
+            )
+            if enviado is not None:
+                resultados.commit.append(ahora - enviado)
+    finally:
+        writer.close()
+
+
+# ============================================
+# EJECUCIÓN
+# ============================================
+
+def subir_limite_archivos(necesarios: int):
+    """Sube el límite de descriptores abiertos hasta el máximo permitido"""
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if blando < necesarios:
+        nuevo = duro if duro == resource.RLIM_INFINITY else min(duro, max(necesarios, blando))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (nuevo, duro))
+        if nuevo < necesarios:
+            print(f"Aviso: límite de archivos abiertos {nuevo} < {necesarios} surtidores")
+
+
+async def ejecutar(args) -> Dict[str, Any]:
+    resultados = Resultados()
+    detener = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    udp, _ = await loop.create_datagram_endpoint(
+        ProtocoloUDP, remote_addr=(args.host, args.puerto_udp)
+    )
+
+    listo = asyncio.Event()
+    tarea_observador = asyncio.create_task(observador(args, resultados, listo))
+    await listo.wait()
+
+    monitor = MonitorProceso(args.pid) if args.pid else None
+    tarea_monitor = asyncio.create_task(monitor.ejecutar(detener)) if monitor else None
+
+    # Rampa: conectar los surtidores a ritmo constante
+    inicio = time.perf_counter()
+    tareas = []
+    espacio = 1.0 / args.rampa
+    for i in range(args.surtidores):
+        tareas.append(asyncio.create_task(
+            surtidor(args.id_inicial + i, args, udp, resultados, detener)
+        ))
+        await asyncio.sleep(espacio)
+
+    # Esperar a que terminen los registros antes de abrir la ventana de medición
+    limite = time.perf_counter() + TIMEOUT_REGISTRO
+    while (len(resultados.conexion) + resultados.fallos_conexion < args.surtidores
+           and time.perf_counter() < limite):
+        await asyncio.sleep(0.1)
+    fin_rampa = time.perf_counter()
+    mensajes_inicio = resultados.total_mensajes()
+
+    # Ventana sostenida con reporte de progreso cada 5 s
+    fin = fin_rampa + args.duracion
+    anterior, anterior_t = mensajes_inicio, fin_rampa
+    while time.perf_counter() < fin:
+        await asyncio.sleep(min(5.0, max(0.0, fin - time.perf_counter())))
+        ahora, total = time.perf_counter(), resultados.total_mensajes()
+        print(f"  t={ahora - fin_rampa:6.1f}s  {(total - anterior) / (ahora - anterior_t):9.0f} msg/s  "
+              f"transacciones={resultados.transacciones_enviadas}  commits={len(resultados.commit)}")
+        anterior, anterior_t = total, ahora
+
+    ventana = time.perf_counter() - fin_rampa
+    mensajes_ventana = resultados.total_mensajes() - mensajes_inicio
+
+    detener.set()
+    # Dar tiempo a que se observen los últimos commits
+    await asyncio.sleep(args.espera_final)
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+    tarea_observador.cancel()
+    if tarea_monitor:
+        await tarea_monitor
+    udp.close()
+
+    return {
+        "fecha": datetime.now().isoformat(),
+        "configuracion": {
+            "host": args.host,
+            "surtidores": args.surtidores,
+            "duracion_s": args.duracion,
+            "tasa_despacho_hz": args.tasa_despacho,
+            "ticks_por_carga": args.ticks_por_carga,
+            "pausa_media_s": args.pausa,
+            "heartbeat_s": args.heartbeat,
+            "rampa_por_s": args.rampa
+        },
+        "conexion": {
+            "establecidas": len(resultados.conexion),
+            "fallidas": resultados.fallos_conexion,
+            "desconexiones": resultados.desconexiones,
+            "rampa_s": round(fin_rampa - inicio, 2),
+            "latencia_ms": percentiles(resultados.conexion)
+        },
+        "throughput": {
+            "ventana_s": round(ventana, 2),
+            "mensajes_por_s": round(mensajes_ventana / ventana, 1),
+            "enviados_tcp": resultados.enviados_tcp,
+            "enviados_udp": resultados.enviados_udp,
+            "recibidos_tcp": resultados.recibidos_tcp,
+            "por_tipo": resultados.por_tipo
+        },
+        "transacciones": {
+            "enviadas": resultados.transacciones_enviadas,
+            "confirmadas": len(resultados.commit),
+            "sin_confirmar": len(resultados.pendientes),
+            "commit_ms": percentiles(resultados.commit)
+        },
+        "servidor": monitor.resumen() if monitor else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto-tcp", type=int, default=6000)
+    parser.add_argument("--puerto-udp", type=int, default=6001)
+    parser.add_argument("--puerto-observador", type=int, default=5000,
+                        help="Puerto de clientes de la estación donde se publica nueva_transaccion")
+    parser.add_argument("--surtidores", type=int, default=100, help="Cantidad de surtidores (1 a 10000)")
+    parser.add_argument("--id-inicial", type=int, default=1000, help="ID del primer surtidor simulado")
+    parser.add_argument("--duracion", type=float, default=60, help="Segundos de medición tras la rampa")
+    parser.add_argument("--tasa-despacho", type=float, default=1.0,
+                        help="Ticks de despacho por segundo (1 litro y un estado_rapido por tick)")
+    parser.add_argument("--ticks-por-carga", type=int, default=20, help="Ticks de cada carga")
+    parser.add_argument("--pausa", type=float, default=5.0, help="Pausa media entre cargas (s)")
+    parser.add_argument("--heartbeat", type=float, default=30.0, help="Intervalo de heartbeat (s)")
+    parser.add_argument("--rampa", type=float, default=500.0, help="Conexiones nuevas por segundo")
+    parser.add_argument("--espera-final", type=float, default=3.0,
+                        help="Segundos para observar los últimos commits al terminar")
+    parser.add_argument("--pid", type=int, help="PID del servidor para medir CPU/RSS (Linux)")
+    parser.add_argument("--salida", help="Archivo JSON de resultados "
+                                         "(default: carga_<surtidores>_<fecha>.json)")
+    args = parser.parse_args()
+
+    if not 1 <= args.surtidores <= 10_000:
+        parser.error("--surtidores debe estar entre 1 y 10000")
+    if args.tasa_despacho <= 0 or args.rampa <= 0:
+        parser.error("--tasa-despacho y --rampa deben ser positivos")
+    if args.pid and not os.path.exists(f"/proc/{args.pid}"):
+        parser.error(f"No existe /proc/{args.pid}: --pid requiere Linux y un PID local")
+
+    subir_limite_archivos(args.surtidores + 64)
+
+    print(f"Simulando {args.surtidores} surtidores contra {args.host}:{args.puerto_tcp} "
+          f"durante {args.duracion:.0f}s")
+    resultado = asyncio.run(ejecutar(args))
+
+    salida = args.salida or f"carga_{args.surtidores}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    if os.path.dirname(salida):
+        os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+    conexion, transacciones = resultado["conexion"], resultado["transacciones"]
+    print()
+    print(f"Conexiones:      {conexion['establecidas']} ok, {conexion['fallidas']} fallidas, "
+          f"p50 {conexion['latencia_ms']['p50']} ms, p99 {conexion['latencia_ms']['p99']} ms")
+    print(f"Throughput:      {resultado['throughput']['mensajes_por_s']} msg/s sostenidos")
+    print(f"Transacciones:   {transacciones['confirmadas']}/{transacciones['enviadas']} confirmadas, "
+          f"commit p50 {transacciones['commit_ms']['p50']} ms, p99 {transacciones['commit_ms']['p99']} ms")
+    if resultado["servidor"]:
+        servidor = resultado["servidor"]
+        print(f"Servidor:        CPU {servidor['cpu_promedio_pct']}% (máx {servidor['cpu_max_pct']}%), "
+              f"RSS máx {servidor['rss_max_mb']} MB")
+    print(f"Resultados en {salida}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
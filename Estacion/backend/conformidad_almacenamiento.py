@@ -0,0 +1,229 @@
+"""
+Verificación de conformidad de los drivers de almacenamiento
+Ejecuta el mismo escenario sobre cada driver (memoria, sqlite y,
+si hay un MongoDB accesible, mongo) y comprueba que todos respondan igual
+a lo que esperan los servicios: secuencia de IDs, clave única, orden,
+filtros, proyección, totales y aislamiento de los documentos entregados.
+
+Uso:
+    python conformidad_almacenamiento.py [--drivers memoria sqlite mongo]
+
+El driver sqlite usa un archivo temporal; el driver mongo trabaja sobre una
+base de datos temporal (MONGODB_URL) que se elimina al terminar. Retorna
+código de salida 1 si algún driver no cumple.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from typing import List
+
+os.environ["DATABASE_NAME"] = os.getenv("CONFORMIDAD_DATABASE_NAME", "conformidad_almacenamiento")
+# La instancia global no se usa aquí: evitar que importe el driver de MongoDB
+os.environ.setdefault("ALMACENAMIENTO", "memoria")
+
+from almacenamiento import DRIVERS, Almacenamiento, ClaveDuplicada, crear_almacenamiento  # noqa: E402
+
+# Fechas sin microsegundos: MongoDB guarda milisegundos
+BASE = datetime(2024, 1, 15, 10, 30, 0)
+
+
+class Verificador:
+    """Acumula las comprobaciones de un driver"""
+
+    def __init__(self, driver: str):
+        self.driver = driver
+        self.total = 0
+        self.fallos: List[str] = []
+
+    def __call__(self, condicion: bool, descripcion: str):
+        self.total += 1
+        if not condicion:
+            self.fallos.append(descripcion)
+
+
+def surtidor(id_surtidor: int, nombre: str, **campos):
+    documento = {
+        "id_surtidor": id_surtidor,
+        "nombre": nombre,
+        "estado": "disponible",
+        "estado_conexion": "desconectado",
+        "combustibles_soportados": ["93", "95"],
+        "fecha_creacion": BASE,
+        "ultima_conexion": None,
+        "total_transacciones": 0,
+        "litros_totales": 0.0,
+        "ingresos_totales": 0
+    }
+    documento.update(campos)
+    return documento
+
+
+def transaccion(surtidor_id: str, tipo: str, monto: int, minutos: int):
+    return {
+        "surtidor_id": surtidor_id,
+        "tipo_combustible": tipo,
+        "litros": monto / 1000,
+        "precio_por_litro": 1000,
+        "monto_total": monto,
+        "metodo_pago": "efectivo",
+        "fecha": BASE + timedelta(minutes=minutos),
+        "estado": "completada"
+    }
+
+
+async def verificar_surtidores(db: Almacenamiento, ok: Verificador):
+    repo = db.surtidores
+
+    primero = await repo.siguiente_id()
+    ok(await repo.siguiente_id() == primero + 1, "siguiente_id entrega valores consecutivos")
+    await repo.asegurar_id_minimo(primero + 10)
+    ok(await repo.siguiente_id() == primero + 11, "asegurar_id_minimo adelanta la secuencia")
+    await repo.asegurar_id_minimo(1)
+    ok(await repo.siguiente_id() == primero + 12, "asegurar_id_minimo nunca retrocede")
+
+    original = surtidor(1, "Isla 1")
+    _id = await repo.insertar(original)
+    ok(isinstance(_id, str) and _id, "insertar retorna el _id como string")
+    ok("_id" not in original, "insertar no modifica el documento recibido")
+    await repo.insertar(surtidor(3, "Isla 3", estado_conexion="conectado"))
+    await repo.insertar(surtidor(2, "Isla 2", estado_conexion="conectado", estado="ocupado"))
+
+    duplicado = False
+    try:
+        await repo.insertar(surtidor(1, "Repetido"))
+    except ClaveDuplicada:
+        duplicado = True
+    ok(duplicado, "insertar un id_surtidor repetido lanza ClaveDuplicada")
+
+    leido = await repo.obtener(1)
+    ok(leido is not None and leido["nombre"] == "Isla 1", "obtener encuentra el surtidor")
+    ok(leido is not None and leido["_id"] == _id, "obtener entrega el mismo _id que insertar")
+    ok(leido is not None and leido["fecha_creacion"] == BASE, "las fechas se recuperan como datetime")
+    ok(leido is not None and leido["combustibles_soportados"] == ["93", "95"], "las listas se conservan")
+    ok(leido is not None and leido["ultima_conexion"] is None, "los None se conservan")
+    ok(await repo.obtener(999) is None, "obtener un ID inexistente retorna None")
+
+    leido["nombre"] = "Modificado fuera"
+    ok((await repo.obtener(1))["nombre"] == "Isla 1", "modificar un documento entregado no altera el guardado")
+
+    ok([s["id_surtidor"] for s in await repo.listar()] == [1, 2, 3], "listar ordena por id_surtidor")
+    ok([s["id_surtidor"] for s in await repo.listar(estado_conexion="conectado")] == [2, 3],
+       "listar filtra por estado de conexión")
+
+    actualizado = await repo.actualizar(1, {"nombre": "Isla Norte", "ultima_conexion": BASE})
+    ok(actualizado is not None and actualizado["nombre"] == "Isla Norte", "actualizar retorna el documento nuevo")
+    ok(actualizado is not None and actualizado["estado"] == "disponible", "actualizar conserva los demás campos")
+    ok((await repo.obtener(1))["ultima_conexion"] == BASE, "actualizar persiste los campos")
+    ok(await repo.actualizar(999, {"nombre": "x"}) is None, "actualizar un ID inexistente retorna None")
+
+    resultado = await repo.sumar_transaccion(2, 10.5, 14000, BASE)
+    await repo.sumar_transaccion(2, 4.5, 6000, BASE + timedelta(minutes=1))
+    ok(resultado == {"nombre": "Isla 2"}, "sumar_transaccion retorna solo el nombre")
+    leido = await repo.obtener(2)
+    ok(leido["total_transacciones"] == 2, "sumar_transaccion cuenta transacciones")
+    ok(abs(leido["litros_totales"] - 15.0) < 1e-9, "sumar_transaccion suma litros")
+    ok(leido["ingresos_totales"] == 20000, "sumar_transaccion suma ingresos")
+    ok(leido["fecha_actualizacion"] == BASE + timedelta(minutes=1), "sumar_transaccion registra la fecha")
+    ok(await repo.sumar_transaccion(999, 1, 1, BASE) is None, "sumar_transaccion a un ID inexistente retorna None")
+
+    ok(await repo.existe_nombre("Isla 3"), "existe_nombre encuentra nombres usados")
+    ok(not await repo.existe_nombre("Isla 3", excluir_id=3), "existe_nombre respeta excluir_id")
+    ok(not await repo.existe_nombre("Isla 9"), "existe_nombre con nombre libre es False")
+
+    stats = await repo.estadisticas()
+    ok(stats["total_surtidores"] == 3, "estadisticas cuenta surtidores")
+    ok(stats["conectados"] == 2, "estadisticas cuenta conectados")
+    ok(stats["disponibles"] == 2, "estadisticas cuenta disponibles")
+    ok(stats["total_transacciones"] == 2, "estadisticas suma transacciones")
+    ok(abs(stats["total_litros"] - 15.0) < 1e-9, "estadisticas suma litros")
+    ok(stats["total_ingresos"] == 20000, "estadisticas suma ingresos")
+
+    ok(await repo.eliminar(3), "eliminar un surtidor existente retorna True")
+    ok(not await repo.eliminar(3), "eliminar dos veces retorna False")
+    ok(await repo.obtener(3) is None, "el surtidor eliminado ya no existe")
+
+
+async def verificar_transacciones(db: Almacenamiento, ok: Verificador):
+    repo = db.transacciones
+
+    vacio = await repo.resumen()
+    ok(vacio == {"total_transacciones": 0, "ingresos_totales": 0}, "resumen sin transacciones es cero")
+
+    original = transaccion("1", "95", 10000, 0)
+    ids = [await repo.insertar(original)]
+    ok("_id" not in original, "insertar no modifica el documento recibido")
+    ids.append(await repo.insertar(transaccion("2", "93", 20000, 2)))
+    ids.append(await repo.insertar(transaccion("1", "93", 30000, 1)))
+    ok(len(set(ids)) == 3 and all(isinstance(i, str) for i in ids), "insertar entrega _id únicos como string")
+
+    todas = await repo.listar()
+    ok([t["monto_total"] for t in todas] == [20000, 30000, 10000], "listar ordena por fecha descendente")
+    ok(todas[0]["fecha"] == BASE + timedelta(minutes=2), "las fechas se recuperan como datetime")
+    ok([t["monto_total"] for t in await repo.listar(surtidor_id="1")] == [30000, 10000],
+       "listar filtra por surtidor")
+    ok([t["monto_total"] for t in await repo.listar(tipo_combustible="93")] == [20000, 30000],
+       "listar filtra por combustible")
+    ok([t["monto_total"] for t in await repo.listar(surtidor_id="1", tipo_combustible="93")] == [30000],
+       "listar combina filtros")
+    ok([t["monto_total"] for t in await repo.listar(skip=1, limit=1)] == [30000], "listar aplica skip y limit")
+
+    campos = ["_id", "monto_total", "fecha"]
+    proyectadas = await repo.listar(campos=campos)
+    ok(all(set(t) == set(campos) for t in proyectadas), "listar aplica la proyección de campos")
+    ok(all(isinstance(t["_id"], str) for t in proyectadas), "listar entrega _id como string")
+
+    leida = await repo.obtener(ids[1])
+    ok(leida is not None and leida["monto_total"] == 20000 and leida["_id"] == ids[1], "obtener por _id")
+    leida = await repo.obtener(ids[1], campos)
+    ok(leida is not None and set(leida) == set(campos), "obtener aplica la proyección de campos")
+    ok(await repo.obtener("no-es-un-id") is None, "obtener con _id inválido retorna None")
+    ok(await repo.obtener("507f1f77bcf86cd799439011") is None, "obtener con _id inexistente retorna None")
+
+    ok(await repo.resumen() == {"total_transacciones": 3, "ingresos_totales": 60000},
+       "resumen cuenta y suma montos")
+
+
+async def verificar(driver: str) -> Verificador:
+    ok = Verificador(driver)
+    with tempfile.TemporaryDirectory() as directorio:
+        db = crear_almacenamiento(driver, ruta=os.path.join(directorio, "conformidad.db"))
+        await db.conectar()
+        try:
+            if driver == "mongo":
+                # Partir de una base vacía aunque una corrida anterior se haya interrumpido
+                import database
+                await database.mongodb_client.drop_database(os.environ["DATABASE_NAME"])
+                await db.desconectar()
+                await db.conectar()
+            await verificar_surtidores(db, ok)
+            await verificar_transacciones(db, ok)
+        finally:
+            if driver == "mongo":
+                import database
+                await database.mongodb_client.drop_database(os.environ["DATABASE_NAME"])
+            await db.desconectar()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--drivers", nargs="+", choices=DRIVERS, default=["memoria", "sqlite"])
+    args = parser.parse_args()
+
+    fallidos = 0
+    for driver in args.drivers:
+        ok = asyncio.run(verificar(driver))
+        estado = "OK" if not ok.fallos else "FALLA"
+        print(f"{driver:<8} {ok.total - len(ok.fallos)}/{ok.total} {estado}")
+        for fallo in ok.fallos:
+            print(f"    - {fallo}")
+        fallidos += bool(ok.fallos)
+
+    return 1 if fallidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
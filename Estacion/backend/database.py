@@ -1,6 +1,13 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from typing import Optional
 import os
+from secuencias import sincronizar_secuencia
+from indices import inicializar_indices
+from bitacora import obtener_registrador
+from metricas import histograma
+
+log = obtener_registrador("database")
 
 # Variables de entorno
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27018")
@@ -10,6 +17,29 @@ DATABASE_NAME = os.getenv("DATABASE_NAME", "estacion_db")
 mongodb_client: Optional[AsyncIOMotorClient] = None
 database = None
 
+latencia_mongo = histograma(
+    "mongo_comando_segundos",
+    "Latencia de los comandos enviados a MongoDB",
+    ("comando", "resultado")
+)
+
+
+class ObservadorComandosMongo(monitoring.CommandListener):
+    """
+    Mide cada comando (find, insert, update, aggregate...) con la duración
+    que informa el driver. Motor ejecuta pymongo en su pool de hilos, por
+    eso la observación se encola con observar_desde_hilo.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        latencia_mongo.observar_desde_hilo(event.duration_micros / 1e6, event.command_name, "ok")
+
+    def failed(self, event):
+        latencia_mongo.observar_desde_hilo(event.duration_micros / 1e6, event.command_name, "error")
+
 
 async def conectar_db():
     """
@@ -17,21 +47,21 @@ async def conectar_db():
     """
     global mongodb_client, database
     try:
-        mongodb_client = AsyncIOMotorClient(MONGODB_URL)
+        mongodb_client = AsyncIOMotorClient(MONGODB_URL, event_listeners=[ObservadorComandosMongo()])
         database = mongodb_client[DATABASE_NAME]
         
         # Verificar conexión
         await mongodb_client.admin.command('ping')
-        print(f"✅ Conectado a MongoDB: {DATABASE_NAME}")
+        log.info("Conectado a MongoDB", base_datos=DATABASE_NAME)
+        
+        # Índices declarados en indices.py (y auditoría opcional de consultas)
+        await inicializar_indices(database)
         
-        # Crear índices para optimizar consultas
-        await database.transacciones.create_index("fecha")
-        await database.transacciones.create_index("surtidor_id")
-        await database.transacciones.create_index("tipo_combustible")
-        print("✅ Índices creados correctamente")
+        # Alinear la secuencia de IDs de surtidores con los datos existentes
+        await sincronizar_secuencia(database, "surtidores", "surtidores", "id_surtidor")
         
     except Exception as e:
-        print(f"❌ Error conectando a MongoDB: {e}")
+        log.error("Error conectando a MongoDB", error=str(e))
         raise
 
 
@@ -42,7 +72,7 @@ async def desconectar_db():
     global mongodb_client
     if mongodb_client:
         mongodb_client.close()
-        print("❌ Desconectado de MongoDB")
+        log.info("Desconectado de MongoDB")
 
 
 def obtener_database():
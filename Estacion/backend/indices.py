@@ -0,0 +1,363 @@
+"""
+Registro declarativo de índices de MongoDB y auditoría de consultas
+INDICES declara, por colección, los índices que necesitan las consultas de
+los servicios; inicializar_indices() los crea al iniciar la aplicación y es
+idempotente (crear un índice que ya existe con la misma definición no hace
+nada). CONSULTAS enumera las formas de consulta que emiten los servicios y
+auditar_consultas() ejecuta explain() sobre cada una para detectar las que
+recorren la colección completa (COLLSCAN).
+
+Aplica solo al driver de almacenamiento mongo (database.conectar_db lo
+llama al conectar); el driver sqlite crea sus propios índices.
+
+Los índices no llevan nombre explícito: MongoDB los nombra a partir de sus
+campos (ej: "surtidor_id_1_fecha_1"), igual que los que creaba antes
+conectar_db, de modo que las bases existentes los reconocen como el mismo
+índice. Los índices simples sobre surtidor_id y tipo_combustible que creaba
+conectar_db quedan cubiertos por los compuestos y se informan como no
+declarados (--eliminar-no-declarados los borra).
+
+Uso (requiere un MongoDB accesible en MONGODB_URL):
+    python indices.py                       # crea los índices declarados
+    python indices.py --auditar             # además audita las consultas
+    python indices.py --eliminar-no-declarados
+
+Con --auditar retorna código de salida 1 si alguna consulta no permitida
+recorre la colección completa.
+
+Variables de entorno:
+    AUDITAR_CONSULTAS: Ejecutar la auditoría al iniciar la aplicación y
+        registrar las consultas sin índice (true/false). Default false
+"""
+import argparse
+import asyncio
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from bitacora import obtener_registrador
+
+log = obtener_registrador("indices")
+
+AUDITAR_CONSULTAS = os.getenv("AUDITAR_CONSULTAS", "false").lower() == "true"
+
+# ============================================
+# ÍNDICES DECLARADOS
+# ============================================
+
+INDICES: Dict[str, List[IndexModel]] = {
+    "surtidores": [
+        IndexModel([("id_surtidor", ASCENDING)], unique=True),
+        # Listado por estado de conexión ordenado por ID y conteo de conectados
+        IndexModel([("estado_conexion", ASCENDING), ("id_surtidor", ASCENDING)]),
+        # Conteo de disponibles en las estadísticas
+        IndexModel([("estado", ASCENDING)]),
+        # Validación de nombre repetido al crear o actualizar
+        IndexModel([("nombre", ASCENDING)]),
+    ],
+    "transacciones": [
+        # Historial completo, más recientes primero
+        IndexModel([("fecha", ASCENDING)]),
+        # Historial filtrado por surtidor y/o combustible, más recientes primero
+        IndexModel([("surtidor_id", ASCENDING), ("fecha", ASCENDING)]),
+        IndexModel([("tipo_combustible", ASCENDING), ("fecha", ASCENDING)]),
+    ],
+}
+
+
+def _nombre_indice(modelo: IndexModel) -> str:
+    return modelo.document["name"]
+
+
+def _misma_definicion(modelo: IndexModel, existente: Dict[str, Any]) -> bool:
+    """Si un índice existente (index_information) coincide en claves y unicidad con el declarado"""
+    return (
+        list(existente["key"]) == list(modelo.document["key"].items())
+        and bool(existente.get("unique")) == bool(modelo.document.get("unique"))
+    )
+
+
+async def aplicar_indices(db, eliminar_no_declarados: bool = False) -> Dict[str, Any]:
+    """
+    Crea los índices declarados en INDICES
+
+    Cada índice se crea por separado para que un conflicto (misma clave con
+    otras opciones, o datos que violan un índice único) no impida crear los
+    demás; el conflicto se registra como error.
+
+    Args:
+        db: Base de datos Motor
+        eliminar_no_declarados: Eliminar los índices existentes que no estén
+            declarados (nunca el de _id)
+
+    Returns:
+        {"creados": [...], "conflictos": [...], "no_declarados": [...], "eliminados": [...]}
+        con nombres "coleccion.indice"
+    """
+    resultado: Dict[str, List[str]] = {"creados": [], "conflictos": [], "no_declarados": [], "eliminados": []}
+
+    for nombre_coleccion, modelos in INDICES.items():
+        coleccion = db[nombre_coleccion]
+        existentes = await coleccion.index_information()
+
+        for modelo in modelos:
+            nombre = _nombre_indice(modelo)
+            if nombre in existentes:
+                if not _misma_definicion(modelo, existentes[nombre]):
+                    resultado["conflictos"].append(f"{nombre_coleccion}.{nombre}")
+                    log.error(
+                        "El índice existe con otra definición",
+                        coleccion=nombre_coleccion,
+                        indice=nombre,
+                        existente=existentes[nombre]
+                    )
+                continue
+            try:
+                await coleccion.create_indexes([modelo])
+                resultado["creados"].append(f"{nombre_coleccion}.{nombre}")
+            except OperationFailure as e:
+                resultado["conflictos"].append(f"{nombre_coleccion}.{nombre}")
+                log.error(
+                    "No se pudo crear el índice",
+                    coleccion=nombre_coleccion,
+                    indice=nombre,
+                    codigo=e.code,
+                    error=str(e)
+                )
+
+        declarados = {_nombre_indice(modelo) for modelo in modelos}
+        for nombre in sorted(set(existentes) - declarados - {"_id_"}):
+            resultado["no_declarados"].append(f"{nombre_coleccion}.{nombre}")
+            if eliminar_no_declarados:
+                await coleccion.drop_index(nombre)
+                resultado["eliminados"].append(f"{nombre_coleccion}.{nombre}")
+
+    if resultado["creados"]:
+        log.info("Índices creados", indices=resultado["creados"])
+    if resultado["no_declarados"] and not eliminar_no_declarados:
+        log.warning("Índices existentes que no están declarados", indices=resultado["no_declarados"])
+    if resultado["eliminados"]:
+        log.info("Índices no declarados eliminados", indices=resultado["eliminados"])
+
+    return resultado
+
+
+# ============================================
+# FORMAS DE CONSULTA
+# ============================================
+
+def consulta(
+    coleccion: str,
+    descripcion: str,
+    filtro: Optional[Dict[str, Any]] = None,
+    orden: Optional[Dict[str, int]] = None,
+    limite: Optional[int] = None,
+    pipeline: Optional[List[Dict[str, Any]]] = None,
+    permitir_collscan: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Describe una forma de consulta a auditar
+
+    Las actualizaciones (update_one, find_one_and_update...) se declaran por
+    su filtro como un find: el planificador elige el índice igual en ambos casos.
+
+    Args:
+        coleccion: Colección consultada
+        descripcion: Dónde se emite la consulta
+        filtro: Filtro con valores de ejemplo (find)
+        orden: Ordenamiento (find)
+        limite: Límite (find)
+        pipeline: Pipeline de agregación (en lugar de filtro/orden)
+        permitir_collscan: Motivo por el que recorrer la colección es aceptable
+    """
+    return {
+        "coleccion": coleccion,
+        "descripcion": descripcion,
+        "filtro": filtro or {},
+        "orden": orden,
+        "limite": limite,
+        "pipeline": pipeline,
+        "permitir_collscan": permitir_collscan
+    }
+
+
+_RECORRE_TODO = "totales sobre toda la colección por diseño"
+
+CONSULTAS: List[Dict[str, Any]] = [
+    # surtidores (almacenamiento_mongo, secuencias)
+    consulta("surtidores", "obtener/actualizar/eliminar surtidor por ID", {"id_surtidor": 1}),
+    consulta("surtidores", "listar surtidores", orden={"id_surtidor": 1}),
+    consulta("surtidores", "listar surtidores por estado de conexión", {"estado_conexion": "conectado"},
+             orden={"id_surtidor": 1}),
+    consulta("surtidores", "validar nombre repetido", {"nombre": "Surtidor 1", "id_surtidor": {"$ne": 1}},
+             limite=1),
+    consulta("surtidores", "estadísticas: conectados", pipeline=[
+        {"$match": {"estado_conexion": "conectado"}}, {"$group": {"_id": 1, "n": {"$sum": 1}}}
+    ]),
+    consulta("surtidores", "estadísticas: disponibles", pipeline=[
+        {"$match": {"estado": "disponible"}}, {"$group": {"_id": 1, "n": {"$sum": 1}}}
+    ]),
+    consulta("surtidores", "estadísticas: totales acumulados", pipeline=[
+        {"$group": {"_id": None, "total_transacciones": {"$sum": "$total_transacciones"}}}
+    ], permitir_collscan=_RECORRE_TODO),
+    consulta("surtidores", "secuencias: máximo id_surtidor", orden={"id_surtidor": -1}, limite=1),
+
+    # transacciones
+    consulta("transacciones", "historial de transacciones", orden={"fecha": -1}, limite=100),
+    consulta("transacciones", "historial por surtidor", {"surtidor_id": "1"}, orden={"fecha": -1}, limite=100),
+    consulta("transacciones", "historial por combustible", {"tipo_combustible": "93"},
+             orden={"fecha": -1}, limite=100),
+    consulta("transacciones", "historial por surtidor y combustible",
+             {"surtidor_id": "1", "tipo_combustible": "93"}, orden={"fecha": -1}, limite=100),
+    consulta("transacciones", "resumen: ingresos totales", pipeline=[
+        {"$group": {"_id": None, "total": {"$sum": "$monto_total"}}}
+    ], permitir_collscan=_RECORRE_TODO),
+]
+
+
+# ============================================
+# AUDITORÍA
+# ============================================
+
+def _etapas(plan: Any, encontradas: List[str], indices: List[str]):
+    """Recorre un plan de explain() acumulando etapas e índices usados (sin planes rechazados)"""
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            encontradas.append(plan["stage"])
+        if isinstance(plan.get("indexName"), str):
+            indices.append(plan["indexName"])
+        for clave, valor in plan.items():
+            if clave != "rejectedPlans":
+                _etapas(valor, encontradas, indices)
+    elif isinstance(plan, list):
+        for elemento in plan:
+            _etapas(elemento, encontradas, indices)
+
+
+async def explicar(db, forma: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ejecuta explain() (verbosidad queryPlanner, no ejecuta la consulta)
+
+    Returns:
+        {"etapas": [...], "indices": [...], "collscan": bool}
+    """
+    if forma["pipeline"] is not None:
+        comando: Dict[str, Any] = {"aggregate": forma["coleccion"], "pipeline": forma["pipeline"], "cursor": {}}
+    else:
+        comando = {"find": forma["coleccion"], "filter": forma["filtro"]}
+        if forma["orden"]:
+            comando["sort"] = forma["orden"]
+        if forma["limite"]:
+            comando["limit"] = forma["limite"]
+
+    plan = await db.command({"explain": comando, "verbosity": "queryPlanner"})
+    etapas: List[str] = []
+    indices: List[str] = []
+    _etapas(plan, etapas, indices)
+    return {"etapas": etapas, "indices": sorted(set(indices)), "collscan": "COLLSCAN" in etapas}
+
+
+async def auditar_consultas(db) -> List[Dict[str, Any]]:
+    """
+    Ejecuta explain() sobre todas las formas de CONSULTAS
+
+    Returns:
+        Una entrada por consulta con coleccion, descripcion, etapas, indices,
+        collscan, permitido (si el COLLSCAN está justificado) y error
+    """
+    resultados = []
+    for forma in CONSULTAS:
+        entrada = {"coleccion": forma["coleccion"], "descripcion": forma["descripcion"], "error": None}
+        try:
+            entrada.update(await explicar(db, forma))
+        except OperationFailure as e:
+            entrada.update({"etapas": [], "indices": [], "collscan": False, "error": str(e)})
+        entrada["permitido"] = bool(forma["permitir_collscan"])
+        resultados.append(entrada)
+    return resultados
+
+
+def consultas_sin_indice(resultados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Consultas auditadas que recorren la colección completa sin justificación"""
+    return [r for r in resultados if r["collscan"] and not r["permitido"]]
+
+
+async def inicializar_indices(db):
+    """
+    Crea los índices declarados al iniciar y, si AUDITAR_CONSULTAS está
+    activo, registra las consultas que no usan índice
+    """
+    await aplicar_indices(db)
+
+    if AUDITAR_CONSULTAS:
+        resultados = await auditar_consultas(db)
+        for r in consultas_sin_indice(resultados):
+            log.warning("Consulta sin índice (COLLSCAN)", coleccion=r["coleccion"], consulta=r["descripcion"],
+                        etapas=r["etapas"])
+        log.info("Auditoría de consultas completada", consultas=len(resultados),
+                 sin_indice=len(consultas_sin_indice(resultados)))
+
+
+# ============================================
+# LÍNEA DE COMANDOS
+# ============================================
+
+def _imprimir_auditoria(resultados: List[Dict[str, Any]]):
+    for r in resultados:
+        if r["error"]:
+            estado = "ERROR"
+        elif r["collscan"]:
+            estado = "COLLSCAN*" if r["permitido"] else "COLLSCAN"
+        else:
+            estado = "ok"
+        detalle = r["error"] or ", ".join(r["indices"]) or " > ".join(r["etapas"])
+        print(f"{estado:<10} {r['coleccion']:<14} {r['descripcion']:<48} {detalle}")
+    print("(* recorrido completo justificado en CONSULTAS)")
+
+
+async def _ejecutar(auditar: bool, eliminar_no_declarados: bool) -> int:
+    import database
+
+    # conectar_db ya crea los índices: esta pasada informa el estado y elimina
+    # los no declarados si se pide
+    await database.conectar_db()
+    db = database.obtener_database()
+    try:
+        return await _ejecutar_sobre(db, auditar, eliminar_no_declarados)
+    finally:
+        await database.desconectar_db()
+
+
+async def _ejecutar_sobre(db, auditar: bool, eliminar_no_declarados: bool) -> int:
+    resultado = await aplicar_indices(db, eliminar_no_declarados)
+    print(f"Índices creados: {len(resultado['creados'])}, conflictos: {len(resultado['conflictos'])}, "
+          f"no declarados: {len(resultado['no_declarados'])}, eliminados: {len(resultado['eliminados'])}")
+    for nombre in resultado["conflictos"]:
+        print(f"    conflicto: {nombre}")
+    for nombre in resultado["no_declarados"]:
+        print(f"    no declarado: {nombre}")
+
+    if not auditar:
+        return 1 if resultado["conflictos"] else 0
+
+    resultados = await auditar_consultas(db)
+    _imprimir_auditoria(resultados)
+    fallidas = consultas_sin_indice(resultados) + [r for r in resultados if r["error"]]
+    return 1 if fallidas or resultado["conflictos"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--auditar", action="store_true",
+                        help="Ejecutar explain() sobre cada forma de consulta y reportar los COLLSCAN")
+    parser.add_argument("--eliminar-no-declarados", action="store_true",
+                        help="Eliminar los índices que no están en INDICES")
+    args = parser.parse_args()
+    return asyncio.run(_ejecutar(args.auditar, args.eliminar_no_declarados))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
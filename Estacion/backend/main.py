@@ -1,11 +1,19 @@
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 import asyncio
 from typing import List, Dict, Any
 from datetime import datetime
-from tcp_server import iniciar_tcp_servidor, obtener_precios_actuales, obtener_nombre_estacion
+from tcp_server import (
+    iniciar_tcp_servidor,
+    obtener_precios_actuales,
+    obtener_nombre_estacion,
+    sincronizar_precios_con_empresa
+)
 from tcp_server_surtidores import iniciar_servidores_surtidores, obtener_cantidad_surtidores_conectados
-from database import conectar_db, desconectar_db, obtener_database
+import pasarela_ws
+from almacenamiento import almacenamiento
+from respuestas import RespuestaJSON
 from models import (
     TransaccionCreate, 
     TransaccionResponse, 
@@ -26,13 +34,25 @@ from surtidores_service import (
     obtener_surtidores_conectados,
     obtener_estadisticas_surtidores
 )
+from bitacora import obtener_registrador, configurar_niveles, estado_bitacora
+from metricas import MetricasHTTP, TIPO_CONTENIDO, exponer, medidor
+
+log = obtener_registrador("api")
 
 app = FastAPI(
     title="Backend Estación",
     version="1.0",
-    description="API para gestión de transacciones y surtidores en la estación"
+    description="API para gestión de transacciones y surtidores en la estación",
+    default_response_class=RespuestaJSON
 )
 
+# Campos que expone TransaccionResponse (con _id): se proyectan en la consulta
+# para retornar los documentos tal cual, sin construir un modelo por fila
+CAMPOS_TRANSACCION = [
+    campo.alias or nombre
+    for nombre, campo in TransaccionResponse.model_fields.items()
+]
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -42,24 +62,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latencia HTTP por ruta (se agrega al final para medir también los demás middlewares)
+app.add_middleware(MetricasHTTP)
+
+medidor(
+    "bitacora_cola_pendientes",
+    "Registros de log en espera del hilo escritor",
+    funcion=lambda: estado_bitacora()["cola"]["pendientes"]
+)
+
 
 @app.on_event("startup")
 async def iniciar_componentes():
-    # 🔹 Conectar a MongoDB
-    await conectar_db()
+    # 🔹 Conectar el almacenamiento (MongoDB, memoria o SQLite según ALMACENAMIENTO)
+    await almacenamiento.conectar()
     
     # 🔹 Iniciar el servidor TCP para Empresa (puerto 5000)
     asyncio.create_task(iniciar_tcp_servidor())
-    print("🚀 Servidor TCP Empresa iniciado (puerto 5000)")
+    log.info("Servidor TCP Empresa iniciado", puerto=5000)
     
     # 🔹 Iniciar servidores TCP/UDP para Surtidores (puertos 6000/6001)
     asyncio.create_task(iniciar_servidores_surtidores())
-    print("🚀 Servidores TCP/UDP Surtidores iniciados (puertos 6000/6001)")
+    log.info("Servidores TCP/UDP Surtidores iniciados", puerto_tcp=6000, puerto_udp=6001)
+    
+    # 🔹 Pedir a la Empresa el último conjunto de precios (si está configurada)
+    asyncio.create_task(sincronizar_precios_con_empresa())
+    
+    # 🔹 socket.io hacia el frontend (puerto 4000), en este mismo loop
+    pasarela_ws.al_conectar(lambda: ("actualizacionPrecios", obtener_precios_actuales()))
+    await pasarela_ws.iniciar()
 
 
 @app.on_event("shutdown")
 async def cerrar_componentes():
-    await desconectar_db()
+    await pasarela_ws.detener()
+    await almacenamiento.desconectar()
 
 
 @app.get("/")
@@ -73,29 +110,20 @@ async def obtener_estado():
     Obtiene el estado general de la estación
     """
     try:
-        db = obtener_database()
-        
         # Obtener nombre de la estación (puede venir de Empresa o variable de entorno)
         nombre = obtener_nombre_estacion()
         
         # Obtener precios actuales
         precios = obtener_precios_actuales()
         
-        # Calcular estadísticas de transacciones
-        total_transacciones = await db.transacciones.count_documents({})
-        
-        # Calcular ingresos totales
-        pipeline = [
-            {"$group": {"_id": None, "total": {"$sum": "$monto_total"}}}
-        ]
-        resultado = await db.transacciones.aggregate(pipeline).to_list(1)
-        ingresos_totales = resultado[0]["total"] if resultado else 0
+        # Calcular total de transacciones e ingresos
+        resumen = await almacenamiento.transacciones.resumen()
         
         return EstadoEstacion(
             nombre=nombre,
             precios=PreciosModel(**precios),
-            total_transacciones=total_transacciones,
-            ingresos_totales=ingresos_totales,
+            total_transacciones=resumen["total_transacciones"],
+            ingresos_totales=resumen["ingresos_totales"],
             estado="activa"
         )
     except Exception as e:
@@ -120,26 +148,14 @@ async def crear_transaccion(transaccion: TransaccionCreate):
     Registra una nueva transacción
     """
     try:
-        db = obtener_database()
-        
         # Crear documento de transacción
         transaccion_db = TransaccionDB(**transaccion.model_dump())
         transaccion_dict = transaccion_db.model_dump()
         
-        # Insertar en la base de datos
-        resultado = await db.transacciones.insert_one(transaccion_dict)
-        
-        # Obtener la transacción insertada
-        transaccion_insertada = await db.transacciones.find_one({"_id": resultado.inserted_id})
-        
-        if transaccion_insertada:
-            transaccion_insertada["_id"] = str(transaccion_insertada["_id"])
-            return TransaccionResponse(**transaccion_insertada)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Error al recuperar la transacción creada"
-            )
+        # Insertar en la base de datos y construir la respuesta con el
+        # documento en memoria (sin releerlo)
+        transaccion_dict["_id"] = await almacenamiento.transacciones.insertar(transaccion_dict)
+        return TransaccionResponse(**transaccion_dict)
             
     except Exception as e:
         raise HTTPException(
@@ -159,24 +175,15 @@ async def listar_transacciones(
     Lista las transacciones con filtros opcionales
     """
     try:
-        db = obtener_database()
-        
-        # Construir filtro
-        filtro = {}
-        if surtidor_id:
-            filtro["surtidor_id"] = surtidor_id
-        if tipo_combustible:
-            filtro["tipo_combustible"] = tipo_combustible
-        
-        # Obtener transacciones
-        cursor = db.transacciones.find(filtro).sort("fecha", -1).skip(skip).limit(limit)
-        transacciones = await cursor.to_list(length=limit)
-        
-        # Convertir ObjectId a string
-        for t in transacciones:
-            t["_id"] = str(t["_id"])
+        transacciones = await almacenamiento.transacciones.listar(
+            surtidor_id=surtidor_id,
+            tipo_combustible=tipo_combustible,
+            skip=skip,
+            limit=limit,
+            campos=CAMPOS_TRANSACCION
+        )
         
-        return [TransaccionResponse(**t) for t in transacciones]
+        return RespuestaJSON(transacciones)
         
     except Exception as e:
         raise HTTPException(
@@ -191,10 +198,7 @@ async def obtener_transaccion(transaccion_id: str):
     Obtiene una transacción específica por ID
     """
     try:
-        from bson import ObjectId
-        db = obtener_database()
-        
-        transaccion = await db.transacciones.find_one({"_id": ObjectId(transaccion_id)})
+        transaccion = await almacenamiento.transacciones.obtener(transaccion_id, CAMPOS_TRANSACCION)
         
         if not transaccion:
             raise HTTPException(
@@ -202,8 +206,7 @@ async def obtener_transaccion(transaccion_id: str):
                 detail=f"Transacción {transaccion_id} no encontrada"
             )
         
-        transaccion["_id"] = str(transaccion["_id"])
-        return TransaccionResponse(**transaccion)
+        return RespuestaJSON(transaccion)
         
     except HTTPException:
         raise
@@ -223,7 +226,7 @@ async def listar_surtidores():
     """Lista todos los surtidores registrados en la estación"""
     try:
         surtidores = await obtener_surtidores()
-        return surtidores
+        return RespuestaJSON(surtidores)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -236,7 +239,7 @@ async def listar_surtidores_conectados():
     """Lista solo los surtidores actualmente conectados vía TCP"""
     try:
         surtidores = await obtener_surtidores_conectados()
-        return surtidores
+        return RespuestaJSON(surtidores)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -269,7 +272,7 @@ async def obtener_surtidor(id_surtidor: int):
             detail=f"Surtidor {id_surtidor} no encontrado"
         )
     
-    return surtidor
+    return RespuestaJSON(surtidor)
 
 
 @app.post("/api/surtidores", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
@@ -381,17 +384,14 @@ async def listar_transacciones_surtidor(
                 detail=f"Surtidor {id_surtidor} no encontrado"
             )
         
-        db = obtener_database()
-        cursor = db.transacciones.find(
-            {"surtidor_id": str(id_surtidor)}
-        ).sort("fecha", -1).skip(skip).limit(limit)
-        
-        transacciones = await cursor.to_list(length=limit)
-        
-        for t in transacciones:
-            t["_id"] = str(t["_id"])
+        transacciones = await almacenamiento.transacciones.listar(
+            surtidor_id=str(id_surtidor),
+            skip=skip,
+            limit=limit,
+            campos=CAMPOS_TRANSACCION
+        )
         
-        return [TransaccionResponse(**t) for t in transacciones]
+        return RespuestaJSON(transacciones)
         
     except HTTPException:
         raise
@@ -400,3 +400,43 @@ async def listar_transacciones_surtidor(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error listando transacciones: {str(e)}"
         )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def obtener_metricas():
+    """
+    Métricas en formato de texto de Prometheus: mensajes por tipo y
+    protocolo, conexiones, buffers de salida y latencias (HTTP por ruta,
+    MongoDB por comando, guardar_transaccion, propagación de precios)
+    """
+    return Response(exponer(), media_type=TIPO_CONTENIDO)
+
+
+@app.get("/api/pasarela", response_model=Dict[str, Any])
+async def obtener_estado_pasarela():
+    """
+    Estado de la pasarela socket.io: frontends conectados y surtidores conocidos
+    """
+    return pasarela_ws.estadisticas()
+
+
+@app.get("/api/logs", response_model=Dict[str, Any])
+async def obtener_estado_logs():
+    """
+    Configuración del registro de eventos: niveles por subsistema, muestreo
+    y estado de la cola de escritura (incluye registros descartados)
+    """
+    return estado_bitacora()
+
+
+@app.put("/api/logs/niveles", response_model=Dict[str, str])
+async def cambiar_niveles_logs(niveles: Dict[str, str]):
+    """
+    Cambia en caliente el nivel de log de uno o más subsistemas
+
+    Ejemplo: {"surtidores.udp": "DEBUG"}; la clave "*" cambia el nivel por defecto
+    """
+    try:
+        return configurar_niveles(niveles)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
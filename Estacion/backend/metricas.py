@@ -0,0 +1,260 @@
+"""
+Métricas en proceso con exposición en formato de texto de Prometheus
+Módulo compartido por los backends de Empresa, Estacion y Surtidor (se
+mantiene una copia idéntica en cada uno). Define contadores, medidores e
+histogramas con etiquetas y los expone en GET /metrics:
+
+    mensajes = contador("estacion_mensajes_total", "Mensajes recibidos", ("origen", "tipo"))
+    mensajes.inc("udp", "estado_rapido")
+
+    latencia = histograma("estacion_guardar_transaccion_segundos", "Duración de guardar_transaccion")
+    with latencia.medir():
+        ...
+
+La agregación no usa locks: el event loop es el único escritor de la
+mayoría de las series y actualizar un diccionario y una lista es una
+operación de pocos nanosegundos. Las observaciones que llegan desde otros
+hilos (p. ej. el listener de comandos de Motor, que corre en su pool de
+hilos) se encolan con observar_desde_hilo() en un deque (append atómico)
+y se agregan al momento de exponer.
+"""
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Límites por defecto de los histogramas de latencia (segundos)
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Observaciones de otros hilos guardadas entre exposiciones (las más viejas se descartan)
+MAX_PENDIENTES_HILOS = 100_000
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+
+    def _lineas(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def exponer(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}", *self._lineas()]
+
+
+class Contador(_Metrica):
+    """Valor que solo aumenta (eventos, bytes, errores)"""
+
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *etiquetas: str, cantidad: float = 1):
+        self.valores[etiquetas] = self.valores.get(etiquetas, 0) + cantidad
+
+    def _lineas(self):
+        for valores, total in list(self.valores.items()):
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(total)}"
+
+
+class Medidor(_Metrica):
+    """
+    Valor que sube y baja (conexiones, profundidad de colas)
+
+    Con funcion, el valor se lee al exponer: la función retorna un número
+    (sin etiquetas) o un diccionario {tupla de etiquetas: número}.
+    """
+
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 funcion: Optional[Callable[[], object]] = None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.valores: Dict[Tuple[str, ...], float] = {}
+        self.funcion = funcion
+
+    def set(self, valor: float, *etiquetas: str):
+        self.valores[etiquetas] = valor
+
+    def inc(self, *etiquetas: str, cantidad: float = 1):
+        self.valores[etiquetas] = self.valores.get(etiquetas, 0) + cantidad
+
+    def dec(self, *etiquetas: str, cantidad: float = 1):
+        self.inc(*etiquetas, cantidad=-cantidad)
+
+    def _lineas(self):
+        valores = self.valores
+        if self.funcion is not None:
+            resultado = self.funcion()
+            valores = resultado if isinstance(resultado, dict) else {(): resultado}
+        for etiquetas, valor in list(valores.items()):
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}"
+
+
+class Histograma(_Metrica):
+    """Distribución de valores (latencias, tamaños) en buckets acumulativos"""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        # {etiquetas: [conteo por bucket..., conteo +Inf, suma]}
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+        self._desde_hilos: Deque[Tuple[float, Tuple[str, ...]]] = deque(maxlen=MAX_PENDIENTES_HILOS)
+
+    def observar(self, valor: float, *etiquetas: str):
+        serie = self.series.get(etiquetas)
+        if serie is None:
+            serie = self.series[etiquetas] = [0] * (len(self.buckets) + 1) + [0.0]
+        serie[bisect_left(self.buckets, valor)] += 1
+        serie[-1] += valor
+
+    def observar_desde_hilo(self, valor: float, *etiquetas: str):
+        """Registra una observación hecha fuera del event loop (se agrega al exponer)"""
+        self._desde_hilos.append((valor, etiquetas))
+
+    @contextmanager
+    def medir(self, *etiquetas: str):
+        """Mide la duración del bloque en segundos"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *etiquetas)
+
+    def _lineas(self):
+        pendientes = self._desde_hilos
+        while pendientes:
+            valor, etiquetas = pendientes.popleft()
+            self.observar(valor, *etiquetas)
+
+        for etiquetas, serie in list(self.series.items()):
+            acumulado = 0
+            for limite, conteo in zip((*self.buckets, float("inf")), serie):
+                acumulado += conteo
+                le = f'le="{_numero(limite)}"'
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, etiquetas, le)} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(serie[-1])}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {acumulado}"
+
+
+# ============================================
+# REGISTRO
+# ============================================
+
+_metricas: Dict[str, _Metrica] = {}
+
+
+def _registrar(metrica: _Metrica) -> _Metrica:
+    existente = _metricas.get(metrica.nombre)
+    if existente is not None:
+        if type(existente) is not type(metrica):
+            raise ValueError(f"La métrica {metrica.nombre} ya existe con otro tipo")
+        return existente
+    _metricas[metrica.nombre] = metrica
+    return metrica
+
+
+def contador(nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+    return _registrar(Contador(nombre, ayuda, etiquetas))
+
+
+def medidor(nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+            funcion: Optional[Callable[[], object]] = None) -> Medidor:
+    return _registrar(Medidor(nombre, ayuda, etiquetas, funcion))
+
+
+def histograma(nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+               buckets: Sequence[float] = BUCKETS_LATENCIA) -> Histograma:
+    return _registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+
+def exponer() -> bytes:
+    """
+    Serializa todas las métricas registradas
+
+    Returns:
+        Texto en formato de exposición de Prometheus (UTF-8)
+    """
+    lineas: List[str] = []
+    for metrica in list(_metricas.values()):
+        try:
+            lineas.extend(metrica.exponer())
+        except Exception:
+            # Un medidor con función rota no debe impedir exponer el resto
+            continue
+    return ("\n".join(lineas) + "\n").encode()
+
+
+# ============================================
+# LATENCIA HTTP POR RUTA
+# ============================================
+
+_peticiones_http = histograma(
+    "http_peticion_segundos",
+    "Latencia de las peticiones HTTP por método, ruta y código de estado",
+    ("metodo", "ruta", "codigo")
+)
+
+
+class MetricasHTTP:
+    """
+    Middleware ASGI que mide la latencia de cada petición HTTP
+
+    La ruta se etiqueta con su plantilla (/api/estaciones/{id_estacion}),
+    no con la URL concreta, para que la cantidad de series sea acotada.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        codigo = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                codigo[0] = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            ruta = scope.get("route")
+            _peticiones_http.observar(
+                time.perf_counter() - inicio,
+                scope["method"],
+                getattr(ruta, "path", "sin_ruta"),
+                str(codigo[0])
+            )
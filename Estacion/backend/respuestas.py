@@ -0,0 +1,49 @@
+"""
+Respuestas JSON rápidas para la API
+Los datos que retornan los servicios ya vienen de la base de datos o de
+modelos validados, por lo que volver a validarlos contra response_model y
+pasarlos por jsonable_encoder es trabajo repetido. RespuestaJSON los
+serializa directamente con orjson, que maneja datetime de forma nativa;
+ObjectId y modelos Pydantic se convierten en el hook default.
+"""
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+
+def _convertir(valor: Any) -> Any:
+    """Convierte los tipos que orjson no serializa por sí solo"""
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if hasattr(valor, "model_dump"):
+        return valor.model_dump(mode="json", by_alias=True)
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    raise TypeError(f"Tipo no serializable a JSON: {type(valor).__name__}")
+
+
+def serializar(contenido: Any) -> bytes:
+    """
+    Serializa a JSON con orjson
+
+    Args:
+        contenido: Diccionarios, listas, datetime, ObjectId o modelos Pydantic
+
+    Returns:
+        JSON codificado en UTF-8
+    """
+    return orjson.dumps(contenido, default=_convertir, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RespuestaJSON(JSONResponse):
+    """
+    Respuesta JSON serializada con orjson
+
+    Retornarla directamente desde un endpoint evita la revalidación contra
+    response_model (que se mantiene solo para la documentación OpenAPI)
+    """
+
+    def render(self, content: Any) -> bytes:
+        return serializar(content)
@@ -5,12 +5,6 @@ echo " Iniciando servicios de Estación..."
 CONTAINER_IP=$(hostname -i)
 echo " IP del contenedor: $CONTAINER_IP"
 
-echo " Iniciando FastAPI + TCP Server..."
-uvicorn main:app --reload --host 0.0.0.0 --port 8000 &
-FASTAPI_PID=$!
-echo " FastAPI iniciado con PID: $FASTAPI_PID"
-
-sleep 3
-
-echo " Iniciando WebSocket bridge..."
-node tcp_bridge.js
\ No newline at end of file
+# FastAPI, servidores TCP/UDP y socket.io (pasarela_ws.py) en un solo proceso
+echo " Iniciando FastAPI + TCP Server + socket.io..."
+exec uvicorn main:app --reload --host 0.0.0.0 --port 8000
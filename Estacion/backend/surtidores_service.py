@@ -5,8 +5,7 @@ Implementa operaciones CRUD y lógica de negocio para surtidores
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from models import SurtidorCreate, SurtidorUpdate, SurtidorDB
-from database import obtener_database
-from bson import ObjectId
+from almacenamiento import almacenamiento, ClaveDuplicada
 
 
 async def crear_surtidor(surtidor: SurtidorCreate, id_surtidor_manual: Optional[int] = None) -> Dict[str, Any]:
@@ -20,19 +19,17 @@ async def crear_surtidor(surtidor: SurtidorCreate, id_surtidor_manual: Optional[
     Returns:
         Diccionario con los datos del surtidor creado
     """
-    db = obtener_database()
+    surtidores = almacenamiento.surtidores
     
     # Usar ID manual si se proporciona, sino auto-incrementar
+    # (los duplicados los detecta la clave única al insertar)
     if id_surtidor_manual is not None:
         nuevo_id = id_surtidor_manual
-        # Verificar que no exista
-        existente = await db.surtidores.find_one({"id_surtidor": nuevo_id})
-        if existente:
-            raise ValueError(f"Ya existe un surtidor con ID {nuevo_id}")
+        # Evitar que la secuencia entregue luego este mismo ID
+        await surtidores.asegurar_id_minimo(nuevo_id)
     else:
-        # Generar ID único autoincrementado
-        ultimo_surtidor = await db.surtidores.find_one(sort=[("id_surtidor", -1)])
-        nuevo_id = 1 if ultimo_surtidor is None else ultimo_surtidor["id_surtidor"] + 1
+        # Generar ID único de forma atómica desde la secuencia
+        nuevo_id = await surtidores.siguiente_id()
     
     # Preparar documento
     surtidor_dict = {
@@ -51,16 +48,15 @@ async def crear_surtidor(surtidor: SurtidorCreate, id_surtidor_manual: Optional[
         "ingresos_totales": 0
     }
     
-    # Insertar en la base de datos
-    resultado = await db.surtidores.insert_one(surtidor_dict)
+    # Insertar en la base de datos (la clave única resuelve creaciones concurrentes)
+    try:
+        surtidor_dict["_id"] = await surtidores.insertar(surtidor_dict)
+    except ClaveDuplicada:
+        raise ValueError(f"Ya existe un surtidor con ID {nuevo_id}")
     
-    # Obtener el documento insertado
-    surtidor_creado = await db.surtidores.find_one({"_id": resultado.inserted_id})
+    # El documento insertado ya está en memoria: no es necesario releerlo
     
-    if surtidor_creado:
-        surtidor_creado["_id"] = str(surtidor_creado["_id"])
-    
-    return surtidor_creado
+    return surtidor_dict
 
 
 async def obtener_surtidores() -> List[Dict[str, Any]]:
@@ -70,15 +66,7 @@ async def obtener_surtidores() -> List[Dict[str, Any]]:
     Returns:
         Lista de diccionarios con los datos de todos los surtidores
     """
-    db = obtener_database()
-    surtidores = []
-    cursor = db.surtidores.find().sort("id_surtidor", 1)
-    
-    async for surtidor in cursor:
-        surtidor["_id"] = str(surtidor["_id"])
-        surtidores.append(surtidor)
-    
-    return surtidores
+    return await almacenamiento.surtidores.listar()
 
 
 async def obtener_surtidor_por_id(id_surtidor: int) -> Optional[Dict[str, Any]]:
@@ -91,13 +79,7 @@ async def obtener_surtidor_por_id(id_surtidor: int) -> Optional[Dict[str, Any]]:
     Returns:
         Diccionario con los datos del surtidor o None si no existe
     """
-    db = obtener_database()
-    surtidor = await db.surtidores.find_one({"id_surtidor": id_surtidor})
-    
-    if surtidor:
-        surtidor["_id"] = str(surtidor["_id"])
-    
-    return surtidor
+    return await almacenamiento.surtidores.obtener(id_surtidor)
 
 
 async def actualizar_surtidor(
@@ -114,8 +96,6 @@ async def actualizar_surtidor(
     Returns:
         Diccionario con los datos actualizados o None si no existe
     """
-    db = obtener_database()
-    
     # Preparar solo los campos que no son None
     datos_actualizacion = {}
     if datos.nombre is not None:
@@ -132,16 +112,8 @@ async def actualizar_surtidor(
     if len(datos_actualizacion) == 1:  # Solo fecha_actualizacion
         return await obtener_surtidor_por_id(id_surtidor)
     
-    # Actualizar en la base de datos
-    resultado = await db.surtidores.update_one(
-        {"id_surtidor": id_surtidor},
-        {"$set": datos_actualizacion}
-    )
-    
-    if resultado.matched_count == 0:
-        return None
-    
-    return await obtener_surtidor_por_id(id_surtidor)
+    # Actualizar y obtener el surtidor actualizado en una sola operación
+    return await almacenamiento.surtidores.actualizar(id_surtidor, datos_actualizacion)
 
 
 async def eliminar_surtidor(id_surtidor: int) -> bool:
@@ -154,16 +126,14 @@ async def eliminar_surtidor(id_surtidor: int) -> bool:
     Returns:
         True si se eliminó exitosamente, False si no existe
     """
-    db = obtener_database()
-    resultado = await db.surtidores.delete_one({"id_surtidor": id_surtidor})
-    return resultado.deleted_count > 0
+    return await almacenamiento.surtidores.eliminar(id_surtidor)
 
 
 async def actualizar_estadisticas_surtidor(
     id_surtidor: int,
     litros: float,
     monto: int
-):
+) -> Optional[Dict[str, Any]]:
     """
     Actualiza las estadísticas de un surtidor después de una transacción
     
@@ -171,22 +141,11 @@ async def actualizar_estadisticas_surtidor(
         id_surtidor: ID del surtidor
         litros: Litros despachados en la transacción
         monto: Monto total de la transacción
+        
+    Returns:
+        Nombre del surtidor ({"nombre": ...}) o None si no existe
     """
-    db = obtener_database()
-    
-    await db.surtidores.update_one(
-        {"id_surtidor": id_surtidor},
-        {
-            "$inc": {
-                "total_transacciones": 1,
-                "litros_totales": litros,
-                "ingresos_totales": monto
-            },
-            "$set": {
-                "fecha_actualizacion": datetime.now()
-            }
-        }
-    )
+    return await almacenamiento.surtidores.sumar_transaccion(id_surtidor, litros, monto, datetime.now())
 
 
 async def actualizar_conexion_surtidor(
@@ -200,8 +159,6 @@ async def actualizar_conexion_surtidor(
         id_surtidor: ID del surtidor
         estado_conexion: "conectado" o "desconectado"
     """
-    db = obtener_database()
-    
     datos = {
         "estado_conexion": estado_conexion,
         "fecha_actualizacion": datetime.now()
@@ -210,10 +167,7 @@ async def actualizar_conexion_surtidor(
     if estado_conexion == "conectado":
         datos["ultima_conexion"] = datetime.now()
     
-    await db.surtidores.update_one(
-        {"id_surtidor": id_surtidor},
-        {"$set": datos}
-    )
+    await almacenamiento.surtidores.actualizar(id_surtidor, datos)
 
 
 async def verificar_nombre_existente(nombre: str, excluir_id: Optional[int] = None) -> bool:
@@ -227,13 +181,7 @@ async def verificar_nombre_existente(nombre: str, excluir_id: Optional[int] = No
     Returns:
         True si el nombre ya existe, False si está disponible
     """
-    db = obtener_database()
-    query = {"nombre": nombre}
-    if excluir_id is not None:
-        query["id_surtidor"] = {"$ne": excluir_id}
-    
-    surtidor = await db.surtidores.find_one(query)
-    return surtidor is not None
+    return await almacenamiento.surtidores.existe_nombre(nombre, excluir_id)
 
 
 async def obtener_surtidores_conectados() -> List[Dict[str, Any]]:
@@ -243,15 +191,7 @@ async def obtener_surtidores_conectados() -> List[Dict[str, Any]]:
     Returns:
         Lista de surtidores conectados
     """
-    db = obtener_database()
-    surtidores = []
-    cursor = db.surtidores.find({"estado_conexion": "conectado"}).sort("id_surtidor", 1)
-    
-    async for surtidor in cursor:
-        surtidor["_id"] = str(surtidor["_id"])
-        surtidores.append(surtidor)
-    
-    return surtidores
+    return await almacenamiento.surtidores.listar(estado_conexion="conectado")
 
 
 async def obtener_estadisticas_surtidores() -> Dict[str, Any]:
@@ -261,36 +201,4 @@ async def obtener_estadisticas_surtidores() -> Dict[str, Any]:
     Returns:
         Diccionario con estadísticas agregadas
     """
-    db = obtener_database()
-    
-    total = await db.surtidores.count_documents({})
-    conectados = await db.surtidores.count_documents({"estado_conexion": "conectado"})
-    disponibles = await db.surtidores.count_documents({"estado": "disponible"})
-    
-    # Agregación de estadísticas
-    pipeline = [
-        {
-            "$group": {
-                "_id": None,
-                "total_transacciones": {"$sum": "$total_transacciones"},
-                "total_litros": {"$sum": "$litros_totales"},
-                "total_ingresos": {"$sum": "$ingresos_totales"}
-            }
-        }
-    ]
-    
-    resultado = await db.surtidores.aggregate(pipeline).to_list(1)
-    stats = resultado[0] if resultado else {
-        "total_transacciones": 0,
-        "total_litros": 0.0,
-        "total_ingresos": 0
-    }
-    
-    return {
-        "total_surtidores": total,
-        "conectados": conectados,
-        "disponibles": disponibles,
-        "total_transacciones": stats.get("total_transacciones", 0),
-        "total_litros": stats.get("total_litros", 0.0),
-        "total_ingresos": stats.get("total_ingresos", 0)
-    }
+    return await almacenamiento.surtidores.estadisticas()
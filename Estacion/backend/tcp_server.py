@@ -1,6 +1,13 @@
 import asyncio
 import json
 import os
+import urllib.error
+import urllib.request
+from bitacora import WARNING, obtener_registrador
+from metricas import contador, medidor
+import pasarela_ws
+
+log = obtener_registrador("tcp")
 
 # Mantendrá el estado actual de los surtidores conectados
 surtidores = {}
@@ -15,11 +22,105 @@ precios_actuales = {
 }
 # Nombre de la estación (puede ser actualizado por la Empresa)
 nombre_estacion = os.getenv("ESTACION_NOMBRE", "Estación Local")
+# Versión del conjunto de precios aplicado (0 = aún no recibido de la Empresa)
+version_precios = 0
+# ID de esta estación en la Empresa (también se aprende de los mensajes recibidos)
+id_estacion = int(os.getenv("ESTACION_ID")) if os.getenv("ESTACION_ID") else None
+# API de la Empresa para pedir los precios vigentes al iniciar (opcional)
+EMPRESA_API_URL = os.getenv("EMPRESA_API_URL")
+INTERVALO_SINCRONIZACION = float(os.getenv("SINCRONIZACION_INTERVALO", "10"))
+
+mensajes_tcp = contador("estacion_tcp_mensajes_total", "Mensajes recibidos en el puerto de la Empresa", ("tipo",))
+precios_recibidos = contador(
+    "estacion_precios_recibidos_total",
+    "Conjuntos de precios recibidos de la Empresa",
+    ("resultado",)
+)
+medidor("estacion_tcp_conexiones", "Clientes conectados al puerto de la Empresa",
+        funcion=lambda: len(clientes_conectados))
+medidor(
+    "estacion_tcp_buffer_salida_bytes",
+    "Bytes pendientes de enviar a los clientes del puerto de la Empresa",
+    funcion=lambda: sum(w.transport.get_write_buffer_size() for w in list(clientes_conectados))
+)
+medidor("estacion_version_precios", "Versión del conjunto de precios aplicado",
+        funcion=lambda: version_precios)
+
+
+async def _propagar_a_clientes(data: bytes):
+    """Envía un mensaje a todos los clientes TCP conectados (surtidores simulados y otros clientes del relay)"""
+    for cliente in list(clientes_conectados):
+        try:
+            cliente.write(data)
+            await cliente.drain()
+        except Exception as e:
+            log.warning("Error propagando precios a cliente", error=str(e))
+            clientes_conectados.discard(cliente)
+
+
+async def aplicar_actualizacion_precios(mensaje: dict) -> bool:
+    """
+    Aplica un conjunto de precios recibido de la Empresa si no es más
+    antiguo que el vigente y lo propaga al frontend y a los surtidores
+    
+    Args:
+        mensaje: Mensaje actualizacion_precios (con "version" si la Empresa la envía)
+        
+    Returns:
+        True si se aplicó, False si se descartó por ser una versión vieja
+    """
+    global nombre_estacion, version_precios, id_estacion
+    
+    version = mensaje.get("version")
+    if mensaje.get("id_estacion") is not None:
+        id_estacion = mensaje["id_estacion"]
+    
+    # Un reintento o un envío reordenado no puede pisar precios más nuevos
+    if version is not None and version <= version_precios:
+        log.info("Precios descartados por versión vieja", version=version, vigente=version_precios)
+        precios_recibidos.inc("descartado")
+        return False
+    
+    precios_actuales.update(mensaje.get("precios", {}))
+    precios_recibidos.inc("aplicado")
+    if version is not None:
+        version_precios = version
+    log.info("Precios actualizados", version=version_precios, precios=precios_actuales)
+    
+    # Actualizar nombre si viene en el mensaje
+    if mensaje.get("nombre_estacion"):
+        nombre_estacion = mensaje.get("nombre_estacion")
+        log.info("Nombre actualizado", nombre=nombre_estacion)
+    
+    # 📡 Propagar los nuevos precios al frontend (socket.io) y a los clientes TCP
+    pasarela_ws.publicar_precios(precios_actuales, nombre_estacion if mensaje.get("nombre_estacion") else None)
+    mensaje_propagacion = {
+        "tipo": "actualizacion_precios",
+        "timestamp": mensaje.get("timestamp"),
+        "version": version_precios,
+        "precios": precios_actuales
+    }
+    
+    # Incluir nombre si fue actualizado
+    if mensaje.get("nombre_estacion"):
+        mensaje_propagacion["nombre_estacion"] = nombre_estacion
+    
+    await _propagar_a_clientes((json.dumps(mensaje_propagacion) + "\n").encode())
+    
+    # 🆕 NUEVO: Propagar precios a todos los SURTIDORES conectados
+    try:
+        from tcp_server_surtidores import propagar_precios_a_surtidores
+        await propagar_precios_a_surtidores(precios_actuales)
+        log.debug("Precios propagados a surtidores")
+    except Exception as e:
+        log.warning("Error propagando precios a surtidores", error=str(e))
+    
+    return True
 
 async def manejar_surtidor(reader, writer):
     addr = writer.get_extra_info('peername')
     surtidor_id = f"{addr[0]}:{addr[1]}"
-    print(f"🔌 Nueva conexión de surtidor {surtidor_id}")
+    log.info("Nueva conexión de cliente", cliente=surtidor_id)
     surtidores[surtidor_id] = {"estado": "Conectado"}
     clientes_conectados.add(writer)
 
@@ -31,56 +132,29 @@ async def manejar_surtidor(reader, writer):
 
             try:
                 mensaje = json.loads(data.decode())
+                mensajes_tcp.inc(str(mensaje.get("tipo", "sin_tipo")))
                 
                 # 🔍 Detectar si es un mensaje de actualización de precios desde la Empresa
                 if mensaje.get("tipo") == "actualizacion_precios":
-                    print(f"💰 Actualización de precios recibida desde Empresa")
-                    nuevos_precios = mensaje.get("precios", {})
-                    
-                    # Actualizar precios globales de la estación
-                    precios_actuales.update(nuevos_precios)
-                    print(f"✅ Precios actualizados: {precios_actuales}")
+                    aplicada = await aplicar_actualizacion_precios(mensaje)
                     
-                    # Actualizar nombre si viene en el mensaje
-                    global nombre_estacion
-                    if mensaje.get("nombre_estacion"):
-                        nombre_estacion = mensaje.get("nombre_estacion")
-                        print(f"✅ Nombre actualizado: {nombre_estacion}")
-                    
-                    # 📡 Propagar los nuevos precios a todos los clientes (frontend vía WebSocket bridge)
-                    mensaje_propagacion = {
-                        "tipo": "actualizacion_precios",
-                        "timestamp": mensaje.get("timestamp"),
-                        "precios": precios_actuales
-                    }
-                    
-                    # Incluir nombre si fue actualizado
-                    if mensaje.get("nombre_estacion"):
-                        mensaje_propagacion["nombre_estacion"] = nombre_estacion
-                    
-                    data_propagacion = (json.dumps(mensaje_propagacion) + "\n").encode()
-                    
-                    for cliente in list(clientes_conectados):
-                        try:
-                            cliente.write(data_propagacion)
-                            await cliente.drain()
-                        except Exception as e:
-                            print(f"⚠️ Error propagando precios a cliente: {e}")
-                            clientes_conectados.discard(cliente)
-                    
-                    # 🆕 NUEVO: Propagar precios a todos los SURTIDORES conectados
-                    try:
-                        from tcp_server_surtidores import propagar_precios_a_surtidores
-                        await propagar_precios_a_surtidores(precios_actuales)
-                        print(f"✅ Precios propagados a surtidores")
-                    except Exception as e:
-                        print(f"⚠️ Error propagando precios a surtidores: {e}")
+                    # ✉️ Acuse de recibo por la misma conexión con la versión vigente
+                    if mensaje.get("version") is not None:
+                        ack = {
+                            "tipo": "ack_precios",
+                            "id_estacion": id_estacion,
+                            "version": version_precios,
+                            "aplicada": aplicada
+                        }
+                        writer.write((json.dumps(ack) + "\n").encode())
+                        await writer.drain()
                     
                     continue  # No procesar como mensaje de surtidor
                 
                 # Mensaje normal de surtidor
                 surtidores[surtidor_id] = mensaje
-                print(f"📡 Estado recibido de {surtidor_id}: {mensaje}")
+                pasarela_ws.actualizar_surtidor(mensaje)
+                log.muestreado("Estado recibido", clave=surtidor_id, cliente=surtidor_id, tipo=mensaje.get("tipo"))
 
                 # 🔄 Reenviar a todos los clientes conectados (excepto al que lo envió)
                 for cliente in list(clientes_conectados):
@@ -89,17 +163,19 @@ async def manejar_surtidor(reader, writer):
                             cliente.write(data)
                             await cliente.drain()
                         except Exception as e:
-                            print(f"⚠️ Error enviando a cliente: {e}")
+                            log.warning("Error enviando a cliente", error=str(e))
                             clientes_conectados.discard(cliente)
 
             except json.JSONDecodeError:
-                print(f"⚠️ Mensaje inválido desde {surtidor_id}: {data.decode()}")
+                mensajes_tcp.inc("invalido")
+                log.muestreado("Mensaje inválido", clave=surtidor_id, nivel=WARNING, cliente=surtidor_id,
+                               bytes=len(data))
 
     except Exception as e:
-        print(f"⚠️ Error en surtidor {surtidor_id}: {e}")
+        log.warning("Error en conexión de cliente", cliente=surtidor_id, error=str(e))
 
     finally:
-        print(f"❌ Surtidor desconectado {surtidor_id}")
+        log.info("Cliente desconectado", cliente=surtidor_id)
         surtidores.pop(surtidor_id, None)
         clientes_conectados.discard(writer)
         writer.close()
@@ -108,7 +184,7 @@ async def manejar_surtidor(reader, writer):
 async def iniciar_tcp_servidor():
     """Inicia el servidor TCP que recibe los estados de los surtidores."""
     server = await asyncio.start_server(manejar_surtidor, "0.0.0.0", 5000)
-    print("🟢 Servidor TCP escuchando en 0.0.0.0:5000")
+    log.info("Servidor TCP escuchando", host="0.0.0.0", puerto=5000)
     async with server:
         await server.serve_forever()
 
@@ -123,6 +199,49 @@ def obtener_precios_actuales():
     return precios_actuales.copy()
 
 
+def obtener_version_precios() -> int:
+    """
+    Retorna la versión del conjunto de precios aplicado
+    
+    Returns:
+        Versión vigente (0 si aún no se recibieron precios de la Empresa)
+    """
+    return version_precios
+
+
+def _consultar_precios_vigentes(version_actual: int):
+    """Consulta (bloqueante) a la API de la Empresa; None si ya está al día"""
+    url = f"{EMPRESA_API_URL.rstrip('/')}/api/estaciones/{id_estacion}/precios-vigentes?version_actual={version_actual}"
+    with urllib.request.urlopen(url, timeout=5) as respuesta:
+        if respuesta.status == 204:
+            return None
+        return json.loads(respuesta.read())
+
+
+async def sincronizar_precios_con_empresa():
+    """
+    Pide a la Empresa solo el último conjunto de precios (por ejemplo, tras
+    reiniciarse la estación, que pierde los precios en memoria) y lo aplica.
+    Reintenta hasta lograr contactar a la Empresa.
+    Requiere EMPRESA_API_URL y ESTACION_ID.
+    """
+    if not EMPRESA_API_URL or id_estacion is None:
+        log.info("Sin EMPRESA_API_URL/ESTACION_ID: no se sincronizan precios al iniciar")
+        return
+    
+    while True:
+        try:
+            vigentes = await asyncio.to_thread(_consultar_precios_vigentes, version_precios)
+            if vigentes is None:
+                log.info("Precios al día con la Empresa", version=version_precios)
+            else:
+                await aplicar_actualizacion_precios(dict(vigentes, tipo="actualizacion_precios"))
+            return
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            log.warning("No se pudo sincronizar precios con la Empresa", error=str(e))
+            await asyncio.sleep(INTERVALO_SINCRONIZACION)
+
+
 def obtener_nombre_estacion():
     """
     Retorna el nombre actual de la estación
@@ -142,4 +261,4 @@ def actualizar_precios_locales(nuevos_precios: dict):
         nuevos_precios: Diccionario con los nuevos precios
     """
     precios_actuales.update(nuevos_precios)
-    print(f"✅ Precios actualizados manualmente: {precios_actuales}")
+    log.info("Precios actualizados manualmente", precios=precios_actuales)
@@ -7,15 +7,22 @@ Formato: Mensajes JSON delimitados por \n (TCP) o JSON puro (UDP)
 """
 import asyncio
 import json
+import time
 from datetime import datetime
 from typing import Dict, Set, Tuple
-from database import obtener_database
+from almacenamiento import almacenamiento
 from surtidores_service import (
     actualizar_conexion_surtidor,
     actualizar_estadisticas_surtidor,
     obtener_surtidor_por_id
 )
 from tcp_server import obtener_precios_actuales
+from bitacora import ERROR, WARNING, obtener_registrador
+from metricas import contador, histograma, medidor
+import pasarela_ws
+
+log = obtener_registrador("surtidores.tcp")
+log_udp = obtener_registrador("surtidores.udp")
 
 # Diccionario de surtidores conectados: {id_surtidor: writer}
 surtidores_conectados: Dict[int, asyncio.StreamWriter] = {}
@@ -26,6 +33,30 @@ clientes_surtidores: Set[asyncio.StreamWriter] = set()
 # Diccionario de direcciones UDP de surtidores: {id_surtidor: (ip, puerto)}
 surtidores_udp: Dict[int, Tuple[str, int]] = {}
 
+mensajes_surtidores = contador(
+    "estacion_surtidor_mensajes_total",
+    "Mensajes recibidos de los surtidores por protocolo y tipo",
+    ("protocolo", "tipo")
+)
+bytes_udp = contador("estacion_udp_bytes_total", "Bytes recibidos en datagramas UDP de surtidores")
+duracion_guardar_transaccion = histograma(
+    "estacion_guardar_transaccion_segundos",
+    "Duración de guardar_transaccion (estadísticas, inserción y propagación al frontend)"
+)
+duracion_fanout_precios = histograma(
+    "estacion_fanout_precios_segundos",
+    "Duración de la propagación de precios a todos los surtidores conectados"
+)
+medidor("estacion_surtidores_conectados", "Surtidores conectados vía TCP",
+        funcion=lambda: len(surtidores_conectados))
+medidor("estacion_surtidores_udp_registrados", "Surtidores con dirección UDP registrada",
+        funcion=lambda: len(surtidores_udp))
+medidor(
+    "estacion_surtidores_buffer_salida_bytes",
+    "Bytes pendientes de enviar a los surtidores conectados",
+    funcion=lambda: sum(w.transport.get_write_buffer_size() for w in list(surtidores_conectados.values()))
+)
+
 
 async def manejar_conexion_surtidor(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
     """
@@ -36,20 +67,20 @@ async def manejar_conexion_surtidor(reader: asyncio.StreamReader, writer: asynci
     id_surtidor = None
     
     try:
-        print(f"🔌 Nueva conexión TCP desde {addr}")
+        log.debug("Nueva conexión TCP", origen=addr)
         
         # Esperar mensaje de registro (timeout 10 segundos)
         registro_data = await asyncio.wait_for(reader.readline(), timeout=10.0)
         
         if not registro_data:
-            print(f"⚠️ Conexión cerrada sin registro desde {addr}")
+            log.warning("Conexión cerrada sin registro", origen=addr)
             return
         
         # Decodificar mensaje JSON
         registro = json.loads(registro_data.decode())
         
         if registro.get("tipo") != "registro":
-            print(f"⚠️ Primer mensaje no es registro: {registro}")
+            log.warning("Primer mensaje no es registro", origen=addr, tipo=registro.get("tipo"))
             writer.close()
             await writer.wait_closed()
             return
@@ -59,7 +90,7 @@ async def manejar_conexion_surtidor(reader: asyncio.StreamReader, writer: asynci
         combustibles_soportados = registro.get("combustibles_soportados", ["93", "95", "97", "diesel"])
         
         if not id_surtidor:
-            print(f"⚠️ Registro sin id_surtidor: {registro}")
+            log.warning("Registro sin id_surtidor", origen=addr)
             writer.close()
             await writer.wait_closed()
             return
@@ -69,7 +100,7 @@ async def manejar_conexion_surtidor(reader: asyncio.StreamReader, writer: asynci
         
         if not surtidor:
             # AUTO-REGISTRO: Crear el surtidor automáticamente
-            print(f"🆕 Surtidor {id_surtidor} no existe, creando automáticamente...")
+            log.info("Surtidor no existe, creando automáticamente", id_surtidor=id_surtidor)
             from surtidores_service import crear_surtidor
             from models import SurtidorCreate
             
@@ -82,9 +113,10 @@ async def manejar_conexion_surtidor(reader: asyncio.StreamReader, writer: asynci
             
             try:
                 surtidor = await crear_surtidor(nuevo_surtidor, id_surtidor_manual=id_surtidor)
-                print(f"✅ Surtidor {id_surtidor} ({nombre_surtidor}) creado y registrado automáticamente")
+                log.info("Surtidor creado y registrado automáticamente", id_surtidor=id_surtidor,
+                         nombre=nombre_surtidor)
             except Exception as e:
-                print(f"❌ Error creando surtidor {id_surtidor}: {e}")
+                log.error("Error creando surtidor", id_surtidor=id_surtidor, error=str(e))
                 error_msg = {
                     "tipo": "error",
                     "codigo": "ERROR_AUTO_REGISTRO",
@@ -96,7 +128,7 @@ async def manejar_conexion_surtidor(reader: asyncio.StreamReader, writer: asynci
                 await writer.wait_closed()
                 return
         
-        print(f"✅ Surtidor {id_surtidor} ({surtidor['nombre']}) conectado vía TCP")
+        log.info("Surtidor conectado vía TCP", id_surtidor=id_surtidor, nombre=surtidor["nombre"], origen=addr)
         
         # Registrar conexión
         surtidores_conectados[id_surtidor] = writer
@@ -113,7 +145,6 @@ async def manejar_conexion_surtidor(reader: asyncio.StreamReader, writer: asynci
         }
         writer.write((json.dumps(confirmacion) + "\n").encode())
         await writer.drain()
-        print(f"📤 Confirmación enviada a surtidor {id_surtidor}")
         
         # Loop principal: recibir mensajes del surtidor
         last_heartbeat = datetime.now()
@@ -124,7 +155,7 @@ async def manejar_conexion_surtidor(reader: asyncio.StreamReader, writer: asynci
                 data = await asyncio.wait_for(reader.readline(), timeout=90.0)
                 
                 if not data:
-                    print(f"⚠️ Conexión cerrada por surtidor {id_surtidor}")
+                    log.info("Conexión cerrada por surtidor", id_surtidor=id_surtidor)
                     break
                 
                 # Decodificar mensaje JSON
@@ -135,25 +166,27 @@ async def manejar_conexion_surtidor(reader: asyncio.StreamReader, writer: asynci
                 await procesar_mensaje_surtidor(id_surtidor, mensaje)
                 
             except asyncio.TimeoutError:
-                print(f"⏱️ Timeout: Surtidor {id_surtidor} sin heartbeat por 90s")
+                log.warning("Surtidor sin heartbeat", id_surtidor=id_surtidor, segundos=90)
                 break
             except json.JSONDecodeError as e:
-                print(f"⚠️ JSON inválido desde surtidor {id_surtidor}: {e}")
+                mensajes_surtidores.inc("tcp", "invalido")
+                log.muestreado("JSON inválido desde surtidor", clave=id_surtidor, nivel=WARNING,
+                               id_surtidor=id_surtidor, error=str(e))
                 # No cerrar conexión, solo ignorar mensaje malo
-            except Exception as e:
-                print(f"❌ Error procesando mensaje de surtidor {id_surtidor}: {e}")
+            except Exception:
+                log.exception("Error procesando mensaje de surtidor", id_surtidor=id_surtidor)
                 break
     
     except asyncio.TimeoutError:
-        print(f"⏱️ Timeout esperando registro desde {addr}")
+        log.warning("Timeout esperando registro", origen=addr)
     except json.JSONDecodeError as e:
-        print(f"⚠️ Error decodificando JSON desde {addr}: {e}")
-    except Exception as e:
-        print(f"❌ Error en conexión TCP desde {addr}: {e}")
+        log.warning("Error decodificando JSON del registro", origen=addr, error=str(e))
+    except Exception:
+        log.exception("Error en conexión TCP", origen=addr)
     finally:
         # Limpiar conexión
         if id_surtidor:
-            print(f"❌ Surtidor {id_surtidor} desconectado")
+            log.info("Surtidor desconectado", id_surtidor=id_surtidor)
             surtidores_conectados.pop(id_surtidor, None)
             await actualizar_conexion_surtidor(id_surtidor, "desconectado")
         
@@ -171,18 +204,23 @@ async def procesar_mensaje_surtidor(id_surtidor: int, mensaje: dict):
         mensaje: Diccionario con el mensaje JSON
     """
     tipo = mensaje.get("tipo")
+    mensajes_surtidores.inc("tcp", str(tipo))
     
     if tipo == "estado":
         # Actualización de estado en tiempo real
-        estado_op = mensaje.get("estado_operacion", "desconocido")
-        litros = mensaje.get("litros_actuales", 0)
-        print(f"📊 Estado surtidor {id_surtidor}: {estado_op} - {litros}L")
+        log.muestreado(
+            "Estado surtidor",
+            clave=id_surtidor,
+            id_surtidor=id_surtidor,
+            estado=mensaje.get("estado_operacion", "desconocido"),
+            litros=mensaje.get("litros_actuales", 0)
+        )
         # Aquí puedes actualizar un cache en memoria o Redis si necesitas
         # estado en tiempo real para el frontend
         
     elif tipo == "transaccion_completada":
         # Guardar transacción en la BD
-        print(f"💰 Transacción completada en surtidor {id_surtidor}")
+        log.debug("Transacción completada", id_surtidor=id_surtidor)
         await guardar_transaccion(id_surtidor, mensaje)
         
     elif tipo == "heartbeat":
@@ -195,16 +233,17 @@ async def procesar_mensaje_surtidor(id_surtidor: int, mensaje: dict):
         puerto = mensaje.get("puerto")
         if ip and puerto:
             surtidores_udp[id_surtidor] = (ip, puerto)
-            print(f"📡 Surtidor {id_surtidor} registró UDP en {ip}:{puerto}")
+            log.info("Surtidor registró UDP", id_surtidor=id_surtidor, ip=ip, puerto=puerto)
         
     elif tipo == "error":
         codigo = mensaje.get("codigo", "ERROR_DESCONOCIDO")
         msg = mensaje.get("mensaje", "Error sin descripción")
-        print(f"🚨 Error en surtidor {id_surtidor} [{codigo}]: {msg}")
+        log.error("Error informado por surtidor", id_surtidor=id_surtidor, codigo=codigo, mensaje=msg)
         # Aquí puedes registrar en logs, enviar alertas, etc.
         
     else:
-        print(f"⚠️ Tipo de mensaje desconocido desde surtidor {id_surtidor}: {tipo}")
+        log.muestreado("Tipo de mensaje desconocido", clave=id_surtidor, nivel=WARNING,
+                       id_surtidor=id_surtidor, tipo=tipo)
 
 
 async def guardar_transaccion(id_surtidor: int, datos: dict):
@@ -216,11 +255,14 @@ async def guardar_transaccion(id_surtidor: int, datos: dict):
         id_surtidor: ID del surtidor
         datos: Datos de la transacción (JSON del mensaje)
     """
+    inicio = time.perf_counter()
     try:
-        db = obtener_database()
-        
-        # Obtener datos del surtidor
-        surtidor = await obtener_surtidor_por_id(id_surtidor)
+        # Actualizar estadísticas del surtidor (retorna su nombre en el mismo round-trip)
+        surtidor = await actualizar_estadisticas_surtidor(
+            id_surtidor,
+            datos.get("litros", 0),
+            datos.get("monto_total", 0)
+        )
         
         # Preparar documento de transacción
         transaccion = {
@@ -236,68 +278,43 @@ async def guardar_transaccion(id_surtidor: int, datos: dict):
         }
         
         # Insertar transacción
-        resultado = await db.transacciones.insert_one(transaccion)
-        transaccion["_id"] = str(resultado.inserted_id)
-        
-        # Actualizar estadísticas del surtidor
-        await actualizar_estadisticas_surtidor(
-            id_surtidor,
-            datos.get("litros", 0),
-            datos.get("monto_total", 0)
-        )
+        transaccion["_id"] = await almacenamiento.transacciones.insertar(transaccion)
         
-        print(f"✅ Transacción guardada: {resultado.inserted_id} - {datos.get('litros')}L - ${datos.get('monto_total')}")
+        log.info("Transacción guardada", id_transaccion=transaccion["_id"], id_surtidor=id_surtidor,
+                 litros=datos.get("litros"), monto_total=datos.get("monto_total"))
         
         # 📡 Propagar transacción al frontend en tiempo real
-        await propagar_transaccion_a_frontend(transaccion)
+        propagar_transaccion_a_frontend(transaccion)
         
-    except Exception as e:
-        print(f"❌ Error guardando transacción: {e}")
+    except Exception:
+        log.exception("Error guardando transacción", id_surtidor=id_surtidor)
+    finally:
+        duracion_guardar_transaccion.observar(time.perf_counter() - inicio)
 
 
-async def propagar_transaccion_a_frontend(transaccion: dict):
+def propagar_transaccion_a_frontend(transaccion: dict):
     """
-    Envía la transacción al WebSocket bridge para notificar al frontend en tiempo real
+    Emite la transacción al frontend en tiempo real (evento nuevaTransaccion)
     
     Args:
         transaccion: Datos de la transacción completada
     """
     try:
-        from tcp_server import clientes_conectados
-        
-        # Preparar mensaje para el bridge
-        mensaje = {
-            "tipo": "nueva_transaccion",
-            "transaccion": {
-                "_id": transaccion.get("_id"),
-                "surtidor_id": transaccion.get("surtidor_id"),
-                "nombre_surtidor": transaccion.get("nombre_surtidor"),
-                "tipo_combustible": transaccion.get("tipo_combustible"),
-                "litros": transaccion.get("litros"),
-                "precio_por_litro": transaccion.get("precio_por_litro"),
-                "monto_total": transaccion.get("monto_total"),
-                "metodo_pago": transaccion.get("metodo_pago"),
-                "fecha": transaccion.get("fecha").isoformat() if isinstance(transaccion.get("fecha"), datetime) else str(transaccion.get("fecha")),
-                "estado": transaccion.get("estado")
-            },
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        data = (json.dumps(mensaje) + "\n").encode()
-        
-        # Enviar a todos los clientes del WebSocket bridge
-        for cliente in list(clientes_conectados):
-            try:
-                cliente.write(data)
-                await cliente.drain()
-            except Exception as e:
-                print(f"⚠️ Error propagando transacción a cliente: {e}")
-                clientes_conectados.discard(cliente)
-        
-        print(f"📡 Transacción propagada al frontend: {transaccion.get('surtidor_id')} - ${transaccion.get('monto_total')}")
-        
+        fecha = transaccion.get("fecha")
+        pasarela_ws.publicar_transaccion({
+            "_id": transaccion.get("_id"),
+            "surtidor_id": transaccion.get("surtidor_id"),
+            "nombre_surtidor": transaccion.get("nombre_surtidor"),
+            "tipo_combustible": transaccion.get("tipo_combustible"),
+            "litros": transaccion.get("litros"),
+            "precio_por_litro": transaccion.get("precio_por_litro"),
+            "monto_total": transaccion.get("monto_total"),
+            "metodo_pago": transaccion.get("metodo_pago"),
+            "fecha": fecha.isoformat() if isinstance(fecha, datetime) else str(fecha),
+            "estado": transaccion.get("estado")
+        })
     except Exception as e:
-        print(f"⚠️ Error propagando transacción al frontend: {e}")
+        log.warning("Error propagando transacción al frontend", error=str(e))
 
 
 async def propagar_precios_a_surtidores(nuevos_precios: dict):
@@ -309,7 +326,7 @@ async def propagar_precios_a_surtidores(nuevos_precios: dict):
         nuevos_precios: Diccionario con los nuevos precios
     """
     if not surtidores_conectados:
-        print("⚠️ No hay surtidores conectados para propagar precios")
+        log.info("No hay surtidores conectados para propagar precios")
         return
     
     mensaje = {
@@ -322,18 +339,21 @@ async def propagar_precios_a_surtidores(nuevos_precios: dict):
     data = (json.dumps(mensaje) + "\n").encode()
     
     desconectados = []
+    inicio = time.perf_counter()
     
-    print(f"📡 Propagando precios a {len(surtidores_conectados)} surtidores...")
+    log.info("Propagando precios a surtidores", surtidores=len(surtidores_conectados))
     
     for id_surtidor, writer in surtidores_conectados.items():
         try:
             writer.write(data)
             await writer.drain()
-            print(f"✅ Precios enviados a surtidor {id_surtidor}")
+            log.debug("Precios enviados a surtidor", id_surtidor=id_surtidor)
         except Exception as e:
-            print(f"❌ Error enviando precios a surtidor {id_surtidor}: {e}")
+            log.warning("Error enviando precios a surtidor", id_surtidor=id_surtidor, error=str(e))
             desconectados.append(id_surtidor)
     
+    duracion_fanout_precios.observar(time.perf_counter() - inicio)
+    
     # Limpiar conexiones muertas
     for id_surtidor in desconectados:
         surtidores_conectados.pop(id_surtidor, None)
@@ -355,7 +375,7 @@ async def enviar_comando_a_surtidor(id_surtidor: int, comando: str, razon: str =
     writer = surtidores_conectados.get(id_surtidor)
     
     if not writer:
-        print(f"⚠️ Surtidor {id_surtidor} no está conectado")
+        log.warning("Surtidor no está conectado", id_surtidor=id_surtidor)
         return False
     
     mensaje = {
@@ -369,10 +389,11 @@ async def enviar_comando_a_surtidor(id_surtidor: int, comando: str, razon: str =
         data = (json.dumps(mensaje) + "\n").encode()
         writer.write(data)
         await writer.drain()
-        print(f"📤 Comando '{comando}' enviado a surtidor {id_surtidor}")
+        log.info("Comando enviado a surtidor", id_surtidor=id_surtidor, comando=comando)
         return True
     except Exception as e:
-        print(f"❌ Error enviando comando a surtidor {id_surtidor}: {e}")
+        log.warning("Error enviando comando a surtidor", id_surtidor=id_surtidor, comando=comando,
+                    error=str(e))
         return False
 
 
@@ -393,29 +414,36 @@ class UDPServerProtocol(asyncio.DatagramProtocol):
         Recibe datagramas UDP con estados de surtidores
         No se garantiza orden ni entrega, pero es muy rápido
         """
+        bytes_udp.inc(cantidad=len(data))
         try:
             mensaje = json.loads(data.decode())
             id_surtidor = mensaje.get("id_surtidor")
             tipo = mensaje.get("tipo")
+            mensajes_surtidores.inc("udp", str(tipo))
             
             if tipo == "estado_rapido":
                 # Estado durante despacho (no crítico si se pierde)
-                estado_op = mensaje.get("estado_operacion", "desconocido")
-                litros = mensaje.get("litros_actuales", 0)
-                monto = mensaje.get("monto_actual", 0)
-                print(f"⚡ UDP Estado surtidor {id_surtidor}: {estado_op} - {litros}L - ${monto}")
+                log_udp.muestreado(
+                    "Estado rápido",
+                    clave=id_surtidor,
+                    id_surtidor=id_surtidor,
+                    estado=mensaje.get("estado_operacion", "desconocido"),
+                    litros=mensaje.get("litros_actuales", 0),
+                    monto=mensaje.get("monto_actual", 0)
+                )
                 # Aquí puedes actualizar cache/Redis para frontend en tiempo real
             
             elif tipo == "registro_udp":
                 # El surtidor nos informa su puerto UDP
                 if id_surtidor:
                     surtidores_udp[id_surtidor] = addr
-                    print(f"📡 Surtidor {id_surtidor} registrado UDP desde {addr}")
+                    log_udp.info("Surtidor registrado UDP", id_surtidor=id_surtidor, origen=addr)
                     
         except json.JSONDecodeError as e:
-            print(f"⚠️ JSON inválido en UDP: {e}")
+            mensajes_surtidores.inc("udp", "invalido")
+            log_udp.muestreado("JSON inválido en UDP", clave=addr[0], nivel=WARNING, origen=addr, error=str(e))
         except Exception as e:
-            print(f"❌ Error procesando UDP: {e}")
+            log_udp.muestreado("Error procesando UDP", clave=addr[0], nivel=ERROR, origen=addr, error=str(e))
 
 
 async def iniciar_servidor_udp_surtidores():
@@ -432,8 +460,7 @@ async def iniciar_servidor_udp_surtidores():
         local_addr=("0.0.0.0", 6001)
     )
     
-    print(f"🟢 Servidor UDP Surtidores escuchando en 0.0.0.0:6001")
-    print(f"   Protocolo: UDP (estados rápidos en tiempo real)")
+    log_udp.info("Servidor UDP Surtidores escuchando", host="0.0.0.0", puerto=6001)
 
 
 async def iniciar_servidor_tcp_surtidores():
@@ -449,8 +476,7 @@ async def iniciar_servidor_tcp_surtidores():
     )
     
     addr = server.sockets[0].getsockname()
-    print(f"🟢 Servidor TCP Surtidores escuchando en {addr[0]}:{addr[1]}")
-    print(f"   Protocolo: Socket TCP puro (JSON + \\n)")
+    log.info("Servidor TCP Surtidores escuchando", host=addr[0], puerto=addr[1])
     
     async with server:
         await server.serve_forever()
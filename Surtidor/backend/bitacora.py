@@ -0,0 +1,309 @@
+"""
+Registro de eventos estructurado y asíncrono
+Módulo compartido por los backends de Empresa, Estacion y Surtidor (se
+mantiene una copia idéntica en cada uno). Cada módulo obtiene un
+registrador por subsistema y emite eventos con campos en vez de texto:
+
+    log = obtener_registrador("surtidores.udp")
+    log.info("Surtidor conectado", id_surtidor=3, ip="10.0.0.7")
+
+El hilo del event loop solo encola el registro (QueueHandler, sin formatear
+ni escribir); un hilo en segundo plano (QueueListener) lo convierte en una
+línea JSON y la escribe en stdout. Si la cola se llena los registros se
+descartan y se cuentan, nunca se bloquea el loop.
+
+Cada subsistema tiene su propio nivel (jerárquico: "surtidores" cubre
+"surtidores.udp"), de modo que producción puede correr en WARNING y subir a
+DEBUG solo lo necesario, incluso en caliente con configurar_niveles().
+Los eventos de alta frecuencia se emiten con muestreado(): por cada clave
+pasan a lo sumo LOG_MUESTREO_MAX eventos por ventana y el resto solo se
+cuenta; el siguiente evento que pasa informa cuántos se suprimieron.
+
+Variables de entorno:
+    LOG_NIVEL: Nivel por defecto (DEBUG, INFO, WARNING, ERROR). Default INFO
+    LOG_NIVELES: Niveles por subsistema, p. ej. "surtidores.udp=DEBUG,pool=WARNING"
+    LOG_FORMATO: "json" (default) o "texto"
+    LOG_MUESTREO_MAX: Eventos muestreados por clave y ventana. Default 1
+    LOG_MUESTREO_VENTANA: Duración de la ventana de muestreo (segundos). Default 10
+    LOG_COLA_MAX: Registros en espera de escritura. Default 10000
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, List, Optional
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+# Todos los registradores cuelgan de esta raíz (no se tocan los de uvicorn)
+RAIZ = "bencineras"
+
+NIVEL_DEFECTO = os.getenv("LOG_NIVEL", "INFO").upper()
+FORMATO = os.getenv("LOG_FORMATO", "json").lower()
+MUESTREO_MAX = int(os.getenv("LOG_MUESTREO_MAX", "1"))
+MUESTREO_VENTANA = float(os.getenv("LOG_MUESTREO_VENTANA", "10"))
+COLA_MAX = int(os.getenv("LOG_COLA_MAX", "10000"))
+
+# Claves de muestreo guardadas antes de olvidar las ventanas viejas
+MAX_CLAVES_MUESTREO = 10000
+
+
+# ============================================
+# FORMATO (se ejecuta en el hilo escritor)
+# ============================================
+
+def _subsistema(record: logging.LogRecord) -> str:
+    return record.name[len(RAIZ) + 1:] if record.name.startswith(RAIZ + ".") else record.name
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por evento: ts, nivel, subsistema, evento y los campos"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        linea: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "subsistema": _subsistema(record),
+            "evento": record.getMessage()
+        }
+        campos = getattr(record, "campos", None)
+        if campos:
+            linea.update(campos)
+        if record.exc_info:
+            linea["traza"] = self.formatException(record.exc_info)
+        return json.dumps(linea, ensure_ascii=False, default=str)
+
+
+class FormatoTexto(logging.Formatter):
+    """Formato legible para desarrollo: hora, nivel, subsistema, evento y campos k=v"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        hora = datetime.fromtimestamp(record.created).strftime("%H:%M:%S.%f")[:-3]
+        campos = getattr(record, "campos", None) or {}
+        detalle = " ".join(f"{k}={v}" for k, v in campos.items())
+        linea = f"{hora} {record.levelname:<7} {_subsistema(record)}: {record.getMessage()}"
+        if detalle:
+            linea += f" | {detalle}"
+        if record.exc_info:
+            linea += "\n" + self.formatException(record.exc_info)
+        return linea
+
+
+# ============================================
+# COLA Y ESCRITOR EN SEGUNDO PLANO
+# ============================================
+
+class _ManejadorCola(logging.handlers.QueueHandler):
+    """Encola el registro tal cual; el formato se hace en el hilo escritor"""
+
+    def __init__(self, cola: queue.Queue):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class _Muestreo:
+    """Ventanas por clave para limitar eventos de alta frecuencia"""
+
+    def __init__(self, maximo: int, ventana: float):
+        self.maximo = maximo
+        self.ventana = ventana
+        # {clave: [inicio de la ventana, emitidos, suprimidos]}
+        self._ventanas: Dict[Hashable, List[float]] = {}
+
+    def permitir(self, clave: Hashable) -> Optional[int]:
+        """
+        Decide si un evento muestreado se emite
+
+        Returns:
+            None si se suprime; si se emite, cuántos se suprimieron en la ventana anterior
+        """
+        ahora = time.monotonic()
+        estado = self._ventanas.get(clave)
+
+        if estado is None or ahora - estado[0] >= self.ventana:
+            suprimidos = int(estado[2]) if estado else 0
+            if estado is None and len(self._ventanas) >= MAX_CLAVES_MUESTREO:
+                self._ventanas.clear()
+            self._ventanas[clave] = [ahora, 1, 0]
+            return suprimidos
+
+        if estado[1] < self.maximo:
+            estado[1] += 1
+            return 0
+
+        estado[2] += 1
+        return None
+
+
+_cola: queue.Queue = queue.Queue(maxsize=COLA_MAX)
+_manejador = _ManejadorCola(_cola)
+_muestreo = _Muestreo(MUESTREO_MAX, MUESTREO_VENTANA)
+_niveles: Dict[str, str] = {}
+
+
+def _salida() -> logging.Handler:
+    manejador = logging.StreamHandler(sys.stdout)
+    manejador.setFormatter(FormatoTexto() if FORMATO == "texto" else FormatoJSON())
+    return manejador
+
+
+_escritor = logging.handlers.QueueListener(_cola, _salida())
+
+
+# ============================================
+# REGISTRADOR
+# ============================================
+
+class Registrador:
+    """Registrador de un subsistema con campos estructurados"""
+
+    __slots__ = ("_logger",)
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def habilitado(self, nivel: int) -> bool:
+        """Permite evitar trabajo caro (armar campos) cuando el nivel está apagado"""
+        return self._logger.isEnabledFor(nivel)
+
+    def _emitir(self, nivel: int, evento: str, campos: Dict[str, Any], exc_info: bool = False):
+        if self._logger.isEnabledFor(nivel):
+            self._logger.log(nivel, evento, exc_info=exc_info, extra={"campos": campos})
+
+    def debug(self, evento: str, **campos):
+        self._emitir(DEBUG, evento, campos)
+
+    def info(self, evento: str, **campos):
+        self._emitir(INFO, evento, campos)
+
+    def warning(self, evento: str, **campos):
+        self._emitir(WARNING, evento, campos)
+
+    def error(self, evento: str, **campos):
+        self._emitir(ERROR, evento, campos)
+
+    def exception(self, evento: str, **campos):
+        """Error con la traza de la excepción en curso"""
+        self._emitir(ERROR, evento, campos, exc_info=True)
+
+    def muestreado(self, evento: str, clave: Hashable = None, nivel: int = DEBUG, **campos):
+        """
+        Emite un evento de alta frecuencia limitado por clave
+
+        Args:
+            evento: Descripción del evento
+            clave: Agrupa el muestreo (p. ej. el id del surtidor); None = un solo grupo
+            nivel: Nivel del evento (DEBUG por defecto)
+            **campos: Campos estructurados
+        """
+        if not self._logger.isEnabledFor(nivel):
+            return
+        suprimidos = _muestreo.permitir((self._logger.name, evento, clave))
+        if suprimidos is None:
+            return
+        if suprimidos:
+            campos["suprimidos"] = suprimidos
+        self._logger.log(nivel, evento, extra={"campos": campos})
+
+
+def obtener_registrador(subsistema: str) -> Registrador:
+    """
+    Retorna el registrador de un subsistema
+
+    Args:
+        subsistema: Nombre con puntos, p. ej. "tcp.estaciones" o "surtidores.udp"
+    """
+    return Registrador(logging.getLogger(f"{RAIZ}.{subsistema}"))
+
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+
+def _validar_nivel(nivel: str) -> str:
+    nivel = str(nivel).upper()
+    if nivel == "WARN":
+        nivel = "WARNING"
+    if not isinstance(logging.getLevelName(nivel), int):
+        raise ValueError(f"Nivel de log inválido: {nivel}")
+    return nivel
+
+
+def configurar_niveles(niveles: Dict[str, str]) -> Dict[str, str]:
+    """
+    Cambia en caliente el nivel de uno o más subsistemas
+
+    Args:
+        niveles: {subsistema: nivel}; "" o "*" cambia el nivel por defecto
+
+    Returns:
+        Niveles vigentes por subsistema
+
+    Raises:
+        ValueError: Si algún nivel no existe
+    """
+    validados = {subsistema: _validar_nivel(nivel) for subsistema, nivel in niveles.items()}
+    for subsistema, nivel in validados.items():
+        if subsistema in ("", "*"):
+            logging.getLogger(RAIZ).setLevel(nivel)
+            continue
+        logging.getLogger(f"{RAIZ}.{subsistema}").setLevel(nivel)
+        _niveles[subsistema] = nivel
+    return dict(_niveles)
+
+
+def _leer_niveles(texto: str) -> Dict[str, str]:
+    niveles = {}
+    for par in texto.split(","):
+        if "=" in par:
+            subsistema, nivel = par.split("=", 1)
+            niveles[subsistema.strip()] = nivel.strip()
+    return niveles
+
+
+def estado_bitacora() -> Dict[str, Any]:
+    """
+    Configuración y contadores del registro de eventos
+
+    Returns:
+        Diccionario con niveles, formato, muestreo y estado de la cola
+    """
+    return {
+        "nivel": logging.getLevelName(logging.getLogger(RAIZ).level),
+        "niveles": dict(_niveles),
+        "formato": FORMATO,
+        "muestreo": {"maximo": MUESTREO_MAX, "ventana": MUESTREO_VENTANA},
+        "cola": {"pendientes": _cola.qsize(), "capacidad": COLA_MAX, "descartados": _manejador.descartados}
+    }
+
+
+def _configurar():
+    raiz = logging.getLogger(RAIZ)
+    raiz.setLevel(_validar_nivel(NIVEL_DEFECTO))
+    raiz.addHandler(_manejador)
+    raiz.propagate = False
+    configurar_niveles(_leer_niveles(os.getenv("LOG_NIVELES", "")))
+
+    _escritor.start()
+    # Vaciar la cola al terminar el proceso
+    atexit.register(_escritor.stop)
+
+
+_configurar()
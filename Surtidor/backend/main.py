@@ -1,10 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 import asyncio
 import json
 import os
 import socket
 from datetime import datetime
+from typing import Dict
+from bitacora import WARNING, obtener_registrador, configurar_niveles, estado_bitacora
+from metricas import MetricasHTTP, TIPO_CONTENIDO, contador, exponer, medidor
+
+log = obtener_registrador("surtidor")
 
 # --- Configuración ---
 ESTACION_HOST = os.getenv("ESTACION_HOST", "estacion-backend")
@@ -38,6 +44,23 @@ precios = {
 writer_tcp_estacion = None  # TCP para transacciones y comandos
 sock_udp = None  # UDP para estados rápidos
 
+# --- Métricas ---
+mensajes_enviados = contador("surtidor_mensajes_enviados_total", "Mensajes enviados a la estación",
+                             ("protocolo", "tipo"))
+mensajes_recibidos = contador("surtidor_mensajes_recibidos_total", "Mensajes recibidos de la estación", ("tipo",))
+reconexiones_tcp = contador("surtidor_reconexiones_tcp_total", "Conexiones TCP establecidas con la estación")
+medidor("surtidor_conectado_tcp", "1 si hay conexión TCP con la estación",
+        funcion=lambda: int(writer_tcp_estacion is not None))
+medidor("surtidor_despachando", "1 si el surtidor está despachando",
+        funcion=lambda: int(surtidor["estado_operacion"] == "despachando"))
+medidor("surtidor_litros_actuales", "Litros despachados en la carga en curso",
+        funcion=lambda: surtidor["litros_actuales"])
+medidor(
+    "surtidor_tcp_buffer_salida_bytes",
+    "Bytes pendientes de enviar a la estación por TCP",
+    funcion=lambda: writer_tcp_estacion.transport.get_write_buffer_size() if writer_tcp_estacion else 0
+)
+
 # --- FastAPI ---
 app = FastAPI(
     title="API del Surtidor",
@@ -53,6 +76,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latencia HTTP por ruta (se agrega al final para medir también los demás middlewares)
+app.add_middleware(MetricasHTTP)
+
 
 # ============================================
 # CLIENTE TCP - CONEXIÓN PERSISTENTE
@@ -67,7 +93,8 @@ async def conectar_tcp_estacion():
         try:
             reader, writer = await asyncio.open_connection(ESTACION_HOST, ESTACION_TCP_PORT)
             writer_tcp_estacion = writer
-            print(f"✅ TCP conectado a estación en {ESTACION_HOST}:{ESTACION_TCP_PORT}")
+            reconexiones_tcp.inc()
+            log.info("TCP conectado a estación", host=ESTACION_HOST, puerto=ESTACION_TCP_PORT)
             
             # Enviar mensaje de registro
             await enviar_registro_tcp()
@@ -77,20 +104,21 @@ async def conectar_tcp_estacion():
                 data = await reader.readline()
                 
                 if not data:
-                    print("⚠️ Conexión TCP cerrada por la estación")
+                    log.warning("Conexión TCP cerrada por la estación")
                     break
                 
                 try:
                     mensaje = json.loads(data.decode())
                     await procesar_mensaje_estacion(mensaje)
                 except json.JSONDecodeError as e:
-                    print(f"⚠️ JSON inválido: {e}")
+                    log.warning("JSON inválido desde la estación", error=str(e))
                     
         except ConnectionRefusedError:
-            print(f"🔌 No se pudo conectar a estación TCP. Reintentando en 5s...")
+            log.muestreado("No se pudo conectar a estación TCP, reintentando", nivel=WARNING,
+                           host=ESTACION_HOST, puerto=ESTACION_TCP_PORT, reintento_en=5)
             writer_tcp_estacion = None
         except Exception as e:
-            print(f"❌ Error en conexión TCP: {e}")
+            log.error("Error en conexión TCP", error=str(e))
             writer_tcp_estacion = None
         
         await asyncio.sleep(5)
@@ -110,51 +138,53 @@ async def enviar_registro_tcp():
             data = (json.dumps(registro) + "\n").encode()
             writer_tcp_estacion.write(data)
             await writer_tcp_estacion.drain()
-            print(f"📤 Registro TCP enviado: ID={ID_SURTIDOR}")
+            mensajes_enviados.inc("tcp", "registro")
+            log.info("Registro TCP enviado", id_surtidor=ID_SURTIDOR)
         except Exception as e:
-            print(f"❌ Error enviando registro TCP: {e}")
+            log.error("Error enviando registro TCP", error=str(e))
 
 
 async def procesar_mensaje_estacion(mensaje: dict):
     """Procesa mensajes recibidos de la estación vía TCP"""
     tipo = mensaje.get("tipo")
+    mensajes_recibidos.inc(str(tipo))
     
     if tipo == "registro_confirmado":
-        print(f"✅ Registro confirmado: {mensaje.get('mensaje')}")
+        log.info("Registro confirmado", mensaje=mensaje.get("mensaje"))
         nuevos_precios = mensaje.get("precios", {})
         precios.update(nuevos_precios)
         actualizar_precio_actual()
         
     elif tipo == "actualizacion_precios":
-        print(f"💰 Actualización de precios recibida")
+        log.info("Actualización de precios recibida", precios=mensaje.get("precios", {}))
         nuevos_precios = mensaje.get("precios", {})
         precios.update(nuevos_precios)
         actualizar_precio_actual()
         
     elif tipo == "comando":
         comando = mensaje.get("comando")
-        print(f"🎮 Comando recibido: {comando}")
+        log.info("Comando recibido", comando=comando)
         await ejecutar_comando(comando, mensaje.get("razon", ""))
         
     elif tipo == "error":
-        print(f"🚨 Error desde estación: {mensaje.get('mensaje')}")
+        log.error("Error desde estación", mensaje=mensaje.get("mensaje"))
 
 
 async def ejecutar_comando(comando: str, razon: str):
     """Ejecuta comandos recibidos desde la estación"""
     if comando == "pausar" and surtidor["estado_operacion"] == "despachando":
         surtidor["estado_operacion"] = "pausado"
-        print(f"⏸️ Surtidor pausado: {razon}")
+        log.info("Surtidor pausado", razon=razon)
         await enviar_estado_tcp()
     elif comando == "reanudar" and surtidor["estado_operacion"] == "pausado":
         surtidor["estado_operacion"] = "despachando"
-        print(f"▶️ Surtidor reanudado")
+        log.info("Surtidor reanudado")
         await enviar_estado_tcp()
     elif comando == "detener_emergencia":
         surtidor["estado_operacion"] = "disponible"
         surtidor["litros_actuales"] = 0.0
         surtidor["monto_actual"] = 0
-        print(f"🚨 Detención de emergencia: {razon}")
+        log.warning("Detención de emergencia", razon=razon)
         await enviar_estado_tcp()
 
 
@@ -169,7 +199,7 @@ def actualizar_precio_actual():
         surtidor["precio_litro"] = precios["precio_97"]
     elif tipo == "diesel":
         surtidor["precio_litro"] = precios["precio_diesel"]
-    print(f"💰 Precio actualizado: ${surtidor['precio_litro']}/L")
+    log.debug("Precio actualizado", tipo_combustible=tipo, precio_litro=surtidor["precio_litro"])
 
 
 async def enviar_estado_tcp():
@@ -188,8 +218,9 @@ async def enviar_estado_tcp():
             data = (json.dumps(estado) + "\n").encode()
             writer_tcp_estacion.write(data)
             await writer_tcp_estacion.drain()
+            mensajes_enviados.inc("tcp", "estado")
         except Exception as e:
-            print(f"❌ Error enviando estado TCP: {e}")
+            log.muestreado("Error enviando estado TCP", nivel=WARNING, error=str(e))
 
 
 async def enviar_transaccion_completada(transaccion_data: dict):
@@ -210,9 +241,11 @@ async def enviar_transaccion_completada(transaccion_data: dict):
             data = (json.dumps(mensaje) + "\n").encode()
             writer_tcp_estacion.write(data)
             await writer_tcp_estacion.drain()
-            print(f"✅ Transacción enviada: {transaccion_data['litros']}L")
+            mensajes_enviados.inc("tcp", "transaccion_completada")
+            log.info("Transacción enviada", litros=transaccion_data["litros"],
+                     monto_total=transaccion_data["monto_total"])
         except Exception as e:
-            print(f"❌ Error enviando transacción TCP: {e}")
+            log.error("Error enviando transacción TCP", error=str(e))
 
 
 async def heartbeat_tcp_task():
@@ -229,8 +262,9 @@ async def heartbeat_tcp_task():
                 data = (json.dumps(heartbeat) + "\n").encode()
                 writer_tcp_estacion.write(data)
                 await writer_tcp_estacion.drain()
+                mensajes_enviados.inc("tcp", "heartbeat")
             except Exception as e:
-                print(f"⚠️ Error enviando heartbeat: {e}")
+                log.warning("Error enviando heartbeat", error=str(e))
 
 
 # ============================================
@@ -242,9 +276,9 @@ def inicializar_udp():
     global sock_udp
     try:
         sock_udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        print(f"✅ Socket UDP inicializado")
+        log.info("Socket UDP inicializado")
     except Exception as e:
-        print(f"❌ Error inicializando UDP: {e}")
+        log.error("Error inicializando UDP", error=str(e))
 
 
 def enviar_estado_udp():
@@ -262,8 +296,9 @@ def enviar_estado_udp():
             }
             data = json.dumps(mensaje).encode()
             sock_udp.sendto(data, (ESTACION_HOST, ESTACION_UDP_PORT))
+            mensajes_enviados.inc("udp", "estado_rapido")
         except Exception as e:
-            print(f"⚠️ Error enviando UDP: {e}")
+            log.muestreado("Error enviando UDP", nivel=WARNING, error=str(e))
 
 
 # ============================================
@@ -298,7 +333,7 @@ async def simular_carga():
 
 @app.on_event("startup")
 async def startup_event():
-    print(f"🚀 Iniciando Surtidor ID={ID_SURTIDOR} ({NOMBRE_SURTIDOR})")
+    log.info("Iniciando surtidor", id_surtidor=ID_SURTIDOR, nombre=NOMBRE_SURTIDOR)
     
     # Inicializar UDP
     inicializar_udp()
@@ -434,3 +469,24 @@ def health_check():
         "udp_enabled": sock_udp is not None,
         "estado_operacion": surtidor["estado_operacion"]
     }
+
+
+@app.get("/metrics", include_in_schema=False)
+def obtener_metricas():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(exponer(), media_type=TIPO_CONTENIDO)
+
+
+@app.get("/logs")
+def obtener_estado_logs():
+    """Configuración del registro de eventos y estado de su cola de escritura"""
+    return estado_bitacora()
+
+
+@app.put("/logs/niveles")
+def cambiar_niveles_logs(niveles: Dict[str, str]):
+    """Cambia en caliente el nivel de log, p. ej. {"surtidor": "DEBUG"}"""
+    try:
+        return configurar_niveles(niveles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))